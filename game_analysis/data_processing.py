@@ -3,19 +3,35 @@ import pandas as pd
 import re
 import json
 import math
+import numpy as np
+from typing import Optional
+from risk_game.battle import win_probability_table, expected_losses_table
+from risk_game.utils.game_log import game_log_path, read_game_log, \
+game_state_frame, player_data_frame
 
 # Provided function
-def load_game_state_from_folder(game_folder: str) -> pd.DataFrame:
+def load_game_state_from_folder(game_folder: str,
+                                store: Optional['ResultsStore'] = None
+                                ) -> pd.DataFrame:
     """
     Load all game state CSV files from a folder into a single DataFrame.
+    Games saved with a game log are read from the log.
     
     Args:
     - game_folder (str): The path to the folder containing the 
         game state CSV files.
+    - store (ResultsStore): Read the game from the results store if it
+        was ingested, see results_store.py.
     
     Returns:
     - pd.DataFrame: A DataFrame containing all the game state data.
     """
+    if store is not None and store.has_game(game_folder):
+        return store.game_state([game_folder])[game_folder]
+    log_path = game_log_path(game_folder)
+    if log_path is not None:
+        return game_state_frame(read_game_log(log_path))
+
     # Regex pattern to match game state files
     pattern = re.compile(r"game_state_turn_(\d+)\.csv")
     
@@ -42,7 +58,9 @@ def load_game_state_from_folder(game_folder: str) -> pd.DataFrame:
     
     return full_game_state_df
 
-def load_player_data_from_folder(game_folder: str) -> pd.DataFrame:
+def load_player_data_from_folder(game_folder: str,
+                                 store: Optional['ResultsStore'] = None
+                                 ) -> pd.DataFrame:
     """
     Load all player data CSV files from a folder into a single DataFrame,
     and remove the 'Troops' column.
@@ -50,10 +68,19 @@ def load_player_data_from_folder(game_folder: str) -> pd.DataFrame:
     Args:
     - game_folder (str): The path to the folder containing the 
         player data CSV files.
+    - store (ResultsStore): Read the game from the results store if it
+        was ingested, see results_store.py.
     
     Returns:
     - pd.DataFrame: A DataFrame containing all the player data (without the 'Troops' column).
     """
+    if store is not None and store.has_game(game_folder):
+        return store.player_data([game_folder])[game_folder]
+    log_path = game_log_path(game_folder)
+    if log_path is not None:
+        return player_data_frame(read_game_log(log_path)).drop(
+            columns=['Troops'])
+
     # Regex pattern to match player data files
     pattern = re.compile(r"player_data_turn_(\d+)\.csv")
     
@@ -83,16 +110,22 @@ def load_player_data_from_folder(game_folder: str) -> pd.DataFrame:
     
     return full_player_data_df
 
-def process_json_files_in_folder(folder_path: str) -> pd.DataFrame:
+def process_json_files_in_folder(folder_path: str,
+                                 store: Optional['ResultsStore'] = None
+                                 ) -> pd.DataFrame:
     """
     Process all JSON files in a folder and compile their data into a DataFrame.
     
     Args:
     - folder_path (str): The path to the folder containing JSON files.
+    - store (ResultsStore): Read the end game results of an ingested game
+        from the index of the results store.
     
     Returns:
     - pd.DataFrame: A DataFrame containing the extracted data from all JSON files.
     """
+    if store is not None and store.has_game(folder_path):
+        return store.game_summaries([folder_path])[folder_path]
     game_summaries = []
     
 
@@ -130,36 +163,80 @@ def extract_game_summary_from_json(json_file: str) -> dict:
     
     return game_summary
 
-def combine_game_results(func, base_folder: str) -> pd.DataFrame:
+# The query of the results store behind each loader
+STORE_QUERIES = {
+    load_game_state_from_folder: 'game_state',
+    load_player_data_from_folder: 'player_data',
+    process_json_files_in_folder: 'game_summaries',
+}
+
+def combine_game_results(func, base_folder: str,
+                         store: Optional['ResultsStore'] = None
+                         ) -> pd.DataFrame:
     """
     Combine game results from all subfolders within the base folder.
     
     Args:
+    - func: The loader of a game folder, e.g. load_game_state_from_folder.
     - base_folder (str): The path to the base folder containing game subfolders.
+    - store (ResultsStore): Read the ingested games from the results 
+        store, all of them in one query, see results_store.py. The other
+        games are read from their folders.
     
     Returns:
     - pd.DataFrame: A DataFrame containing all the combined game state data.
     """
-    combined_df = pd.DataFrame()  # Initialize an empty DataFrame
-    folder_number = 0  # Initialize folder counter
+    game_folders = [os.path.join(base_folder, folder_name)
+                    for folder_name in os.listdir(base_folder)
+                    if os.path.isdir(os.path.join(base_folder, folder_name))]
+    stored = {}
+    if store is not None and func in STORE_QUERIES:
+        stored = getattr(store, STORE_QUERIES[func])(game_folders)
 
-    # Loop through each subfolder in the base folder
-    for folder_name in os.listdir(base_folder):
-        game_folder = os.path.join(base_folder, folder_name)
+    game_dfs = []
+    for folder_number, game_folder in enumerate(game_folders, start=1):
+        # Load the game data from the store or the folder
+        game_df = (stored[game_folder] if game_folder in stored
+                   else func(game_folder))
         
-        if os.path.isdir(game_folder):  # Check if it's a directory
-            folder_number += 1  # Increment folder counter
-            
-            # Load the game state data from the folder
-            full_game_state_df = func(game_folder)
-            
-            # Add a column indicating the folder number
-            full_game_state_df['Game_Number'] = folder_number
-            
-            # Append the game state DataFrame to the combined DataFrame
-            combined_df = pd.concat([combined_df, full_game_state_df], ignore_index=True)
+        # Add a column indicating the folder number
+        game_df['Game_Number'] = folder_number
+        game_dfs.append(game_df)
+    
+    # Concatenated once, concatenating in the loop copies the rows of 
+    # every game again for every later game
+    if not game_dfs:
+        return pd.DataFrame()
+    return pd.concat(game_dfs, ignore_index=True)
+
+def calculate_attack_odds(max_attackers: int = 20, 
+                          max_defenders: int = 20) -> pd.DataFrame:
+    """
+    Exact win probability and expected losses for every battle size.
+    
+    Args:
+    - max_attackers (int): The largest number of attacking troops.
+    - max_defenders (int): The largest number of defending troops.
     
-    return combined_df
+    Returns:
+    - pd.DataFrame: One row per (Attackers, Defenders) pair with the 
+        Win_Probability, Expected_Attacker_Losses and 
+        Expected_Defender_Losses columns.
+    """
+    win_probability = win_probability_table(max_attackers, max_defenders)
+    attacker_losses, defender_losses = expected_losses_table(
+        max_attackers, max_defenders)
+    attackers, defenders = np.meshgrid(
+        np.arange(1, max_attackers + 1), np.arange(1, max_defenders + 1),
+        indexing='ij')
+
+    return pd.DataFrame({
+        'Attackers': attackers.ravel(),
+        'Defenders': defenders.ravel(),
+        'Win_Probability': win_probability[1:, 1:].ravel(),
+        'Expected_Attacker_Losses': attacker_losses[1:, 1:].ravel(),
+        'Expected_Defender_Losses': defender_losses[1:, 1:].ravel()
+    })
 
 def binomial_coefficient(n, k):
     """Calculate the binomial coefficient (n choose k)."""
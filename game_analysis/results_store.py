@@ -0,0 +1,342 @@
+"""
+Consolidated store of the game results.
+
+Loading a results folder used to read every per-turn CSV file of every
+game, over a second for ten games. ingest_results compacts the
+game folders under a results folder into one Parquet dataset, in
+results_store in the results folder by default:
+- games.parquet: the index of the games, one row per game: Game_Id,
+  Experiment, Game_Folder (relative to the results folder), Agent_Mix and
+  Config (JSON) from the manifest of the experiment, Players, Winner,
+  Victory_Condition, Total_Rounds and Turns.
+- game_state/Experiment=<name>/part-N.parquet: the board after every turn,
+  one row per territory and turn: Game_Id, Turn_Number, Game_Round,
+  Territory, Player (the owner) and Troops.
+- player_data/Experiment=<name>/part-N.parquet: the players after every
+  turn, the columns of load_player_data_from_folder with the Game_Id.
+The experiment is the folder of the game relative to the results folder.
+Ingesting again only adds the games that are not in the index yet, in a
+new part file per experiment. Only finished games, with their
+end_game_results.json, are ingested.
+
+ResultsStore queries the dataset with pyarrow.dataset: only the columns
+asked for are read, a filter on Experiment skips the other partitions and
+a filter on Game_Id the row groups of other games. The loaders of
+data_processing take a store, see combine_game_results. The files can
+also be queried with DuckDB, e.g.
+SELECT * FROM 'results_store/game_state/*/*.parquet'.
+
+Ingest a results folder with:
+python -m game_analysis.results_store game_results
+"""
+import argparse
+import json
+import os
+from typing import Dict, List, Optional
+from urllib.parse import quote
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from risk_game.game_constants import TERRITORIES
+from game_analysis.data_processing import load_game_state_from_folder, \
+load_player_data_from_folder
+
+STORE_FOLDER = "results_store"
+INDEX_FILE = "games.parquet"
+STORE_TABLES = ("game_state", "player_data")
+ROW_GROUP_SIZE: int = 2 ** 16
+
+
+def game_key(game_folder: str, results_folder: str) -> str:
+    """A game folder relative to the results folder, with / separators."""
+    return os.path.relpath(os.path.abspath(game_folder),
+                           os.path.abspath(results_folder)).replace(os.sep, "/")
+
+
+def find_game_folders(results_folder: str, store_folder: str) -> List[str]:
+    """The finished game folders under a results folder, in sorted order."""
+    game_folders = []
+    for folder, subfolders, file_names in os.walk(results_folder):
+        subfolders[:] = sorted(
+            subfolder for subfolder in subfolders
+            if os.path.abspath(os.path.join(folder, subfolder)) !=
+            os.path.abspath(store_folder))
+        if 'end_game_results.json' in file_names:
+            game_folders.append(folder)
+    return game_folders
+
+
+def read_manifest(experiment_folder: str) -> Dict:
+    path = os.path.join(experiment_folder, 'manifest.json')
+    if not os.path.exists(path):
+        return {}
+    with open(path) as file:
+        return json.load(file)
+
+
+def long_game_state(game_state: pd.DataFrame, players: List[str]
+    ) -> pd.DataFrame:
+    """The wide game state (one troop column per player) as one row per
+    territory and turn with its owner."""
+    troops = game_state[players].to_numpy()
+    owned = troops > 0
+    owner = np.where(owned.any(axis=1),
+                     np.array(players, dtype=object)[owned.argmax(axis=1)],
+                     None)
+    return pd.DataFrame({
+        'Turn_Number': game_state['Turn_Number'].to_numpy(np.int32),
+        'Game_Round': game_state['Game_Round'].to_numpy(np.int32),
+        'Territory': pd.Categorical(game_state['Territory'],
+                                    categories=TERRITORIES),
+        'Player': pd.Categorical(owner, categories=players),
+        'Troops': troops.max(axis=1).astype(np.int32),
+    })
+
+
+def write_part(store_folder: str, table_name: str, experiment: str,
+               table: pa.Table) -> None:
+    partition = os.path.join(store_folder, table_name,
+                             f"Experiment={quote(experiment, safe='')}")
+    os.makedirs(partition, exist_ok=True)
+    part_number = len([file_name for file_name in os.listdir(partition)
+                       if file_name.endswith(".parquet")])
+    pq.write_table(table, os.path.join(partition,
+                                       f"part-{part_number}.parquet"),
+                   row_group_size=ROW_GROUP_SIZE)
+
+
+def ingest_results(results_folder: str = "game_results",
+                   store_folder: Optional[str] = None) -> int:
+    """
+    Add the finished games of a results folder to its store, see the
+    module docstring.
+
+    Args:
+    - results_folder (str): Folder with the experiment and game folders.
+    - store_folder (str): Folder of the store, results_store in the
+        results folder if None.
+
+    Returns:
+    - int: The number of games added.
+    """
+    if store_folder is None:
+        store_folder = os.path.join(results_folder, STORE_FOLDER)
+    os.makedirs(store_folder, exist_ok=True)
+    index_path = os.path.join(store_folder, INDEX_FILE)
+    index = (pd.read_parquet(index_path) if os.path.exists(index_path)
+             else pd.DataFrame())
+    known_games = set(index['Game_Folder']) if len(index) else set()
+    next_game_id = int(index['Game_Id'].max()) + 1 if len(index) else 1
+
+    games = []
+    frames: Dict[str, Dict[str, List[pd.DataFrame]]] = {}
+    for game_folder in find_game_folders(results_folder, store_folder):
+        key = game_key(game_folder, results_folder)
+        if key in known_games:
+            continue
+        experiment = os.path.dirname(key) or "."
+        manifest = read_manifest(os.path.dirname(game_folder))
+        with open(os.path.join(game_folder, 'end_game_results.json')) as file:
+            end_game_data = json.load(file)
+
+        game_state = load_game_state_from_folder(game_folder)
+        players = [column for column in game_state.columns
+                   if column not in ('Territory', 'Turn_Number', 'Game_Round')]
+        game_state = long_game_state(game_state, players).sort_values(
+            ['Turn_Number', 'Territory'], kind='stable')
+        player_data = load_player_data_from_folder(game_folder).sort_values(
+            'Turn_Number', kind='stable')
+        for frame in (game_state, player_data):
+            frame.insert(0, 'Game_Id', next_game_id)
+        tables = frames.setdefault(experiment, {name: []
+                                                for name in STORE_TABLES})
+        tables['game_state'].append(game_state)
+        tables['player_data'].append(player_data)
+
+        games.append({
+            'Game_Id': next_game_id,
+            'Experiment': experiment,
+            'Game_Folder': key,
+            'Agent_Mix': manifest.get('agent_mix'),
+            'Config': (json.dumps(manifest['config'])
+                       if 'config' in manifest else None),
+            'Players': players,
+            'Winner': end_game_data.get('winner'),
+            'Victory_Condition': end_game_data.get('victory_condition'),
+            'Total_Rounds': end_game_data.get('total_rounds'),
+            'Turns': int(game_state['Turn_Number'].nunique()),
+        })
+        next_game_id += 1
+
+    for experiment, tables in frames.items():
+        for table_name, table_frames in tables.items():
+            write_part(store_folder, table_name, experiment, pa.Table.from_pandas(
+                pd.concat(table_frames, ignore_index=True),
+                preserve_index=False))
+    if games:
+        index = pd.concat([index, pd.DataFrame(games)], ignore_index=True)
+        # Replaced in one rename, a failed ingest leaves the old index
+        index.to_parquet(index_path + ".tmp", index=False)
+        os.replace(index_path + ".tmp", index_path)
+    return len(games)
+
+
+class ResultsStore:
+    """
+    Queries of a store written by ingest_results, see the module
+    docstring.
+
+    Parameters:
+    - store_folder: Folder of the store.
+    - results_folder: The results folder the store was ingested from, the
+    game folders are relative to it. The parent of the store folder if
+    None.
+    """
+    def __init__(self, store_folder: str,
+                 results_folder: Optional[str] = None) -> None:
+        self.store_folder = store_folder
+        self.results_folder = (results_folder if results_folder is not None
+                               else os.path.dirname(os.path.abspath(
+                                   store_folder)))
+        self.index = pd.read_parquet(os.path.join(store_folder, INDEX_FILE))
+        self.game_ids: Dict[str, int] = dict(
+            zip(self.index['Game_Folder'], self.index['Game_Id']))
+        self.datasets: Dict[str, ds.Dataset] = {}
+
+    def __repr__(self) -> str:
+        return (f"<ResultsStore(games={len(self.index)}, " +
+                f"store_folder='{self.store_folder}')>")
+
+    def dataset(self, table_name: str) -> ds.Dataset:
+        if table_name not in self.datasets:
+            path = os.path.join(self.store_folder, table_name)
+            files = sorted(
+                os.path.join(folder, file_name)
+                for folder, _, file_names in os.walk(path)
+                for file_name in file_names if file_name.endswith(".parquet"))
+            # The games of later ingests can have more player counters
+            schema = pa.unify_schemas(
+                [pq.read_schema(file) for file in files] +
+                [pa.schema([pa.field('Experiment', pa.string())])],
+                promote_options="permissive")
+            self.datasets[table_name] = ds.dataset(
+                files, schema=schema, format="parquet",
+                partitioning=ds.partitioning(
+                    pa.schema([pa.field('Experiment', pa.string())]),
+                    flavor="hive"),
+                partition_base_dir=path)
+        return self.datasets[table_name]
+
+    def game_id(self, game_folder: str) -> Optional[int]:
+        return self.game_ids.get(game_key(game_folder, self.results_folder))
+
+    def has_game(self, game_folder: str) -> bool:
+        return self.game_id(game_folder) is not None
+
+    def games(self, experiments: Optional[List[str]] = None) -> pd.DataFrame:
+        """The index of the games, of some experiments."""
+        if experiments is None:
+            return self.index.copy()
+        return self.index[self.index['Experiment'].isin(experiments)].copy()
+
+    def query(self, table_name: str, columns: Optional[List[str]] = None,
+              game_ids: Optional[List[int]] = None,
+              experiments: Optional[List[str]] = None) -> pd.DataFrame:
+        """
+        Rows of game_state or player_data, only reading the columns asked
+        for of the games and experiments asked for.
+        """
+        if table_name not in STORE_TABLES:
+            raise ValueError(f"Unknown table: {table_name}. " +
+                             f"Please choose one of {STORE_TABLES}.")
+        condition = None
+        if game_ids is not None:
+            # Typed, an empty list would be a null array
+            condition = ds.field('Game_Id').isin(
+                pa.array(list(game_ids), pa.int64()))
+            if experiments is None:
+                # Only the partitions of the games are read
+                experiments = sorted(set(self.index.loc[
+                    self.index['Game_Id'].isin(game_ids), 'Experiment']))
+        if experiments is not None:
+            experiment_condition = ds.field('Experiment').isin(
+                pa.array(experiments, pa.string()))
+            condition = (experiment_condition if condition is None
+                         else condition & experiment_condition)
+        return self.dataset(table_name).to_table(
+            columns=columns, filter=condition).to_pandas()
+
+    def stored_games(self, game_folders: List[str]) -> Dict[str, int]:
+        return {game_folder: self.game_id(game_folder)
+                for game_folder in game_folders if self.has_game(game_folder)}
+
+    def game_state(self, game_folders: List[str]) -> Dict[str, pd.DataFrame]:
+        """The game states of the stored game folders, in the layout of
+        load_game_state_from_folder, in one query."""
+        games = self.stored_games(game_folders)
+        if not games:
+            return {}
+        rows = self.query('game_state', columns=[
+            'Game_Id', 'Turn_Number', 'Game_Round', 'Territory', 'Player',
+            'Troops'], game_ids=list(games.values()))
+        players = dict(zip(self.index['Game_Id'], self.index['Players']))
+        rows_by_game = dict(list(rows.groupby('Game_Id', sort=False)))
+        game_states = {}
+        for game_folder, game_id in games.items():
+            game_rows = rows_by_game[game_id]
+            game_state = pd.DataFrame(
+                {'Territory': game_rows['Territory'].astype(str).to_numpy()})
+            owner = game_rows['Player'].astype(object).to_numpy()
+            troops = game_rows['Troops'].to_numpy(np.int64)
+            for player in players[game_id]:
+                game_state[player] = np.where(owner == player, troops, 0)
+            game_state['Turn_Number'] = game_rows['Turn_Number'].to_numpy(
+                np.int64)
+            game_state['Game_Round'] = game_rows['Game_Round'].to_numpy(
+                np.int64)
+            game_states[game_folder] = game_state
+        return game_states
+
+    def player_data(self, game_folders: List[str]
+        ) -> Dict[str, pd.DataFrame]:
+        """The player data of the stored game folders, in the layout of
+        load_player_data_from_folder, in one query."""
+        games = self.stored_games(game_folders)
+        if not games:
+            return {}
+        rows = self.query('player_data', game_ids=list(games.values()))
+        rows = rows.drop(columns=['Experiment'])
+        rows_by_game = dict(list(rows.groupby('Game_Id', sort=False)))
+        player_data = {}
+        for game_folder, game_id in games.items():
+            # Without the counters the game did not have yet
+            player_data[game_folder] = rows_by_game[game_id].drop(
+                columns=['Game_Id']).dropna(axis=1, how='all').reset_index(
+                drop=True)
+        return player_data
+
+    def game_summaries(self, game_folders: List[str]
+        ) -> Dict[str, pd.DataFrame]:
+        """The end game results of the stored game folders, in the layout
+        of process_json_files_in_folder."""
+        games = self.stored_games(game_folders)
+        index = self.index.set_index('Game_Id')
+        return {game_folder: pd.DataFrame({
+                    'winner': [index.at[game_id, 'Winner']],
+                    'victory_condition': [index.at[game_id,
+                                                   'Victory_Condition']],
+                    'total_rounds': [index.at[game_id, 'Total_Rounds']]})
+                for game_folder, game_id in games.items()}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Compact the game folders into the results store")
+    parser.add_argument("results_folder", nargs="?", default="game_results")
+    parser.add_argument("--store-folder", default=None)
+    args = parser.parse_args()
+
+    added = ingest_results(args.results_folder, args.store_folder)
+    print(f"Added {added} games to the results store")
@@ -0,0 +1,265 @@
+"""
+Closed form battle outcomes.
+
+A battle is a Markov chain over (attackers, defenders). Each round the
+attacker rolls min(attackers, 3) dice and the defender min(defenders, 2),
+the highest dice are compared pairwise and the defender wins ties, exactly
+as in GameState.simulate_attack. The distribution of the final result of
+every battle up to a cap is computed once and sampled with a single
+uniform draw from its cumulative distribution.
+
+simulate_battles resolves large batches of battles with vectorised dice
+rolls, and the win probability and expected loss tables are exposed for
+prompts and for the analysis notebooks.
+"""
+import numpy as np
+from functools import lru_cache
+from itertools import product
+from typing import Dict, List, Tuple
+
+DEFAULT_TABLE_CAP: int = 50
+
+
+def _round_outcomes(attacker_dice: int, defender_dice: int
+    ) -> List[Tuple[int, int, float]]:
+    """Probability of every (attacker losses, defender losses) pair for a
+    single round of dice."""
+    counts: Dict[Tuple[int, int], int] = {}
+    for rolls in product(range(1, 7), repeat=attacker_dice + defender_dice):
+        attacker_rolls = sorted(rolls[:attacker_dice], reverse=True)
+        defender_rolls = sorted(rolls[attacker_dice:], reverse=True)
+        attacker_losses = defender_losses = 0
+        for attack_roll, defend_roll in zip(attacker_rolls, defender_rolls):
+            if attack_roll > defend_roll:
+                defender_losses += 1
+            else:
+                attacker_losses += 1
+        counts[(attacker_losses, defender_losses)] = counts.get(
+            (attacker_losses, defender_losses), 0) + 1
+    total = 6 ** (attacker_dice + defender_dice)
+    return [(attacker_losses, defender_losses, count / total)
+            for (attacker_losses, defender_losses), count in sorted(counts.items())]
+
+
+# Round outcomes keyed by (attacker dice, defender dice)
+ROUND_OUTCOMES: Dict[Tuple[int, int], List[Tuple[int, int, float]]] = {
+    (attacker_dice, defender_dice): _round_outcomes(attacker_dice, defender_dice)
+    for attacker_dice in range(1, 4) for defender_dice in range(1, 3)
+}
+# Losses and probabilities of a full 3 vs 2 dice round
+FULL_ROUND_LOSSES: np.ndarray = np.array(
+    [(attacker_losses, defender_losses)
+     for attacker_losses, defender_losses, _ in ROUND_OUTCOMES[(3, 2)]])
+FULL_ROUND_PROBABILITIES: np.ndarray = np.array(
+    [probability for _, _, probability in ROUND_OUTCOMES[(3, 2)]])
+
+
+@lru_cache(maxsize=4)
+def battle_outcome_table(cap: int = DEFAULT_TABLE_CAP) -> np.ndarray:
+    """
+    Exact distribution of the final result of every battle with up to cap
+    attackers and cap defenders.
+
+    Returns:
+    - An array of shape (cap + 1, cap + 1, 2 * cap + 1). Entry [a, d, k] is
+    the probability that a battle of a attackers against d defenders ends
+    with the attacker winning with k troops left (1 <= k <= cap) or the
+    defender winning with k - cap troops left (k > cap).
+    """
+    table = np.zeros((cap + 1, cap + 1, 2 * cap + 1))
+    for troops in range(1, cap + 1):
+        table[troops, 0, troops] = 1.0
+        table[0, troops, cap + troops] = 1.0
+
+    for attackers in range(1, cap + 1):
+        for defenders in range(1, cap + 1):
+            round_outcomes = ROUND_OUTCOMES[(min(attackers, 3), min(defenders, 2))]
+            for attacker_losses, defender_losses, probability in round_outcomes:
+                table[attackers, defenders] += probability * table[
+                    attackers - attacker_losses, defenders - defender_losses]
+    return table
+
+
+@lru_cache(maxsize=4)
+def battle_outcome_cdf(cap: int = DEFAULT_TABLE_CAP) -> np.ndarray:
+    cdf = np.cumsum(battle_outcome_table(cap), axis=2)
+    # Guard against rounding so that every draw falls inside the table
+    cdf[:, :, -1] = 1.0
+    return cdf
+
+
+def _play_round(attackers: int, defenders: int, rng: np.random.Generator
+    ) -> Tuple[int, int]:
+    round_outcomes = ROUND_OUTCOMES[(min(attackers, 3), min(defenders, 2))]
+    draw = rng.random()
+    for attacker_losses, defender_losses, probability in round_outcomes:
+        draw -= probability
+        if draw < 0:
+            break
+    return attackers - attacker_losses, defenders - defender_losses
+
+
+def _reduce_large_battle(attackers: int, defenders: int, cap: int,
+                         rng: np.random.Generator) -> Tuple[int, int]:
+    """Play rounds until both sides fit in the outcome table. Consecutive
+    rounds where both sides roll all their dice are resolved in one batch
+    with a single multinomial draw."""
+    while (attackers > cap or defenders > cap) and attackers > 0 and defenders > 0:
+        if attackers >= 3 and defenders >= 2:
+            # Number of rounds in which both sides keep rolling 3 and 2 dice
+            full_rounds = min((attackers - 3) // 2, (defenders - 2) // 2) + 1
+            round_counts = rng.multinomial(full_rounds, FULL_ROUND_PROBABILITIES)
+            attacker_losses, defender_losses = round_counts @ FULL_ROUND_LOSSES
+            attackers -= int(attacker_losses)
+            defenders -= int(defender_losses)
+        else:
+            attackers, defenders = _play_round(attackers, defenders, rng)
+    return attackers, defenders
+
+
+def resolve_battle(attacking_troops: int, defending_troops: int,
+                   rng: np.random.Generator, cap: int = DEFAULT_TABLE_CAP
+    ) -> Tuple[str, int]:
+    """
+    Resolve a battle with the same outcome distribution as rolling the dice
+    round by round.
+
+    Parameters:
+    - attacking_troops: Number of troops attacking.
+    - defending_troops: Number of troops defending.
+    - rng: Random number generator used for the draws.
+    - cap: Largest number of troops on either side covered by the table.
+
+    Returns:
+    - The winner ('attacker' or 'defender') and the number of troops left.
+    """
+    attackers, defenders = _reduce_large_battle(
+        attacking_troops, defending_troops, cap, rng)
+    if defenders <= 0:
+        return 'attacker', attackers
+    if attackers <= 0:
+        return 'defender', defenders
+
+    outcome = int(np.searchsorted(
+        battle_outcome_cdf(cap)[attackers, defenders], rng.random(), side='right'))
+    if outcome <= cap:
+        return 'attacker', outcome
+    return 'defender', outcome - cap
+
+
+def simulate_battles(attackers: np.ndarray, defenders: np.ndarray,
+                     rng: np.random.Generator) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Resolve many battles at once by rolling the dice of every battle that
+    is still running in one vectorised step per round.
+
+    Parameters:
+    - attackers: Number of attacking troops of every battle.
+    - defenders: Number of defending troops of every battle, broadcast
+    against attackers.
+    - rng: Random number generator used for the dice.
+
+    Returns:
+    - A boolean array that is True where the attacker won, and an array
+    with the number of troops the winner has left.
+    """
+    attackers, defenders = np.broadcast_arrays(
+        np.asarray(attackers, dtype=np.int64), np.asarray(defenders, dtype=np.int64))
+    attackers = attackers.ravel().copy()
+    defenders = defenders.ravel().copy()
+    running = np.flatnonzero((attackers > 0) & (defenders > 0))
+
+    while running.size:
+        battle_attackers = attackers[running]
+        battle_defenders = defenders[running]
+        attacker_dice = np.minimum(battle_attackers, 3)
+        defender_dice = np.minimum(battle_defenders, 2)
+
+        # Dice that are not rolled count as 0 and end up last after sorting
+        attacker_rolls = rng.integers(1, 7, size=(running.size, 3), dtype=np.int8)
+        attacker_rolls[np.arange(3) >= attacker_dice[:, None]] = 0
+        defender_rolls = rng.integers(1, 7, size=(running.size, 2), dtype=np.int8)
+        defender_rolls[np.arange(2) >= defender_dice[:, None]] = 0
+        attacker_rolls = -np.sort(-attacker_rolls, axis=1)[:, :2]
+        defender_rolls = -np.sort(-defender_rolls, axis=1)
+
+        compared = np.arange(2) < np.minimum(attacker_dice, defender_dice)[:, None]
+        attacker_higher = attacker_rolls > defender_rolls
+        defenders[running] -= (compared & attacker_higher).sum(axis=1)
+        attackers[running] -= (compared & ~attacker_higher).sum(axis=1)
+
+        running = running[(attackers[running] > 0) & (defenders[running] > 0)]
+
+    attacker_wins = defenders == 0
+    survivors = np.where(attacker_wins, attackers, defenders)
+    return attacker_wins, survivors
+
+
+def win_probability_table(max_attackers: int, max_defenders: int) -> np.ndarray:
+    """Exact probability that the attacker wins, indexed by [attackers,
+    defenders] for up to max_attackers and max_defenders troops."""
+    cap = max(max_attackers, max_defenders, 1)
+    table = battle_outcome_table(cap)[:max_attackers + 1, :max_defenders + 1]
+    return table[:, :, 1:cap + 1].sum(axis=2)
+
+
+def expected_losses_table(max_attackers: int, max_defenders: int
+    ) -> Tuple[np.ndarray, np.ndarray]:
+    """Exact expected attacker and defender losses, indexed by [attackers,
+    defenders] for up to max_attackers and max_defenders troops."""
+    cap = max(max_attackers, max_defenders, 1)
+    table = battle_outcome_table(cap)[:max_attackers + 1, :max_defenders + 1]
+    attackers = np.arange(max_attackers + 1)[:, None]
+    defenders = np.arange(max_defenders + 1)[None, :]
+    survivors = np.arange(1, cap + 1)
+
+    attacker_win = table[:, :, 1:cap + 1]
+    defender_win = table[:, :, cap + 1:]
+    attacker_losses = (
+        attackers * attacker_win.sum(axis=2) - attacker_win @ survivors 
+        + attackers * defender_win.sum(axis=2))
+    defender_losses = (
+        defenders * attacker_win.sum(axis=2) 
+        + defenders * defender_win.sum(axis=2) - defender_win @ survivors)
+    return attacker_losses, defender_losses
+
+
+@lru_cache(maxsize=4)
+def _odds_tables(cap: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Win probability and expected loss tables of attack_odds, computed
+    once per cap."""
+    attacker_losses, defender_losses = expected_losses_table(cap, cap)
+    return win_probability_table(cap, cap), attacker_losses, defender_losses
+
+
+@lru_cache(maxsize=4096)
+def _estimated_odds(attacking_troops: int, defending_troops: int,
+                    num_samples: int) -> Tuple[float, float, float]:
+    rng = np.random.default_rng((attacking_troops, defending_troops))
+    attacker_wins, survivors = simulate_battles(
+        np.full(num_samples, attacking_troops), defending_troops, rng)
+    attacker_losses = np.where(attacker_wins, attacking_troops - survivors,
+                               attacking_troops)
+    defender_losses = np.where(attacker_wins, defending_troops,
+                               defending_troops - survivors)
+    return (float(attacker_wins.mean()), float(attacker_losses.mean()),
+            float(defender_losses.mean()))
+
+
+def attack_odds(attacking_troops: int, defending_troops: int,
+                cap: int = DEFAULT_TABLE_CAP, num_samples: int = 20000
+    ) -> Tuple[float, float, float]:
+    """
+    Win probability and expected attacker and defender losses of a battle.
+    Battles within the cap are looked up in the exact tables, larger ones
+    are estimated with simulate_battles using a generator seeded by the
+    troop counts, so the same battle always gets the same estimate and it
+    is only simulated once.
+    """
+    if attacking_troops <= cap and defending_troops <= cap:
+        win_probability, attacker_losses, defender_losses = _odds_tables(cap)
+        return (float(win_probability[attacking_troops, defending_troops]),
+                float(attacker_losses[attacking_troops, defending_troops]),
+                float(defender_losses[attacking_troops, defending_troops]))
+    return _estimated_odds(int(attacking_troops), int(defending_troops),
+                           num_samples)
@@ -0,0 +1,177 @@
+import numpy as np
+import pandas as pd
+from typing import Dict, List, Optional
+from risk_game.game_constants import TERRITORIES
+from risk_game.world_map import TERRITORY_IDS, NUM_TERRITORIES, \
+NEIGHBOUR_MASKS, mask_to_ids, flood_fill
+
+NO_OWNER: int = -1
+
+
+class Board:
+    """
+    Array backed board. Territories and players are identified by integer
+    ids, the owner of each territory is stored in an int8 array and the
+    number of troops in an int32 array, so every lookup and write is O(1).
+    Each player also has an ownership bitmask (bit i set when the player
+    owns territory i) to combine with the neighbour masks of world_map.
+
+    For every owned territory the board tracks the mask of the connected
+    component (through territories of the same owner) it belongs to. The
+    components are updated incrementally when a territory changes hands,
+    so checking if two territories are connected is O(1).
+
+    The wide DataFrame layout (one column per player) is only built on
+    demand by `to_dataframe` for the CSV export.
+    """
+    def __init__(self, player_names: List[str]) -> None:
+        self.player_names: List[str] = list(player_names)
+        self.player_ids: Dict[str, int] = {
+            name: player_id for player_id, name in enumerate(self.player_names)
+        }
+        self.owner: np.ndarray = np.full(NUM_TERRITORIES, NO_OWNER, dtype=np.int8)
+        self.troops: np.ndarray = np.zeros(NUM_TERRITORIES, dtype=np.int32)
+        self.owned_masks: List[int] = [0] * len(self.player_names)
+        # Component mask of each territory, 0 when the territory has no owner
+        self.component_masks: List[int] = [0] * NUM_TERRITORIES
+
+    def __repr__(self) -> str:
+        return (f"<Board(players={self.player_names}, "
+                f"troops={int(self.troops.sum())})>")
+
+    def territory_id(self, territory: Optional[str]) -> Optional[int]:
+        return TERRITORY_IDS.get(territory)
+
+    def player_id(self, player_name: str) -> int:
+        return self.player_ids[player_name]
+
+    def owner_name(self, territory_id: int) -> Optional[str]:
+        owner = self.owner[territory_id]
+        if owner == NO_OWNER:
+            return None
+        return self.player_names[owner]
+
+    def controls(self, player_id: int, territory_id: int) -> bool:
+        return self.owner[territory_id] == player_id
+
+    def troops_of(self, player_id: int, territory_id: int) -> int:
+        if self.owner[territory_id] != player_id:
+            return 0
+        return int(self.troops[territory_id])
+
+    def set_troops(self, player_id: int, territory_id: int,
+                   num_troops: int) -> None:
+        """Set the troops of a player in a territory. Setting a positive
+        number of troops hands the territory to the player, setting zero
+        troops for the current owner leaves the territory without owner."""
+        owner = self.owner[territory_id]
+        if num_troops > 0:
+            if owner != player_id:
+                self._change_owner(territory_id, owner, player_id)
+            self.troops[territory_id] = num_troops
+        elif owner == player_id:
+            self._change_owner(territory_id, owner, NO_OWNER)
+            self.troops[territory_id] = 0
+
+    def _change_owner(self, territory_id: int, old_owner: int, 
+                      new_owner: int) -> None:
+        territory_bit = 1 << territory_id
+        old_component_mask = self.component_masks[territory_id]
+        if old_owner != NO_OWNER:
+            self.owned_masks[old_owner] &= ~territory_bit
+        if new_owner != NO_OWNER:
+            self.owned_masks[new_owner] |= territory_bit
+        self.owner[territory_id] = new_owner
+
+        if old_owner != NO_OWNER:
+            self._split_component(old_component_mask & ~territory_bit)
+        if new_owner != NO_OWNER:
+            self._merge_components(new_owner, territory_id)
+        else:
+            self.component_masks[territory_id] = 0
+
+    def _merge_components(self, player_id: int, territory_id: int) -> None:
+        # The new territory joins every component of the player it touches
+        component_mask = 1 << territory_id
+        for neighbour_id in mask_to_ids(
+                NEIGHBOUR_MASKS[territory_id] & self.owned_masks[player_id]):
+            component_mask |= self.component_masks[neighbour_id]
+        for member_id in mask_to_ids(component_mask):
+            self.component_masks[member_id] = component_mask
+
+    def _split_component(self, remaining_mask: int) -> None:
+        # Losing a territory can split its component into several pieces
+        while remaining_mask:
+            seed_id = (remaining_mask & -remaining_mask).bit_length() - 1
+            component_mask = flood_fill(seed_id, remaining_mask)
+            for member_id in mask_to_ids(component_mask):
+                self.component_masks[member_id] = component_mask
+            remaining_mask &= ~component_mask
+
+    def connected(self, player_id: int, from_territory_id: int, 
+                  to_territory_id: int) -> bool:
+        """Check if two territories of the player are connected by a chain
+        of territories under the player's control."""
+        if self.owner[from_territory_id] != player_id:
+            return False
+        return bool(
+            self.component_masks[from_territory_id] >> to_territory_id & 1)
+
+    def add_troops(self, player_id: int, territory_id: int,
+                   num_troops: int) -> None:
+        owner = self.owner[territory_id]
+        if owner == NO_OWNER:
+            self.set_troops(player_id, territory_id, num_troops)
+        elif owner == player_id:
+            self.set_troops(player_id, territory_id,
+                            int(self.troops[territory_id]) + num_troops)
+        else:
+            raise ValueError(
+                f"Cannot add troops for {self.player_names[player_id]} to " +
+                f"{TERRITORIES[territory_id]}, it is controlled by " +
+                f"{self.player_names[owner]}")
+
+    def territories_of(self, player_id: int) -> List[int]:
+        return mask_to_ids(self.owned_masks[player_id])
+
+    def total_troops(self, player_id: int) -> int:
+        return int(self.troops[self.owner == player_id].sum())
+
+    def to_dataframe(self) -> pd.DataFrame:
+        """Wide view of the board with a 'Territory' column and one troop
+        column per player, as written to the game state CSV files."""
+        territories_df = pd.DataFrame(TERRITORIES, columns=['Territory'])
+        troops = self.troops.astype(np.int64)
+        for player_id, name in enumerate(self.player_names):
+            territories_df[name] = np.where(self.owner == player_id, troops, 0)
+        return territories_df
+
+    def clear(self) -> None:
+        self.owner[:] = NO_OWNER
+        self.troops[:] = 0
+        self.owned_masks = [0] * len(self.player_names)
+        self.component_masks = [0] * NUM_TERRITORIES
+
+    def load_arrays(self, owner: np.ndarray, troops: np.ndarray) -> None:
+        """Load the board from owner and troops arrays, e.g. of a
+        checkpoint, rebuilding the masks."""
+        self.clear()
+        for territory_id in np.flatnonzero(owner != NO_OWNER):
+            self._change_owner(int(territory_id), NO_OWNER,
+                               int(owner[territory_id]))
+        self.troops[:] = troops
+
+    def load_dataframe(self, territories_df: pd.DataFrame) -> None:
+        """Load the board from the wide DataFrame layout."""
+        unknown_columns = [column for column in territories_df.columns[1:]
+                           if column not in self.player_ids]
+        if unknown_columns:
+            raise ValueError(f"Unknown player columns: {unknown_columns}")
+
+        self.clear()
+        for _, row in territories_df.iterrows():
+            territory_id = TERRITORY_IDS[row['Territory']]
+            for column in territories_df.columns[1:]:
+                if row[column] > 0:
+                    self.set_troops(self.player_ids[column], territory_id,
+                                    int(row[column]))
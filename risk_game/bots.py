@@ -0,0 +1,345 @@
+"""
+Scripted players that choose their moves with a fixed policy instead of an
+LLM. They return the same structured moves as the parsed LLM responses, so
+GameMaster validates and applies them exactly like any other move, but no
+prompt is formatted and no request leaves the process. This makes them
+useful to stress test the engine and as baselines for the LLM players.
+"""
+import numpy as np
+from abc import ABC, abstractmethod
+from typing import Dict, List, Optional, Tuple
+from risk_game.player_agent import PlayerAgent
+from risk_game.world_map import TERRITORY_IDS, CONTINENT_MASKS, \
+NEIGHBOUR_MASKS, territory_mask
+
+BLANK_MOVE = [{'territory_name': 'Blank', 'num_troops': 0}]
+
+
+class ScriptedAgent(PlayerAgent, ABC):
+    """Base class of the bots. Subclasses implement the abstract choose_*
+    hooks, a bot missing one cannot be created."""
+    def __init__(self, name: str,
+                 rng: Optional[np.random.Generator] = None) -> None:
+        super().__init__(name, llm_client=None)
+        self.rng: np.random.Generator = (
+            rng if rng is not None else np.random.default_rng())
+
+    def __str__(self) -> str:
+        return (f"Player: {self.name}\n"
+                f"Bot: {type(self).__name__}\n"
+            f"Accumulated Turn Time: {self.accumulated_turn_time:.2f} seconds\n")
+
+    def send_message(self, message_content: str) -> str:
+        raise RuntimeError(f"{type(self).__name__} does not use an LLM client")
+
+    # Policy hooks
+
+    @abstractmethod
+    def choose_placement_territory(self, game_state: 'GameState') -> str:
+        """Return the territory to place troops on."""
+
+    def choose_troop_placement(self, game_state: 'GameState', num_troops: int
+        ) -> List[Dict[str, int]]:
+        return [{'territory_name': self.choose_placement_territory(game_state),
+                 'num_troops': num_troops}]
+
+    @abstractmethod
+    def choose_attack(self, game_state: 'GameState'
+        ) -> Optional[Tuple[str, str, int]]:
+        """Return (from territory, to territory, troops) or None to stop."""
+
+    @abstractmethod
+    def choose_fortify(self, game_state: 'GameState'
+        ) -> Optional[Tuple[str, str, int]]:
+        """Return (from territory, to territory, troops) or None to skip."""
+
+    def choose_cards(self,
+        valid_combinations: Dict[int, List[Tuple[List[int], bool]]]
+        ) -> List[int]:
+        # Trade the combination worth the most troops
+        best_value = max(valid_combinations)
+        combination, _ = valid_combinations[best_value][0]
+        return combination
+
+    # Helpers shared by the policies
+
+    def attack_options(self, game_state: 'GameState'
+        ) -> List[Tuple[str, str, int, float]]:
+        """Every possible attack with all available troops as
+        (from territory, to territory, troops, win probability)."""
+        attack_vectors = game_state.get_adjacent_enemy_territories(
+            self.name, game_state.get_strong_territories_with_troops(self.name))
+        return [
+            (from_territory, to_territory, attacking_troops,
+             game_state.get_attack_win_probability(attacking_troops, to_territory))
+            for from_territory, (attacking_troops, enemy_territories)
+            in attack_vectors.items()
+            for to_territory in enemy_territories
+        ]
+
+    def reinforce_border(self, game_state: 'GameState'
+        ) -> Optional[Tuple[str, str, int]]:
+        """Move the largest stack of an interior territory to the most
+        threatened border territory connected to it."""
+        border_territories = set(game_state.get_border_territories(self.name))
+        interior_stacks = [
+            (troops, territory) for territory, troops in
+            game_state.get_strong_territories_with_troops(self.name)
+            if territory not in border_territories
+        ]
+        for troops, from_territory in sorted(interior_stacks, reverse=True):
+            destinations = [
+                territory for territory in
+                game_state.get_fortify_destinations(self.name, from_territory)
+                if territory in border_territories
+            ]
+            if destinations:
+                to_territory = max(destinations,
+                                   key=lambda territory: self.threat(game_state, territory))
+                return from_territory, to_territory, troops
+        return None
+
+    def threat(self, game_state: 'GameState', territory: str) -> int:
+        # Enemy troops adjacent to a territory
+        enemy_troops = 0
+        for enemy_territory in game_state.get_adjacent_enemy_territories(
+                self.name, [(territory, 0)])[territory][1]:
+            control = game_state.get_territory_control(enemy_territory)
+            if control is not None:
+                enemy_troops += control[1]
+        return enemy_troops
+
+    # PlayerAgent interface
+
+    def define_strategy_for_move(self, rules: 'Rules',
+            game_state: 'GameState') -> None:
+        self.turn_strategy = f"{type(self).__name__} policy"
+
+    def make_initial_troop_placement(
+            self, rules: 'Rules',
+            game_state: 'GameState', error_msg: Optional[str] = None
+    ) -> Tuple[List[Dict[str, int]], Optional[str], Optional[str]]:
+        return (self.choose_troop_placement(game_state, 1),
+                self.turn_strategy, None)
+
+    def make_troop_placement(
+            self, rules: 'Rules',
+            game_state: 'GameState',  error_msg: Optional[str] = None
+    ) -> Tuple[List[Dict[str, int]], Optional[str], Optional[str]]:
+        return (self.choose_troop_placement(game_state, self.troops),
+                self.turn_strategy, None)
+
+    def make_attack_move(
+            self, rules: 'Rules',
+            game_state: 'GameState', successful_attacks: int,
+            error_msg: Optional[str] = None
+    ) -> Tuple[List[Dict[str, int]], Optional[str], Optional[str]]:
+        attack = self.choose_attack(game_state)
+        if attack is None:
+            return BLANK_MOVE, self.turn_strategy, 'Blank'
+        from_territory, to_territory, num_troops = attack
+        return ([{'territory_name': to_territory, 'num_troops': num_troops}],
+                self.turn_strategy, from_territory)
+
+    def make_fortify_move(
+            self, rules: 'Rules',
+            game_state: 'GameState', error_msg: Optional[str] = None
+    ) -> Tuple[List[Dict[str, int]], Optional[str], Optional[str]]:
+        fortify = self.choose_fortify(game_state)
+        if fortify is None:
+            return BLANK_MOVE, self.turn_strategy, 'Blank'
+        from_territory, to_territory, num_troops = fortify
+        return ([{'territory_name': to_territory, 'num_troops': num_troops}],
+                self.turn_strategy, from_territory)
+
+    def must_trade_cards(self, cards: List['Card'], game_state: 'GameState',
+        valid_combinations: Dict[int, List[Tuple[List[int], bool]]]
+        ) -> Tuple[Optional[List[int]], Optional[str]]:
+        return self.choose_cards(valid_combinations), self.turn_strategy
+
+    def may_trade_cards(self, cards: List['Card'], game_state: 'GameState',
+        valid_combinations: Dict[int, List[Tuple[List[int], bool]]]
+        ) -> Tuple[Optional[List[int]], Optional[str]]:
+        if not valid_combinations:
+            return [0], self.turn_strategy
+        return self.choose_cards(valid_combinations), self.turn_strategy
+
+    # The policies are cheap and never wait, the async moves of the game
+    # loop call them directly
+
+    async def define_strategy_for_move_async(self, rules: 'Rules',
+            game_state: 'GameState') -> None:
+        self.define_strategy_for_move(rules, game_state)
+
+    async def make_initial_troop_placement_async(
+            self, rules: 'Rules',
+            game_state: 'GameState', error_msg: Optional[str] = None
+    ) -> Tuple[List[Dict[str, int]], Optional[str], Optional[str]]:
+        return self.make_initial_troop_placement(rules, game_state, error_msg)
+
+    async def make_troop_placement_async(
+            self, rules: 'Rules',
+            game_state: 'GameState',  error_msg: Optional[str] = None
+    ) -> Tuple[List[Dict[str, int]], Optional[str], Optional[str]]:
+        return self.make_troop_placement(rules, game_state, error_msg)
+
+    async def make_attack_move_async(
+            self, rules: 'Rules',
+            game_state: 'GameState', successful_attacks: int,
+            error_msg: Optional[str] = None
+    ) -> Tuple[List[Dict[str, int]], Optional[str], Optional[str]]:
+        return self.make_attack_move(rules, game_state, successful_attacks,
+                                     error_msg)
+
+    async def make_fortify_move_async(
+            self, rules: 'Rules',
+            game_state: 'GameState', error_msg: Optional[str] = None
+    ) -> Tuple[List[Dict[str, int]], Optional[str], Optional[str]]:
+        return self.make_fortify_move(rules, game_state, error_msg)
+
+    async def must_trade_cards_async(self, cards: List['Card'], 
+        game_state: 'GameState',
+        valid_combinations: Dict[int, List[Tuple[List[int], bool]]]
+        ) -> Tuple[Optional[List[int]], Optional[str]]:
+        return self.must_trade_cards(cards, game_state, valid_combinations)
+
+    async def may_trade_cards_async(self, cards: List['Card'], 
+        game_state: 'GameState',
+        valid_combinations: Dict[int, List[Tuple[List[int], bool]]]
+        ) -> Tuple[Optional[List[int]], Optional[str]]:
+        return self.may_trade_cards(cards, game_state, valid_combinations)
+
+    def speculate(self, prompt_parts: Tuple[str, str], rules: 'Rules',
+                  game_state: 'GameState', schema_name: str) -> None:
+        # Nothing to send ahead of time
+        pass
+
+
+class RandomBot(ScriptedAgent):
+    """Spreads troops at random and attacks and fortifies at random."""
+    def __init__(self, name: str, rng: Optional[np.random.Generator] = None,
+                 stop_probability: float = 0.2) -> None:
+        super().__init__(name, rng)
+        self.stop_probability = stop_probability
+
+    def choose_placement_territory(self, game_state: 'GameState') -> str:
+        territories = game_state.get_player_territories(self.name)
+        return territories[self.rng.integers(len(territories))]
+
+    def choose_troop_placement(self, game_state: 'GameState', num_troops: int
+        ) -> List[Dict[str, int]]:
+        territories = game_state.get_player_territories(self.name)
+        counts = self.rng.multinomial(
+            num_troops, np.full(len(territories), 1 / len(territories)))
+        return [{'territory_name': territory, 'num_troops': int(count)}
+                for territory, count in zip(territories, counts) if count > 0]
+
+    def choose_attack(self, game_state: 'GameState'
+        ) -> Optional[Tuple[str, str, int]]:
+        options = self.attack_options(game_state)
+        if not options or self.rng.random() < self.stop_probability:
+            return None
+        from_territory, to_territory, troops, _ = options[
+            self.rng.integers(len(options))]
+        return from_territory, to_territory, int(self.rng.integers(1, troops + 1))
+
+    def choose_fortify(self, game_state: 'GameState'
+        ) -> Optional[Tuple[str, str, int]]:
+        options = [
+            (from_territory, to_territory, troops)
+            for from_territory, (troops, destinations) in
+            game_state.get_fortify_options(self.name).items()
+            for to_territory in destinations
+        ]
+        if not options:
+            return None
+        from_territory, to_territory, troops = options[
+            self.rng.integers(len(options))]
+        return from_territory, to_territory, int(self.rng.integers(1, troops + 1))
+
+
+class GreedyBorderBot(ScriptedAgent):
+    """Stacks troops on the border next to the weakest enemy territory and
+    takes the attack with the best odds while they are good enough."""
+    def __init__(self, name: str, rng: Optional[np.random.Generator] = None,
+                 min_win_probability: float = 0.6) -> None:
+        super().__init__(name, rng)
+        self.min_win_probability = min_win_probability
+
+    def choose_placement_territory(self, game_state: 'GameState') -> str:
+        border_territories = game_state.get_border_territories(self.name)
+        if not border_territories:
+            return game_state.get_player_territories(self.name)[0]
+
+        def weakest_neighbour(territory: str) -> int:
+            return min(
+                game_state.get_territory_control(enemy_territory)[1]
+                for enemy_territory in game_state.get_adjacent_enemy_territories(
+                    self.name, [(territory, 0)])[territory][1])
+
+        return min(border_territories, key=lambda territory: (
+            weakest_neighbour(territory),
+            -game_state.check_number_of_troops(self.name, territory)))
+
+    def choose_attack(self, game_state: 'GameState'
+        ) -> Optional[Tuple[str, str, int]]:
+        options = [option for option in self.attack_options(game_state)
+                   if option[3] >= self.min_win_probability]
+        if not options:
+            return None
+        from_territory, to_territory, troops, _ = max(
+            options, key=lambda option: option[3])
+        return from_territory, to_territory, troops
+
+    def choose_fortify(self, game_state: 'GameState'
+        ) -> Optional[Tuple[str, str, int]]:
+        return self.reinforce_border(game_state)
+
+
+class ContinentBot(GreedyBorderBot):
+    """Picks the continent it is closest to completing and concentrates its
+    placements and attacks there, falling back to the greedy policy."""
+    def target_continent_mask(self, game_state: 'GameState') -> int:
+        owned_mask = game_state.get_territory_mask(self.name)
+        open_continents = [
+            continent_mask for continent_mask in CONTINENT_MASKS
+            if owned_mask & continent_mask != continent_mask]
+        if not open_continents:
+            return 0
+        return max(open_continents, key=lambda continent_mask: (
+            bin(owned_mask & continent_mask).count("1") /
+            bin(continent_mask).count("1")))
+
+    def choose_placement_territory(self, game_state: 'GameState') -> str:
+        continent_mask = self.target_continent_mask(game_state)
+        enemy_mask = continent_mask & ~game_state.get_territory_mask(self.name)
+        staging_territories = [
+            territory for territory in game_state.get_border_territories(self.name)
+            if NEIGHBOUR_MASKS[TERRITORY_IDS[territory]] & enemy_mask
+        ]
+        if not staging_territories:
+            return super().choose_placement_territory(game_state)
+        return max(staging_territories, key=lambda territory: (
+            bin(NEIGHBOUR_MASKS[TERRITORY_IDS[territory]] & enemy_mask).count("1"),
+            game_state.check_number_of_troops(self.name, territory)))
+
+    def choose_attack(self, game_state: 'GameState'
+        ) -> Optional[Tuple[str, str, int]]:
+        continent_mask = self.target_continent_mask(game_state)
+        options = [
+            option for option in self.attack_options(game_state)
+            if option[3] >= self.min_win_probability
+            and territory_mask([option[1]]) & continent_mask
+        ]
+        if not options:
+            return super().choose_attack(game_state)
+        from_territory, to_territory, troops, _ = max(
+            options, key=lambda option: option[3])
+        return from_territory, to_territory, troops
+
+
+BOTS = {
+    "Random": RandomBot,
+    "GreedyBorder": GreedyBorderBot,
+    "Continent": ContinentBot,
+}
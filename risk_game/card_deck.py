@@ -1,5 +1,5 @@
-import random
-from typing import List, Dict
+import numpy as np
+from typing import List, Dict, Optional
 from risk_game.game_constants import STANDARD_CARD_DECK, TERRITORIES
 
 class Card:
@@ -11,15 +11,17 @@ class Card:
         return f"Card(territory={self.territory}, troop_type={self.troop_type})"
 
 class Deck:
-    def __init__(self, card_list: List[Dict[str, str]] = STANDARD_CARD_DECK):
+    def __init__(self, card_list: List[Dict[str, str]] = STANDARD_CARD_DECK,
+                 rng: Optional[np.random.Generator] = None):
+        self.rng = rng if rng is not None else np.random.default_rng()
         self.cards = [Card(card["territory"], card["troop_type"]) for card in card_list]
-        random.shuffle(self.cards)
+        self.rng.shuffle(self.cards)
 
     def draw_card(self, discarded_cards: List[Card]) -> Card:
         if not self.cards and discarded_cards:
             print("Reshuffling discard pile into deck")
             self.cards = discarded_cards[:]
-            random.shuffle(self.cards)
+            self.rng.shuffle(self.cards)
             discarded_cards.clear()
         
         if self.cards:
@@ -28,12 +30,16 @@ class Deck:
             return None
         
 
+    @staticmethod
     def create_deck_of_random_cards(
-        territories: List[str] = TERRITORIES
+        territories: List[str] = TERRITORIES,
+        rng: Optional[np.random.Generator] = None
     ) -> List[Dict[str, str]]:
+        rng = rng if rng is not None else np.random.default_rng()
     
-        # Shuffle the list of territories
-        random.shuffle(territories)
+        # Shuffle a copy of the list of territories
+        territories = list(territories)
+        rng.shuffle(territories)
 
         # Number of troop types
         troop_types = ["infantry", "cavalry", "canon"]
@@ -55,7 +61,7 @@ class Deck:
             cards.append({"territory": "Wild Card", "troop_type": "wild"})
 
         # Shuffle the cards to randomize the order
-        random.shuffle(cards)
+        rng.shuffle(cards)
 
         # Print the entire list of cards
         for card in cards:
@@ -0,0 +1,191 @@
+"""
+Checkpoints of a game at turn boundaries.
+
+A game that stops in the middle, e.g. when a provider is down longer than
+the retries of its client, used to be lost. With
+GameConfig(checkpoint_interval=N) the game master saves its state every N
+turns in checkpoint.npz in the game folder, a compressed numpy archive:
+- owner and troops: the board arrays,
+- state: JSON of everything else, the order of the players and who is
+  still active, the troops, strategy and counters of every player (with
+  the token counts of its session and the prompt cache counters of its
+  client), the cards of the players, the deck order and the discard pile,
+  Rules.trade_count, the state of the random generators of the game and
+  of the bots, and the round and turn the game is at.
+
+play_game(resume=True) continues a game from its checkpoint, the game log
+is cut back to the turn of the checkpoint. The players have to be added as
+for the original game, with the same names. A resumed game plays the same
+moves as the game would have without the interruption, as long as the
+players do: the bots do, the answers of LLM players differ unless they are
+replayed from the response cache. Players in session mode start a new
+session. The checkpoint is removed when the game ends.
+
+The checkpoint is written through the queue of the game log, after the
+turn it belongs to, so the log on disk always has the turn of the
+checkpoint. A new checkpoint replaces the last one in a single rename.
+"""
+import json
+import os
+from typing import Any, Dict, Optional, Tuple
+import numpy as np
+from risk_game.card_deck import Card, Deck
+from risk_game.game_state import GameState
+
+CHECKPOINT_FILE = "checkpoint.npz"
+# Counters of a player saved in a checkpoint
+PLAYER_COUNTERS = ("troops", "turn_strategy", "troop_placement_errors",
+                   "return_formatting_errors", "attack_errors",
+                   "fortify_errors", "card_trade_errors", "move_requests",
+                   "move_retries", "move_repairs", "speculative_prompts",
+                   "speculation_hits", "accumulated_turn_time",
+                   "system_prompt_tokens")
+# Token counters of a player's session, see player_session.py
+SESSION_COUNTERS = ("session_tokens", "stateless_tokens", "truncations")
+
+
+def checkpoint_path(game_folder: str) -> str:
+    return os.path.join(game_folder, CHECKPOINT_FILE)
+
+
+def game_checkpoint(game: 'GameMaster', turn_number: int, player_index: int
+    ) -> Dict[str, np.ndarray]:
+    """
+    The state of a game after a turn.
+
+    Parameters:
+    - game: The game, between two turns.
+    - turn_number: The number of the last turn played.
+    - player_index: Index in game.active_players of the next player of the
+    round, the number of active players when the round is over.
+    """
+    players = []
+    for player in game.players:
+        record = {counter: getattr(player, counter)
+                  for counter in PLAYER_COUNTERS}
+        record['name'] = player.name
+        record['prompt_token_counts'] = [
+            list(counts) for counts in player.prompt_token_counts]
+        if player.session is not None:
+            record['session'] = {counter: getattr(player.session, counter)
+                                 for counter in SESSION_COUNTERS}
+        if player.prompt_cache_stats():
+            record['prompt_cache'] = player.prompt_cache_stats()
+        if hasattr(player, 'rng'):
+            record['rng'] = player.rng.bit_generator.state
+        players.append(record)
+
+    def cards(card_list: list) -> list:
+        return [[card.territory, card.troop_type] for card in card_list]
+
+    state = {
+        'turn_number': turn_number,
+        'player_index': player_index,
+        'game_round': game.game_round,
+        'phase': game.phase,
+        'current_player_index': game.current_player_index,
+        'players': players,
+        'active_players': [player.name for player in game.active_players],
+        'dead_players': [player.name for player in game.dead_players],
+        'player_cards': {name: cards(card_list) for name, card_list
+                         in game.player_cards.items()},
+        'deck': cards(game.deck.cards),
+        'discarded_cards': cards(game.discarded_cards),
+        'trade_count': game.rules.trade_count,
+        'capitals': game.game_state.capitals,
+        'last_player_index': game.game_state.last_player_index,
+        'rng': game.rng.bit_generator.state,
+    }
+    board = game.game_state.board
+    return {'owner': board.owner.copy(), 'troops': board.troops.copy(),
+            'state': np.frombuffer(json.dumps(state).encode(),
+                                   dtype=np.uint8)}
+
+
+def save_checkpoint(game_folder: str, checkpoint: Dict[str, np.ndarray]
+    ) -> None:
+    path = checkpoint_path(game_folder)
+    temporary_path = path + ".tmp"
+    with open(temporary_path, 'wb') as file:
+        np.savez_compressed(file, **checkpoint)
+    os.replace(temporary_path, path)
+
+
+def remove_checkpoint(game_folder: str) -> None:
+    if os.path.exists(checkpoint_path(game_folder)):
+        os.remove(checkpoint_path(game_folder))
+
+
+def load_checkpoint(game_folder: str) -> Optional[Dict[str, Any]]:
+    """The checkpoint of a game folder, None without one."""
+    path = checkpoint_path(game_folder)
+    if not os.path.exists(path):
+        return None
+    with np.load(path, allow_pickle=False) as archive:
+        checkpoint = json.loads(archive['state'].tobytes().decode())
+        checkpoint['owner'] = archive['owner']
+        checkpoint['troops'] = archive['troops']
+    return checkpoint
+
+
+def restore_checkpoint(game: 'GameMaster', checkpoint: Dict[str, Any]
+    ) -> Tuple[int, int]:
+    """
+    Put a game in the state of a checkpoint. The game needs the players of
+    the checkpoint, it is not initialised with init_game_state.
+
+    Returns:
+    - The turn number and the index of the next player of the round, see
+    game_checkpoint.
+    """
+    players_by_name = {player.name: player for player in game.players}
+    missing = [record['name'] for record in checkpoint['players']
+               if record['name'] not in players_by_name]
+    if missing or len(players_by_name) != len(checkpoint['players']):
+        raise ValueError(f"The players of the game do not match the " +
+                         f"checkpoint, missing players: {missing}")
+    for record in checkpoint['players']:
+        player = players_by_name[record['name']]
+        for counter in PLAYER_COUNTERS:
+            setattr(player, counter, record[counter])
+        player.prompt_token_counts = [
+            tuple(counts) for counts in record['prompt_token_counts']]
+        if 'session' in record and player.session is not None:
+            for counter in SESSION_COUNTERS:
+                setattr(player.session, counter, record['session'][counter])
+        if 'prompt_cache' in record and player.prompt_cache_stats():
+            # In place, the wrappers of the client share its counters
+            player.llm_client.prompt_cache_stats.update(record['prompt_cache'])
+        if 'rng' in record:
+            player.rng.bit_generator.state = record['rng']
+    game.players = [players_by_name[record['name']]
+                    for record in checkpoint['players']]
+    game.active_players = [players_by_name[name]
+                           for name in checkpoint['active_players']]
+    game.dead_players = [players_by_name[name]
+                         for name in checkpoint['dead_players']]
+
+    # The board keeps the player ids of the start of the game
+    game.game_state = GameState(game.players, game.rules, rng=game.rng)
+    game.game_state.num_players = len(game.active_players)
+    game.game_state.capitals = checkpoint['capitals']
+    game.game_state.last_player_index = checkpoint['last_player_index']
+    game.game_state.board.load_arrays(checkpoint['owner'],
+                                      checkpoint['troops'])
+
+    def cards(card_list: list) -> list:
+        return [Card(territory, troop_type)
+                for territory, troop_type in card_list]
+
+    game.deck = Deck(rng=game.rng)
+    game.deck.cards = cards(checkpoint['deck'])
+    game.discarded_cards = cards(checkpoint['discarded_cards'])
+    game.player_cards = {name: cards(card_list) for name, card_list
+                         in checkpoint['player_cards'].items()}
+    game.rules.trade_count = checkpoint['trade_count']
+    game.game_round = checkpoint['game_round']
+    game.phase = checkpoint['phase']
+    game.current_player_index = checkpoint['current_player_index']
+    # Last, creating the deck shuffled with the generator
+    game.rng.bit_generator.state = checkpoint['rng']
+    return checkpoint['turn_number'], checkpoint['player_index']
@@ -1,12 +1,33 @@
+import asyncio
+import numpy as np
+import json
+import os
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import nullcontext, redirect_stdout
+from datetime import datetime
+from functools import partial
 from risk_game.llm_clients import llm_client
+from risk_game.llm_clients.batch_client import BatchCollector, \
+ProviderBatchExecutor
 import risk_game.game_master as gm
+from risk_game.checkpoint import load_checkpoint
 from risk_game.rules import Rules
-from typing import List
+from risk_game.utils.game_admin import create_game_folder
+from typing import Any, Dict, List, Optional, Tuple
 from risk_game.game_config import GameConfig 
 
 class Experiment:
-    def __init__(self, config: GameConfig, agent_mix: int= 1, num_games=10
-      ) -> None:
+    def __init__(self, config: GameConfig, agent_mix: int= 1, num_games=10,
+                 seed: Optional[int] = None, 
+                 cache_mode: Optional[str] = None,
+                 prompt_mode: str = "full", session_mode: bool = False,
+                 output_mode: str = "text", hedge_requests: bool = False,
+                 hedge_fallbacks: Optional[Dict[str, Tuple[str, int]]] = None,
+                 max_resumes: int = 2
+                 ) -> None:
         """
         Initialize the experiment with default options.
         
@@ -14,11 +35,39 @@ class Experiment:
         - num_games (int): The number of games to run in the experiment.
         - agent_mix (int): The type of agent mix to use in the experiment.
         - config (GameConfig): The configuration for the game.
+        - seed (int): The experiment seed, every game gets its own random
+            generator spawned from it. A random seed is used if None.
+        - cache_mode (str): Cache the LLM responses ("record", "replay", 
+            "auto" or "bypass"), running an experiment again with the same 
+            seed in replay mode plays the same games without any requests.
+        - prompt_mode (str): "full" or "compact" prompts for the LLM 
+            players, see player_agent.py.
+        - session_mode (bool): Send the prompts of a turn as one
+            conversation, see player_session.py.
+        - output_mode (str): "text" or "json" (structured output) answers
+            of the LLM players, see move_schema.py.
+        - hedge_requests (bool): Send a duplicate of the requests that take
+            longer than the p95 latency of their model, see 
+            hedged_client.py. The players get async clients.
+        - hedge_fallbacks (dict): Provider name to the (provider, 
+            model_number) the duplicates of its requests go to, the same
+            model if a provider is missing.
+        - max_resumes (int): Times a game that raised an error, e.g. after
+            a provider outage, is resumed from its last checkpoint before
+            it is recorded as failed, see checkpoint.py.
 
         """
         self.config = config    
         self.num_games = num_games
         self.agent_mix = agent_mix
+        self.seed_sequence = np.random.SeedSequence(seed)
+        self.cache_mode = cache_mode
+        self.prompt_mode = prompt_mode
+        self.session_mode = session_mode
+        self.output_mode = output_mode
+        self.hedge_requests = hedge_requests
+        self.hedge_fallbacks = hedge_fallbacks or {}
+        self.max_resumes = max_resumes
 
     def __repr__(self) -> str:
 
@@ -36,56 +85,497 @@ class Experiment:
                 f"{self.config.territory_control_percentage:.2f}\n"
                 f"Required Continents: {self.config.required_continents}\n"
                 f"Key Areas: {key_areas}\n"
-                f"Max Rounds: {self.config.max_rounds}\n")
+                f"Max Rounds: {self.config.max_rounds}\n"
+                f"Seed: {self.seed_sequence.entropy}\n"
+                f"Cache Mode: {self.cache_mode}\n"
+                f"Prompt Mode: {self.prompt_mode}\n"
+                f"Session Mode: {self.session_mode}\n"
+                f"Output Mode: {self.output_mode}\n"
+                f"Hedge Requests: {self.hedge_requests}\n"
+                f"Max Resumes: {self.max_resumes}\n")
     
-    def initialize_game(self)-> gm.GameMaster:
+    def initialize_game(self, seed: Optional[np.random.SeedSequence] = None,
+                        async_clients: bool = False,
+                        batch_collector: Optional[BatchCollector] = None
+                        )-> gm.GameMaster:
         """
         Initializes a single game with default rules and players.
+
+        Args:
+        - seed (SeedSequence): The seed of the game's random generator.
+        - async_clients (bool): Give the players async LLM clients, for
+            games played with play_game_async.
+        - batch_collector (BatchCollector): Give the players clients that
+            send their requests in the batches of the collector.
         
         Returns:
         - game: An instance of the initialized GameMaster class.
         """
         # Initialize the rules
         rules = Rules(self.config)
-        game = gm.GameMaster(rules)
+        game = gm.GameMaster(rules, seed=seed)
+        if batch_collector is not None:
+            create_llm_client = partial(llm_client.create_batch_llm_client,
+                                        batch_collector=batch_collector,
+                                        cache_mode=self.cache_mode)
+        elif async_clients or self.hedge_requests:
+            create_llm_client = partial(llm_client.create_async_llm_client,
+                                        cache_mode=self.cache_mode,
+                                        hedge_requests=self.hedge_requests,
+                                        hedge_fallbacks=self.hedge_fallbacks)
+        else:
+            create_llm_client = partial(llm_client.create_llm_client,
+                                        cache_mode=self.cache_mode)
+        add_player = partial(game.add_player, prompt_mode=self.prompt_mode,
+                             session_mode=self.session_mode,
+                             output_mode=self.output_mode)
+
+        def create_local_client(model_number: int) -> Any:
+            # Like the bots the local model draws from a stream spawned
+            # from the game seed. The batches are answered by the local 
+            # model of the LocalBatchExecutor
+            if batch_collector is not None:
+                return create_llm_client("Local", model_number)
+            return create_llm_client("Local", model_number, seed=int(
+                game.seed_sequence.spawn(1)[0].generate_state(1)[0]))
         
-        if self.agent_mix == 1:
+        if self.agent_mix == 0:
+            # Add scripted bots, no LLM calls are made
+            game.add_bot(name="Random_Bot", bot="Random")
+            game.add_bot(name="Greedy_Border_Bot", bot="GreedyBorder")
+            game.add_bot(name="Continent_Bot", bot="Continent")
+
+        elif self.agent_mix == 1:
             # Add strong AI players
-            game.add_player(name="llama3.1_70", 
-                        llm_client=llm_client.create_llm_client("Groq", 1))
-            game.add_player(name="Claude_Sonnet_3_5", 
-                        llm_client=llm_client.create_llm_client("Anthropic", 1))
-            game.add_player(name="gpt-4o", 
-                        llm_client=llm_client.create_llm_client("OpenAI", 1))
+            add_player(name="llama3.1_70", 
+                        llm_client=create_llm_client("Groq", 1))
+            add_player(name="Claude_Sonnet_3_5", 
+                        llm_client=create_llm_client("Anthropic", 1))
+            add_player(name="gpt-4o", 
+                        llm_client=create_llm_client("OpenAI", 1))
         
+        elif self.agent_mix == 2:
+            # Add players of the local model, a load test of the LLM path 
+            # without requests to a provider
+            add_player(name="Local_Greedy_Border", 
+                        llm_client=create_local_client(1))
+            add_player(name="Local_Continent", 
+                        llm_client=create_local_client(2))
+            add_player(name="Local_Random", 
+                        llm_client=create_local_client(3))
+
         elif self.agent_mix == 3:
             # Add mix of strong and weaker AI players from Open AI
-            game.add_player(name="Strong(gpt-4o)", 
-                        llm_client=llm_client.create_llm_client("OpenAI", 1))
-            game.add_player(name="Medium(gpt-4o-mini)", 
-                        llm_client=llm_client.create_llm_client("OpenAI", 2))
-            game.add_player(name="Weak(gpt-3.5-turbo)", 
-                        llm_client=llm_client.create_llm_client("OpenAI", 3))
+            add_player(name="Strong(gpt-4o)", 
+                        llm_client=create_llm_client("OpenAI", 1))
+            add_player(name="Medium(gpt-4o-mini)", 
+                        llm_client=create_llm_client("OpenAI", 2))
+            add_player(name="Weak(gpt-3.5-turbo)", 
+                        llm_client=create_llm_client("OpenAI", 3))
 
         elif self.agent_mix == 5:
             # Add mix extra strong AI players
-            game.add_player(name="Big_llama3.1_400", 
-                        llm_client=llm_client.create_llm_client("Bedrock", 1))
-            game.add_player(name="Claude_Sonnet_3_5", 
-                        llm_client=llm_client.create_llm_client("Anthropic", 1))
-            game.add_player(name="gpt-4o", 
-                        llm_client=llm_client.create_llm_client("OpenAI", 1))
+            add_player(name="Big_llama3.1_400", 
+                        llm_client=create_llm_client("Bedrock", 1))
+            add_player(name="Claude_Sonnet_3_5", 
+                        llm_client=create_llm_client("Anthropic", 1))
+            add_player(name="gpt-4o", 
+                        llm_client=create_llm_client("OpenAI", 1))
           
 
 
         return game
 
-    def run_experiment(self)-> None:
+    def run_experiment(self, workers: int = 1, 
+                       base_folder: str = "game_results",
+                       experiment_folder: Optional[str] = None
+                       ) -> Dict[str, Any]:
         """
         Runs the experiment by playing multiple games and saving results.
+
+        Every game is saved in its own folder inside a new experiment folder
+        under base_folder. With more than one worker the games are played in
+        a pool of processes and the output of each game is written to a 
+        game_log.txt file in its folder instead of the console. A game that
+        raises an error is recorded as failed and the remaining games keep
+        running. When a worker process dies the pool is replaced and the
+        games without a result are played in the new one: the games that
+        had started resume from their checkpoints, at most max_resumes 
+        times before they are recorded as crashed.
+
+        Args:
+        - workers (int): Number of processes playing games at the same time.
+        - base_folder (str): Folder to create the experiment folder in.
+        - experiment_folder (str): Folder of an experiment that was 
+            interrupted, to continue it with the same seed: the finished
+            games are kept and the others resume from their checkpoints.
+
+        Returns:
+        - manifest: The experiment configuration and the result of every 
+            game, also saved as manifest.json in the experiment folder.
+        """
+        if workers < 1:
+            raise ValueError("workers must be at least 1")
+
+        experiment_folder, games = self.prepare_games(base_folder,
+                                                      experiment_folder)
+        start_time = time.time()
+        results: List[Dict[str, Any]] = []
+        if workers == 1:
+            for i, seed, game_folder in games:
+                print(f"Starting game {i}...")
+                results.append(play_experiment_game(self, i, seed, game_folder))
+        else:
+            remaining = games
+            # Times a game was in a pool whose worker died
+            pool_crashes = {i: 0 for i, _, _ in games}
+            while remaining:
+                broken = []
+                with ProcessPoolExecutor(max_workers=workers) as executor:
+                    futures = {
+                        executor.submit(play_experiment_game, self, i, seed,
+                                        game_folder, log_to_file=True): 
+                        (i, seed, game_folder)
+                        for i, seed, game_folder in remaining
+                    }
+                    for future in as_completed(futures):
+                        i, seed, game_folder = futures[future]
+                        try:
+                            result = future.result()
+                        except BrokenProcessPool:
+                            # A worker died, e.g. it ran out of memory, and
+                            # every game left in the pool fails with it
+                            broken.append(futures[future])
+                            continue
+                        except Exception as e:
+                            result = game_result(i, seed, game_folder)
+                            result['status'] = 'crashed'
+                            result['error'] = repr(e)
+                        result['resumes'] += pool_crashes[i]
+                        print(f"Game {i} {result['status']}")
+                        results.append(result)
+                remaining = self.replay_broken_games(broken, pool_crashes,
+                                                     results)
+
+        return self.save_manifest(experiment_folder, results, start_time,
+                                  workers=workers)
+
+    def replay_broken_games(self, broken: List[Tuple[int, Any, str]],
+                            pool_crashes: Dict[int, int],
+                            results: List[Dict[str, Any]]
+                            ) -> List[Tuple[int, Any, str]]:
+        """
+        The games of a broken process pool to play in a new pool. A game 
+        that had not started is played again. A game that had started (it
+        has a folder) resumes, until it was in max_resumes broken pools, 
+        then it is added to the results as crashed. When no game had
+        started the pool cannot play games and they all crashed.
+        """
+        started = [os.path.exists(game_folder) for _, _, game_folder in broken]
+        replayed = []
+        for (i, seed, game_folder), has_started in zip(broken, started):
+            if any(started) and not has_started:
+                replayed.append((i, seed, game_folder))
+            elif any(started) and pool_crashes[i] < self.max_resumes:
+                pool_crashes[i] += 1
+                replayed.append((i, seed, game_folder))
+            else:
+                result = game_result(i, seed, game_folder)
+                result['status'] = 'crashed'
+                result['resumes'] = pool_crashes[i]
+                result['error'] = "The worker process playing the game died"
+                print(f"Game {i} {result['status']}")
+                results.append(result)
+        if replayed:
+            print(f"A worker process died, playing {len(replayed)} games " +
+                  f"in a new pool")
+        return replayed
+
+    async def run_experiment_async(self, concurrent_games: int = 8,
+            base_folder: str = "game_results",
+            experiment_folder: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Runs the experiment by playing the games in the running event loop.
+        The players get async LLM clients, so while one game waits for a 
+        response the others keep playing. The requests in flight are 
+        limited per provider (see llm_base.set_provider_concurrency). The
+        output of the games is interleaved on the console.
+
+        Args:
+        - concurrent_games (int): Number of games played at the same time.
+        - base_folder (str): Folder to create the experiment folder in.
+        - experiment_folder (str): Folder of an interrupted experiment to
+            continue, see run_experiment.
+
+        Returns:
+        - manifest: The experiment configuration and the result of every 
+            game, also saved as manifest.json in the experiment folder.
+        """
+        if concurrent_games < 1:
+            raise ValueError("concurrent_games must be at least 1")
+
+        experiment_folder, games = self.prepare_games(base_folder,
+                                                      experiment_folder)
+        start_time = time.time()
+        game_slots = asyncio.Semaphore(concurrent_games)
+
+        async def play(i: int, seed: np.random.SeedSequence, 
+                       game_folder: str) -> Dict[str, Any]:
+            async with game_slots:
+                print(f"Starting game {i}...")
+                return await play_experiment_game_async(
+                    self, i, seed, game_folder)
+
+        results = list(await asyncio.gather(
+            *(play(i, seed, game_folder) for i, seed, game_folder in games)))
+        return self.save_manifest(experiment_folder, results, start_time,
+                                  concurrent_games=concurrent_games)
+
+    async def run_experiment_batch(self, 
+            executor: Optional[Any] = None,
+            base_folder: str = "game_results",
+            max_batch_size: int = 10000) -> Dict[str, Any]:
         """
-        for i in range(1, self.num_games + 1):
+        Runs the experiment in batch mode: every game is played at the same
+        time in the running event loop, and the requests of all games are
+        sent together in the batch APIs of the providers, see 
+        batch_client.py. The batch files are kept in the batches folder of 
+        the experiment.
+
+        Args:
+        - executor: Runs the batch files, a ProviderBatchExecutor by 
+            default, a LocalBatchExecutor plays without network access.
+        - base_folder (str): Folder to create the experiment folder in.
+        - max_batch_size (int): Maximum number of requests in a batch.
+
+        Returns:
+        - manifest: The experiment configuration and the result of every 
+            game, also saved as manifest.json in the experiment folder.
+        """
+        experiment_folder, games = self.prepare_games(base_folder)
+        start_time = time.time()
+        collector = BatchCollector(
+            executor if executor is not None else ProviderBatchExecutor(),
+            os.path.join(experiment_folder, "batches"), max_batch_size)
+
+        async def play(i: int, seed: np.random.SeedSequence, 
+                       game_folder: str) -> Dict[str, Any]:
             print(f"Starting game {i}...")
-            game = self.initialize_game()
-            game.play_game(include_initial_troop_placement=True)
-           
+            return await play_experiment_game_async(
+                self, i, seed, game_folder, batch_collector=collector)
+
+        results = list(await asyncio.gather(
+            *(play(i, seed, game_folder) for i, seed, game_folder in games)))
+        return self.save_manifest(experiment_folder, results, start_time,
+                                  batches=collector.batches,
+                                  batch_requests=collector.request_count,
+                                  failed_batch_requests=collector.failed_requests)
+
+    def prepare_games(self, base_folder: str,
+                      experiment_folder: Optional[str] = None
+        ) -> Tuple[str, List[Tuple[int, np.random.SeedSequence, str]]]:
+        """Create the experiment folder and give every game its number, 
+        seed and folder."""
+        if experiment_folder is None:
+            timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+            experiment_folder = create_game_folder(
+                base_folder=base_folder, game_name="experiment__" + timestamp)
+        else:
+            os.makedirs(experiment_folder, exist_ok=True)
+        game_seeds = self.seed_sequence.spawn(self.num_games)
+        games = [
+            (i, game_seeds[i - 1], os.path.join(experiment_folder, f"game__{i:03d}"))
+            for i in range(1, self.num_games + 1)
+        ]
+        return experiment_folder, games
+
+    def save_manifest(self, experiment_folder: str, 
+                      results: List[Dict[str, Any]], start_time: float,
+                      **settings: Any) -> Dict[str, Any]:
+        results.sort(key=lambda result: result['game'])
+        manifest = {
+            'config': self.config.to_dict(),
+            'agent_mix': self.agent_mix,
+            'num_games': self.num_games,
+            'prompt_mode': self.prompt_mode,
+            'session_mode': self.session_mode,
+            'output_mode': self.output_mode,
+            'hedge_requests': self.hedge_requests,
+            'hedge_fallbacks': self.hedge_fallbacks,
+            'max_resumes': self.max_resumes,
+            **settings,
+            'seed': self.seed_sequence.entropy,
+            'duration': time.time() - start_time,
+            'completed': sum(result['status'] == 'completed' for result in results),
+            'games': results
+        }
+        with open(os.path.join(experiment_folder, 'manifest.json'), 'w') as file:
+            json.dump(manifest, file, indent=4)
+
+        print(f"Experiment finished: {manifest['completed']} of " +
+              f"{self.num_games} games completed in " +
+              f"{manifest['duration']:.2f} seconds")
+        return manifest
+
+
+def game_result(game_index: int, seed: np.random.SeedSequence,
+                game_folder: str) -> Dict[str, Any]:
+    return {
+        'game': game_index,
+        'seed': {
+            'entropy': seed.entropy,
+            'spawn_key': list(seed.spawn_key)
+        },
+        'folder': game_folder,
+        'status': None,
+        'winner': None,
+        'victory_condition': None,
+        'rounds': None,
+        'move_requests': None,
+        'move_retries': None,
+        'move_repairs': None,
+        'speculative_prompts': None,
+        'speculation_hits': None,
+        'log_blocked_time': None,
+        'resumes': 0,
+        'duration': None,
+        'error': None
+    }
+
+
+def play_experiment_game(experiment: Experiment, game_index: int,
+                         seed: np.random.SeedSequence, game_folder: str,
+                         log_to_file: bool = False) -> Dict[str, Any]:
+    """
+    Play a single game of an experiment. Defined at module level so it can
+    be sent to the worker processes of run_experiment.
+
+    Args:
+    - experiment (Experiment): The experiment the game belongs to.
+    - game_index (int): Number of the game in the experiment.
+    - seed (SeedSequence): The seed of the game's random generator.
+    - game_folder (str): Folder to save the game in.
+    - log_to_file (bool): Write the output of the game to game_log.txt in 
+        the game folder instead of the console.
+
+    Returns:
+    - result: Status, winner and duration of the game, with the traceback
+        if the game raised an error.
+    """
+    result = game_result(game_index, seed, game_folder)
+    start_time = time.time()
+    if record_finished_game(result, game_folder):
+        return result
+    os.makedirs(game_folder, exist_ok=True)
+    # Appended to, a resumed game continues the output of before
+    log_file = open(os.path.join(game_folder, 'game_log.txt'), 'a') \
+        if log_to_file else None
+    try:
+        with redirect_stdout(log_file) if log_file else nullcontext():
+            while True:
+                game = experiment.initialize_game(seed=seed)
+                try:
+                    game.play_game(include_initial_troop_placement=True,
+                                   games_folder=game_folder, resume=True)
+                    break
+                except Exception:
+                    if not can_resume(experiment, result, game_folder):
+                        raise
+        record_game(result, game)
+    except Exception:
+        record_failure(result)
+    finally:
+        if log_file:
+            log_file.close()
+    result['duration'] = time.time() - start_time
+    return result
+
+
+async def play_experiment_game_async(
+        experiment: Experiment, game_index: int, seed: np.random.SeedSequence,
+        game_folder: str, batch_collector: Optional[BatchCollector] = None
+        ) -> Dict[str, Any]:
+    """Play a single game of an experiment with async LLM clients, or the
+    batch clients of batch_collector, see play_experiment_game."""
+    result = game_result(game_index, seed, game_folder)
+    start_time = time.time()
+    if record_finished_game(result, game_folder):
+        return result
+    try:
+        while True:
+            game = experiment.initialize_game(seed=seed, async_clients=True,
+                                              batch_collector=batch_collector)
+            try:
+                await game.play_game_async(include_initial_troop_placement=True,
+                                           games_folder=game_folder,
+                                           resume=True)
+                break
+            except Exception:
+                if not can_resume(experiment, result, game_folder):
+                    raise
+        record_game(result, game)
+    except Exception:
+        record_failure(result)
+    result['duration'] = time.time() - start_time
+    return result
+
+
+def record_game(result: Dict[str, Any], game: gm.GameMaster) -> None:
+    result['status'] = 'completed'
+    result['winner'] = game.winner.name if game.winner else None
+    result['victory_condition'] = game.victory_condition
+    result['rounds'] = game.game_round
+    # Moves asked for again after an invalid one, to compare output modes
+    result['move_requests'] = sum(player.move_requests for player in game.players)
+    result['move_retries'] = sum(player.move_retries for player in game.players)
+    result['move_repairs'] = sum(player.move_repairs for player in game.players)
+    result['speculative_prompts'] = sum(player.speculative_prompts
+                                        for player in game.players)
+    result['speculation_hits'] = sum(player.speculation_hits
+                                     for player in game.players)
+    # Seconds the game loop waited for the writer of the game log
+    result['log_blocked_time'] = game.log_writer_stats.get('blocked_time')
+
+
+def can_resume(experiment: Experiment, result: Dict[str, Any],
+               game_folder: str) -> bool:
+    """Whether a game that raised an error is resumed from its checkpoint,
+    counted in result['resumes']."""
+    if (result['resumes'] >= experiment.max_resumes or
+            load_checkpoint(game_folder) is None):
+        return False
+    result['resumes'] += 1
+    print(f"Game {result['game']} raised an error, resuming from its " +
+          f"checkpoint ({result['resumes']} of {experiment.max_resumes}):\n" +
+          traceback.format_exc())
+    return True
+
+
+def record_finished_game(result: Dict[str, Any], game_folder: str) -> bool:
+    """Fill in the result of a game that already finished, in the folder
+    of an experiment that is continued."""
+    end_game_file = os.path.join(game_folder, 'end_game_results.json')
+    if not os.path.exists(end_game_file):
+        return False
+    with open(end_game_file) as file:
+        end_game_data = json.load(file)
+    players = end_game_data['players']
+    result['status'] = 'completed'
+    result['winner'] = (end_game_data['winner']
+                        if end_game_data['winner'] != 'No Winner' else None)
+    result['victory_condition'] = (
+        end_game_data['victory_condition']
+        if end_game_data['victory_condition'] != 'None' else None)
+    result['rounds'] = end_game_data['total_rounds']
+    for counter in ('move_requests', 'move_retries', 'move_repairs',
+                    'speculative_prompts', 'speculation_hits'):
+        result[counter] = sum(player.get(counter, 0) for player in players)
+    result['log_blocked_time'] = end_game_data.get(
+        'log_writer', {}).get('blocked_time')
+    return True
+
+
+def record_failure(result: Dict[str, Any]) -> None:
+    result['status'] = 'failed'
+    result['error'] = traceback.format_exc()
+    print(f"Game {result['game']} failed:\n{result['error']}")
@@ -7,13 +7,42 @@ class GameConfig:
                  territory_control_percentage: float = 0.65, 
                  required_continents: int = 0, 
                  key_areas: List[str] = None, 
-                 max_rounds: int = 15) -> None:
+                 max_rounds: int = 15,
+                 battle_engine: str = "dice",
+                 battle_table_cap: int = 50,
+                 move_repair: str = "off",
+                 speculative_prompts: bool = False,
+                 game_log: str = "arrow",
+                 keyframe_interval: int = 10,
+                 background_writer: bool = True,
+                 checkpoint_interval: int = 1) -> None:
         self.progressive = progressive
         self.capitals = capitals
         self.territory_control_percentage = territory_control_percentage
         self.required_continents = required_continents
         self.key_areas = key_areas or []
         self.max_rounds = max_rounds
+        # "dice" rolls every round, "table" samples the exact outcome 
+        # distribution of battles up to battle_table_cap troops per side
+        self.battle_engine = battle_engine
+        self.battle_table_cap = battle_table_cap
+        # Repair near-valid moves of the players before validation, "off", 
+        # "silent" or "log", see move_repair.py
+        self.move_repair = move_repair
+        # Send the troop placement with the strategy and the fortify move
+        # with the attacks, see speculation.py
+        self.speculative_prompts = speculative_prompts
+        # Log of the turns of a game, "arrow", "parquet", the moves of
+        # "events" or the per-turn "csv" files, see utils/game_log.py
+        self.game_log = game_log
+        # Turns between the full boards of the "events" log
+        self.keyframe_interval = keyframe_interval
+        # Write the game log in a background thread instead of the game
+        # loop, see utils/log_writer.py
+        self.background_writer = background_writer
+        # Turns between two checkpoints a game can be resumed from, 0 for
+        # none, see checkpoint.py
+        self.checkpoint_interval = checkpoint_interval
 
     def to_dict(self) -> Dict[str, Any]:
         return {
@@ -22,5 +51,13 @@ class GameConfig:
             "territory_control_percentage": self.territory_control_percentage,
             "required_continents": self.required_continents,
             "key_areas": self.key_areas,
-            "max_rounds": self.max_rounds
+            "max_rounds": self.max_rounds,
+            "battle_engine": self.battle_engine,
+            "battle_table_cap": self.battle_table_cap,
+            "move_repair": self.move_repair,
+            "speculative_prompts": self.speculative_prompts,
+            "game_log": self.game_log,
+            "keyframe_interval": self.keyframe_interval,
+            "background_writer": self.background_writer,
+            "checkpoint_interval": self.checkpoint_interval
         }
\ No newline at end of file
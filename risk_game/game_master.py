@@ -1,18 +1,30 @@
-from typing import Dict, List, Optional, Tuple
-import random
+from typing import Any, Dict, List, Optional, Tuple, Union
+import asyncio
+import numpy as np
 import pandas as pd
+import os
 import time
+from contextlib import asynccontextmanager
 from risk_game.player_agent import PlayerAgent
+from risk_game.llm_clients.llm_base import AsyncLLMClient
+from risk_game.bots import BOTS
 from risk_game.game_state import GameState
+from risk_game.move_repair import MoveRepair
 from risk_game.rules import Rules
 from risk_game.card_deck import Deck, Card
+from risk_game.checkpoint import game_checkpoint, load_checkpoint, \
+remove_checkpoint, restore_checkpoint, save_checkpoint
 from risk_game.utils.decorators import track_turn_time
-from risk_game.utils.game_admin import create_game_folder, save_game_state, \
-save_player_data, save_end_game_results
+from risk_game.utils.game_admin import create_game_folder, \
+save_end_game_results, prompt_cache_summary
+from risk_game.utils.game_log import GameLog, open_game_log
+from risk_game.utils.log_writer import LogWriter
 
 
 class GameMaster:
-    def __init__(self, rules: Rules)-> None:
+    def __init__(self, rules: Rules, 
+                 seed: Union[None, int, np.random.SeedSequence] = None
+                 )-> None:
         self.players: List[PlayerAgent] = []
         self.dead_players: List[PlayerAgent] = []
         self.active_players: List[PlayerAgent] = []
@@ -25,8 +37,22 @@ class GameMaster:
         self.winner: Optional[PlayerAgent] = None
         self.discarded_cards = []
         self.rules = rules  # Store the rules instance
+        # Fixes near-valid moves before they are validated
+        self.move_repair = MoveRepair(rules.move_repair)
         self.player_cards: Dict[str, List[Card]] = {}
         self.victory_condition: Optional[str] = None
+        # Log of the game being played, the event log records the moves
+        self.game_log: Optional[Union[GameLog, LogWriter]] = None
+        # Write times and backpressure of the log of the last game
+        self.log_writer_stats: Dict[str, Any] = {}
+        # Played by play_game without an event loop
+        self.synchronous: bool = False
+        # Every game owns an independent random generator, derived from 
+        # the seed so that games can be replayed and run side by side
+        if not isinstance(seed, np.random.SeedSequence):
+            seed = np.random.SeedSequence(seed)
+        self.seed_sequence: np.random.SeedSequence = seed
+        self.rng: np.random.Generator = np.random.default_rng(seed)
 
     def __repr__(self) -> str:
         return (f"<GameMaster("
@@ -43,12 +69,23 @@ class GameMaster:
 
 
 
-    def add_player(self, name:str, llm_client: 'LLMClient') -> None:
+    def add_player(self, name:str, llm_client: 'LLMClient',
+                   prompt_mode: str = "full", session_mode: bool = False,
+                   output_mode: str = "text") -> None:
+        self.add_agent(PlayerAgent(name, llm_client, prompt_mode, session_mode,
+                                   output_mode))
+
+    def add_bot(self, name: str, bot: str) -> None:
+        # Scripted players get their own stream spawned from the game seed
+        if bot not in BOTS:
+            raise ValueError(f"Unknown bot: {bot}")
+        self.add_agent(BOTS[bot](name, rng=self.rng.spawn(1)[0]))
+
+    def add_agent(self, player: PlayerAgent) -> None:
         if len(self.players) >= 6:
             raise ValueError("Cannot add more than 6 players")
-        player = PlayerAgent(name, llm_client)
         self.players.append(player)
-        self.player_cards[name] = []  # Initialize an empty list of cards 
+        self.player_cards[player.name] = []  # Initialize an empty list of cards 
 
     def calculate_initial_troops(self, num_players: int) -> int:
         initial_troops_map = {2: 40,3: 35, 4: 30,5: 25,6: 20}
@@ -59,13 +96,14 @@ class GameMaster:
         # only init the game state if there are 2 or more players
         if num_players < 2:
             raise ValueError("Cannot start a game with fewer than 2 players")
-        random.shuffle(self.players)
+        self.rng.shuffle(self.players)
         intial_troops = self.calculate_initial_troops(num_players)
         for player in self.players:
             player.troops = intial_troops
         self.active_players = self.players.copy()
-        self.game_state = GameState(self.active_players, self.rules)
-        self.deck = Deck()
+        self.game_state = GameState(self.active_players, self.rules, 
+                                    rng=self.rng)
+        self.deck = Deck(rng=self.rng)
 
     def remove_player(self, player_name: str) -> None:
         player_to_remove = None
@@ -142,22 +180,22 @@ class GameMaster:
                     self.game_state.capitals[player.name] = capital
 
     @track_turn_time
-    def intial_troop_placement_player(self, player: 'PlayerAgent') -> None:
+    async def intial_troop_placement_player(self, player: 'PlayerAgent') -> None:
         print(f"*****-------------NOW PLACING TROOPS FOR: -------------*****")
         print(f"Current player name: {player.name}")
         if player.troops > 0:
-            self.ensure_valid_move(player)
+            await self.ensure_valid_move(player)
 
     def move_to_next_player(self):
         self.current_player_index = (
             (self.current_player_index + 1) % len(self.active_players)
         )
   
-    def complete_initial_troop_placement(self):
+    async def complete_initial_troop_placement(self):
         #self.current_player_index = 0
         while any(player.troops > 0 for player in self.active_players):
             current_player = self.active_players[self.current_player_index]
-            self.intial_troop_placement_player(current_player)
+            await self.intial_troop_placement_player(current_player)
             self.move_to_next_player()
 
         corrrect_initial_troops =self.calculate_initial_troops(
@@ -175,12 +213,12 @@ class GameMaster:
         else:
             raise ValueError("Invalid territory assignment")
 
-    def force_trade_in_cards(self, player: 'PlayerAgent') -> None:
+    async def force_trade_in_cards(self, player: 'PlayerAgent') -> None:
         player_cards = self.player_cards.get(player.name)
         valid_combinations = self.rules.find_valid_combinations(
             player_cards,player.name, self.game_state)
         # Make the player propose a trade
-        cards_to_trade, _ = player.must_trade_cards(player_cards,
+        cards_to_trade, _ = await player.must_trade_cards_async(player_cards,
             self.game_state, valid_combinations)
         
         if cards_to_trade is None:
@@ -206,17 +244,18 @@ class GameMaster:
                 # Grant the player the corresponding troops
                 player.troops += troops
                 self.rules.trade_count += 1
+                self.record_event("card_trade", player, count=troops)
                 print(f"{player.name} traded in cards for {troops} extra troops.")
             else:
                 player.card_trade_errors += 1
                 print(f"Invalid trade attempt by {player.name}.")
 
-    def ask_to_trade_in_cards(self, player: 'PlayerAgent') -> None:
+    async def ask_to_trade_in_cards(self, player: 'PlayerAgent') -> None:
         player_cards = self.player_cards.get(player.name)
         # Ask the player if they want to trade in cards
         valid_combinations = self.rules.find_valid_combinations(
             player_cards, player.name, self.game_state)
-        cards_to_trade, _ = player.may_trade_cards(player_cards, 
+        cards_to_trade, _ = await player.may_trade_cards_async(player_cards, 
             self.game_state, valid_combinations)
         
         if cards_to_trade is None:
@@ -224,7 +263,7 @@ class GameMaster:
             player.return_formatting_errors += 1
             return
 
-        if cards_to_trade.pop() == 0:
+        if cards_to_trade[-1] == 0:
             print(f"{player.name} chose not to trade in cards.")
             return
         else:
@@ -243,6 +282,7 @@ class GameMaster:
                 # Grant the player the corresponding troops
                 player.troops += troops
                 self.rules.trade_count += 1
+                self.record_event("card_trade", player, count=troops)
                 print(f"{player.name} traded in cards for {troops} extra troops.")
             else:
                 player.card_trade_errors += 1
@@ -251,20 +291,31 @@ class GameMaster:
   
         # end phase 0
 
-    def phase_1_troop_placement(self, player: 'PlayerAgent')-> None:
+    async def phase_1_troop_placement(self, player: 'PlayerAgent')-> None:
         self.phase = 1
         player.troops = 0
+        if self.rules.speculative_prompts and not self.can_trade_cards(player):
+            # Without a card trade the troops to place are known, and the
+            # placement prompt does not show the strategy, so both prompts
+            # are sent at once
+            player.troops = self.rules.calculate_troops(
+                self.game_state.get_player_territories(player.name),
+                self.game_state)
+            player.speculate(player.troop_placement_prompt_parts(
+                self.rules, self.game_state), self.rules, self.game_state,
+                "troop_placement")
+            player.troops = 0
         # Make the player define a strategy for the turn
-        player.define_strategy_for_move(self.rules, self.game_state)
+        await player.define_strategy_for_move_async(self.rules, self.game_state)
 
         # figure out if the player needs to trade in cards (i.e. has 5 or more cards)
         while len(self.player_cards[player.name]) >= 5:
-            self.force_trade_in_cards(player)
+            await self.force_trade_in_cards(player)
         
         if (len(self.player_cards[player.name]) >= 3):
             # check if the player has a set of cards that can be traded in
             if self.rules.has_valid_combination(self.player_cards[player.name]):
-                 self.ask_to_trade_in_cards(player)
+                 await self.ask_to_trade_in_cards(player)
 
         # figure out how many troops the player gets
         total_troops_from_territories = self.rules.calculate_troops(
@@ -272,15 +323,21 @@ class GameMaster:
         
         player.troops += total_troops_from_territories
         # ensure the player places all their troops on the board
-        self.ensure_valid_move(player)
+        await self.ensure_valid_move(player)
 
         # end phase 1
 
-    def phase_2_attack(self, player: 'PlayerAgent')-> None:
+    def can_trade_cards(self, player: 'PlayerAgent') -> bool:
+        """Whether the player is asked to trade cards before the placement."""
+        cards = self.player_cards[player.name]
+        return len(cards) >= 5 or (
+            len(cards) >= 3 and self.rules.has_valid_combination(cards))
+
+    async def phase_2_attack(self, player: 'PlayerAgent')-> None:
         self.phase = 2
         # print(f"{player.name} is attacking")
     
-        successful_attacks, game_over = self.ensure_valid_attack_move(player)
+        successful_attacks, game_over = await self.ensure_valid_attack_move(player)
 
         # if game is over, return to end the game
         if self.game_over:
@@ -293,10 +350,10 @@ class GameMaster:
             print(f"{player.name} won an attack and received a card")
 
 
-    def phase_3_fortify(self, player: 'PlayerAgent') -> None:
+    async def phase_3_fortify(self, player: 'PlayerAgent') -> None:
         self.phase = 3
         print(f"{player.name} is fortifying")
-        self.ensure_valid_fortify_move(player)
+        await self.ensure_valid_fortify_move(player)
 
     # def is_game_over(self) -> bool:
     #     if self.rules.capitals:
@@ -420,7 +477,7 @@ class GameMaster:
 
         return True, None  # All moves are valid
 
-    def ensure_valid_move(
+    async def ensure_valid_move(
         self, player: 'PlayerAgent')-> None:
         valid_move = False
         invalid_moves = 0
@@ -431,8 +488,10 @@ class GameMaster:
                 # Phase 0: Initial troop placement 
                 # (single move treated as a list with one move)
                 moves, reasoning, _  = (
-                    player.make_initial_troop_placement(
+                    await player.make_initial_troop_placement_async(
                         self.rules, self.game_state, error_msg))
+                moves = self.move_repair.repair_placement(
+                    player, moves, initial_placement=True)
                 
                 is_valid, error_msg = self.validate_move_phase_0(
                     player, moves, reasoning)
@@ -440,8 +499,9 @@ class GameMaster:
             elif self.phase == 1:
                 # Phase 1: Troop placement (multiple moves)
                 moves, reasoning, _ = (
-                    player.make_troop_placement(
+                    await player.make_troop_placement_async(
                         self.rules, self.game_state, error_msg))
+                moves = self.move_repair.repair_placement(player, moves)
                 # Validate the moves
                 is_valid, error_msg = self.validate_move_phase_1(
                     player, moves, reasoning)
@@ -483,16 +543,18 @@ class GameMaster:
                 print(f"Moves are invalid: {error_msg}, asking for new moves")
                 invalid_moves += 1
 
-    def ensure_valid_fortify_move(
+    async def ensure_valid_fortify_move(
         self, player: 'PlayerAgent')-> None:
         fortify_tries = 0
         error_msg = None
 
         while fortify_tries < 3:
             moves, reasoning, from_territory = (
-                player.make_fortify_move(self.rules,
+                await player.make_fortify_move_async(self.rules,
                     self.game_state, error_msg)
             ) 
+            moves, from_territory = self.move_repair.repair_troop_move(
+                player, moves, from_territory, self.game_state)
             # print(f"Proposed moves: {moves}, Reasoning: {reasoning}")
             is_valid, error_msg = self.validate_fortify_move(
                 player, moves, reasoning, from_territory)
@@ -556,7 +618,11 @@ class GameMaster:
         # Check if the territories are connected
         if not self.game_state.are_territories_connected(
             player.name, from_territory, territory):
-            error_msg = f"Error: Territories are not connected"
+            destinations = self.game_state.get_fortify_destinations(
+                player.name, from_territory)
+            error_msg = (f"Error: Territories are not connected. From " +
+                f"{from_territory} you can only fortify: " +
+                f"{', '.join(destinations) if destinations else 'None'}")
             print(error_msg)
             player.fortify_errors += 1
             return False ,error_msg
@@ -580,6 +646,18 @@ class GameMaster:
             self.game_state.update_troops(player.name, territory, num_troops)
             #update the troops for the from_territory
             self.game_state.update_troops(player.name, from_territory, -num_troops)
+            self.record_event("fortify", player, territory, from_territory,
+                              num_troops)
+
+    def record_event(self, event: str, player: Union['PlayerAgent', str],
+                     territory: Optional[str] = None,
+                     from_territory: Optional[str] = None,
+                     count: int = 0) -> None:
+        """Record a move in the event log, see utils/game_log.py."""
+        if self.game_log is not None:
+            self.game_log.record_event(
+                event, player if isinstance(player, str) else player.name,
+                territory, from_territory, count)
 
     def update_game_state_for_multiple_moves(
             self, player: 'PlayerAgent', moves: List[Dict[str, int]])-> None:
@@ -589,6 +667,7 @@ class GameMaster:
             num_troops = move['num_troops']
             # Update the game state (for example, add troops to the territory)
             self.game_state.update_troops(player.name, territory, num_troops)
+            self.record_event("placement", player, territory, count=num_troops)
 
     def reduce_player_troops_for_multiple_moves(
             self, player: 'PlayerAgent', moves: List[Dict[str, int]])-> None:
@@ -596,7 +675,7 @@ class GameMaster:
         total_troops = sum(move['num_troops'] for move in moves)
         player.troops -= total_troops
 
-    def ensure_valid_attack_move(
+    async def ensure_valid_attack_move(
         self, player: 'PlayerAgent')-> Tuple[int, Optional[bool]]:
         invalid_attacks = 0
         lost_attacks = 0
@@ -604,11 +683,19 @@ class GameMaster:
         error_msg = None
 
         while invalid_attacks < 3:
+            if self.rules.speculative_prompts:
+                # Fortify on the board of this attack in case it is the
+                # last one, thrown away when the attack changes the board
+                player.speculate(player.fortify_prompt_parts(
+                    self.rules, self.game_state), self.rules, self.game_state,
+                    "fortify")
             move, reasoning, from_territory = (
-                player.make_attack_move(self.rules,
+                await player.make_attack_move_async(self.rules,
                     self.game_state, successful_attacks, 
                                         error_msg)
             ) 
+            move, from_territory = self.move_repair.repair_troop_move(
+                player, move, from_territory, self.game_state)
             # print(f"Proposed attack: {move} from {from_territory}, " +
             #       f"Reasoning: {reasoning}")
             
@@ -624,11 +711,21 @@ class GameMaster:
                 if outcome == 'no_attack':
                     print("No attack was made")
                     invalid_attacks = 4  # Exit the loop
-                elif outcome == 'win':
+                    continue
+                player.discard_speculations("fortify")
+                attacked_territory = move[0]['territory_name']
+                self.record_event("attack", player, attacked_territory,
+                                  from_territory, move[0]['num_troops'])
+                if outcome == 'win':
                     successful_attacks += 1
+                    self.record_event(
+                        "conquest", player, attacked_territory,
+                        count=self.game_state.check_number_of_troops(
+                            player.name, attacked_territory))
                     # print("Player won the attack")
                     if not self.game_state.has_remaining_territories(defender):
                         print(f"{defender} has been eliminated!")
+                        self.record_event("elimination", defender)
                         # Transfer cards from the eliminated player to the attacker
                         if defender in self.player_cards:
                             (self.player_cards[player.name].extend(
@@ -646,7 +743,7 @@ class GameMaster:
                     if len(self.player_cards[player.name]) > 5:
                         print(f"{player.name} has more than 5 cards. " +
                               f"Forcing card trade...")
-                        self.force_trade_in_cards(player)
+                        await self.force_trade_in_cards(player)
 
 
                 else:
@@ -754,7 +851,7 @@ class GameMaster:
                 break
 
             # Randomly decide the number of troops to place in the current territory
-            troops_for_this_territory = random.randint(1, troops_to_allocate)
+            troops_for_this_territory = int(self.rng.integers(1, troops_to_allocate + 1))
             troop_placement.append({'territory_name': territory, 'num_troops': troops_for_this_territory})
 
             # Subtract the allocated troops from the total remaining troops
@@ -813,7 +910,7 @@ class GameMaster:
                 break  # Only place one troop
             else:
                 # Randomly decide the number of troops to place in the current territory
-                troops_for_this_territory = random.randint(1, troops_to_allocate)
+                troops_for_this_territory = int(self.rng.integers(1, troops_to_allocate + 1))
                 troop_placement.append({'territory_name': territory, 'num_troops': troops_for_this_territory})
 
                 # Subtract the allocated troops from the total remaining troops
@@ -832,71 +929,237 @@ class GameMaster:
 
         
     @track_turn_time
-    def play_a_turn(self, player: 'PlayerAgent')-> None:
+    async def play_a_turn(self, player: 'PlayerAgent')-> None:
         print(f"---------Player {player.name} is starting their turn.----------")
-        # Phase 1: Troop Placement
-        self.phase_1_troop_placement(player)
-        self.phase_2_attack(player)
-        if not self.game_over:
-            self.phase_3_fortify(player)
+        try:
+            # Phase 1: Troop Placement
+            await self.phase_1_troop_placement(player)
+            await self.phase_2_attack(player)
+            if not self.game_over:
+                await self.phase_3_fortify(player)
+        finally:
+            # Speculative prompts do not outlive the turn
+            player.discard_speculations()
         print(f"{player.name} has completed their turn.")
     
-    def play_game(self, include_initial_troop_placement:bool = True
-    ) -> None:
+    def play_game(self, include_initial_troop_placement:bool = True,
+                  games_folder: Optional[str] = None, resume: bool = False
+    ) -> str:
+        """
+        Play the game until it is over and save the results. 
         
-        turn_number = 0
-        games_folder = create_game_folder(base_folder="game_results")
-
-        self.init_game_state()
-
-        if include_initial_troop_placement:
-            self.distribute_territories_random()
-            self.choose_capitals()
-            self.complete_initial_troop_placement()
+        A game of bots and blocking LLM clients is played without an event
+        loop, also inside a running one (e.g. a notebook): the requests 
+        are sent directly and play_game_async never waits for the loop.
+        Async clients and speculative prompts need an event loop, the game
+        is played in a new one, inside a running event loop await 
+        play_game_async instead.
+        """
+        game = self.play_game_async(include_initial_troop_placement,
+                                    games_folder, resume)
+        if not self.needs_event_loop():
+            self.synchronous = True
+            for player in self.players:
+                player.synchronous = True
+            try:
+                return run_without_event_loop(game)
+            finally:
+                self.synchronous = False
+                for player in self.players:
+                    player.synchronous = False
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return asyncio.run(game)
+        game.close()
+        raise RuntimeError("play_game was called in a running event loop " +
+                           "and the game needs one for its async clients " +
+                           "or speculative prompts. " +
+                           "Please await play_game_async instead.")
+
+    async def wait_for(self, function: Any, *args: Any) -> Any:
+        """
+        Call a function that blocks, on the disk or on the log writer, in a
+        worker thread so that the other games of the event loop keep 
+        playing. A game played without an event loop calls it directly.
+        """
+        if self.synchronous:
+            return function(*args)
+        return await asyncio.to_thread(function, *args)
+
+    async def write_log(self, method: Any, *args: Any) -> None:
+        """Write to the game log, waiting for a full log writer off the
+        event loop."""
+        if isinstance(self.game_log, LogWriter) and self.game_log.full():
+            await self.wait_for(method, *args)
         else:
-            self.game_state.territories_df = pd.read_csv('territories.csv')
+            method(*args)
+
+    @asynccontextmanager
+    async def closing_off_loop(self, game_log: Union[GameLog, LogWriter]):
+        """Open the game log and close it in a worker thread: closing 
+        waits for the log writer and syncs the game folder to disk."""
+        game_log.__enter__()
+        try:
+            yield game_log
+        except BaseException as error:
+            await self.wait_for(game_log.__exit__, type(error), error,
+                                error.__traceback__)
+            raise
+        await self.wait_for(game_log.__exit__, None, None, None)
+
+    def needs_event_loop(self) -> bool:
+        """Whether the requests of the game have to wait for an event loop."""
+        return bool(self.rules.speculative_prompts) or any(
+            isinstance(player.llm_client, AsyncLLMClient)
+            for player in self.players)
+
+    async def play_game_async(self, include_initial_troop_placement:bool = True,
+                              games_folder: Optional[str] = None,
+                              resume: bool = False
+    ) -> str:
+        """
+        Play the game until it is over and save the results. Every request
+        to an LLM is awaited, so many games can share one event loop.
 
+        Parameters:
+        - include_initial_troop_placement: Distribute the territories and 
+        let the players place their initial troops.
+        - games_folder: Folder to save the game in, a new timestamped 
+        folder under game_results is created if None.
+        - resume: Continue the game from the checkpoint in games_folder,
+        see checkpoint.py. Without a checkpoint a new game is played.
 
-        # save the first snapshot of the game state
-        save_game_state(self.game_state, games_folder, turn_number, 
-                               self.game_round)
-        save_player_data(self.players, games_folder, turn_number, 
-                                self.game_round)
+        Returns:
+        - The folder the game was saved in.
+        """
+        turn_number = 0
+        # Index of the next player of the round in active_players
+        player_index = 0
+        if games_folder is None:
+            games_folder = create_game_folder(base_folder="game_results")
+        else:
+            os.makedirs(games_folder, exist_ok=True)
 
-        while not self.is_game_over():
-            print(f"this is the game_round var: {self.game_round}" )
-            self.game_round += 1
+        checkpoint = load_checkpoint(games_folder) if resume else None
+        if checkpoint is not None:
+            turn_number, player_index = restore_checkpoint(self, checkpoint)
+            print(f"Resuming the game after turn {turn_number} " +
+                  f"(round {self.game_round})")
+        else:
+            self.init_game_state()
 
-            print(f'This is the current game state:----------')
-            print(self.game_state.territories_df)
-            for player in self.active_players:
-                # print(f"these are the active players_:{self.active_players}")
-                # distribute some cards to test logic needs to be taken out
-                # just used for testing card logic
-                # if self.game_round == 1:
-                #     for _ in range(5):
-                #         card = self.deck.draw_card(self.discarded_cards)
-                #         self.player_cards[player.name].append(card)
+            if include_initial_troop_placement:
+                self.distribute_territories_random()
+                self.choose_capitals()
+                await self.complete_initial_troop_placement()
+            else:
+                self.game_state.territories_df = pd.read_csv('territories.csv')
+
+
+        game_log = open_game_log(games_folder, self.rules.game_log,
+                                 self.rules.keyframe_interval)
+        if self.rules.background_writer:
+            game_log = LogWriter(game_log)
+        async with self.closing_off_loop(game_log):
+            self.game_log = game_log
+            if checkpoint is not None:
+                # Rewrites the log up to the turn of the checkpoint
+                await self.wait_for(game_log.resume, self.game_state,
+                                    self.players, turn_number,
+                                    self.game_round)
+            else:
+                # log the first snapshot of the game state
+                await self.write_log(game_log.append_turn, self.game_state,
+                                     self.players, turn_number,
+                                     self.game_round)
+
+            while not self.is_game_over():
+                if player_index == 0:
+                    print(f"this is the game_round var: {self.game_round}" )
+                    self.game_round += 1
+
+                    print(f'This is the current game state:----------')
+                    print(self.game_state.format_game_state())
+                # Indexed like the iterator of a list, a player removed
+                # before the index shifts the players after it
+                while player_index < len(self.active_players):
+                    player = self.active_players[player_index]
+                    player_index += 1
+                    # print(f"these are the active players_:{self.active_players}")
+                    # distribute some cards to test logic needs to be taken out
+                    # just used for testing card logic
+                    # if self.game_round == 1:
+                    #     for _ in range(5):
+                    #         card = self.deck.draw_card(self.discarded_cards)
+                    #         self.player_cards[player.name].append(card)
                 
-                self.play_a_turn(player)
-
-                turn_number += 1
-                save_game_state(self.game_state, games_folder, turn_number, 
-                               self.game_round)
-                save_player_data(self.players, games_folder, turn_number, 
-                                self.game_round)
-
-                # check if the game is over
-                if self.is_game_over():
-                    break
- 
+                    await self.play_a_turn(player)
+
+                    turn_number += 1
+                    await self.write_log(game_log.append_turn,
+                                         self.game_state, self.players,
+                                         turn_number, self.game_round)
+                    if (self.rules.checkpoint_interval and
+                            turn_number % self.rules.checkpoint_interval == 0):
+                        await self.write_log(game_log.submit,
+                                             save_checkpoint, games_folder,
+                                        game_checkpoint(self, turn_number,
+                                                        player_index))
+
+                    # check if the game is over
+                    if self.is_game_over():
+                        break
+                else:
+                    player_index = 0
+
+            await self.write_log(game_log.submit, save_end_game_results,
+                                 self.players,
+                            self.winner.name if self.winner else None,
+                            self.victory_condition, self.game_round,
+                            games_folder, self.game_state,
+                            self.seed_sequence, game_log.stats())
+            await self.write_log(game_log.submit, remove_checkpoint,
+                                 games_folder)
+
+        self.game_log = None
+        self.log_writer_stats = game_log.stats()
         print(f"Game Over! The winner is {self.winner.name} by "+
               f"{self.victory_condition}")
         print(f"Game lasted {self.game_round} rounds")
-        save_end_game_results(self.players, 
-                          self.winner.name if self.winner else None, 
-                          self.victory_condition, 
-                          self.game_round, 
-                          games_folder, self.game_state)
-
-
+        for player in self.players:
+            prompt_cache = prompt_cache_summary(player)
+            if prompt_cache.get("prompt_tokens"):
+                print(f"{player.name} prompt cache hit rate: " +
+                      f"{prompt_cache['hit_rate']:.0%}")
+            if player.session is not None:
+                print(f"{player.name} session mode saved " +
+                      f"{player.session_tokens_saved} prompt tokens")
+            if player.move_requests:
+                print(f"{player.name} retried {player.move_retries} of " +
+                      f"{player.move_requests} moves ({player.retry_rate:.0%})")
+            if player.move_repairs:
+                print(f"{player.name} had {player.move_repairs} moves repaired")
+            if player.speculative_prompts:
+                print(f"{player.name} used {player.speculation_hits} of " +
+                      f"{player.speculative_prompts} speculative prompts " +
+                      f"({player.speculation_hit_rate:.0%})")
+        if self.log_writer_stats['blocked_writes']:
+            print(f"The game waited {self.log_writer_stats['blocked_time']:.2f}" +
+                  f" seconds for the log writer " +
+                  f"({self.log_writer_stats['blocked_writes']} turns)")
+        return games_folder
+
+
+def run_without_event_loop(coroutine: Any) -> Any:
+    """
+    Run a coroutine that never waits for an event loop, as play_game_async
+    of a synchronous game, and return its result.
+    """
+    try:
+        coroutine.send(None)
+    except StopIteration as stop:
+        return stop.value
+    coroutine.close()
+    raise RuntimeError("The game waited for an event loop, " +
+                       "please await play_game_async instead.")
@@ -1,49 +1,54 @@
-from collections import deque
 import pandas as pd
 import math
 import numpy as np
-import random
 from typing import Dict, List, Optional, Tuple
 from risk_game.game_constants import TERRITORIES, CONTINENT_BONUSES, \
 TERRITORY_CONNECTIONS
+from risk_game.board import Board
+from risk_game.battle import resolve_battle, attack_odds
+from risk_game.world_map import TERRITORY_IDS, NEIGHBOUR_MASKS, CONTINENTS, \
+mask_to_territories, controlled_continent_ids
 
 class GameState:
     def __init__(self,
-                 players: List['PlayerAgent'], rules: 'Rules') -> None: 
+                 players: List['PlayerAgent'], rules: 'Rules',
+                 rng: Optional[np.random.Generator] = None) -> None: 
         self.num_players: int = len(players)
         # Initialize to -1 indicating no player has acted yet
         self.last_player_index: int = -1
         self.capitals: Dict[str, str] = {} # store capitals for each player
-        self.territories_df: pd.DataFrame = self._init_territories_df(players)
+        # Owner and troops of every territory, indexed by territory id
+        self.board: Board = Board([player.name for player in players])
         # Graph of territory connections
         self.territories_graph: Dict[str, List[str]] = TERRITORY_CONNECTIONS 
         self.rules = rules
+        # Random number generator of the game, used for all dice and shuffles
+        self.rng: np.random.Generator = (
+            rng if rng is not None else np.random.default_rng())
         self.territories_required_to_win = math.ceil(
             self.rules.territory_control_percentage * len(TERRITORIES))
-    
-    def _init_territories_df(self, players: List['PlayerAgent']) -> pd.DataFrame:
-        # Use player names for columns
-        print([player.name for player in players])
-        columns = ['Territory'] + [f'{player.name}' for player in players]
-        territories_df = pd.DataFrame(TERRITORIES, columns=['Territory'])
-        for player in players:
-            territories_df[f'{player.name}'] = 0
-        return territories_df
+
+    @property
+    def territories_df(self) -> pd.DataFrame:
+        # DataFrame view of the board, only used for exporting the state
+        return self.board.to_dataframe()
+
+    @territories_df.setter
+    def territories_df(self, territories_df: pd.DataFrame) -> None:
+        self.board.load_dataframe(territories_df)
 
     def assign_territories_to_players_random(
             self, players: List['PlayerAgent']
     ) -> int:
-        territories = list(self.territories_df['Territory'])
-        random.shuffle(territories)
+        territories = list(TERRITORIES)
+        self.rng.shuffle(territories)
 
         for i, territory in enumerate(territories):
             player = players[i % self.num_players]
             player_name = player.name
             print(f'Assigning {territory} to {player_name}')
-            self.territories_df.loc[
-                self.territories_df['Territory'] == territory, 
-                f'{player_name}'
-            ] = 1
+            self.board.set_troops(self.board.player_id(player_name), 
+                                  TERRITORY_IDS[territory], 1)
             player.troops -= 1 # Remove one troop from the player
             # Update the last player index to the current player
             self.last_player_index = i % self.num_players  
@@ -56,69 +61,76 @@ class GameState:
         return self.last_player_index, next_player.name
 
     def validate_territory_assignment(self) -> bool:
-        # Sum all the values in the DataFrame
-        # Sums all player columns
-        total_sum = self.territories_df.iloc[:, 1:].sum().sum()  
+        # Sum the troops on all territories
+        total_sum = int(self.board.troops.sum())
         return total_sum == 42
     
     def check_terr_control(self, player_name: str, territory: str) -> bool:
-        controlled = self.territories_df.loc[
-            self.territories_df['Territory'] == territory, 
-            f'{player_name}'
-        ]
-        if controlled.empty:
+        territory_id = self.board.territory_id(territory)
+        if territory_id is None:
             return False
-        return controlled.values[0] > 0
+        return self.board.controls(self.board.player_id(player_name), 
+                                   territory_id)
     
     def are_territories_connected(
             self, player_name: str, from_territory: str, to_territory: str
         ) -> bool:
         """Check if two territories are connected by a chain of territories 
         under the player's control."""
-        # breath first search setup
-        queue = deque([from_territory])
-        visited = set()
-        while queue:
-            current_territory = queue.popleft()
-            
-            if current_territory == to_territory:
-                return True
-            
-            visited.add(current_territory)
-            
-            # Explore neighbors
-            for neighbor in self.territories_graph[current_territory]:
-                if neighbor not in visited and (
-                    self.check_terr_control(player_name, neighbor)):
-                    queue.append(neighbor)
-        
-        return False
+        if from_territory == to_territory:
+            return True
+        from_territory_id = self.board.territory_id(from_territory)
+        to_territory_id = self.board.territory_id(to_territory)
+        if from_territory_id is None or to_territory_id is None:
+            return False
+        return self.board.connected(self.board.player_id(player_name), 
+                                    from_territory_id, to_territory_id)
+
+    def get_fortify_destinations(
+            self, player_name: str, from_territory: str
+        ) -> List[str]:
+        """All territories the player can fortify from a territory, i.e. the
+        other territories in its connected component."""
+        from_territory_id = self.board.territory_id(from_territory)
+        if (from_territory_id is None or not self.board.controls(
+                self.board.player_id(player_name), from_territory_id)):
+            return []
+        return mask_to_territories(
+            self.board.component_masks[from_territory_id] 
+            & ~(1 << from_territory_id))
+
+    def get_fortify_options(self, player_name: str) -> Dict[str, List]:
+        """
+        For each territory the player can fortify from (more than one troop),
+        return the maximum number of troops that can be moved and the list
+        of territories they can be moved to.
+        """
+        return {
+            territory: [movable_troops, 
+                        self.get_fortify_destinations(player_name, territory)]
+            for territory, movable_troops in 
+            self.get_strong_territories_with_troops(player_name)
+        }
 
     def check_number_of_troops(self, player_name: str, territory: str) -> int:
-        controlled = self.territories_df.loc[
-            self.territories_df['Territory'] == territory, 
-            f'{player_name}'
-        ]
-        if controlled.empty:
+        territory_id = self.board.territory_id(territory)
+        if territory_id is None:
             return 0
-        return controlled.values[0]
+        return self.board.troops_of(self.board.player_id(player_name), 
+                                    territory_id)
     
     def update_troops(
         self, player_name: str, 
         territory: Optional[str], num_troops: Optional[int], 
         set_troops: bool = False
     ) -> None:
-        if territory and num_troops is not None:
+        territory_id = self.board.territory_id(territory)
+        if territory_id is not None and num_troops is not None:
+            player_id = self.board.player_id(player_name)
             if set_troops:
-                self.territories_df.loc[
-                    self.territories_df['Territory'] == territory, 
-                    f'{player_name}'
-                ] = num_troops
+                self.board.set_troops(player_id, territory_id, num_troops)
             else:
-                self.territories_df.loc[
-                    self.territories_df['Territory'] == territory, 
-                    f'{player_name}'
-                ] += num_troops
+                self.board.add_troops(player_id, territory_id, num_troops)
         else:
             print(
                 f'''Invalid move data: territory={territory}, 
@@ -126,40 +138,37 @@ class GameState:
             )
 
     def get_strong_territories(self, player_name: str) -> List[str]:
-        # Construct the column name for the player
-        player_column = f'{player_name}'
-        
-        # Filter the DataFrame to get territories with more than 1 troop
-        strong_territories = self.territories_df[
-            (self.territories_df[player_column] > 1)
-        ]['Territory'].tolist()
+        player_id = self.board.player_id(player_name)
         
-        return strong_territories
+        # Territories where the player has more than 1 troop
+        return [TERRITORIES[territory_id] 
+                for territory_id in self.board.territories_of(player_id)
+                if self.board.troops[territory_id] > 1]
     
     def get_strong_territories_with_troops(self, player_name: str
         ) -> List[Tuple[str, int]]:
-        # Construct the column name for the player
-        player_column = f'{player_name}'
-        
-        # Filter the DataFrame to get territories with more than 1 troop
-        strong_territories_df = self.territories_df[
-            self.territories_df[player_column] > 1
-        ]
+        player_id = self.board.player_id(player_name)
         
         # Create a list of tuples containing the territory name and troops - 1
         strong_territories_with_troops = [
-            (row['Territory'], row[player_column] - 1)
-            for _, row in strong_territories_df.iterrows()
+            (TERRITORIES[territory_id], int(self.board.troops[territory_id]) - 1)
+            for territory_id in self.board.territories_of(player_id)
+            if self.board.troops[territory_id] > 1
         ]
         
         return strong_territories_with_troops
 
     def get_player_territories(self, player_name: str) -> List[str]:
-        return list(self.territories_df[
-            self.territories_df[f'{player_name}'] > 0]['Territory']) 
+        player_id = self.board.player_id(player_name)
+        return [TERRITORIES[territory_id] 
+                for territory_id in self.board.territories_of(player_id)]
+    
+    def get_territory_mask(self, player_name: str) -> int:
+        # Bitmask of the territories controlled by the player
+        return self.board.owned_masks[self.board.player_id(player_name)]
     
     def has_remaining_territories(self, player_name: str) -> bool:
-        return len(self.get_player_territories(player_name)) > 0     
+        return self.get_territory_mask(player_name) != 0     
 
     def get_adjacent_enemy_territories(
         self, player_name: str, territories_with_troops: List[Tuple[str, int]]
@@ -180,24 +189,44 @@ class GameState:
         territories not under the player's control.
         """
         adjacent_enemy_territories = {}
+        owned_mask = self.get_territory_mask(player_name)
 
         for territory, attacking_troops in territories_with_troops:
-            # Get the neighbors (adjacent territories) of the current territory
-            neighbors = self.territories_graph.get(territory, [])
-
-            # print(f'----#-#-#-#-##-Neighbors of {territory}: {neighbors}')
-            
-            # List to store adjacent territories not under the player's control
-            enemy_territories = []
-            
-            for neighbor in neighbors:
-                if not self.check_terr_control(player_name, neighbor):
-                    enemy_territories.append(neighbor)
+            # Adjacent territories not under the player's control, in the
+            # order of the map as they appear in the prompts
+            enemy_territories = [
+                neighbour for neighbour in self.territories_graph.get(territory, [])
+                if not owned_mask >> TERRITORY_IDS[neighbour] & 1]
             
             # Add the result to the dictionary
-            adjacent_enemy_territories[territory] = [attacking_troops, enemy_territories]
+            adjacent_enemy_territories[territory] = [
+                attacking_troops, enemy_territories]
         
         return adjacent_enemy_territories
+
+    def get_border_territories(self, player_name: str) -> List[str]:
+        """Territories of the player that are adjacent to at least one 
+        territory not under the player's control."""
+        player_id = self.board.player_id(player_name)
+        owned_mask = self.board.owned_masks[player_id]
+        return [TERRITORIES[territory_id] 
+                for territory_id in self.board.territories_of(player_id)
+                if NEIGHBOUR_MASKS[territory_id] & ~owned_mask]
+
+    def get_frontier_territories(self, player_name: str) -> List[str]:
+        """Territories not under the player's control that are adjacent to
+        at least one territory controlled by the player."""
+        player_id = self.board.player_id(player_name)
+        owned_mask = self.board.owned_masks[player_id]
+        reachable_mask = 0
+        for territory_id in self.board.territories_of(player_id):
+            reachable_mask |= NEIGHBOUR_MASKS[territory_id]
+        return mask_to_territories(reachable_mask & ~owned_mask)
+
+    def get_controlled_continents(self, player_name: str) -> List[str]:
+        owned_mask = self.get_territory_mask(player_name)
+        return [CONTINENTS[continent_id] 
+                for continent_id in controlled_continent_ids(owned_mask)]
     
     def is_capital(self, territory: str) -> bool:
         # Check if the territory is a capital
@@ -208,21 +237,32 @@ class GameState:
         self.capitals[player_name] = territory
 
     def check_if_adjacent(self, territory1: str, territory2: str) -> bool:
-        return territory2 in self.territories_graph[territory1]
+        territory_id1 = TERRITORY_IDS.get(territory1)
+        territory_id2 = TERRITORY_IDS.get(territory2)
+        if territory_id1 is None or territory_id2 is None:
+            return False
+        return bool(NEIGHBOUR_MASKS[territory_id1] >> territory_id2 & 1)
     
     def get_territory_control(self, territory: str) -> Optional[Tuple[str, int]]:
-        # Find the row corresponding to the territory
-        territory_row = (
-            self.territories_df[self.territories_df['Territory'] == territory])
-        
-        # Iterate over each player column
-        for column in territory_row.columns[1:]:  # Skips the 'Territory' column
-            troops = territory_row[column].values[0]
-            if troops > 0:
-                player_name = column
-                return player_name, troops
+        territory_id = self.board.territory_id(territory)
+        if territory_id is None:
+            return None
         
-        return None  # If no player controls the territory
+        player_name = self.board.owner_name(territory_id)
+        if player_name is None:
+            return None  # If no player controls the territory
+        return player_name, int(self.board.troops[territory_id])
+
+    def board_snapshot(self) -> Dict[str, Optional[Tuple[str, int]]]:
+        """Owner and troops of every territory, see get_changed_territories."""
+        return {territory: self.get_territory_control(territory)
+                for territory in TERRITORIES}
+
+    def get_changed_territories(
+        self, snapshot: Dict[str, Optional[Tuple[str, int]]]) -> List[str]:
+        """Territories whose owner or troops changed since the snapshot."""
+        return [territory for territory in TERRITORIES
+                if self.get_territory_control(territory) != snapshot.get(territory)]
     
     def update_game_state_for_attack_move(
         self, player: 'PlayerAgent', 
@@ -274,6 +314,9 @@ class GameState:
         Returns:
         - Tuple[str, int]: The winner ('attacker' or 'defender') and the number of troops left.
         """
+        if self.rules.battle_engine == "table":
+            return resolve_battle(attacking_troops, defending_troops, 
+                                  self.rng, self.rules.battle_table_cap)
 
         while attacking_troops > 0 and defending_troops > 0:
             # Determine the number of dice each side rolls
@@ -281,8 +324,8 @@ class GameState:
             defender_dice = min(defending_troops, 2)
 
             # Roll the dice
-            attacker_rolls = sorted([random.randint(1, 6) for _ in range(attacker_dice)], reverse=True)
-            defender_rolls = sorted([random.randint(1, 6) for _ in range(defender_dice)], reverse=True)
+            attacker_rolls = sorted(self.rng.integers(1, 7, size=attacker_dice).tolist(), reverse=True)
+            defender_rolls = sorted(self.rng.integers(1, 7, size=defender_dice).tolist(), reverse=True)
 
             # Compare the highest rolls
             for attack_roll, defend_roll in zip(attacker_rolls, defender_rolls):
@@ -297,35 +340,104 @@ class GameState:
         else:
             return 'defender', defending_troops
         
-    def format_game_state(self) -> str:
+    def format_game_state(self, only_territories: Optional[List[str]] = None
+        ) -> str:
+        """The whole board, or only the given territories (and the
+        continents they are in)."""
         # Initialize formatted game state string
         formatted_game_state = "Current Game State:\n\n"
         
         # Iterate through continents using CONTINENT_BONUSES
         for continent, (territories, bonus) in CONTINENT_BONUSES.items():
-            formatted_game_state += (f"Continent: {continent} (Bonus: " +
-                                    f"{bonus} troops)\n")
+            formatted_continent = ""
             
             # Iterate through territories in each continent
             for territory in territories:
-                row = self.territories_df[(
-                    self.territories_df['Territory'] == territory)].iloc[0]
+                if only_territories is not None and \
+                        territory not in only_territories:
+                    continue
+                territory_id = TERRITORY_IDS[territory]
                 
                 # Identify the player who controls the territory and the number of troops
-                for col in self.territories_df.columns[1:]:  # Skip the 'Territory' column
-                    troops = row[col]
-                    if troops > 0:
-                        player_name = col
-                        formatted_game_state += (
-                            f"  - {territory}: Controlled by {player_name} " +
-                            f"with {troops} troops\n")
-                        break
+                player_name = self.board.owner_name(territory_id)
+                if player_name is not None:
+                    troops = int(self.board.troops[territory_id])
+                    formatted_continent += (
+                        f"  - {territory}: Controlled by {player_name} " +
+                        f"with {troops} troops\n")
             
-            formatted_game_state += "\n"  # Add a blank line between continents
+            if only_territories is None or formatted_continent:
+                formatted_game_state += (f"Continent: {continent} (Bonus: " +
+                                         f"{bonus} troops)\n" +
+                                         formatted_continent +
+                                         "\n")  # Add a blank line between continents
         
         return formatted_game_state
     
-    def format_strong_territories(self, 
+    def format_compact_game_state(self, player_name: str,
+                                  only_territories: Optional[List[str]] = None
+        ) -> str:
+        """
+        Abbreviated game state for the compact prompts: only the rows that
+        matter to the player, i.e. its own territories and the enemy
+        territories adjacent to them, grouped by owner, and one summary
+        line per player. With only_territories the rows are limited to
+        those territories.
+        """
+        player_id = self.board.player_id(player_name)
+        relevant_ids = (self.board.territories_of(player_id) +
+                        [TERRITORY_IDS[territory] for territory in
+                         self.get_frontier_territories(player_name)])
+        rows: Dict[str, List[str]] = {}
+        for territory_id in sorted(relevant_ids):
+            if only_territories is not None and \
+                    TERRITORIES[territory_id] not in only_territories:
+                continue
+            owner = self.board.owner_name(territory_id)
+            if owner is not None:
+                rows.setdefault(owner, []).append(
+                    f"{TERRITORIES[territory_id]} " +
+                    f"{int(self.board.troops[territory_id])}")
+
+        formatted_game_state = "Board (Owner: Territory Troops):\n"
+        for owner, territories in rows.items():
+            formatted_game_state += f"{owner}: {', '.join(territories)}\n"
+
+        formatted_game_state += "Players:\n"
+        for name in self.board.player_names:
+            if not self.has_remaining_territories(name):
+                continue
+            continents = self.get_controlled_continents(name)
+            formatted_game_state += (
+                f"{name}: {len(self.get_player_territories(name))} " +
+                f"territories, {self.get_sum_of_player_troops(name)} troops" +
+                (f", holds {', '.join(continents)}" if continents else "") +
+                "\n")
+        return formatted_game_state
+
+    def format_compact_attack_options(
+        self, adjacent_enemy_territories: Dict[str, List]) -> str:
+        # One line per territory: From (max troops): Target win chance, ...
+        formatted_output = "Attack options, From (Max Troops): Target Win Chance:\n"
+        for territory, (attacking_troops, enemy_territories) in adjacent_enemy_territories.items():
+            if enemy_territories:
+                win_chances = [
+                    f"{enemy_territory} {self.get_attack_win_probability(attacking_troops, enemy_territory):.0%}"
+                    for enemy_territory in enemy_territories]
+                formatted_output += (f"{territory} ({attacking_troops}): " +
+                                     f"{', '.join(win_chances)}\n")
+        return formatted_output
+
+    def format_compact_fortify_options(self, fortify_options: Dict[str, List]
+        ) -> str:
+        formatted_output = "Fortify options, From (Max Troops): Destinations:\n"
+        for territory, (movable_troops, destinations) in fortify_options.items():
+            if destinations:
+                formatted_output += (f"{territory} ({movable_troops}): " +
+                                     f"{', '.join(destinations)}\n")
+        return formatted_output
+
+    def format_strong_territories(self,
         strong_territories_with_troops: List[Tuple[str, int]], player_name: str
     ) -> str:
         formatted_strong_territories = f"Strong Territories for {player_name}:\n\n"
@@ -359,14 +471,42 @@ class GameState:
             formatted_output += f"  - Maximum Available Attacking Troops: {attacking_troops}\n"
             if enemy_territories:
                 formatted_output += f"  - Adjacent Enemy Territories: {', '.join(enemy_territories)}\n"
+                win_chances = [
+                    f"{enemy_territory} {self.get_attack_win_probability(attacking_troops, enemy_territory):.0%}"
+                    for enemy_territory in enemy_territories]
+                formatted_output += f"  - Win Chance Attacking With All Available Troops: {', '.join(win_chances)}\n"
             else:
                 formatted_output += "  - No adjacent enemy territories.\n"
             formatted_output += "\n"  # Add a blank line for readability
         
         return formatted_output
 
+    def format_fortify_options(self, fortify_options: Dict[str, List]) -> str:
+        formatted_output = ("The following is a list of territories you can " +
+            "fortify from and the territories connected to them:\n\n")
+
+        for territory, (movable_troops, destinations) in fortify_options.items():
+            formatted_output += f"{territory}:\n"
+            formatted_output += f"  - Maximum Troops to Move: {movable_troops}\n"
+            if destinations:
+                formatted_output += f"  - Connected Territories: {', '.join(destinations)}\n"
+            else:
+                formatted_output += "  - No connected territories.\n"
+            formatted_output += "\n"
+        
+        return formatted_output
+
+    def get_attack_win_probability(self, attacking_troops: int, 
+                                   territory: str) -> float:
+        # Probability of conquering the territory with the attacking troops
+        control = self.get_territory_control(territory)
+        if control is None or attacking_troops <= 0:
+            return 0.0
+        win_probability, _, _ = attack_odds(attacking_troops, control[1])
+        return win_probability
+
     def get_sum_of_player_troops(self, player_name: str) -> int:
-        return self.territories_df[f'{player_name}'].sum()
+        return self.board.total_troops(self.board.player_id(player_name))
 
     
      
\ No newline at end of file
@@ -1,50 +1,187 @@
 import os
-from anthropic import Client, AnthropicError
-from risk_game.llm_clients.llm_base import LLMClient 
+import json
+import asyncio
+from anthropic import Client, AsyncAnthropic, AnthropicError, RateLimitError
+from risk_game.llm_clients.llm_base import LLMClient, AsyncLLMClient, \
+get_retry_after_header, history_text, join_prompt
 import time
+from typing import Any, Dict, List, Optional, Tuple
+
+SYSTEM_PROMPT = ("You are a master strategist and Risk player " +
+                 "with 20 years experience.")
+CACHE_CONTROL = {"type": "ephemeral"}
+
+
+def get_model_type(model_number: int) -> str:
+    if model_number == 1:
+        model_type = "claude-3-5-sonnet-20240620"
+    elif model_number == 2:
+        model_type = "claude-3-sonnet-20240229"
+    elif model_number == 3:
+        model_type = "claude-3-haiku-20240307"
+    else:
+        raise ValueError("Invalid model number. Please choose a number " +
+                         "between 1 and 3.")
+    return model_type
+
+
+def build_request(message_content: str, system_prompt: Optional[str] = None,
+                  prompt_prefix: Optional[str] = None,
+                  history: Optional[List[Dict[str, str]]] = None
+                  ) -> Tuple[list, list]:
+    """
+    System blocks and messages of a prompt. The cache breakpoint is set on
+    the last static block, so the next call with the same system prompt
+    and prefix reads them from the prompt cache. Prefixes shorter than the
+    model's minimum (1024 tokens, 2048 for Haiku) are not cached. The
+    history of a session gets a breakpoint of its own on its last message,
+    the next call of the session starts with the same messages.
+    """
+    system = [{"type": "text", "text": system_prompt or SYSTEM_PROMPT}]
+    content = []
+    if prompt_prefix:
+        content.append({"type": "text", "text": prompt_prefix,
+                        "cache_control": CACHE_CONTROL})
+    elif system_prompt is not None:
+        system[0]["cache_control"] = CACHE_CONTROL
+    if message_content or not content:
+        content.append({"type": "text", "text": message_content})
+    messages = [{"role": message["role"], "content": message["content"]}
+                for message in history or []]
+    if messages:
+        messages[-1]["content"] = [{"type": "text",
+                                    "text": messages[-1]["content"],
+                                    "cache_control": CACHE_CONTROL}]
+    return system, messages + [{"role": "user", "content": content}]
+
+
+def tool_params(response_schema: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """The schema as the only tool, which the model has to call: the
+    arguments of the call are the structured answer."""
+    if response_schema is None:
+        return {}
+    return {"tools": [{"name": response_schema["title"],
+                       "description": "Submit your move.",
+                       "input_schema": response_schema}],
+            "tool_choice": {"type": "tool", "name": response_schema["title"]}}
+
+
+def response_text(content: List[Any]) -> str:
+    """Text of a response, or the arguments of its tool call as JSON."""
+    for block in content:
+        if getattr(block, "type", None) == "tool_use":
+            return json.dumps(block.input)
+    return content[0].text
+
+
+def record_prompt_cache(client: LLMClient, usage: object) -> None:
+    # input_tokens only counts the tokens after the cache breakpoint
+    cached_tokens = getattr(usage, 'cache_read_input_tokens', None) or 0
+    cache_write_tokens = getattr(usage, 'cache_creation_input_tokens', None) or 0
+    client.record_prompt_cache(
+        usage.input_tokens + cached_tokens + cache_write_tokens, 
+        cached_tokens, cache_write_tokens)
 
 
 class AnthropicClient(LLMClient):
     def __init__(self, model_number: int):
         self.client = Client(api_key=os.environ.get("ANTHROPIC_API_KEY"))
-        if model_number == 1:
-            model_type = "claude-3-5-sonnet-20240620"
-        elif model_number == 2:
-            model_type = "claude-3-sonnet-20240229"
-        elif model_number == 3:
-            model_type = "claude-3-haiku-20240307"
-        else:
-            raise ValueError("Invalid model number. Please choose a number " +
-                             "between 1 and 3.")
+        model_type = get_model_type(model_number)
 
         # Call the parent class constructor to set provider and model_type
-        super().__init__(provider_name="Anthropic", model_type=model_type)
+        super().__init__(provider_name="Anthropic", model_type=model_type,
+                         temperature=0)
 
 
-    def get_chat_completion(self, message_content) -> str:
-        full_prompt = [
-        {
-            "role": "user",
-            "content": message_content
-        }]
+    def get_chat_completion(self, message_content: str,
+                            system_prompt: Optional[str] = None,
+                            prompt_prefix: Optional[str] = None,
+                            history: Optional[List[Dict[str, str]]] = None,
+                            response_schema: Optional[Dict[str, Any]] = None
+                            ) -> str:
+        system, full_prompt = build_request(message_content, system_prompt,
+                                            prompt_prefix, history)
 
         for attempt in range(self.max_retries):
             try:
+                estimated_tokens = self.wait_for_rate_limit(
+                    (system_prompt or "") + history_text(history) +
+                    join_prompt(message_content, prompt_prefix), 
+                    2000)
                 message= self.client.messages.create(
                     model=self.model_type,
-                    system=(f"You are a master strategist and Risk player " +
-                    f"with 20 years experience."),
+                    system=system,
                     max_tokens=2000,
-                    temperature=0,
-                    messages=full_prompt
+                    temperature=self.temperature,
+                    messages=full_prompt,
+                    **tool_params(response_schema)
                     )
-                return message.content[0].text
+                self.record_usage(estimated_tokens, message.usage.input_tokens +
+                                  message.usage.output_tokens)
+                record_prompt_cache(self, message.usage)
+                return response_text(message.content)
+            except RateLimitError as e:
+                delay = self.rate_limit_backoff(attempt, get_retry_after_header(e))
+                print(f"Rate limit reached, retrying in {delay:.1f} seconds...")
+                time.sleep(delay)
+            except (AnthropicError) as e:
+                delay = self.retry_backoff(attempt)
+                print(f"Attempt {attempt + 1} failed with error: {e}." +
+                f"Retrying in {delay:.1f} seconds...")
+                time.sleep(delay)
+            except Exception as e:
+                print(f"Unexpected error: {e}")
+                break
+
+        raise AnthropicError("Maximum retries reached. Service is still unavailable.")
+
+
+class AsyncAnthropicClient(AsyncLLMClient):
+    def __init__(self, model_number: int):
+        self.client = AsyncAnthropic(api_key=os.environ.get("ANTHROPIC_API_KEY"))
+        model_type = get_model_type(model_number)
+        super().__init__(provider_name="Anthropic", model_type=model_type,
+                         temperature=0)
+
+    async def get_chat_completion(self, message_content: str,
+                                  system_prompt: Optional[str] = None,
+                                  prompt_prefix: Optional[str] = None,
+                                  history: Optional[List[Dict[str, str]]] = None,
+                                  response_schema: Optional[Dict[str, Any]] = None
+                                  ) -> str:
+        system, full_prompt = build_request(message_content, system_prompt,
+                                            prompt_prefix, history)
+
+        for attempt in range(self.max_retries):
+            try:
+                estimated_tokens = await self.wait_for_rate_limit_async(
+                    (system_prompt or "") + history_text(history) +
+                    join_prompt(message_content, prompt_prefix), 
+                    2000)
+                async with self.concurrency_limit():
+                    message = await self.client.messages.create(
+                        model=self.model_type,
+                        system=system,
+                        max_tokens=2000,
+                        temperature=self.temperature,
+                        messages=full_prompt,
+                        **tool_params(response_schema)
+                        )
+                self.record_usage(estimated_tokens, message.usage.input_tokens +
+                                  message.usage.output_tokens)
+                record_prompt_cache(self, message.usage)
+                return response_text(message.content)
+            except RateLimitError as e:
+                delay = self.rate_limit_backoff(attempt, get_retry_after_header(e))
+                print(f"Rate limit reached, retrying in {delay:.1f} seconds...")
+                await asyncio.sleep(delay)
             except (AnthropicError) as e:
+                delay = self.retry_backoff(attempt)
                 print(f"Attempt {attempt + 1} failed with error: {e}." +
-                f"Retrying in {self.retry_delay} seconds...")
-                time.sleep(self.retry_delay)
+                f"Retrying in {delay:.1f} seconds...")
+                await asyncio.sleep(delay)
             except Exception as e:
                 print(f"Unexpected error: {e}")
                 break
 
-        raise AnthropicError("Maximum retries reached. Service is still unavailable.")
\ No newline at end of file
+        raise AnthropicError("Maximum retries reached. Service is still unavailable.")
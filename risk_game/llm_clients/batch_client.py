@@ -0,0 +1,459 @@
+"""
+Batch API mode, for experiments where nobody waits for the games.
+
+The batch APIs of the providers (OpenAI Batch, Anthropic Message Batches)
+answer within 24 hours at half the price of interactive requests and do not
+count towards the rate limits. In batch mode the games of an experiment run
+in one event loop with BatchLLMClients. A client does not send its request,
+it hands it to the BatchCollector shared by all games. When every game is
+waiting for a response the collector writes the pending requests to one
+JSONL file per model, in the batch file format of the provider, submits the
+files with a BatchExecutor and resumes each game with its result, so the
+games advance in lockstep. Failed requests go into the next batch, up to
+the client's max_retries.
+
+Executors:
+- ProviderBatchExecutor: uploads the files to the batch API of OpenAI,
+  Anthropic or Groq and polls until the results are ready. Requests to
+  the local model are answered by a LocalBatchExecutor.
+- LocalBatchExecutor: answers the batch files with the local model (see
+  local_client.py) and writes the results in the format of the provider,
+  to test batch mode without network access.
+
+The batch files and their results are kept in the batch folder, e.g.
+batch_00001_OpenAI_gpt-4o.jsonl and batch_00001_OpenAI_gpt-4o_results.jsonl.
+"""
+import asyncio
+import json
+import os
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from anthropic import Client
+from openai import OpenAI
+from risk_game.llm_clients import anthropic_client, groq_client, \
+local_client, openai_client
+from risk_game.llm_clients.llm_base import AsyncLLMClient
+from risk_game.llm_clients.local_client import LOCAL_MODELS, LocalModel, \
+LocalModelError, chat_completion, read_messages, request_schema
+from risk_game.llm_clients.rate_limiter import estimate_tokens
+
+# Batch file format, model names, message builder, temperature and
+# structured output arguments of the providers with a batch API (the local
+# model stands in for one)
+BATCH_PROVIDERS: Dict[str, Tuple[str, Callable[[int], str], Callable, float,
+                                 Callable]] = {
+    "OpenAI": ("openai", openai_client.get_model_type,
+               openai_client.build_messages, 0, openai_client.response_format),
+    "Anthropic": ("anthropic", anthropic_client.get_model_type,
+                  anthropic_client.build_request, 0, anthropic_client.tool_params),
+    "Groq": ("openai", groq_client.get_model_type,
+             groq_client.build_messages, 1, groq_client.response_format),
+    "Local": ("openai", local_client.get_model_type,
+              local_client.build_messages, 0, openai_client.response_format),
+}
+FINISHED_OPENAI_BATCH = ("completed", "failed", "expired", "cancelled")
+# Groq's batch API is compatible with OpenAI's
+GROQ_BASE_URL = "https://api.groq.com/openai/v1"
+
+
+class BatchRequestError(Exception):
+    """A request failed in every batch it was submitted in."""
+
+
+def batch_request(provider_name: str, custom_id: str, model_type: str,
+                  max_tokens: int, temperature: float, message_content: str,
+                  system_prompt: Optional[str] = None,
+                  prompt_prefix: Optional[str] = None,
+                  history: Optional[List[Dict[str, str]]] = None,
+                  response_schema: Optional[Dict[str, Any]] = None
+                  ) -> Dict[str, Any]:
+    """One line of a batch file in the format of the provider."""
+    batch_format, _, build, _, structured_output = BATCH_PROVIDERS[provider_name]
+    if batch_format == "anthropic":
+        system, messages = build(message_content, system_prompt,
+                                 prompt_prefix, history)
+        return {"custom_id": custom_id, "params": {
+            "model": model_type, "max_tokens": max_tokens,
+            "temperature": temperature, "system": system,
+            "messages": messages, **structured_output(response_schema)}}
+    return {"custom_id": custom_id, "method": "POST",
+            "url": "/v1/chat/completions", "body": {
+                "model": model_type, "max_tokens": max_tokens,
+                "temperature": temperature,
+                "messages": build(message_content, system_prompt,
+                                  prompt_prefix, history),
+                **structured_output(response_schema)}}
+
+
+def results_path(batch_file: str) -> str:
+    root, extension = os.path.splitext(batch_file)
+    return root + "_results" + extension
+
+
+def read_batch_results(results_file: str, batch_format: str
+    ) -> Dict[str, Dict[str, Any]]:
+    """
+    Results of a batch by custom_id: the response content, or the error
+    of a failed request, and the prompt tokens (sent, read from and written
+    to the prompt cache).
+    """
+    results = {}
+    with open(results_file) as file:
+        for line in file:
+            if not line.strip():
+                continue
+            line = json.loads(line)
+            result = {"content": None, "error": None, "prompt_tokens": 0,
+                      "cached_tokens": 0, "cache_write_tokens": 0}
+            if batch_format == "anthropic":
+                outcome = line["result"]
+                if outcome["type"] == "succeeded":
+                    message = outcome["message"]
+                    usage = message.get("usage") or {}
+                    result["content"] = next(
+                        (json.dumps(block["input"]) for block in message["content"]
+                         if block["type"] == "tool_use"),
+                        message["content"][0].get("text"))
+                    result["cached_tokens"] = usage.get("cache_read_input_tokens") or 0
+                    result["cache_write_tokens"] = (
+                        usage.get("cache_creation_input_tokens") or 0)
+                    result["prompt_tokens"] = (usage.get("input_tokens", 0) +
+                                               result["cached_tokens"] +
+                                               result["cache_write_tokens"])
+                else:
+                    result["error"] = json.dumps(outcome.get("error") or outcome)
+            else:
+                response = line.get("response") or {}
+                body = response.get("body") or {}
+                if line.get("error") or response.get("status_code") != 200:
+                    result["error"] = json.dumps(line.get("error") or
+                                                 body.get("error") or response)
+                else:
+                    usage = body.get("usage") or {}
+                    details = usage.get("prompt_tokens_details") or {}
+                    result["content"] = body["choices"][0]["message"]["content"]
+                    result["prompt_tokens"] = usage.get("prompt_tokens", 0)
+                    result["cached_tokens"] = details.get("cached_tokens") or 0
+            results[line["custom_id"]] = result
+    return results
+
+
+class LocalBatchExecutor:
+    """
+    Answers batch files with the local model, in the result format of the
+    provider of the file.
+
+    Parameters:
+    - profile: Failure profile of the local model, see LATENCY_PROFILES in
+    local_client.py. The latency is ignored, a batch is answered at once.
+    - seed: Seed of the failures and bot decisions.
+    - default_model: Local model answering the requests to the models of
+    the providers, e.g. to play an OpenAI experiment offline.
+    """
+    def __init__(self, profile: Any = "instant", seed: Optional[int] = None,
+                 default_model: str = "local-greedy-border") -> None:
+        if default_model not in LOCAL_MODELS:
+            raise ValueError(f"Unknown local model: {default_model}")
+        self.model = LocalModel(profile, seed)
+        self.default_model = default_model
+        self.batches = 0
+
+    def run(self, batch_file: str, batch_format: str,
+            provider_name: str) -> str:
+        self.batches += 1
+        results_file = results_path(batch_file)
+        with open(batch_file) as requests, open(results_file, "w") as results:
+            for number, line in enumerate(requests, start=1):
+                result = self.answer(json.loads(line), batch_format,
+                                     f"local_batch_{self.batches}_{number}")
+                results.write(json.dumps(result) + "\n")
+        return results_file
+
+    def answer(self, request: Dict[str, Any], batch_format: str,
+               request_id: str) -> Dict[str, Any]:
+        if batch_format == "anthropic":
+            body = request["params"]
+            messages = [{"role": "system", "content": "".join(
+                block["text"] for block in body.get("system", []))}]
+            messages += body["messages"]
+        else:
+            body = request["body"]
+            messages = body["messages"]
+        model_type = body["model"]
+        response_schema = request_schema(body)
+        system_prompt, context, prompt_prefix, message_content = read_messages(
+            messages)
+
+        try:
+            content = self.model.complete(
+                model_type if model_type in LOCAL_MODELS else self.default_model,
+                prompt_prefix + message_content, context, response_schema)
+        except LocalModelError as e:
+            if batch_format == "anthropic":
+                return {"custom_id": request["custom_id"], "result": {
+                    "type": "errored", "error": {"type": "error", "error": {
+                        "type": "api_error", "message": str(e)}}}}
+            return {"id": request_id, "custom_id": request["custom_id"],
+                    "response": {"status_code": e.status_code,
+                                 "request_id": request_id,
+                                 "body": {"error": {"message": str(e),
+                                                    "type": "local_model_error"}}},
+                    "error": None}
+
+        static_prompt = system_prompt + context + prompt_prefix
+        cached_tokens, cache_write_tokens = self.model.prompt_cache(static_prompt)
+        prompt_tokens = estimate_tokens(static_prompt + message_content)
+        if batch_format == "anthropic":
+            if response_schema is not None:
+                # The answer is the call of the schema's tool
+                content_blocks = [{"type": "tool_use", "id": request_id,
+                                   "name": response_schema["title"],
+                                   "input": json.loads(content)}]
+            else:
+                content_blocks = [{"type": "text", "text": content}]
+            return {"custom_id": request["custom_id"], "result": {
+                "type": "succeeded", "message": {
+                    "id": request_id, "type": "message", "role": "assistant",
+                    "model": model_type, "content": content_blocks,
+                    "stop_reason": ("tool_use" if response_schema is not None
+                                    else "end_turn"),
+                    "usage": {
+                        "input_tokens": (prompt_tokens - cached_tokens -
+                                         cache_write_tokens),
+                        "output_tokens": estimate_tokens(content),
+                        "cache_read_input_tokens": cached_tokens,
+                        "cache_creation_input_tokens": cache_write_tokens}}}}
+        return {"id": request_id, "custom_id": request["custom_id"],
+                "response": {"status_code": 200, "request_id": request_id,
+                             "body": chat_completion(request_id, model_type,
+                                                     content, prompt_tokens,
+                                                     cached_tokens)},
+                "error": None}
+
+
+class ProviderBatchExecutor:
+    """
+    Submits batch files to the batch API of their provider and waits for
+    the results.
+
+    Parameters:
+    - poll_interval: Seconds between two checks of a submitted batch.
+    - local_executor: Executor of the batches of the local model.
+    """
+    def __init__(self, poll_interval: float = 60.0,
+                 local_executor: Optional[LocalBatchExecutor] = None) -> None:
+        self.poll_interval = poll_interval
+        self.local_executor = local_executor or LocalBatchExecutor()
+
+    def run(self, batch_file: str, batch_format: str,
+            provider_name: str) -> str:
+        if provider_name == "Local":
+            return self.local_executor.run(batch_file, batch_format,
+                                           provider_name)
+        if provider_name == "OpenAI":
+            return self.run_openai(batch_file, OpenAI())
+        if provider_name == "Groq":
+            return self.run_openai(batch_file, OpenAI(
+                base_url=GROQ_BASE_URL, api_key=os.environ.get("GROQ_API_KEY")))
+        if provider_name == "Anthropic":
+            return self.run_anthropic(batch_file)
+        raise ValueError(f"No batch API for provider: {provider_name}")
+
+    def run_openai(self, batch_file: str, client: OpenAI) -> str:
+        with open(batch_file, "rb") as file:
+            input_file = client.files.create(file=file, purpose="batch")
+        batch = client.batches.create(input_file_id=input_file.id,
+                                      endpoint="/v1/chat/completions",
+                                      completion_window="24h")
+        print(f"Submitted batch {batch.id} ({batch_file})")
+        while batch.status not in FINISHED_OPENAI_BATCH:
+            time.sleep(self.poll_interval)
+            batch = client.batches.retrieve(batch.id)
+
+        # Requests missing from the results (e.g. of an expired batch)
+        # count as failed and are submitted again
+        results_file = results_path(batch_file)
+        with open(results_file, "w") as file:
+            for file_id in (batch.output_file_id, batch.error_file_id):
+                if file_id:
+                    file.write(client.files.content(file_id).text)
+        print(f"Batch {batch.id} {batch.status}")
+        return results_file
+
+    def run_anthropic(self, batch_file: str) -> str:
+        client = Client(api_key=os.environ.get("ANTHROPIC_API_KEY"))
+        with open(batch_file) as file:
+            requests = [json.loads(line) for line in file]
+        batch = client.messages.batches.create(requests=requests)
+        print(f"Submitted Anthropic batch {batch.id} ({batch_file})")
+        while batch.processing_status != "ended":
+            time.sleep(self.poll_interval)
+            batch = client.messages.batches.retrieve(batch.id)
+
+        results_file = results_path(batch_file)
+        with open(results_file, "w") as file:
+            for result in client.messages.batches.results(batch.id):
+                file.write(result.to_json(indent=None) + "\n")
+        print(f"Anthropic batch {batch.id} ended")
+        return results_file
+
+
+class BatchCollector:
+    """
+    Gathers the requests of the games into batches, see the module
+    docstring. One collector is shared by every BatchLLMClient of an
+    experiment, in one event loop.
+
+    Parameters:
+    - executor: Runs a batch file and returns the file of its results,
+    e.g. ProviderBatchExecutor or LocalBatchExecutor.
+    - batch_folder: Folder of the batch and result files.
+    - max_batch_size: Maximum number of requests in one batch file.
+    - idle_passes: Turns of the event loop without a new request after
+    which the games are taken to be all waiting.
+    """
+    def __init__(self, executor: Any, batch_folder: str,
+                 max_batch_size: int = 10000, idle_passes: int = 20) -> None:
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size must be at least 1")
+        self.executor = executor
+        self.batch_folder = batch_folder
+        self.max_batch_size = max_batch_size
+        self.idle_passes = idle_passes
+        self.pending: List[Dict[str, Any]] = []
+        self.flush_task: Optional[asyncio.Task] = None
+        self.request_count = 0
+        self.batches = 0
+        self.batch_files: List[str] = []
+        self.failed_requests = 0
+        os.makedirs(batch_folder, exist_ok=True)
+
+    def __repr__(self) -> str:
+        return (f"<BatchCollector(folder='{self.batch_folder}', " +
+                f"batches={self.batches}, requests={self.request_count})>")
+
+    async def submit(self, client: 'BatchLLMClient',
+                     request: Dict[str, Any]) -> Dict[str, Any]:
+        """Queue a request for the next batch and wait for its result."""
+        pending = {"client": client, "request": request, "attempt": 0,
+                   "future": asyncio.get_running_loop().create_future()}
+        self.queue(pending)
+        if self.flush_task is None or self.flush_task.done():
+            self.flush_task = asyncio.create_task(self.run_batches())
+        return await pending["future"]
+
+    def queue(self, pending: Dict[str, Any]) -> None:
+        self.request_count += 1
+        pending["custom_id"] = f"request-{self.request_count}"
+        pending["request"]["custom_id"] = pending["custom_id"]
+        self.pending.append(pending)
+
+    async def wait_for_games(self) -> None:
+        # The games are CPU bound between two requests, once the loop has
+        # turned a few times without a new request they all wait for one
+        count = -1
+        while len(self.pending) != count and len(self.pending) < self.max_batch_size:
+            count = len(self.pending)
+            for _ in range(self.idle_passes):
+                await asyncio.sleep(0)
+
+    async def run_batches(self) -> None:
+        while self.pending:
+            await self.wait_for_games()
+            batch = self.pending[:self.max_batch_size]
+            self.pending = self.pending[self.max_batch_size:]
+            await self.run_batch(batch)
+
+    async def run_batch(self, batch: List[Dict[str, Any]]) -> None:
+        self.batches += 1
+        # One file per model, the providers do not mix models in a batch
+        groups: Dict[Tuple[str, str], List[Dict[str, Any]]] = {}
+        for pending in batch:
+            client = pending["client"]
+            groups.setdefault((client.provider_name, client.model_type),
+                              []).append(pending)
+        await asyncio.gather(*(
+            self.run_group(provider_name, model_type, group)
+            for (provider_name, model_type), group in groups.items()))
+
+    async def run_group(self, provider_name: str, model_type: str,
+                        group: List[Dict[str, Any]]) -> None:
+        batch_format = BATCH_PROVIDERS[provider_name][0]
+        batch_file = os.path.join(
+            self.batch_folder, f"batch_{self.batches:05d}_{provider_name}_" +
+            f"{model_type.replace('/', '_').replace(':', '_')}.jsonl")
+        with open(batch_file, "w") as file:
+            for pending in group:
+                file.write(json.dumps(pending["request"]) + "\n")
+        self.batch_files.append(batch_file)
+        print(f"Batch {self.batches}: {len(group)} requests to " +
+              f"{provider_name} {model_type}")
+
+        try:
+            results_file = await asyncio.to_thread(
+                self.executor.run, batch_file, batch_format, provider_name)
+            results = read_batch_results(results_file, batch_format)
+        except Exception as e:
+            for pending in group:
+                if not pending["future"].done():
+                    pending["future"].set_exception(e)
+            return
+
+        for pending in group:
+            if pending["future"].done():
+                # The game was cancelled
+                continue
+            result = results.get(pending["custom_id"])
+            if result is not None and result["error"] is None:
+                pending["future"].set_result(result)
+                continue
+            self.failed_requests += 1
+            pending["attempt"] += 1
+            if pending["attempt"] < pending["client"].max_retries:
+                self.queue(pending)
+            else:
+                pending["future"].set_exception(BatchRequestError(
+                    f"Request failed in {pending['attempt']} batches: " +
+                    (result["error"] if result else "no result")))
+
+
+class BatchLLMClient(AsyncLLMClient):
+    """
+    Client that sends its requests in the batches of a BatchCollector.
+
+    Parameters:
+    - provider_name: A provider of BATCH_PROVIDERS.
+    - model_number: Model of the provider, as for the other clients.
+    - collector: The collector shared by the games of the experiment.
+    - max_tokens: Maximum tokens of a response.
+    """
+    def __init__(self, provider_name: str, model_number: int,
+                 collector: BatchCollector, max_tokens: int = 1000) -> None:
+        if provider_name not in BATCH_PROVIDERS:
+            raise ValueError(f"No batch API for provider: {provider_name}")
+        _, get_model_type, _, temperature, _ = BATCH_PROVIDERS[provider_name]
+        super().__init__(provider_name=provider_name,
+                         model_type=get_model_type(model_number),
+                         temperature=temperature)
+        self.collector = collector
+        self.max_tokens = max_tokens
+
+    def __repr__(self) -> str:
+        return (f"<BatchLLMClient(provider='{self.provider_name}', " +
+                f"model='{self.model_type}')>")
+
+    async def get_chat_completion(self, message_content: str,
+                                  system_prompt: Optional[str] = None,
+                                  prompt_prefix: Optional[str] = None,
+                                  history: Optional[List[Dict[str, str]]] = None,
+                                  response_schema: Optional[Dict[str, Any]] = None
+                                  ) -> str:
+        # The custom_id is set when the request is queued
+        request = batch_request(self.provider_name, "", self.model_type,
+                                self.max_tokens, self.temperature,
+                                message_content, system_prompt, prompt_prefix,
+                                history, response_schema)
+        result = await self.collector.submit(self, request)
+        self.record_prompt_cache(result["prompt_tokens"], result["cached_tokens"],
+                                 result["cache_write_tokens"])
+        return result["content"]
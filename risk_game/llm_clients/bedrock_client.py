@@ -1,47 +1,109 @@
 import boto3
-from risk_game.llm_clients.llm_base import LLMClient 
+import asyncio
+from risk_game.llm_clients.llm_base import LLMClient, AsyncLLMClient, \
+history_text, join_prompt
 import time
 import json
+from typing import Any, Dict, List, Optional
+
+
+def get_model_type(model_number: int) -> str:
+    if model_number == 1:
+        model_type = "meta.llama3-1-405b-instruct-v1:0"
+    elif model_number == 2:
+        model_type = "meta.llama3-1-70b-instruct-v1:0"
+    else:
+        raise ValueError("Invalid model number. Please choose a number " +
+                         "between 1 and 2.")
+    return model_type
+
 
 class BedrockClient(LLMClient):
     def __init__(self, model_number: int):
         self.client = boto3.client('bedrock-runtime', region_name='us-west-2')
-        if model_number == 1:
-            model_type = "meta.llama3-1-405b-instruct-v1:0"
-        if model_number == 2:
-            model_type = "meta.llama3-1-70b-instruct-v1:0"
-        else:
-            raise ValueError("Invalid model number. Please choose a number " +
-                             "between 1 and 2.")
+        model_type = get_model_type(model_number)
         
         # Call the parent class constructor to set provider and model_type
-        super().__init__(provider_name="AWS_Bedrock", model_type=model_type)
-    
-    def get_chat_completion(self, message_content: str) -> str:
+        super().__init__(provider_name="AWS_Bedrock", model_type=model_type,
+                         temperature=1)
 
+    def invoke_model(self, message_content: str,
+                     system_prompt: Optional[str] = None) -> str:
+        # The raw llama prompt has no system role, it goes first
+        if system_prompt is not None:
+            message_content = system_prompt + "\n\n" + message_content
         full_prompt = {
             "prompt": message_content,
             "max_gen_len": 2000,
-            "temperature": 1,
+            "temperature": self.temperature,
             "top_p": 1
         }
+        response = self.client.invoke_model(
+            contentType="application/json", 
+            body=json.dumps(full_prompt),
+            modelId=self.model_type
+        )
+        # print(response)
+        response_body = response["body"].read().decode("utf-8")
+        # print(response_body)
+        generated_text = json.loads(response_body).get('generation', '')
+        cleaned_text = generated_text.replace('\n', ' ')
+        return cleaned_text
+    
+    def get_chat_completion(self, message_content: str,
+                            system_prompt: Optional[str] = None,
+                            prompt_prefix: Optional[str] = None,
+                            history: Optional[List[Dict[str, str]]] = None,
+                            response_schema: Optional[Dict[str, Any]] = None
+                            ) -> str:
+        # The raw prompt has no turns, the history goes first as text. There
+        # is no structured output, a response_schema is only in the prompt
+        message_content = (history_text(history) +
+                           join_prompt(message_content, prompt_prefix))
+        for attempt in range(self.max_retries):
+            try:
+                self.wait_for_rate_limit(
+                    (system_prompt or "") + message_content, 2000)
+                return self.invoke_model(message_content, system_prompt)
+            except Exception as e:
+                delay = self.retry_backoff(attempt)
+                print(f"Attempt {attempt + 1} failed with error: {e}." +
+                f"Retrying in {delay:.1f} seconds...")
+                time.sleep(delay)
+
+        raise Exception("Maximum retries reached. Service is still unavailable.")
+
+
+class AsyncBedrockClient(AsyncLLMClient):
+    # boto3 has no async API, the blocking call runs in a worker thread
+    def __init__(self, model_number: int):
+        self.bedrock_client = BedrockClient(model_number)
+        super().__init__(provider_name="AWS_Bedrock",
+                         model_type=self.bedrock_client.model_type,
+                         temperature=self.bedrock_client.temperature)
 
+    async def get_chat_completion(self, message_content: str,
+                                  system_prompt: Optional[str] = None,
+                                  prompt_prefix: Optional[str] = None,
+                                  history: Optional[List[Dict[str, str]]] = None,
+                                  response_schema: Optional[Dict[str, Any]] = None
+                                  ) -> str:
+        # The raw prompt has no turns, the history goes first as text. There
+        # is no structured output, a response_schema is only in the prompt
+        message_content = (history_text(history) +
+                           join_prompt(message_content, prompt_prefix))
         for attempt in range(self.max_retries):
             try:
-                response = self.client.invoke_model(
-                    contentType="application/json", 
-                    body=json.dumps(full_prompt),
-                    modelId=self.model_type
-                )
-                # print(response)
-                response_body = response["body"].read().decode("utf-8")
-                # print(response_body)
-                generated_text = json.loads(response_body).get('generation', '')
-                cleaned_text = generated_text.replace('\n', ' ')
-                return cleaned_text
+                await self.wait_for_rate_limit_async(
+                    (system_prompt or "") + message_content, 2000)
+                async with self.concurrency_limit():
+                    return await asyncio.to_thread(
+                        self.bedrock_client.invoke_model, message_content,
+                        system_prompt)
             except Exception as e:
+                delay = self.retry_backoff(attempt)
                 print(f"Attempt {attempt + 1} failed with error: {e}." +
-                f"Retrying in {self.retry_delay} seconds...")
-                time.sleep(self.retry_delay)
+                f"Retrying in {delay:.1f} seconds...")
+                await asyncio.sleep(delay)
 
-        raise Exception("Maximum retries reached. Service is still unavailable.")
\ No newline at end of file
+        raise Exception("Maximum retries reached. Service is still unavailable.")
@@ -1,78 +1,130 @@
 import os
 import time
-from groq import Groq, InternalServerError, APIStatusError
-from risk_game.llm_clients.llm_base import LLMClient
+import asyncio
+from groq import Groq, AsyncGroq, InternalServerError, APIStatusError
+from risk_game.llm_clients.llm_base import LLMClient, AsyncLLMClient, \
+ProviderUnavailableError, get_retry_after_header, history_text, join_prompt
+from typing import Any, Dict, List, Optional
 import json  # Import json to handle response decoding
 
+SYSTEM_PROMPT = ("You are a master strategist and Risk player " +
+                 "with 20 years experience.")
+
+
+def get_model_type(model_number: int) -> str:
+    if model_number == 1:
+        model_type = "llama-3.1-70b-versatile"
+    elif model_number == 2:
+        model_type = "llama3-70b-8192"
+    elif model_number == 3:
+        model_type = "llama-3.1-8b-instant"
+    elif model_number == 4:
+        model_type = "mixtral-8x7b-32768"
+    else:
+        raise ValueError("Invalid model number. Please choose a number " +
+                         "between 1 and 4.")
+    return model_type
+
+
+def build_messages(message_content: str,
+                   system_prompt: Optional[str] = None,
+                   prompt_prefix: Optional[str] = None,
+                   history: Optional[List[Dict[str, str]]] = None) -> list:
+    return [
+        {"role": "system", 
+        "content": system_prompt or SYSTEM_PROMPT},
+        *(history or []),
+        {
+            "role": "user",
+            "content": join_prompt(message_content, prompt_prefix)
+        }]
+
+
+def response_format(response_schema: Optional[Dict[str, Any]]
+    ) -> Dict[str, Any]:
+    # Groq's JSON mode only makes the answer a JSON object, the schema is
+    # checked after the answer with move_schema.read_move
+    if response_schema is None:
+        return {}
+    return {"response_format": {"type": "json_object"}}
+
+
+def get_retry_after(e: APIStatusError) -> Optional[float]:
+    """Delay requested by a rate limit (429) error, or None when the
+    response does not say."""
+    try:
+        # Convert the response to JSON
+        error_data = e.response.json()
+        
+        # Extract the error details
+        error_message = error_data['error']['message']
+        error_type = error_data['error']['type']
+        print(f"Rate Limit Error: {error_message} (Type: {error_type})")
+        
+        # Extract Retry-After or fallback to the header
+        retry_after = error_data.get('retry_after')
+    except json.JSONDecodeError:
+        retry_after = None
+        print("Failed to decode JSON response, using the Retry-After header.")
+
+    if retry_after is None:
+        return get_retry_after_header(e)
+    return float(retry_after)
+
+
 class GroqClient(LLMClient):
 
     def __init__(self, model_number: int):
         self.client = Groq(api_key=os.environ.get("GROQ_API_KEY"))
-        if model_number == 1:
-            model_type = "llama-3.1-70b-versatile"
-        elif model_number == 2:
-            model_type = "llama3-70b-8192"
-        elif model_number == 3:
-            model_type = "llama-3.1-8b-instant"
-        elif model_number == 4:
-            model_type = "mixtral-8x7b-32768"
-        else:
-            raise ValueError("Invalid model number. Please choose a number " +
-                             "between 1 and 4.")
+        model_type = get_model_type(model_number)
 
         # Call the parent class constructor to set provider and model_type
-        super().__init__(provider_name="Groq", model_type=model_type)
+        super().__init__(provider_name="Groq", model_type=model_type,
+                         temperature=1)
 
-    def get_chat_completion(self, message_content: str) -> str:
-        full_prompt = [
-            {"role": "system", 
-            "content": "You are a master strategist and Risk player with 20 years experience."},
-            {
-                "role": "user",
-                "content": message_content
-            }]
+    def get_chat_completion(self, message_content: str,
+                            system_prompt: Optional[str] = None,
+                            prompt_prefix: Optional[str] = None,
+                            history: Optional[List[Dict[str, str]]] = None,
+                            response_schema: Optional[Dict[str, Any]] = None
+                            ) -> str:
+        full_prompt = build_messages(message_content, system_prompt, prompt_prefix,
+                                     history)
 
         for attempt in range(self.max_retries):
             try:
+                estimated_tokens = self.wait_for_rate_limit(
+                    (system_prompt or "") + history_text(history) +
+                    join_prompt(message_content, prompt_prefix), 
+                    2000)
                 response = self.client.chat.completions.create(
                     model=self.model_type,
                     messages=full_prompt,
                     max_tokens=2000,
-                    temperature=1)
+                    temperature=self.temperature,
+                    **response_format(response_schema))
+                if response.usage:
+                    self.record_usage(estimated_tokens, response.usage.total_tokens)
                 return response.choices[0].message.content
 
             except APIStatusError as e:
                 # Handle API status error, particularly rate limit errors (429)
                 if e.status_code == 429:  # Too Many Requests error
-                    try:
-                        # Convert the response to JSON
-                        error_data = e.response.json()
-                        
-                        # Extract the error details
-                        error_message = error_data['error']['message']
-                        error_type = error_data['error']['type']
-                        print(f"Rate Limit Error: {error_message} (Type: {error_type})")
-                        
-                        # Extract Retry-After or fallback to retry_delay
-                        retry_after = error_data.get('retry_after', 
-                                                     self.retry_delay)
-                    except json.JSONDecodeError:
-                        # Fallback to the default delay if JSON decoding fails
-                        retry_after = self.retry_delay
-                        print("Failed to decode JSON response, using default retry delay.")
-                    
-                    print(f"Rate limit reached, retrying in {retry_after} seconds...")
-                    time.sleep(float(retry_after))
+                    delay = self.rate_limit_backoff(attempt, get_retry_after(e))
+                    print(f"Rate limit reached, retrying in {delay:.1f} seconds...")
+                    time.sleep(delay)
 
                 else:
+                    delay = self.retry_backoff(attempt)
                     print(f"Attempt {attempt + 1} failed with error: {e}. " +
-                          f"Retrying in {self.retry_delay} seconds...")
-                    time.sleep(self.retry_delay)
+                          f"Retrying in {delay:.1f} seconds...")
+                    time.sleep(delay)
 
             except InternalServerError as e:
                 # Handle InternalServerError generically
-                print(f"Internal Server Error (503): {e}. Retrying in {self.retry_delay} seconds...")
-                time.sleep(self.retry_delay)
+                delay = self.retry_backoff(attempt)
+                print(f"Internal Server Error (503): {e}. Retrying in {delay:.1f} seconds...")
+                time.sleep(delay)
 
             except Exception as e:
                 # Generic exception handling for other errors
@@ -80,5 +132,63 @@ class GroqClient(LLMClient):
                 break
 
         # If we exhausted all retries, raise an error
-        raise InternalServerError(("Maximum retries reached. Service is " +
-                                   "still unavailable."), response=None, body=None)
+        raise ProviderUnavailableError("Maximum retries reached. Service is " +
+                                       "still unavailable.")
+
+
+class AsyncGroqClient(AsyncLLMClient):
+
+    def __init__(self, model_number: int):
+        self.client = AsyncGroq(api_key=os.environ.get("GROQ_API_KEY"))
+        model_type = get_model_type(model_number)
+        super().__init__(provider_name="Groq", model_type=model_type,
+                         temperature=1)
+
+    async def get_chat_completion(self, message_content: str,
+                                  system_prompt: Optional[str] = None,
+                                  prompt_prefix: Optional[str] = None,
+                                  history: Optional[List[Dict[str, str]]] = None,
+                                  response_schema: Optional[Dict[str, Any]] = None
+                                  ) -> str:
+        full_prompt = build_messages(message_content, system_prompt, prompt_prefix,
+                                     history)
+
+        for attempt in range(self.max_retries):
+            try:
+                estimated_tokens = await self.wait_for_rate_limit_async(
+                    (system_prompt or "") + history_text(history) +
+                    join_prompt(message_content, prompt_prefix), 
+                    2000)
+                async with self.concurrency_limit():
+                    response = await self.client.chat.completions.create(
+                        model=self.model_type,
+                        messages=full_prompt,
+                        max_tokens=2000,
+                        temperature=self.temperature,
+                        **response_format(response_schema))
+                if response.usage:
+                    self.record_usage(estimated_tokens, response.usage.total_tokens)
+                return response.choices[0].message.content
+
+            except APIStatusError as e:
+                if e.status_code == 429:  # Too Many Requests error
+                    delay = self.rate_limit_backoff(attempt, get_retry_after(e))
+                    print(f"Rate limit reached, retrying in {delay:.1f} seconds...")
+                    await asyncio.sleep(delay)
+                else:
+                    delay = self.retry_backoff(attempt)
+                    print(f"Attempt {attempt + 1} failed with error: {e}. " +
+                          f"Retrying in {delay:.1f} seconds...")
+                    await asyncio.sleep(delay)
+
+            except InternalServerError as e:
+                delay = self.retry_backoff(attempt)
+                print(f"Internal Server Error (503): {e}. Retrying in {delay:.1f} seconds...")
+                await asyncio.sleep(delay)
+
+            except Exception as e:
+                print(f"Unexpected error: {e}")
+                break
+
+        raise ProviderUnavailableError("Maximum retries reached. Service is " +
+                                       "still unavailable.")
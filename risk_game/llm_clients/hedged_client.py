@@ -0,0 +1,194 @@
+"""
+Hedged requests against tail latency.
+
+One slow completion, e.g. stuck behind a rate limit or the retries of a
+provider error, stalls the whole game. HedgedLLMClient wraps an async
+client: when a request has not been answered within a deadline it sends a
+duplicate, to the same model or to a fallback model, and returns whichever
+response arrives first. The other request is cancelled.
+
+The deadline is the HEDGE_QUANTILE (p95) of the latencies of the model,
+kept in a LatencyHistogram shared by every client of the model. Until the
+histogram has MIN_SAMPLES latencies the initial deadline is used. At the
+p95 about one request in twenty is duplicated.
+
+The wrapper keeps the provider and model of the wrapped client, so without
+a fallback the players keep their model identity; with a fallback some
+responses come from the fallback model, see hedge_wins.
+"""
+import asyncio
+import math
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+from risk_game.llm_clients.llm_base import AsyncLLMClient
+
+HEDGE_QUANTILE: float = 0.95
+MIN_SAMPLES: int = 20
+# Deadline before the histogram has enough latencies, and the shortest
+# deadline, so fast requests are never duplicated
+INITIAL_DEADLINE: float = 30.0
+MIN_DEADLINE: float = 1.0
+
+
+class LatencyHistogram:
+    """
+    Latencies in buckets growing by a constant factor, from min_latency to
+    max_latency seconds. Quantiles are read at the upper bound of their
+    bucket, within 1 / buckets_per_decade of a decade of the exact value.
+    """
+    def __init__(self, min_latency: float = 0.01, max_latency: float = 3600.0,
+                 buckets_per_decade: int = 20) -> None:
+        self.min_latency = min_latency
+        self.buckets_per_decade = buckets_per_decade
+        num_buckets = math.ceil(
+            math.log10(max_latency / min_latency) * buckets_per_decade) + 1
+        self.counts: List[int] = [0] * num_buckets
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def __repr__(self) -> str:
+        p95 = self.quantile(HEDGE_QUANTILE)
+        return (f"<LatencyHistogram(count={self.count}, " +
+                f"p95={'None' if p95 is None else f'{p95:.2f}'})>")
+
+    def bucket(self, latency: float) -> int:
+        if latency <= self.min_latency:
+            return 0
+        bucket = math.ceil(math.log10(latency / self.min_latency) *
+                           self.buckets_per_decade)
+        return min(bucket, len(self.counts) - 1)
+
+    def upper_bound(self, bucket: int) -> float:
+        return self.min_latency * 10 ** (bucket / self.buckets_per_decade)
+
+    def record(self, latency: float) -> None:
+        with self.lock:
+            self.counts[self.bucket(latency)] += 1
+            self.count += 1
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Latency below which a share q of the requests finished, None
+        without any latency."""
+        with self.lock:
+            if self.count == 0:
+                return None
+            rank = math.ceil(q * self.count)
+            seen = 0
+            for bucket, bucket_count in enumerate(self.counts):
+                seen += bucket_count
+                if seen >= rank:
+                    return self.upper_bound(bucket)
+        return self.upper_bound(len(self.counts) - 1)
+
+
+_latency_histograms: Dict[Tuple[str, str], LatencyHistogram] = {}
+_latency_histograms_lock = threading.Lock()
+
+
+def get_latency_histogram(provider_name: str, model_type: str
+    ) -> LatencyHistogram:
+    """Shared latency histogram of a provider model."""
+    with _latency_histograms_lock:
+        key = (provider_name, model_type)
+        if key not in _latency_histograms:
+            _latency_histograms[key] = LatencyHistogram()
+        return _latency_histograms[key]
+
+
+class HedgedLLMClient(AsyncLLMClient):
+    """
+    Wraps an async client and duplicates the requests that take longer
+    than the deadline, see the module docstring.
+
+    Parameters:
+    - llm_client: The client of the player's model.
+    - fallback_client: Client the duplicate goes to, the same client if
+    None.
+    - quantile: Quantile of the latencies used as the deadline.
+    - initial_deadline: Deadline in seconds until the histogram has
+    min_samples latencies.
+    - min_deadline: Shortest deadline in seconds.
+    """
+    def __init__(self, llm_client: AsyncLLMClient,
+                 fallback_client: Optional[AsyncLLMClient] = None,
+                 quantile: float = HEDGE_QUANTILE,
+                 initial_deadline: float = INITIAL_DEADLINE,
+                 min_deadline: float = MIN_DEADLINE,
+                 min_samples: int = MIN_SAMPLES) -> None:
+        if not 0 < quantile < 1:
+            raise ValueError("The hedge quantile must be between 0 and 1")
+        super().__init__(provider_name=llm_client.provider_name,
+                         model_type=llm_client.model_type,
+                         temperature=llm_client.temperature)
+        self.llm_client = llm_client
+        self.fallback_client = fallback_client
+        self.prompt_cache_stats = llm_client.prompt_cache_stats
+        self.quantile = quantile
+        self.initial_deadline = initial_deadline
+        self.min_deadline = min_deadline
+        self.min_samples = min_samples
+        # Requests that were duplicated, and how many the duplicate won
+        self.hedged_requests = 0
+        self.hedge_wins = 0
+
+    def __repr__(self) -> str:
+        fallback = (f", fallback='{self.fallback_client.model_type}'"
+                    if self.fallback_client is not None else "")
+        return (f"<HedgedLLMClient(provider='{self.provider_name}', " +
+                f"model='{self.model_type}'{fallback})>")
+
+    def deadline(self) -> float:
+        """Seconds to wait for a response before sending the duplicate."""
+        histogram = get_latency_histogram(self.provider_name, self.model_type)
+        if histogram.count < self.min_samples:
+            return self.initial_deadline
+        return max(self.min_deadline, histogram.quantile(self.quantile))
+
+    async def timed_completion(self, llm_client: AsyncLLMClient,
+                               *args: Any) -> str:
+        histogram = get_latency_histogram(llm_client.provider_name,
+                                          llm_client.model_type)
+        start_time = time.monotonic()
+        try:
+            return await llm_client.get_chat_completion(*args)
+        finally:
+            # A cancelled request took at least this long, leaving it out
+            # would pull the deadline down
+            histogram.record(time.monotonic() - start_time)
+
+    async def get_chat_completion(self, message_content: str,
+                                  system_prompt: Optional[str] = None,
+                                  prompt_prefix: Optional[str] = None,
+                                  history: Optional[List[Dict[str, str]]] = None,
+                                  response_schema: Optional[Dict[str, Any]] = None
+                                  ) -> str:
+        args = (message_content, system_prompt, prompt_prefix, history,
+                response_schema)
+        primary = asyncio.ensure_future(
+            self.timed_completion(self.llm_client, *args))
+        tasks = [primary]
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=self.deadline())
+            if done:
+                return primary.result()
+
+            self.hedged_requests += 1
+            hedge = asyncio.ensure_future(self.timed_completion(
+                self.fallback_client or self.llm_client, *args))
+            tasks.append(hedge)
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED)
+                # The first response wins, a failed request waits for the
+                # other one
+                for task in sorted(done, key=tasks.index):
+                    if task.exception() is None:
+                        if task is hedge:
+                            self.hedge_wins += 1
+                        return task.result()
+            return primary.result()
+        finally:
+            for task in tasks:
+                task.cancel()
@@ -1,21 +1,168 @@
-from typing import List, Dict
+import asyncio
+import weakref
+from typing import Any, List, Dict, Optional
 from abc import ABC, abstractmethod
+from risk_game.llm_clients.rate_limiter import RateLimiter, backoff_delay, \
+estimate_tokens
+
+# Maximum number of requests in flight per provider for the async clients.
+# The limits are shared by every game running in the same event loop.
+DEFAULT_CONCURRENCY: int = 8
+PROVIDER_CONCURRENCY: Dict[str, int] = {
+    "OpenAI": 16,
+    "Anthropic": 8,
+    "Groq": 4,
+    "AWS_Bedrock": 8,
+    "Local": 64,
+}
+_provider_semaphores: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, asyncio.Semaphore]]" = (
+    weakref.WeakKeyDictionary())
+
+
+class ProviderUnavailableError(RuntimeError):
+    """The provider still failed after every retry of a request."""
+
+
+def set_provider_concurrency(provider_name: str, limit: int) -> None:
+    """Set the maximum number of requests in flight for a provider. Takes
+    effect in event loops that have not sent a request to it yet."""
+    if limit < 1:
+        raise ValueError("The concurrency limit must be at least 1")
+    PROVIDER_CONCURRENCY[provider_name] = limit
+
+
+def provider_semaphore(provider_name: str) -> asyncio.Semaphore:
+    """Semaphore limiting the requests in flight to a provider in the
+    running event loop."""
+    semaphores = _provider_semaphores.setdefault(asyncio.get_running_loop(), {})
+    if provider_name not in semaphores:
+        semaphores[provider_name] = asyncio.Semaphore(
+            PROVIDER_CONCURRENCY.get(provider_name, DEFAULT_CONCURRENCY))
+    return semaphores[provider_name]
+
+
+def join_prompt(message_content: str, prompt_prefix: Optional[str]) -> str:
+    """Full user message of a prompt sent with a static prefix."""
+    if prompt_prefix is None:
+        return message_content
+    return prompt_prefix + message_content
+
+
+def history_text(history: Optional[List[Dict[str, str]]]) -> str:
+    """Text of the earlier messages of a session, to estimate its tokens."""
+    if not history:
+        return ""
+    return "".join(message["content"] + "\n\n" for message in history)
+
+
+def get_retry_after_header(e: Exception) -> Optional[float]:
+    """Seconds to wait from the Retry-After header of an API error, if the
+    provider sent one."""
+    response = getattr(e, 'response', None)
+    try:
+        return float(response.headers['retry-after'])
+    except (AttributeError, KeyError, TypeError, ValueError):
+        return None
+
 
 class LLMClient(ABC):
     def __init__(self, provider_name: str, model_type: str, max_retries: int=4,
-                 retry_delay: int=10) -> None:
+                 retry_delay: int=10, temperature: float=0) -> None:
         self.provider_name = provider_name
         self.model_type = model_type
+        self.temperature = temperature
         self.retry_delay = retry_delay
         self.max_retries = max_retries
-
+        # Shared with every client of the same model, set by create_llm_client
+        self.rate_limiter: Optional[RateLimiter] = None
+        # Prompt tokens sent, read from the provider's prompt cache and 
+        # written to it, for the providers that report them
+        self.prompt_cache_stats: Dict[str, int] = {
+            "prompt_tokens": 0, "cached_tokens": 0, "cache_write_tokens": 0}
 
     @abstractmethod
-    def get_chat_completion(self, messages: List[Dict[str, str]]) -> str:
+    def get_chat_completion(self, message_content: str,
+                            system_prompt: Optional[str] = None,
+                            prompt_prefix: Optional[str] = None,
+                            history: Optional[List[Dict[str, str]]] = None,
+                            response_schema: Optional[Dict[str, Any]] = None
+                            ) -> str:
+        """
+        Response to the prompt. Without a system_prompt the provider client
+        uses its default one. The prompt_prefix is the static start of the
+        user message, sent before message_content, which the clients of
+        providers with prompt caching mark as cacheable together with the
+        system prompt. The history holds the earlier messages of a
+        multi-turn session, {"role": "user" or "assistant", "content": ...},
+        sent between the system prompt and the new user message. With a
+        response_schema (see move_schema.py) the response is a JSON object
+        of the schema, enforced by the providers that support it.
+        """
         pass
 
     def __repr__(self) -> str:
         return (f"<LLMClient(provider='{self.provider_name}', " +
                 f"model='{self.model_type}')>")
 
+    def wait_for_rate_limit(self, message_content: str, 
+                            max_tokens: int) -> int:
+        """Wait for room in the rate limits and return the estimated
+        number of tokens of the request."""
+        estimated_tokens = estimate_tokens(message_content, max_tokens)
+        if self.rate_limiter is not None:
+            self.rate_limiter.acquire(estimated_tokens)
+        return estimated_tokens
+
+    async def wait_for_rate_limit_async(self, message_content: str, 
+                                        max_tokens: int) -> int:
+        estimated_tokens = estimate_tokens(message_content, max_tokens)
+        if self.rate_limiter is not None:
+            await self.rate_limiter.acquire_async(estimated_tokens)
+        return estimated_tokens
+
+    def record_usage(self, estimated_tokens: int, used_tokens: int) -> None:
+        if self.rate_limiter is not None:
+            self.rate_limiter.record_usage(estimated_tokens, used_tokens)
+
+    def record_prompt_cache(self, prompt_tokens: int, cached_tokens: int,
+                            cache_write_tokens: int = 0) -> None:
+        self.prompt_cache_stats["prompt_tokens"] += prompt_tokens
+        self.prompt_cache_stats["cached_tokens"] += cached_tokens
+        self.prompt_cache_stats["cache_write_tokens"] += cache_write_tokens
+
+    def retry_backoff(self, attempt: int) -> float:
+        return backoff_delay(attempt, self.retry_delay)
+
+    def rate_limit_backoff(self, attempt: int, 
+                           retry_after: Optional[float] = None) -> float:
+        """Delay after a rate limit error. The shared limiter is paused so 
+        the other games hold back too, and the delay is jittered so they 
+        do not all retry at once."""
+        delay = retry_after if retry_after is not None else self.retry_backoff(attempt)
+        if self.rate_limiter is not None:
+            self.rate_limiter.pause(delay)
+        return delay + backoff_delay(0, self.retry_delay / 10)
+
 
+class AsyncLLMClient(LLMClient):
+    """
+    Client that awaits the provider instead of blocking, so one event loop
+    can keep the requests of many games in flight. Implementations hold
+    `self.concurrency_limit()` while a request is in flight and sleep with
+    asyncio.sleep between retries.
+    """
+    @abstractmethod
+    async def get_chat_completion(self, message_content: str,
+                                  system_prompt: Optional[str] = None,
+                                  prompt_prefix: Optional[str] = None,
+                                  history: Optional[List[Dict[str, str]]] = None,
+                                  response_schema: Optional[Dict[str, Any]] = None
+                                  ) -> str:
+        pass
+
+    def concurrency_limit(self) -> asyncio.Semaphore:
+        return provider_semaphore(self.provider_name)
+
+    def __repr__(self) -> str:
+        return (f"<AsyncLLMClient(provider='{self.provider_name}', " +
+                f"model='{self.model_type}')>")
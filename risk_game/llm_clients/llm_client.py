@@ -1,19 +1,120 @@
-from .groq_client import GroqClient
-from .anthropic_client import AnthropicClient
-from .openai_client import OpenAIClient
-from .bedrock_client import BedrockClient
+from .groq_client import GroqClient, AsyncGroqClient
+from .anthropic_client import AnthropicClient, AsyncAnthropicClient
+from .openai_client import OpenAIClient, AsyncOpenAIClient
+from .bedrock_client import BedrockClient, AsyncBedrockClient
+from .local_client import LocalClient, AsyncLocalClient
+from .batch_client import BatchLLMClient, BatchCollector
+from .hedged_client import HedgedLLMClient
+from .rate_limiter import get_rate_limiter
+from .response_cache import CachedLLMClient, AsyncCachedLLMClient, \
+get_response_cache, DEFAULT_CACHE_PATH
+from typing import Any, Dict, Optional, Tuple
 
 
 
 # Factory Method
-def create_llm_client(provider: str, model_number: int) -> 'LLMClient':
+def create_llm_client(provider: str, model_number: int,
+                      requests_per_minute: Optional[int] = None,
+                      tokens_per_minute: Optional[int] = None,
+                      cache_mode: Optional[str] = None,
+                      cache_path: str = DEFAULT_CACHE_PATH,
+                      cache_max_size_bytes: Optional[int] = None,
+                      **client_options: Any
+    ) -> 'LLMClient':
+    """
+    Create a client for a provider model. Every client of the same model 
+    shares one rate limiter, its limits default to RATE_LIMITS in 
+    rate_limiter.py and can be set with requests_per_minute and 
+    tokens_per_minute.
+
+    With a cache_mode ("record", "replay" or "auto") the client is wrapped
+    in a CachedLLMClient that stores the responses in the SQLite file at
+    cache_path, see response_cache.py. In "bypass" mode it is not wrapped
+    and no cache file is opened.
+
+    The "Local" provider answers with a bot policy instead of an LLM, its
+    client_options (profile, base_url, seed, enforce_schema) are passed to
+    LocalClient, see local_client.py.
+    """
+    if provider == "Groq":
+        client = GroqClient(model_number)
+    elif provider == "Anthropic":
+        client = AnthropicClient(model_number)
+    elif provider == "OpenAI":
+        client = OpenAIClient(model_number)
+    elif provider == "Bedrock":
+        client = BedrockClient(model_number)
+    elif provider == "Local":
+        client = LocalClient(model_number, **client_options)
+    else:
+        raise ValueError(f"Unknown LLM provider: {provider}")
+    client.rate_limiter = get_rate_limiter(
+        client.provider_name, client.model_type, 
+        requests_per_minute, tokens_per_minute)
+    if cache_mode not in (None, "bypass"):
+        client = CachedLLMClient(
+            client, get_response_cache(cache_path, cache_max_size_bytes), 
+            cache_mode)
+    return client
+
+
+def create_async_llm_client(provider: str, model_number: int,
+                            requests_per_minute: Optional[int] = None,
+                            tokens_per_minute: Optional[int] = None,
+                            cache_mode: Optional[str] = None,
+                            cache_path: str = DEFAULT_CACHE_PATH,
+                            cache_max_size_bytes: Optional[int] = None,
+                            hedge_requests: bool = False,
+                            hedge_fallbacks: Optional[Dict[str, Tuple[str, int]]] = None,
+                            **client_options: Any
+    ) -> 'AsyncLLMClient':
+    """
+    Async version of create_llm_client. With hedge_requests the client is
+    wrapped in a HedgedLLMClient that sends a duplicate of the slow
+    requests, see hedged_client.py. The duplicate goes to the same model
+    unless hedge_fallbacks gives a (provider, model_number) fallback for
+    the provider. Responses from the cache are not hedged.
+    """
     if provider == "Groq":
-        return GroqClient(model_number)
+        client = AsyncGroqClient(model_number)
     elif provider == "Anthropic":
-        return AnthropicClient(model_number)
+        client = AsyncAnthropicClient(model_number)
     elif provider == "OpenAI":
-        return OpenAIClient(model_number)
+        client = AsyncOpenAIClient(model_number)
     elif provider == "Bedrock":
-        return BedrockClient(model_number)
+        client = AsyncBedrockClient(model_number)
+    elif provider == "Local":
+        client = AsyncLocalClient(model_number, **client_options)
     else:
         raise ValueError(f"Unknown LLM provider: {provider}")
+    client.rate_limiter = get_rate_limiter(
+        client.provider_name, client.model_type, 
+        requests_per_minute, tokens_per_minute)
+    if hedge_requests:
+        fallback = (hedge_fallbacks or {}).get(provider)
+        client = HedgedLLMClient(client, create_async_llm_client(*fallback)
+                                 if fallback is not None else None)
+    if cache_mode not in (None, "bypass"):
+        client = AsyncCachedLLMClient(
+            client, get_response_cache(cache_path, cache_max_size_bytes), 
+            cache_mode)
+    return client
+
+
+def create_batch_llm_client(provider: str, model_number: int,
+                            batch_collector: BatchCollector,
+                            cache_mode: Optional[str] = None,
+                            cache_path: str = DEFAULT_CACHE_PATH,
+                            cache_max_size_bytes: Optional[int] = None
+    ) -> 'AsyncLLMClient':
+    """
+    Create a client that sends its requests in the provider batches of the
+    batch_collector, see batch_client.py. Batches do not count towards the
+    rate limits, the client has no rate limiter.
+    """
+    client = BatchLLMClient(provider, model_number, batch_collector)
+    if cache_mode not in (None, "bypass"):
+        client = AsyncCachedLLMClient(
+            client, get_response_cache(cache_path, cache_max_size_bytes), 
+            cache_mode)
+    return client
@@ -0,0 +1,601 @@
+"""
+Local stand-in for an LLM provider, to load test the game loop without
+network access or API spend.
+
+A LocalModel reads the prompts the PlayerAgent sends, rebuilds the board
+from the game state in the prompt and lets one of the scripted bots choose
+the move, which it answers in the same |||Territory, N|||, ###From### and
++++Reasoning+++ format as an LLM. The answers go through the normal
+parsing and validation, so the whole path of a request is exercised.
+
+Latency and failures are drawn from a profile (see LATENCY_PROFILES): a
+log-normal response time, transient server errors, rate limit errors,
+malformed answers and well formed moves the game rejects, to benchmark the
+retries, the rate limiter and the throughput of many games. Asked for
+structured output (a response_schema, see move_schema.py) the model 
+answers in JSON. A malformed JSON answer misses the fields of the schema,
+as from Groq's JSON mode or Bedrock, which do not enforce the schema; with
+enforce_schema, as OpenAI and Anthropic do, the JSON answers are never 
+malformed. Invalid moves are drawn in every output mode.
+
+The model can be called in-process by LocalClient and AsyncLocalClient, or
+served over HTTP with an OpenAI compatible /v1/chat/completions endpoint
+(start_local_server, or `python -m risk_game.llm_clients.local_client`),
+in which case the clients talk to it with the openai package.
+"""
+import argparse
+import asyncio
+import json
+import re
+import threading
+import time
+import numpy as np
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+from openai import OpenAI, AsyncOpenAI, APIError
+from risk_game.bots import BOTS, ScriptedAgent
+from risk_game.game_config import GameConfig
+from risk_game.game_state import GameState
+from risk_game.llm_clients.llm_base import LLMClient, AsyncLLMClient, \
+history_text, join_prompt
+from risk_game.llm_clients.openai_client import cached_prompt_tokens, \
+response_format
+from risk_game.move_schema import format_card_trade_json, format_move_json
+from risk_game.llm_clients.rate_limiter import estimate_tokens
+from risk_game.player_agent import PlayerAgent
+from risk_game.rules import Rules
+
+# Bot policy answering for each local model
+LOCAL_MODELS: Dict[str, str] = {
+    "local-greedy-border": "GreedyBorder",
+    "local-continent": "Continent",
+    "local-random": "Random",
+}
+
+# Median latency in seconds, log-normal sigma of the latency and the
+# probability of a server error, a rate limit error, a malformed answer and
+# an invalid move (optional in a profile, 0 if missing)
+LATENCY_PROFILES: Dict[str, Dict[str, float]] = {
+    "instant": {"median_latency": 0.0, "latency_sigma": 0.0,
+                "error_rate": 0.0, "rate_limit_rate": 0.0,
+                "malformed_rate": 0.0, "invalid_move_rate": 0.0},
+    "fast": {"median_latency": 0.05, "latency_sigma": 0.3,
+             "error_rate": 0.0, "rate_limit_rate": 0.0,
+             "malformed_rate": 0.0, "invalid_move_rate": 0.0},
+    "realistic": {"median_latency": 2.0, "latency_sigma": 0.5,
+                  "error_rate": 0.01, "rate_limit_rate": 0.0,
+                  "malformed_rate": 0.02, "invalid_move_rate": 0.02},
+    "flaky": {"median_latency": 0.5, "latency_sigma": 0.8,
+              "error_rate": 0.1, "rate_limit_rate": 0.05,
+              "malformed_rate": 0.1, "invalid_move_rate": 0.05},
+}
+MALFORMED_ANSWER = "I think the best move is to attack everywhere."
+# Valid JSON without the fields of the move schemas
+MALFORMED_JSON_ANSWER = json.dumps({"reasoning": MALFORMED_ANSWER})
+
+BOARD_LINE = re.compile(
+    r"^\s*- (.+?): Controlled by (.+) with (\d+) troops\s*$", re.MULTILINE)
+# Rows of the compact board, "Owner: Territory Troops, Territory Troops"
+COMPACT_BOARD = re.compile(r"^Board \(Owner: Territory Troops\):\n((?:.+\n)*?)Players:",
+                           re.MULTILINE)
+PLAYER_NAME = re.compile(r"You,? are (.+?)(?:, and|\. Phase:)")
+TROOPS_TO_PLACE = re.compile(r"You have (\d+) (?:troops )?to place")
+CARD_COMBINATION = re.compile(r"^\s*(\d+) troops: \[([\d, ]+)\] \((Wildcard (?:not )?used)\)",
+                              re.MULTILINE)
+
+
+def get_model_type(model_number: int) -> str:
+    if model_number == 1:
+        model_type = "local-greedy-border"
+    elif model_number == 2:
+        model_type = "local-continent"
+    elif model_number == 3:
+        model_type = "local-random"
+    else:
+        raise ValueError("Invalid model number. Please choose a number " +
+                         "between 1 and 3.")
+    return model_type
+
+
+def build_messages(message_content: str,
+                   system_prompt: Optional[str] = None,
+                   prompt_prefix: Optional[str] = None,
+                   history: Optional[List[Dict[str, str]]] = None) -> list:
+    # The prompt prefix is sent as its own content part, so the server
+    # knows which part of the user message is static
+    messages = [{"role": "user", "content": message_content}]
+    if prompt_prefix is not None:
+        messages[0]["content"] = [{"type": "text", "text": prompt_prefix},
+                                  {"type": "text", "text": message_content}]
+    messages = list(history or []) + messages
+    if system_prompt is not None:
+        messages.insert(0, {"role": "system", "content": system_prompt})
+    return messages
+
+
+def read_messages(messages: List[Dict[str, Any]]
+    ) -> Tuple[str, str, str, str]:
+    """System prompt, earlier messages of the session, prompt prefix and
+    last user message of a chat completions request."""
+    system_prompt = ""
+    history: List[Dict[str, str]] = []
+    prompt_prefix = ""
+    message_content = ""
+    for message in messages:
+        content = message.get("content", "")
+        if message.get("role") == "system":
+            system_prompt += content
+            continue
+        if message_content:
+            history.append({"role": "user", "content": prompt_prefix +
+                            message_content})
+            prompt_prefix = message_content = ""
+        if message.get("role") == "user":
+            if isinstance(content, list):
+                parts = [part.get("text", "") for part in content]
+                if len(parts) > 1:
+                    prompt_prefix += parts[0]
+                    parts = parts[1:]
+                content = "".join(parts)
+            message_content += content
+        else:
+            if isinstance(content, list):
+                content = "".join(part.get("text", "") for part in content)
+            history.append({"role": "assistant", "content": content})
+    return system_prompt, history_text(history), prompt_prefix, message_content
+
+
+def request_schema(request: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Schema of the structured output of a chat completions request
+    (response_format) or of an Anthropic messages request (its tool)."""
+    format_request = request.get("response_format") or {}
+    if format_request.get("type") == "json_schema":
+        return format_request["json_schema"]["schema"]
+    for tool in request.get("tools") or []:
+        return tool["input_schema"]
+    return None
+
+
+def chat_completion(request_id: str, model_type: str, content: str,
+                    prompt_tokens: int, cached_tokens: int) -> Dict[str, Any]:
+    """Body of an OpenAI chat completion response."""
+    completion_tokens = estimate_tokens(content)
+    return {
+        "id": request_id,
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model_type,
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": content},
+            "finish_reason": "stop"
+        }],
+        "usage": {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+            "prompt_tokens_details": {"cached_tokens": cached_tokens}
+        }
+    }
+
+
+def record_local_prompt_cache(client: LLMClient, message_content: str,
+                              system_prompt: Optional[str],
+                              prompt_prefix: Optional[str],
+                              history: Optional[List[Dict[str, str]]] = None
+                              ) -> None:
+    static_prompt = ((system_prompt or "") + history_text(history) +
+                     (prompt_prefix or ""))
+    cached_tokens, cache_write_tokens = client.model.prompt_cache(static_prompt)
+    client.record_prompt_cache(
+        estimate_tokens(static_prompt + message_content),
+        cached_tokens, cache_write_tokens)
+
+
+class LocalModelError(Exception):
+    """Injected failure, with the HTTP status code it is served as."""
+    def __init__(self, status_code: int, message: str) -> None:
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class LocalModel:
+    """
+    Answers the game prompts with the moves of a bot policy.
+
+    Parameters:
+    - profile: Name of a profile in LATENCY_PROFILES or a dict with the
+    same keys.
+    - seed: Seed of the latency, failures and bot decisions.
+    - enforce_schema: Never give a malformed JSON answer, like a provider
+    that enforces the response schema.
+    """
+    def __init__(self, profile: Any = "instant",
+                 seed: Optional[int] = None,
+                 enforce_schema: bool = False) -> None:
+        if isinstance(profile, str):
+            if profile not in LATENCY_PROFILES:
+                raise ValueError(f"Unknown latency profile: {profile}")
+            profile = LATENCY_PROFILES[profile]
+        self.profile: Dict[str, float] = dict(profile)
+        self.enforce_schema = enforce_schema
+        self.rng = np.random.default_rng(seed)
+        self.rules = Rules(GameConfig())
+        self.bots: Dict[Tuple[str, str], ScriptedAgent] = {}
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.injected_errors = 0
+        # Static prompts seen before, to answer like a provider prompt cache
+        self.cached_prompts: set = set()
+
+    def latency(self) -> float:
+        median_latency = self.profile["median_latency"]
+        if median_latency <= 0:
+            return 0.0
+        with self.lock:
+            return float(median_latency * np.exp(
+                self.rng.normal(0, self.profile["latency_sigma"])))
+
+    def prompt_cache(self, static_prompt: str) -> Tuple[int, int]:
+        """Cached and written tokens of the static part of a prompt."""
+        static_tokens = estimate_tokens(static_prompt)
+        with self.lock:
+            if static_prompt in self.cached_prompts:
+                return static_tokens, 0
+            self.cached_prompts.add(static_prompt)
+        return 0, static_tokens
+
+    def bot(self, model_type: str, player_name: str) -> ScriptedAgent:
+        if model_type not in LOCAL_MODELS:
+            raise LocalModelError(404, f"Unknown local model: {model_type}")
+        key = (model_type, player_name)
+        if key not in self.bots:
+            self.bots[key] = BOTS[LOCAL_MODELS[model_type]](
+                player_name, rng=self.rng.spawn(1)[0])
+        return self.bots[key]
+
+    def complete(self, model_type: str, message_content: str,
+                 context: str = "",
+                 response_schema: Optional[Dict[str, Any]] = None) -> str:
+        """Answer a prompt, or raise LocalModelError for an injected
+        failure. The context is the text of the earlier messages of a
+        session, the board is rebuilt from it and the changes sent since.
+        With a response_schema the answer is a JSON object of the schema."""
+        with self.lock:
+            self.requests += 1
+            draw = self.rng.random()
+            error_rate = self.profile["error_rate"]
+            rate_limit_rate = self.profile["rate_limit_rate"]
+            if draw < error_rate:
+                self.injected_errors += 1
+                raise LocalModelError(500, "Injected server error")
+            if draw < error_rate + rate_limit_rate:
+                self.injected_errors += 1
+                raise LocalModelError(429, "Injected rate limit error")
+            malformed_rate = self.profile["malformed_rate"]
+            invalid_move_rate = self.profile.get("invalid_move_rate", 0.0)
+            if draw < error_rate + rate_limit_rate + malformed_rate:
+                if response_schema is None:
+                    return MALFORMED_ANSWER
+                if not self.enforce_schema:
+                    return MALFORMED_JSON_ANSWER
+            invalid_move = (error_rate + rate_limit_rate + malformed_rate <=
+                            draw < error_rate + rate_limit_rate +
+                            malformed_rate + invalid_move_rate)
+            answer = self.answer(model_type, message_content, context,
+                                 invalid_move)
+            if response_schema is not None:
+                return self.json_answer(answer, response_schema)
+            return answer
+
+    def read_game_state(self, message_content: str, context: str = ""
+        ) -> Tuple[Optional[str], Optional[GameState]]:
+        player_name_match = PLAYER_NAME.search(message_content)
+        board = BOARD_LINE.findall(context + message_content)
+        # Later boards of a session only hold the rows that changed
+        for compact_board in COMPACT_BOARD.finditer(context + message_content):
+            for row in compact_board.group(1).splitlines():
+                owner, territories = row.split(": ", 1)
+                for territory in territories.split(", "):
+                    territory, troops = territory.rsplit(" ", 1)
+                    board.append((territory, owner, troops))
+        if player_name_match is None or not board:
+            return None, None
+        player_name = player_name_match.group(1)
+        player_names = list(dict.fromkeys(
+            [player_name] + [owner for _, owner, _ in board]))
+        game_state = GameState(
+            [PlayerAgent(name, None) for name in player_names], self.rules)
+        for territory, owner, troops in board:
+            game_state.update_troops(owner, territory, int(troops),
+                                    set_troops=True)
+        return player_name, game_state
+
+    def answer(self, model_type: str, message_content: str,
+               context: str = "", invalid_move: bool = False) -> str:
+        if "need to trade cards" in message_content or \
+                "whether to trade in a set" in message_content:
+            return self.answer_card_trade(model_type, message_content)
+
+        player_name, game_state = self.read_game_state(message_content, context)
+        if game_state is None or "Phase: strategy" in message_content:
+            # The bots do not need a strategy, any text will do
+            return "- **Attack Strategy:** Take the weakest neighbours.\n" + \
+                "- **Defense Strategy:** Reinforce the borders."
+        bot = self.bot(model_type, player_name)
+        # A territory of an opponent to move from or place on, the game
+        # rejects the move
+        enemy_territory = None
+        if invalid_move:
+            enemy_territories = [
+                territory for territory, control
+                in game_state.board_snapshot().items()
+                if control is not None and control[0] != player_name]
+            if enemy_territories:
+                enemy_territory = str(self.rng.choice(enemy_territories))
+
+        if ("initial troop placement phase" in message_content or
+                "Phase: initial troop placement" in message_content):
+            return self.format_placement(self.misplace(
+                bot.choose_troop_placement(game_state, 1), enemy_territory))
+        if ("troop placement phase" in message_content or
+                "Phase: troop placement" in message_content):
+            troops_match = TROOPS_TO_PLACE.search(message_content)
+            num_troops = int(troops_match.group(1)) if troops_match else 1
+            return self.format_placement(self.misplace(
+                bot.choose_troop_placement(game_state, num_troops),
+                enemy_territory))
+        if ("we are in the attack phase" in message_content or
+                "Phase: attack" in message_content):
+            return self.format_move("Attack Opponent Territory", self.misplace(
+                bot.choose_attack(game_state), enemy_territory))
+        if ("troop fortify phase" in message_content or
+                "Phase: fortify" in message_content):
+            return self.format_move("To Territory", self.misplace(
+                bot.choose_fortify(game_state), enemy_territory))
+        return "I am not sure what to do."
+
+    def misplace(self, move: Any, enemy_territory: Optional[str]) -> Any:
+        """A placement on, or an attack or fortify move from, the enemy
+        territory instead of the territory the bot chose."""
+        if enemy_territory is None or not move:
+            return move
+        if isinstance(move, list):
+            return [{**move[0], 'territory_name': enemy_territory}] + move[1:]
+        _, to_territory, num_troops = move
+        return enemy_territory, to_territory, num_troops
+
+    def answer_card_trade(self, model_type: str, message_content: str) -> str:
+        valid_combinations: Dict[int, List[Tuple[List[int], bool]]] = {}
+        for value, cards, wildcard_text in CARD_COMBINATION.findall(message_content):
+            valid_combinations.setdefault(int(value), []).append(
+                ([int(card) for card in cards.split(",")],
+                 wildcard_text == "Wildcard used"))
+        if not valid_combinations:
+            return "List of cards to trade ||| 0 |||"
+        bot = self.bot(model_type, "Card Trader")
+        cards = bot.choose_cards(valid_combinations)
+        return f"List of cards to trade ||| {', '.join(map(str, cards))} |||"
+
+    def json_answer(self, answer: str, response_schema: Dict[str, Any]) -> str:
+        """An answer of the text format in the JSON format of the schema."""
+        parser = PlayerAgent("Local", None)
+        if response_schema["title"] == "card_trade":
+            return format_card_trade_json(*parser.parse_card_trade_response(answer))
+        moves, reasoning, from_territory = parser.parse_response_text(answer)
+        return format_move_json(response_schema["title"], moves, reasoning,
+                                from_territory)
+
+    def format_placement(self, moves: List[Dict[str, int]]) -> str:
+        response = ""
+        for i, move in enumerate(moves, start=1):
+            response += (f"Move {i}: |||{move['territory_name']}, " +
+                         f"{move['num_troops']}|||\n")
+        return response + "Reasoning:+++Local model placement+++"
+
+    def format_move(self, label: str, move: Optional[Tuple[str, str, int]]
+        ) -> str:
+        if move is None:
+            return (f"{label}:|||Blank, 0|||\nFrom Territory:###Blank###\n" +
+                    "Reasoning:+++Local model is done+++")
+        from_territory, to_territory, num_troops = move
+        return (f"{label}:|||{to_territory}, {num_troops}|||\n" +
+                f"From Territory:###{from_territory}###\n" +
+                "Reasoning:+++Local model move+++")
+
+
+class LocalClient(LLMClient):
+    """
+    Client of the local model, in-process or over HTTP when base_url
+    points to a server started with start_local_server.
+    """
+    def __init__(self, model_number: int, profile: Any = "instant",
+                 base_url: Optional[str] = None, seed: Optional[int] = None,
+                 enforce_schema: bool = False):
+        self.model = LocalModel(profile, seed, enforce_schema)
+        self.client = OpenAI(base_url=base_url, api_key="local",
+                             max_retries=0) if base_url else None
+        model_type = get_model_type(model_number)
+        super().__init__(provider_name="Local", model_type=model_type,
+                         retry_delay=1, temperature=0)
+
+    def get_chat_completion(self, message_content: str,
+                            system_prompt: Optional[str] = None,
+                            prompt_prefix: Optional[str] = None,
+                            history: Optional[List[Dict[str, str]]] = None,
+                            response_schema: Optional[Dict[str, Any]] = None
+                            ) -> str:
+        for attempt in range(self.max_retries):
+            try:
+                self.wait_for_rate_limit(message_content, 0)
+                if self.client is not None:
+                    response = self.client.chat.completions.create(
+                        model=self.model_type,
+                        messages=build_messages(message_content, system_prompt,
+                                                prompt_prefix, history),
+                        temperature=self.temperature,
+                        **response_format(response_schema))
+                    self.record_prompt_cache(response.usage.prompt_tokens,
+                                             cached_prompt_tokens(response.usage))
+                    return response.choices[0].message.content
+                time.sleep(self.model.latency())
+                response = self.model.complete(
+                    self.model_type, join_prompt(message_content, prompt_prefix),
+                    history_text(history), response_schema)
+                record_local_prompt_cache(self, message_content, system_prompt,
+                                          prompt_prefix, history)
+                return response
+            except (LocalModelError, APIError) as e:
+                if getattr(e, 'status_code', None) == 429:
+                    delay = self.rate_limit_backoff(attempt)
+                else:
+                    delay = self.retry_backoff(attempt)
+                print(f"Attempt {attempt + 1} failed with error: {e}. " +
+                      f"Retrying in {delay:.1f} seconds...")
+                time.sleep(delay)
+
+        raise LocalModelError(503, "Maximum retries reached. Service is " +
+                              "still unavailable.")
+
+
+class AsyncLocalClient(AsyncLLMClient):
+    def __init__(self, model_number: int, profile: Any = "instant",
+                 base_url: Optional[str] = None, seed: Optional[int] = None,
+                 enforce_schema: bool = False):
+        self.model = LocalModel(profile, seed, enforce_schema)
+        self.client = AsyncOpenAI(base_url=base_url, api_key="local",
+                                  max_retries=0) if base_url else None
+        model_type = get_model_type(model_number)
+        super().__init__(provider_name="Local", model_type=model_type,
+                         retry_delay=1, temperature=0)
+
+    async def get_chat_completion(self, message_content: str,
+                                  system_prompt: Optional[str] = None,
+                                  prompt_prefix: Optional[str] = None,
+                                  history: Optional[List[Dict[str, str]]] = None,
+                                  response_schema: Optional[Dict[str, Any]] = None
+                                  ) -> str:
+        for attempt in range(self.max_retries):
+            try:
+                await self.wait_for_rate_limit_async(message_content, 0)
+                async with self.concurrency_limit():
+                    if self.client is not None:
+                        response = await self.client.chat.completions.create(
+                            model=self.model_type,
+                            messages=build_messages(message_content, 
+                                                    system_prompt, prompt_prefix,
+                                                    history),
+                            temperature=self.temperature,
+                            **response_format(response_schema))
+                        self.record_prompt_cache(
+                            response.usage.prompt_tokens,
+                            cached_prompt_tokens(response.usage))
+                        return response.choices[0].message.content
+                    await asyncio.sleep(self.model.latency())
+                    response = self.model.complete(
+                        self.model_type, join_prompt(message_content, prompt_prefix),
+                        history_text(history), response_schema)
+                    record_local_prompt_cache(self, message_content, 
+                                              system_prompt, prompt_prefix,
+                                              history)
+                    return response
+            except (LocalModelError, APIError) as e:
+                if getattr(e, 'status_code', None) == 429:
+                    delay = self.rate_limit_backoff(attempt)
+                else:
+                    delay = self.retry_backoff(attempt)
+                print(f"Attempt {attempt + 1} failed with error: {e}. " +
+                      f"Retrying in {delay:.1f} seconds...")
+                await asyncio.sleep(delay)
+
+        raise LocalModelError(503, "Maximum retries reached. Service is " +
+                              "still unavailable.")
+
+
+class LocalModelHandler(BaseHTTPRequestHandler):
+    """OpenAI compatible chat completions endpoint of the local model."""
+    server: "LocalModelServer"
+
+    def do_POST(self) -> None:
+        if self.path.rstrip("/") not in ("/v1/chat/completions",
+                                         "/chat/completions"):
+            self.send_json(404, {"error": {"message": "Not found",
+                                           "type": "not_found"}})
+            return
+        request = json.loads(self.rfile.read(
+            int(self.headers.get("Content-Length", 0))))
+        system_prompt, context, prompt_prefix, message_content = read_messages(
+            request.get("messages", []))
+        model_type = request.get("model", "local-greedy-border")
+
+        time.sleep(self.server.model.latency())
+        try:
+            content = self.server.model.complete(
+                model_type, prompt_prefix + message_content, context,
+                request_schema(request))
+        except LocalModelError as e:
+            self.send_json(e.status_code, {"error": {
+                "message": str(e), "type": "local_model_error"}})
+            return
+
+        static_prompt = system_prompt + context + prompt_prefix
+        cached_tokens, _ = self.server.model.prompt_cache(static_prompt)
+        self.send_json(200, chat_completion(
+            f"local-{self.server.model.requests}", model_type, content,
+            estimate_tokens(static_prompt + message_content), cached_tokens))
+
+    def send_json(self, status_code: int, body: Dict[str, Any]) -> None:
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status_code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format: str, *args: Any) -> None:
+        # Keep the game output readable
+        pass
+
+
+class LocalModelServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, host: str, port: int, model: LocalModel) -> None:
+        super().__init__((host, port), LocalModelHandler)
+        self.model = model
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+
+def start_local_server(host: str = "127.0.0.1", port: int = 0,
+                       profile: Any = "instant",
+                       seed: Optional[int] = None,
+                       enforce_schema: bool = False) -> LocalModelServer:
+    """Serve a local model in a background thread. Port 0 picks a free
+    port, the base URL for the clients is in server.url. Stop it with
+    server.shutdown()."""
+    server = LocalModelServer(host, port,
+                              LocalModel(profile, seed, enforce_schema))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve the local model")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--profile", default="fast",
+                        choices=list(LATENCY_PROFILES))
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--enforce-schema", action="store_true",
+                        help="Never give a malformed JSON answer")
+    args = parser.parse_args()
+
+    server = LocalModelServer(args.host, args.port,
+                              LocalModel(args.profile, args.seed,
+                                         args.enforce_schema))
+    print(f"Serving the local model on {server.url}")
+    server.serve_forever()
@@ -1,53 +1,167 @@
 import os
-from openai import OpenAI, InternalServerError
-from risk_game.llm_clients.llm_base import LLMClient
+import asyncio
+from openai import OpenAI, AsyncOpenAI, InternalServerError, RateLimitError
+from risk_game.llm_clients.llm_base import LLMClient, AsyncLLMClient, \
+ProviderUnavailableError, get_retry_after_header, history_text, join_prompt
 import time
+from typing import Any, Dict, List, Optional
 
-class OpenAIClient(LLMClient):
-    def __init__(self, model_number: int):
-        # os.environ.get("OPENAI_API_KEY")
-        self.client = OpenAI()
-        
-        if model_number == 1:
-            model_type = "gpt-4o"
-        elif model_number == 2:
-            model_type = "gpt-4o-mini"
-        elif model_number == 3:
-            model_type = "gpt-3.5-turbo-0125"
-        
-        else:
-            raise ValueError("Invalid model number. Please choose a number " +
-                             "between 1 and 2.")
-        # Call the parent class constructor to set provider and model_type
-        super().__init__(provider_name="OpenAI", model_type=model_type)
+SYSTEM_PROMPT = ("You are a master strategist and Risk player " +
+                 "with 20 years experience.")
+
+
+def get_model_type(model_number: int) -> str:
+    if model_number == 1:
+        model_type = "gpt-4o"
+    elif model_number == 2:
+        model_type = "gpt-4o-mini"
+    elif model_number == 3:
+        model_type = "gpt-3.5-turbo-0125"
     
-    def get_chat_completion(self, message_content) -> str:
-        messages = [
+    else:
+        raise ValueError("Invalid model number. Please choose a number " +
+                         "between 1 and 3.")
+    return model_type
+
+
+def build_messages(message_content: str,
+                   system_prompt: Optional[str] = None,
+                   prompt_prefix: Optional[str] = None,
+                   history: Optional[List[Dict[str, str]]] = None) -> list:
+    # OpenAI caches the longest prompt prefix it has seen (of at least 1024
+    # tokens) by itself, the static parts only have to come first. The
+    # history of a session is the same from one call to the next, so it is
+    # cached as well
+    return [
         {"role": "system", 
-         "content": "You are a master strategist and Risk player with 20 years experience."},
+         "content": system_prompt or SYSTEM_PROMPT},
+        *(history or []),
         {
             "role": "user",
-            "content": message_content
+            "content": join_prompt(message_content, prompt_prefix)
         }
     ]
 
+
+def response_format(response_schema: Optional[Dict[str, Any]]
+    ) -> Dict[str, Any]:
+    """Structured outputs arguments of a request, the schema is enforced
+    in strict mode."""
+    if response_schema is None:
+        return {}
+    return {"response_format": {"type": "json_schema", "json_schema": {
+        "name": response_schema["title"], "schema": response_schema,
+        "strict": True}}}
+
+
+def cached_prompt_tokens(usage: object) -> int:
+    details = getattr(usage, 'prompt_tokens_details', None)
+    return getattr(details, 'cached_tokens', None) or 0
+
+
+class OpenAIClient(LLMClient):
+    def __init__(self, model_number: int):
+        # os.environ.get("OPENAI_API_KEY")
+        self.client = OpenAI()
+        model_type = get_model_type(model_number)
+        # Call the parent class constructor to set provider and model_type
+        super().__init__(provider_name="OpenAI", model_type=model_type,
+                         temperature=0)
+    
+    def get_chat_completion(self, message_content: str,
+                            system_prompt: Optional[str] = None,
+                            prompt_prefix: Optional[str] = None,
+                            history: Optional[List[Dict[str, str]]] = None,
+                            response_schema: Optional[Dict[str, Any]] = None
+                            ) -> str:
+        messages = build_messages(message_content, system_prompt, prompt_prefix,
+                                  history)
+
         for attempt in range(self.max_retries):
             try:
+                estimated_tokens = self.wait_for_rate_limit(
+                    (system_prompt or "") + history_text(history) +
+                    join_prompt(message_content, prompt_prefix), 
+                    1000)
                 response = self.client.chat.completions.create(
                     model=self.model_type,
                     messages=messages,
                     max_tokens=1000,
-                    temperature=0,
+                    temperature=self.temperature,
+                    **response_format(response_schema)
                 )
+                if response.usage:
+                    self.record_usage(estimated_tokens, response.usage.total_tokens)
+                    self.record_prompt_cache(response.usage.prompt_tokens,
+                                             cached_prompt_tokens(response.usage))
                 return response.choices[0].message.content
+            except RateLimitError as e:
+                delay = self.rate_limit_backoff(attempt, get_retry_after_header(e))
+                print(f"Rate limit reached, retrying in {delay:.1f} seconds...")
+                time.sleep(delay)
             except InternalServerError as e:
+                delay = self.retry_backoff(attempt)
                 print(f"Attempt {attempt + 1} failed with API error: {e}." +
-                      f"Retrying in {self.retry_delay} seconds...")
-                time.sleep(self.retry_delay)
+                      f"Retrying in {delay:.1f} seconds...")
+                time.sleep(delay)
             except Exception as e:
                 print(f"Unexpected error: {e}")
                 break
 
-        raise InternalServerError("Maximum retries reached. Service is still unavailable.")
+        raise ProviderUnavailableError(
+            "Maximum retries reached. Service is still unavailable.")
+
+
+
+
+
+class AsyncOpenAIClient(AsyncLLMClient):
+    def __init__(self, model_number: int):
+        self.client = AsyncOpenAI()
+        model_type = get_model_type(model_number)
+        super().__init__(provider_name="OpenAI", model_type=model_type,
+                         temperature=0)
+
+    async def get_chat_completion(self, message_content: str,
+                                  system_prompt: Optional[str] = None,
+                                  prompt_prefix: Optional[str] = None,
+                                  history: Optional[List[Dict[str, str]]] = None,
+                                  response_schema: Optional[Dict[str, Any]] = None
+                                  ) -> str:
+        messages = build_messages(message_content, system_prompt, prompt_prefix,
+                                  history)
 
+        for attempt in range(self.max_retries):
+            try:
+                estimated_tokens = await self.wait_for_rate_limit_async(
+                    (system_prompt or "") + history_text(history) +
+                    join_prompt(message_content, prompt_prefix), 
+                    1000)
+                async with self.concurrency_limit():
+                    response = await self.client.chat.completions.create(
+                        model=self.model_type,
+                        messages=messages,
+                        max_tokens=1000,
+                        temperature=self.temperature,
+                        **response_format(response_schema)
+                    )
+                if response.usage:
+                    self.record_usage(estimated_tokens, response.usage.total_tokens)
+                    self.record_prompt_cache(response.usage.prompt_tokens,
+                                             cached_prompt_tokens(response.usage))
+                return response.choices[0].message.content
+            except RateLimitError as e:
+                delay = self.rate_limit_backoff(attempt, get_retry_after_header(e))
+                print(f"Rate limit reached, retrying in {delay:.1f} seconds...")
+                await asyncio.sleep(delay)
+            except InternalServerError as e:
+                delay = self.retry_backoff(attempt)
+                print(f"Attempt {attempt + 1} failed with API error: {e}." +
+                      f"Retrying in {delay:.1f} seconds...")
+                await asyncio.sleep(delay)
+            except Exception as e:
+                print(f"Unexpected error: {e}")
+                break
 
+        raise ProviderUnavailableError(
+            "Maximum retries reached. Service is still unavailable.")
@@ -0,0 +1,167 @@
+"""
+Token bucket rate limiting shared by every client of the same provider and
+model, so games running side by side (threads, or tasks of one event loop)
+draw from one quota instead of each hitting the limit and backing off.
+
+Every request takes one unit from the request bucket and its estimated
+number of tokens from the token bucket. The buckets refill continuously at
+the per minute rates and may go negative: a request that does not fit
+reserves the capacity anyway and waits until the bucket has refilled past
+it. Later requests see the deeper deficit and wait longer, so requests are
+served in the order they arrive, whichever game they come from.
+"""
+import asyncio
+import random
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+# Requests and tokens per minute for each (provider, model). These are the
+# limits of the lowest paid tiers, pass higher ones to create_llm_client.
+RATE_LIMITS: Dict[Tuple[str, str], Tuple[int, int]] = {
+    ("OpenAI", "gpt-4o"): (500, 30000),
+    ("OpenAI", "gpt-4o-mini"): (500, 200000),
+    ("OpenAI", "gpt-3.5-turbo-0125"): (500, 200000),
+    ("Anthropic", "claude-3-5-sonnet-20240620"): (50, 40000),
+    ("Anthropic", "claude-3-sonnet-20240229"): (50, 40000),
+    ("Anthropic", "claude-3-haiku-20240307"): (50, 50000),
+    ("Groq", "llama-3.1-70b-versatile"): (30, 6000),
+    ("Groq", "llama3-70b-8192"): (30, 6000),
+    ("Groq", "llama-3.1-8b-instant"): (30, 20000),
+    ("Groq", "mixtral-8x7b-32768"): (30, 5000),
+    ("AWS_Bedrock", "meta.llama3-1-405b-instruct-v1:0"): (50, 50000),
+    ("AWS_Bedrock", "meta.llama3-1-70b-instruct-v1:0"): (400, 300000),
+    # The local models are not rate limited, only by the latency profile
+    ("Local", "local-greedy-border"): (1000000, 1000000000),
+    ("Local", "local-continent"): (1000000, 1000000000),
+    ("Local", "local-random"): (1000000, 1000000000),
+}
+DEFAULT_RATE_LIMITS: Tuple[int, int] = (60, 60000)
+# Rough number of characters per token, used to estimate prompt sizes
+CHARS_PER_TOKEN: int = 4
+
+
+def estimate_tokens(message_content: str, completion_tokens: int = 0) -> int:
+    return len(message_content) // CHARS_PER_TOKEN + completion_tokens
+
+
+def backoff_delay(attempt: int, base_delay: float, max_delay: float = 60.0
+    ) -> float:
+    """Exponential backoff with full jitter: a random delay up to
+    base_delay * 2**attempt, so clients that failed together do not retry
+    together."""
+    return random.uniform(0, min(max_delay, base_delay * 2 ** attempt))
+
+
+class TokenBucket:
+    def __init__(self, capacity: float, refill_per_second: float) -> None:
+        self.capacity = capacity
+        self.refill_per_second = refill_per_second
+        self.level = capacity
+        self.updated = time.monotonic()
+
+    def refill(self, now: float) -> None:
+        self.level = min(self.capacity, self.level +
+                         (now - self.updated) * self.refill_per_second)
+        self.updated = now
+
+    def reserve(self, amount: float, now: float) -> float:
+        """Take amount from the bucket and return the number of seconds
+        until the bucket is back at zero."""
+        self.refill(now)
+        self.level -= min(amount, self.capacity)
+        if self.level >= 0:
+            return 0.0
+        return -self.level / self.refill_per_second
+
+
+class RateLimiter:
+    """
+    Requests per minute and tokens per minute limits of one provider model.
+    Use `acquire` from blocking clients and `acquire_async` from async
+    clients, both can share the same limiter.
+    """
+    def __init__(self, requests_per_minute: int, tokens_per_minute: int
+        ) -> None:
+        if requests_per_minute < 1 or tokens_per_minute < 1:
+            raise ValueError("Rate limits must be at least 1 per minute")
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.requests = TokenBucket(requests_per_minute, requests_per_minute / 60)
+        self.tokens = TokenBucket(tokens_per_minute, tokens_per_minute / 60)
+        self.lock = threading.Lock()
+        self.total_requests = 0
+        self.total_wait_time = 0.0
+
+    def __repr__(self) -> str:
+        return (f"<RateLimiter(rpm={self.requests_per_minute}, " +
+                f"tpm={self.tokens_per_minute})>")
+
+    def reserve(self, tokens: int) -> float:
+        # Reservations are made in arrival order under the lock
+        with self.lock:
+            now = time.monotonic()
+            delay = max(self.requests.reserve(1, now),
+                        self.tokens.reserve(tokens, now))
+            self.total_requests += 1
+            self.total_wait_time += delay
+        return delay
+
+    def acquire(self, tokens: int) -> None:
+        """Wait until a request of the given number of tokens fits in the
+        limits."""
+        delay = self.reserve(tokens)
+        if delay > 0:
+            time.sleep(delay)
+
+    async def acquire_async(self, tokens: int) -> None:
+        delay = self.reserve(tokens)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def record_usage(self, estimated_tokens: int, used_tokens: int) -> None:
+        """Correct the token bucket once the real usage of a request is
+        known."""
+        with self.lock:
+            self.tokens.level = min(self.tokens.capacity,
+                self.tokens.level + estimated_tokens - used_tokens)
+
+    def pause(self, delay: float) -> None:
+        """Hold back every request for delay seconds, e.g. when the
+        provider answered with a rate limit error."""
+        with self.lock:
+            now = time.monotonic()
+            self.requests.refill(now)
+            self.requests.level = min(
+                self.requests.level, -delay * self.requests.refill_per_second)
+
+
+_rate_limiters: Dict[Tuple[str, str], RateLimiter] = {}
+_rate_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(provider_name: str, model_type: str,
+                     requests_per_minute: Optional[int] = None,
+                     tokens_per_minute: Optional[int] = None) -> RateLimiter:
+    """
+    Shared rate limiter of a provider model. The first call creates it with
+    the given limits, or the defaults from RATE_LIMITS, later calls return
+    the same limiter unless they pass different limits, which replace it.
+    """
+    with _rate_limiters_lock:
+        rate_limiter = _rate_limiters.get((provider_name, model_type))
+        if rate_limiter is None:
+            default_rpm, default_tpm = RATE_LIMITS.get(
+                (provider_name, model_type), DEFAULT_RATE_LIMITS)
+        else:
+            default_rpm = rate_limiter.requests_per_minute
+            default_tpm = rate_limiter.tokens_per_minute
+        requests_per_minute = requests_per_minute or default_rpm
+        tokens_per_minute = tokens_per_minute or default_tpm
+
+        if (rate_limiter is None or
+                rate_limiter.requests_per_minute != requests_per_minute or
+                rate_limiter.tokens_per_minute != tokens_per_minute):
+            rate_limiter = RateLimiter(requests_per_minute, tokens_per_minute)
+            _rate_limiters[(provider_name, model_type)] = rate_limiter
+    return rate_limiter
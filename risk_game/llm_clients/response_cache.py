@@ -0,0 +1,283 @@
+"""
+Persistent cache of LLM responses in a local SQLite file.
+
+Responses are keyed by provider, model, temperature and the SHA-256 hash of
+the prompt. A game can send the same prompt more than once (e.g. after an
+invalid move with the same error) and with a non-zero temperature the
+answers differ, so each key also stores one response per occurrence: the
+n-th time a client sends a prompt it gets the n-th recorded response, and
+a replayed game sees exactly the responses of the recorded one.
+
+Modes:
+- "record": always ask the provider and store the response.
+- "replay": only answer from the cache, a missing response raises
+  CacheMissError, so no request leaves the process.
+- "auto": answer from the cache when possible and record the rest.
+- "bypass": ignore the cache. The client factories of llm_client.py do
+  not wrap the client at all.
+
+The default cache file is in the user's cache folder, so that games 
+started from different working directories share it and no file is left
+in the working directory.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+from risk_game.llm_clients.llm_base import LLMClient, AsyncLLMClient, \
+history_text, join_prompt
+
+CACHE_MODES = ("record", "replay", "auto", "bypass")
+DEFAULT_CACHE_PATH: str = os.path.join(
+    os.environ.get("XDG_CACHE_HOME") or os.path.join(
+        os.path.expanduser("~"), ".cache"), "risk_game", "llm_cache.sqlite")
+
+
+class CacheMissError(KeyError):
+    """Raised in replay mode when a response was never recorded."""
+
+
+def prompt_hash(message_content: str) -> str:
+    return hashlib.sha256(message_content.encode("utf-8")).hexdigest()
+
+
+def cache_content(message_content: str, system_prompt: Optional[str],
+                  response_schema: Optional[Dict[str, Any]] = None) -> str:
+    # A custom system prompt and the schema of the answer are part of the
+    # cached prompt
+    if response_schema is not None:
+        message_content += "\n\n" + json.dumps(response_schema, sort_keys=True)
+    if system_prompt is None:
+        return message_content
+    return system_prompt + "\n\n" + message_content
+
+
+class ResponseCache:
+    """
+    SQLite store of responses. Safe to share between threads, and between
+    processes through SQLite's file locking.
+
+    Parameters:
+    - path: File of the cache database.
+    - max_size_bytes: When the stored responses grow larger than this, the
+    least recently used ones are evicted. No limit if None.
+    """
+    def __init__(self, path: str = DEFAULT_CACHE_PATH,
+                 max_size_bytes: Optional[int] = None) -> None:
+        self.path = path
+        self.max_size_bytes = max_size_bytes
+        self.lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.connection = sqlite3.connect(path, timeout=30,
+                                          check_same_thread=False)
+        with self.lock, self.connection:
+            self.connection.execute("""
+                CREATE TABLE IF NOT EXISTS responses (
+                    cache_key TEXT NOT NULL,
+                    occurrence INTEGER NOT NULL,
+                    provider TEXT NOT NULL,
+                    model TEXT NOT NULL,
+                    temperature REAL NOT NULL,
+                    prompt_hash TEXT NOT NULL,
+                    response TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    created REAL NOT NULL,
+                    last_used REAL NOT NULL,
+                    PRIMARY KEY (cache_key, occurrence)
+                )""")
+            self.connection.execute(
+                "CREATE INDEX IF NOT EXISTS responses_last_used "
+                "ON responses (last_used)")
+
+    def __repr__(self) -> str:
+        return f"<ResponseCache(path='{self.path}', responses={len(self)})>"
+
+    def __len__(self) -> int:
+        with self.lock:
+            return self.connection.execute(
+                "SELECT COUNT(*) FROM responses").fetchone()[0]
+
+    @staticmethod
+    def make_key(provider_name: str, model_type: str, temperature: float,
+                 message_content: str) -> str:
+        return hashlib.sha256(
+            (f"{provider_name}|{model_type}|{float(temperature)}|" +
+             prompt_hash(message_content)).encode("utf-8")).hexdigest()
+
+    def get(self, cache_key: str, occurrence: int) -> Optional[str]:
+        with self.lock, self.connection:
+            row = self.connection.execute(
+                "SELECT response FROM responses "
+                "WHERE cache_key = ? AND occurrence = ?",
+                (cache_key, occurrence)).fetchone()
+            if row is None:
+                return None
+            self.connection.execute(
+                "UPDATE responses SET last_used = ? "
+                "WHERE cache_key = ? AND occurrence = ?",
+                (time.time(), cache_key, occurrence))
+        return row[0]
+
+    def put(self, cache_key: str, occurrence: int, client: LLMClient,
+            message_content: str, response: str) -> None:
+        now = time.time()
+        with self.lock, self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO responses VALUES "
+                "(?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (cache_key, occurrence, client.provider_name,
+                 client.model_type, float(client.temperature),
+                 prompt_hash(message_content), response,
+                 len(response.encode("utf-8")), now, now))
+            if self.max_size_bytes is not None:
+                self._evict()
+
+    def _evict(self) -> None:
+        total_size = self.connection.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total_size <= self.max_size_bytes:
+            return
+        # Drop the least recently used responses until the cache fits
+        excess = total_size - self.max_size_bytes
+        evicted = []
+        for cache_key, occurrence, size in self.connection.execute(
+                "SELECT cache_key, occurrence, size FROM responses "
+                "ORDER BY last_used"):
+            evicted.append((cache_key, occurrence))
+            excess -= size
+            if excess <= 0:
+                break
+        self.connection.executemany(
+            "DELETE FROM responses WHERE cache_key = ? AND occurrence = ?",
+            evicted)
+
+    def size_bytes(self) -> int:
+        with self.lock:
+            return self.connection.execute(
+                "SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    def clear(self) -> None:
+        with self.lock, self.connection:
+            self.connection.execute("DELETE FROM responses")
+
+    def close(self) -> None:
+        self.connection.close()
+
+
+_response_caches: Dict[Tuple[str, Optional[int]], ResponseCache] = {}
+
+
+def get_response_cache(path: str = DEFAULT_CACHE_PATH,
+                       max_size_bytes: Optional[int] = None) -> ResponseCache:
+    """Cache of a file, opened once per process."""
+    if (path, max_size_bytes) not in _response_caches:
+        _response_caches[(path, max_size_bytes)] = ResponseCache(
+            path, max_size_bytes)
+    return _response_caches[(path, max_size_bytes)]
+
+
+class CachedLLMClient(LLMClient):
+    """Wraps a client and answers from the response cache, see the module
+    docstring for the modes."""
+    def __init__(self, llm_client: LLMClient, cache: ResponseCache,
+                 mode: str = "auto") -> None:
+        if mode not in CACHE_MODES:
+            raise ValueError(f"Unknown cache mode: {mode}. " +
+                             f"Please choose one of {CACHE_MODES}.")
+        super().__init__(provider_name=llm_client.provider_name,
+                         model_type=llm_client.model_type,
+                         temperature=llm_client.temperature)
+        self.llm_client = llm_client
+        # Responses from the cache never reach the provider's prompt cache
+        self.prompt_cache_stats = llm_client.prompt_cache_stats
+        self.cache = cache
+        self.mode = mode
+        self.occurrences: Dict[str, int] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def __repr__(self) -> str:
+        return (f"<CachedLLMClient(provider='{self.provider_name}', " +
+                f"model='{self.model_type}', mode='{self.mode}')>")
+
+    def next_occurrence(self, message_content: str) -> Tuple[str, int]:
+        cache_key = ResponseCache.make_key(
+            self.provider_name, self.model_type, self.temperature,
+            message_content)
+        occurrence = self.occurrences.get(cache_key, 0)
+        self.occurrences[cache_key] = occurrence + 1
+        return cache_key, occurrence
+
+    def lookup(self, message_content: str
+        ) -> Tuple[Optional[str], str, int]:
+        """Cached response of the next occurrence of the prompt, None when
+        the provider has to be asked."""
+        cache_key, occurrence = self.next_occurrence(message_content)
+        if self.mode in ("replay", "auto"):
+            response = self.cache.get(cache_key, occurrence)
+            if response is not None:
+                self.hits += 1
+                return response, cache_key, occurrence
+            if self.mode == "replay":
+                raise CacheMissError(
+                    f"No recorded response for {self.provider_name} " +
+                    f"{self.model_type} (prompt {prompt_hash(message_content)[:12]}, " +
+                    f"occurrence {occurrence})")
+        self.misses += 1
+        return None, cache_key, occurrence
+
+    def get_chat_completion(self, message_content: str,
+                            system_prompt: Optional[str] = None,
+                            prompt_prefix: Optional[str] = None,
+                            history: Optional[List[Dict[str, str]]] = None,
+                            response_schema: Optional[Dict[str, Any]] = None
+                            ) -> str:
+        if self.mode == "bypass":
+            return self.llm_client.get_chat_completion(
+                message_content, system_prompt, prompt_prefix, history,
+                response_schema)
+        cached_content = cache_content(
+            history_text(history) + join_prompt(message_content, prompt_prefix),
+            system_prompt, response_schema)
+        response, cache_key, occurrence = self.lookup(cached_content)
+        if response is None:
+            response = self.llm_client.get_chat_completion(
+                message_content, system_prompt, prompt_prefix, history,
+                response_schema)
+            self.cache.put(cache_key, occurrence, self, cached_content, response)
+        return response
+
+
+class AsyncCachedLLMClient(AsyncLLMClient, CachedLLMClient):
+    """Async version of CachedLLMClient."""
+    def __init__(self, llm_client: AsyncLLMClient, cache: ResponseCache,
+                 mode: str = "auto") -> None:
+        CachedLLMClient.__init__(self, llm_client, cache, mode)
+
+    def __repr__(self) -> str:
+        return (f"<AsyncCachedLLMClient(provider='{self.provider_name}', " +
+                f"model='{self.model_type}', mode='{self.mode}')>")
+
+    async def get_chat_completion(self, message_content: str,
+                                  system_prompt: Optional[str] = None,
+                                  prompt_prefix: Optional[str] = None,
+                                  history: Optional[List[Dict[str, str]]] = None,
+                                  response_schema: Optional[Dict[str, Any]] = None
+                                  ) -> str:
+        if self.mode == "bypass":
+            return await self.llm_client.get_chat_completion(
+                message_content, system_prompt, prompt_prefix, history,
+                response_schema)
+        cached_content = cache_content(
+            history_text(history) + join_prompt(message_content, prompt_prefix),
+            system_prompt, response_schema)
+        response, cache_key, occurrence = self.lookup(cached_content)
+        if response is None:
+            response = await self.llm_client.get_chat_completion(
+                message_content, system_prompt, prompt_prefix, history,
+                response_schema)
+            self.cache.put(cache_key, occurrence, self, cached_content, response)
+        return response
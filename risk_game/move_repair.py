@@ -0,0 +1,175 @@
+"""
+Local repair of near-valid moves.
+
+Many invalid moves of the LLM players are only slightly wrong, and each one
+costs another round trip to the provider. GameMaster runs the moves through
+MoveRepair between parsing and validation, which fixes:
+- territory names that are misspelt or differently capitalised, when they
+  are close to exactly one territory of the map,
+- a troop placement whose total is a little off, by rescaling the troops
+  of every move in proportion,
+- an initial placement of more than one troop, placed as one troop,
+- an attack or fortify move with every troop of the territory, one troop
+  has to stay behind, clamped to the troops of the territory minus one.
+
+Everything else, e.g. a territory the player does not control or two
+territories that are not connected, is left to the validation, and the
+player is asked again as before.
+
+Modes (GameConfig.move_repair):
+- "off": moves are validated as the player sent them.
+- "silent": moves are repaired without a trace.
+- "log": every repair is printed and counted in player.move_repairs, so
+  the mistakes of the models are still measured.
+"""
+import difflib
+from typing import Dict, List, Optional, Tuple
+from risk_game.game_constants import TERRITORIES
+
+MOVE_REPAIR_MODES = ("off", "silent", "log")
+BLANK = "Blank"
+# Similarity (difflib ratio) a misspelt name needs to its territory
+NAME_CUTOFF: float = 0.8
+# A placement total is rescaled when it is off by at most this share of
+# the troops to place (and at least by one troop)
+MAX_TROOP_ERROR: float = 0.25
+
+_TERRITORY_KEYS: Dict[str, str] = {
+    " ".join(territory.lower().split()): territory for territory in TERRITORIES}
+
+
+def match_territory(name: Optional[str], allow_blank: bool = False
+    ) -> Optional[str]:
+    """
+    The territory a name stands for, None when it is not close to exactly
+    one territory of the map.
+    """
+    if name is None:
+        return None
+    key = " ".join(name.lower().split())
+    if allow_blank and key == BLANK.lower():
+        return BLANK
+    if key in _TERRITORY_KEYS:
+        return _TERRITORY_KEYS[key]
+    matches = difflib.get_close_matches(key, list(_TERRITORY_KEYS), n=2,
+                                        cutoff=NAME_CUTOFF)
+    if len(matches) == 2 and (
+            difflib.SequenceMatcher(None, key, matches[0]).ratio() ==
+            difflib.SequenceMatcher(None, key, matches[1]).ratio()):
+        # Just as close to two territories
+        return None
+    return _TERRITORY_KEYS[matches[0]] if matches else None
+
+
+def rescale_troops(troops: List[int], total: int) -> List[int]:
+    """Troops scaled in proportion to add up to total, the troops left
+    over from rounding go to the largest remainders."""
+    current_total = sum(troops)
+    if current_total <= 0:
+        return troops
+    shares = [count * total / current_total for count in troops]
+    scaled = [int(share) for share in shares]
+    by_remainder = sorted(range(len(troops)),
+                          key=lambda i: shares[i] - scaled[i], reverse=True)
+    for i in by_remainder[:total - sum(scaled)]:
+        scaled[i] += 1
+    return scaled
+
+
+class MoveRepair:
+    """
+    Repairs the moves of a player before validation, see the module
+    docstring.
+
+    Parameters:
+    - mode: "off", "silent" or "log".
+    """
+    def __init__(self, mode: str = "off") -> None:
+        if mode not in MOVE_REPAIR_MODES:
+            raise ValueError(f"Unknown move repair mode: {mode}. " +
+                             f"Please choose one of {MOVE_REPAIR_MODES}.")
+        self.mode = mode
+
+    def __repr__(self) -> str:
+        return f"<MoveRepair(mode='{self.mode}')>"
+
+    def record(self, player: 'PlayerAgent', repairs: List[str]) -> None:
+        if self.mode != "log":
+            return
+        for repair in repairs:
+            print(f"Repaired the move of {player.name}: {repair}")
+        player.move_repairs += len(repairs)
+
+    def repair_name(self, name: Optional[str], repairs: List[str],
+                    allow_blank: bool = False) -> Optional[str]:
+        territory = match_territory(name, allow_blank)
+        if territory is None:
+            return name
+        if territory != name:
+            repairs.append(f"'{name}' is {territory}")
+        return territory
+
+    def repair_placement(self, player: 'PlayerAgent',
+                         moves: List[Dict[str, int]],
+                         initial_placement: bool = False
+                         ) -> List[Dict[str, int]]:
+        """Placement moves with the names and troop total repaired."""
+        if self.mode == "off" or any(
+                move.get('territory_name') is None or
+                move.get('num_troops') is None for move in moves):
+            return moves
+        repairs: List[str] = []
+        moves = [{**move, 'territory_name': self.repair_name(
+                    move['territory_name'], repairs)} for move in moves]
+
+        if initial_placement:
+            if len(moves) == 1 and moves[0]['num_troops'] > 1:
+                repairs.append(f"placed 1 troop instead of " +
+                               f"{moves[0]['num_troops']}")
+                moves[0]['num_troops'] = 1
+        else:
+            troops = [move['num_troops'] for move in moves]
+            total = sum(troops)
+            if (total != player.troops and total > 0 and
+                    abs(total - player.troops) <=
+                    max(1, MAX_TROOP_ERROR * player.troops)):
+                repairs.append(f"placed {player.troops} troops instead of " +
+                               f"{total}")
+                for move, count in zip(moves, rescale_troops(troops,
+                                                             player.troops)):
+                    move['num_troops'] = count
+                moves = [move for move in moves if move['num_troops'] > 0]
+
+        self.record(player, repairs)
+        return moves
+
+    def repair_troop_move(self, player: 'PlayerAgent',
+                          moves: List[Dict[str, int]],
+                          from_territory: Optional[str],
+                          game_state: 'GameState'
+                          ) -> Tuple[List[Dict[str, int]], Optional[str]]:
+        """An attack or fortify move with the names repaired and the
+        troops clamped to what can leave from_territory."""
+        move = moves[0]
+        if (self.mode == "off" or move.get('territory_name') is None or
+                move.get('num_troops') is None):
+            return moves, from_territory
+        repairs: List[str] = []
+        territory = self.repair_name(move['territory_name'], repairs,
+                                     allow_blank=True)
+        num_troops = move['num_troops']
+        if territory != BLANK and num_troops != 0:
+            from_territory = self.repair_name(from_territory, repairs)
+            if game_state.check_terr_control(player.name, from_territory):
+                from_troops = game_state.check_number_of_troops(
+                    player.name, from_territory)
+                # Only the off-by-one of moving every troop, a larger
+                # count is a real mistake and goes back to the player
+                if num_troops == from_troops > 1:
+                    repairs.append(f"moved {from_troops - 1} troops from " +
+                                   f"{from_territory} instead of {num_troops}")
+                    num_troops = from_troops - 1
+
+        self.record(player, repairs)
+        return ([{**move, 'territory_name': territory,
+                  'num_troops': num_troops}] + moves[1:], from_territory)
@@ -0,0 +1,184 @@
+"""
+Structured output of the moves.
+
+In the "text" output mode the players answer in the |||Territory, N|||,
+###From Territory### and +++Reasoning+++ format and the moves are pulled
+out of the answer with regular expressions. In the "json" output mode they
+answer with a JSON object of the schema of the phase (MOVE_SCHEMAS):
+- the schema is sent to the providers that enforce it, OpenAI structured
+  outputs, Anthropic tool use and the local model, so the answer always
+  parses and only names territories of the map,
+- Groq gets its JSON mode and Bedrock only the example in the prompt,
+- read_move checks every answer against the schema, territory names
+  included, before it reaches the validation of the game master.
+
+The schemas only use the subset of JSON schema that OpenAI's strict mode
+accepts: every property is required and no other property is allowed.
+"""
+import json
+import re
+from typing import Any, Dict, List, Optional, Tuple
+from risk_game.game_constants import TERRITORIES
+
+OUTPUT_MODES = ("text", "json")
+BLANK = "Blank"
+
+
+def object_schema(properties: Dict[str, Any]) -> Dict[str, Any]:
+    return {"type": "object", "properties": properties,
+            "required": list(properties), "additionalProperties": False}
+
+
+def placement_schema(title: str) -> Dict[str, Any]:
+    return {"title": title, **object_schema({
+        "moves": {"type": "array", "items": object_schema({
+            "territory": {"type": "string", "enum": list(TERRITORIES)},
+            "troops": {"type": "integer", "minimum": 0}})},
+        "reasoning": {"type": "string"}})}
+
+
+def move_schema(title: str) -> Dict[str, Any]:
+    # Blank, 0 from Blank ends the attacks or skips the fortify move
+    territories = list(TERRITORIES) + [BLANK]
+    return {"title": title, **object_schema({
+        "territory": {"type": "string", "enum": territories},
+        "troops": {"type": "integer", "minimum": 0},
+        "from_territory": {"type": "string", "enum": territories},
+        "reasoning": {"type": "string"}})}
+
+
+MOVE_SCHEMAS: Dict[str, Dict[str, Any]] = {
+    "initial_troop_placement": placement_schema("initial_troop_placement"),
+    "troop_placement": placement_schema("troop_placement"),
+    "attack": move_schema("attack"),
+    "fortify": move_schema("fortify"),
+    "card_trade": {"title": "card_trade", **object_schema({
+        "cards": {"type": "array", "items": {"type": "integer", "minimum": 0}},
+        "reasoning": {"type": "string"}})},
+}
+
+# Examples of the answers given in the prompt, the enums of the schemas are
+# too long to repeat in every prompt
+JSON_EXAMPLES: Dict[str, str] = {
+    "initial_troop_placement": ('{"moves": [{"territory": "Brazil", "troops": 1}], ' +
+                                '"reasoning": "Brazil is a key territory"}'),
+    "troop_placement": ('{"moves": [{"territory": "Brazil", "troops": 2}, ' +
+                        '{"territory": "Peru", "troops": 1}], ' +
+                        '"reasoning": "Brazil and Peru are key territories"}'),
+    "attack": ('{"territory": "Brazil", "troops": 3, "from_territory": ' +
+               '"Argentina", "reasoning": "Take South America"}\n' +
+               'When you are finished attacking: {"territory": "Blank", ' +
+               '"troops": 0, "from_territory": "Blank", "reasoning": "Done"}'),
+    "fortify": ('{"territory": "Brazil", "troops": 10, "from_territory": ' +
+                '"Argentina", "reasoning": "Reinforce the border"}\n' +
+                'To not fortify: {"territory": "Blank", "troops": 0, ' +
+                '"from_territory": "Blank", "reasoning": "No need"}'),
+    "card_trade": ('{"cards": [1, 3, 4], "reasoning": "I need the troops"}\n' +
+                   'To not trade any cards: {"cards": [], "reasoning": "Wait"}'),
+}
+
+JSON_INSTRUCTIONS = """
+Answer ONLY with a JSON object, instead of the response format given above,
+with the territory names written exactly as on the board. For example:
+{example}
+"""
+
+JSON_OBJECT = re.compile(r'\{.*\}', re.DOTALL)
+
+
+def json_instructions(schema_name: str) -> str:
+    return JSON_INSTRUCTIONS.format(example=JSON_EXAMPLES[schema_name])
+
+
+def validate_json(value: Any, schema: Dict[str, Any], path: str = "answer"
+    ) -> Optional[str]:
+    """
+    Check a value against a schema of MOVE_SCHEMAS. Only the keywords the
+    schemas use are supported: type, enum, minimum, properties, required,
+    additionalProperties and items.
+
+    Returns:
+    - The first error found, or None when the value is valid.
+    """
+    schema_type = schema.get("type")
+    if schema_type == "object":
+        if not isinstance(value, dict):
+            return f"{path} must be a JSON object"
+        for key in schema.get("required", []):
+            if key not in value:
+                return f"{path} is missing '{key}'"
+        properties = schema.get("properties", {})
+        for key, item in value.items():
+            if key not in properties:
+                if schema.get("additionalProperties", True) is False:
+                    return f"{path} has an unknown key '{key}'"
+                continue
+            error = validate_json(item, properties[key], f"{path}.{key}")
+            if error:
+                return error
+        return None
+    if schema_type == "array":
+        if not isinstance(value, list):
+            return f"{path} must be a list"
+        for i, item in enumerate(value):
+            error = validate_json(item, schema["items"], f"{path}[{i}]")
+            if error:
+                return error
+        return None
+    if schema_type == "integer":
+        # bool is an int in Python, not in JSON
+        if not isinstance(value, int) or isinstance(value, bool):
+            return f"{path} must be a whole number"
+        if value < schema.get("minimum", value):
+            return f"{path} must be at least {schema['minimum']}"
+    elif schema_type == "string" and not isinstance(value, str):
+        return f"{path} must be a string"
+    if "enum" in schema and value not in schema["enum"]:
+        return f"{path} '{value}' is not a territory of the map"
+    return None
+
+
+def read_json(response: str) -> Any:
+    """The JSON object of an answer, also when the model wrapped it in a
+    code block or added a sentence around it. None if there is none."""
+    match = JSON_OBJECT.search(response)
+    if match is None:
+        return None
+    try:
+        return json.loads(match.group(0))
+    except json.JSONDecodeError:
+        return None
+
+
+def read_move(response: str, schema_name: str
+    ) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+    """The answer as a dict valid for the schema, or None and the error."""
+    move = read_json(response)
+    if move is None:
+        return None, "the answer is not a JSON object"
+    error = validate_json(move, MOVE_SCHEMAS[schema_name])
+    if error:
+        return None, error
+    return move, None
+
+
+def format_move_json(schema_name: str, moves: List[Dict[str, int]],
+                     reasoning: Optional[str] = None,
+                     from_territory: Optional[str] = None) -> str:
+    """JSON answer of parsed moves, the inverse of read_move."""
+    if schema_name in ("initial_troop_placement", "troop_placement"):
+        move = {"moves": [{"territory": move['territory_name'],
+                           "troops": move['num_troops']} for move in moves]}
+    else:
+        move = {"territory": moves[0]['territory_name'],
+                "troops": moves[0]['num_troops'],
+                "from_territory": from_territory or BLANK}
+    move["reasoning"] = reasoning or ""
+    return json.dumps(move)
+
+
+def format_card_trade_json(cards: Optional[List[int]],
+                           reasoning: Optional[str] = None) -> str:
+    # 0 is the text format's answer for no trade
+    return json.dumps({"cards": [card for card in cards or [] if card != 0],
+                       "reasoning": reasoning or ""})
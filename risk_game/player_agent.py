@@ -1,11 +1,87 @@
 import re
-from typing import Dict,Optional,List,Tuple
-from risk_game.llm_clients.llm_base import LLMClient
+import asyncio
+from typing import Any, Dict,Optional,List,Tuple
+from risk_game.game_constants import TERRITORIES
+from risk_game.llm_clients.llm_base import LLMClient, AsyncLLMClient, \
+provider_semaphore, history_text
+from risk_game.llm_clients.rate_limiter import estimate_tokens
+from risk_game.move_schema import MOVE_SCHEMAS, OUTPUT_MODES, \
+json_instructions, read_move
+from risk_game.player_session import PlayerSession
+from risk_game.speculation import SpeculativePrompt
+
+# "full" sends the whole rules, board and instructions with every prompt,
+# "compact" moves the rules and the static instructions to a system prompt
+# that is the same for every call and only sends the relevant rows of the
+# board
+PROMPT_MODES = ("full", "compact")
+
+COMPACT_SYSTEM_PROMPT = """You are a master strategist and Risk player with 20 years experience.
+We are playing Risk with the following rules: {rules}
+
+Every message gives your name, the phase of your turn and the relevant part
+of the board: your territories and the enemy territories adjacent to them as
+"Owner: Territory Troops", and a summary of every player. Answer only in the
+format of the phase and keep your reasoning very brief. An invalid move is
+reported in the next message, don't make the same mistake twice.
+
+Phase: strategy. Formulate your strategy for this turn in two bullet points
+of at most four sentences each, thinking 2-3 turns ahead:
+- **Attack Strategy:** Which territories will you attack, from where and with
+how many troops? Target continent bonuses and eliminate weak opponents to
+take their cards.
+- **Defense Strategy:** Which territories will you fortify and where will you
+place your troops?
+
+Phase: initial troop placement. Place one troop on a territory you control.
+Move:|||Territory, 1|||
+Reasoning:+++Reasoning for move+++
+
+Phase: troop placement. Place all your available troops on territories you
+control, one move per territory.
+Move 1:|||Territory, Number of troops|||
+Move 2:|||Territory, Number of troops|||
+Reasoning:+++Reasoning for move+++
+
+Phase: attack. Attack an enemy territory from one of the attack options,
+with at most the listed number of troops. Attack with 3 or more troops when
+you can, the defender wins ties. Attacking is optional, but you only get a
+card after a successful attack.
+Attack Opponent Territory:|||Territory, Number of troops|||
+From Territory:###From Territory###
+Reasoning:+++Reasoning for move+++
+When you are finished attacking answer:
+Attack Opponent Territory:|||Blank, 0|||
+From Territory:###Blank###
+Reasoning:+++Reasoning for move+++
+
+Phase: fortify. Optionally move troops once, from one of the fortify options
+to a connected territory you control. Move large numbers of troops from
+interior territories to the key border territories.
+To Territory:|||To Territory, Number of troops|||
+From Territory:###From Territory###
+Reasoning:+++Reasoning for move+++
+If you don't want to fortify answer:
+To Territory:|||Blank, 0|||
+From Territory:###Blank###
+Reasoning:+++Reasoning for move+++"""
 
 class PlayerAgent:
-    def __init__(self, name: str, llm_client: LLMClient)-> None:
+    def __init__(self, name: str, llm_client: LLMClient,
+                 prompt_mode: str = "full", session_mode: bool = False,
+                 output_mode: str = "text")-> None:
+        if prompt_mode not in PROMPT_MODES:
+            raise ValueError(f"Unknown prompt mode: {prompt_mode}. " +
+                             f"Please choose one of {PROMPT_MODES}.")
+        if output_mode not in OUTPUT_MODES:
+            raise ValueError(f"Unknown output mode: {output_mode}. " +
+                             f"Please choose one of {OUTPUT_MODES}.")
         self.name: str = name
         self.llm_client: LLMClient = llm_client
+        self.prompt_mode: str = prompt_mode
+        # "text" moves are parsed from the |||Territory, N||| format, "json"
+        # moves are JSON objects of a schema, see move_schema.py
+        self.output_mode: str = output_mode
         self.include_reasoning: bool = True
         self.troops: int = 0
         self.turn_strategy: str = ""
@@ -14,15 +90,268 @@ class PlayerAgent:
         self.attack_errors: int = 0
         self.fortify_errors: int = 0
         self.card_trade_errors: int = 0
+        # Move prompts sent, and how many of them asked again after an
+        # invalid move
+        self.move_requests: int = 0
+        self.move_retries: int = 0
+        # Near-valid moves fixed by the game master, see move_repair.py
+        self.move_repairs: int = 0
+        # Prompts sent ahead of time by schema name, and how many were sent
+        # and used, see speculation.py
+        self.speculations: Dict[str, SpeculativePrompt] = {}
+        self.speculative_prompts: int = 0
+        self.speculation_hits: int = 0
         self.accumulated_turn_time : float = 0.0
+        # Estimated (static, dynamic) prompt tokens of every call. The static
+        # system prompt and prompt prefix are the same for every call of a
+        # phase, providers can cache them
+        self.prompt_token_counts: List[Tuple[int, int]] = []
+        # Estimated tokens of the system prompts alone, the static tokens
+        # without the prompt prefixes and the session history
+        self.system_prompt_tokens: int = 0
+        # In session mode the prompts of a turn are one conversation and
+        # only send what changed, see player_session.py
+        self.session: Optional[PlayerSession] = (
+            PlayerSession() if session_mode else None)
+        # Set while a game is played without an event loop, see 
+        # GameMaster.play_game: blocking clients are called directly
+        self.synchronous: bool = False
 
     def __str__(self) -> str:
         return (f"Player: {self.name}\n"
                 f"LLM Client: {self.llm_client}\n"
             f"Accumulated Turn Time: {self.accumulated_turn_time:.2f} seconds\n")
     
-    def send_message(self, message_content: str) -> str:
-        return self.llm_client.get_chat_completion(message_content)
+    def send_message(self, message_content: str,
+                     system_prompt: Optional[str] = None,
+                     prompt_prefix: Optional[str] = None,
+                     history: Optional[List[Dict[str, str]]] = None,
+                     response_schema: Optional[Dict[str, Any]] = None) -> str:
+        """
+        Send a prompt and return the response. The system prompt and the
+        prompt prefix are the static part of the prompt, the same for every
+        call, which the clients mark as cacheable; the message content is
+        the dynamic rest of the prompt. The history holds the earlier
+        messages of a session. The response_schema asks for a JSON answer
+        in json output mode.
+        """
+        if isinstance(self.llm_client, AsyncLLMClient):
+            # Its sessions and limits belong to the event loop of the game
+            raise RuntimeError(f"{self.name} has an async client, " +
+                               "please use send_message_async.")
+        self.record_prompt_tokens(message_content, system_prompt, prompt_prefix,
+                                  history)
+        return self.request_completion(message_content, system_prompt,
+                                       prompt_prefix, history, response_schema)
+
+    async def send_message_async(self, message_content: str,
+                                 system_prompt: Optional[str] = None,
+                                 prompt_prefix: Optional[str] = None,
+                                 history: Optional[List[Dict[str, str]]] = None,
+                                 response_schema: Optional[Dict[str, Any]] = None
+                                 ) -> str:
+        if isinstance(self.llm_client, AsyncLLMClient):
+            self.record_prompt_tokens(message_content, system_prompt,
+                                      prompt_prefix, history)
+            return await self.request_completion(message_content, system_prompt,
+                                                 prompt_prefix, history,
+                                                 response_schema)
+        if self.synchronous:
+            return self.send_message(message_content, system_prompt,
+                                     prompt_prefix, history, response_schema)
+        # Blocking clients run in a worker thread so other games keep going
+        if not isinstance(self.llm_client, LLMClient):
+            return await asyncio.to_thread(self.send_message, message_content,
+                                           system_prompt, prompt_prefix, history,
+                                           response_schema)
+        async with provider_semaphore(self.llm_client.provider_name):
+            return await asyncio.to_thread(self.send_message, message_content,
+                                           system_prompt, prompt_prefix, history,
+                                           response_schema)
+
+    def request_completion(self, message_content: str,
+                           system_prompt: Optional[str],
+                           prompt_prefix: Optional[str],
+                           history: Optional[List[Dict[str, str]]] = None,
+                           response_schema: Optional[Dict[str, Any]] = None
+                           ) -> object:
+        # The result is awaitable for async clients
+        return self.llm_client.get_chat_completion(
+            message_content, system_prompt=system_prompt,
+            prompt_prefix=prompt_prefix, history=history,
+            response_schema=response_schema)
+
+    def send_prompt(self, prompt_parts: Tuple[str, str], rules: 'Rules',
+                    game_state: Optional['GameState'] = None,
+                    schema_name: Optional[str] = None) -> str:
+        prompt_parts = self.structured_prompt_parts(prompt_parts, schema_name)
+        response_schema = self.response_schema(schema_name)
+        if self.session is not None and game_state is not None:
+            history = self.session.history
+            message = self.session.next_message(
+                prompt_parts, rules, game_state, self, self.system_prompt(rules))
+            response = self.send_message(message, self.system_prompt(rules),
+                                         history=history,
+                                         response_schema=response_schema)
+            self.session.add_response(response)
+            return response
+        prompt_prefix, prompt = prompt_parts
+        return self.send_message(prompt, self.system_prompt(rules),
+                                 prompt_prefix or None,
+                                 response_schema=response_schema)
+
+    async def send_prompt_async(self, prompt_parts: Tuple[str, str],
+                                rules: 'Rules',
+                                game_state: Optional['GameState'] = None,
+                                schema_name: Optional[str] = None) -> str:
+        # The response of a speculative prompt is used when the prompt is
+        # still the same
+        speculation = self.speculations.pop(schema_name, None)
+        if speculation is not None:
+            if speculation.matches(prompt_parts):
+                self.speculation_hits += 1
+                return await speculation.response()
+            speculation.cancel()
+        return await self.request_prompt_async(prompt_parts, rules, game_state,
+                                               schema_name)
+
+    async def request_prompt_async(self, prompt_parts: Tuple[str, str],
+                                   rules: 'Rules',
+                                   game_state: Optional['GameState'] = None,
+                                   schema_name: Optional[str] = None) -> str:
+        prompt_parts = self.structured_prompt_parts(prompt_parts, schema_name)
+        response_schema = self.response_schema(schema_name)
+        if self.session is not None and game_state is not None:
+            history = self.session.history
+            message = self.session.next_message(
+                prompt_parts, rules, game_state, self, self.system_prompt(rules))
+            response = await self.send_message_async(
+                message, self.system_prompt(rules), history=history,
+                response_schema=response_schema)
+            self.session.add_response(response)
+            return response
+        prompt_prefix, prompt = prompt_parts
+        return await self.send_message_async(prompt, self.system_prompt(rules),
+                                             prompt_prefix or None,
+                                             response_schema=response_schema)
+
+    def speculate(self, prompt_parts: Tuple[str, str], rules: 'Rules',
+                  game_state: 'GameState', schema_name: str) -> None:
+        """
+        Send the prompt of a move in the background, the next prompt of
+        the move uses the response if it is the same prompt. Sessions do not
+        speculate, their prompts have to follow each other.
+        """
+        if self.session is not None or schema_name in self.speculations:
+            return
+        self.speculative_prompts += 1
+        self.speculations[schema_name] = SpeculativePrompt(
+            prompt_parts, asyncio.ensure_future(self.request_prompt_async(
+                prompt_parts, rules, game_state, schema_name)))
+
+    def discard_speculations(self, schema_name: Optional[str] = None) -> None:
+        """Throw away the speculative prompts, or the one of a schema."""
+        for name in ([schema_name] if schema_name else list(self.speculations)):
+            speculation = self.speculations.pop(name, None)
+            if speculation is not None:
+                speculation.cancel()
+
+    @property
+    def speculation_hit_rate(self) -> float:
+        """Share of the speculative prompts that were used."""
+        return (self.speculation_hits / self.speculative_prompts
+                if self.speculative_prompts else 0.0)
+
+    def response_schema(self, schema_name: Optional[str]
+        ) -> Optional[Dict[str, Any]]:
+        """Schema of the answer in json output mode, None for text."""
+        if self.output_mode != "json" or schema_name is None:
+            return None
+        return MOVE_SCHEMAS[schema_name]
+
+    def structured_prompt_parts(self, prompt_parts: Tuple[str, str],
+                                schema_name: Optional[str]) -> Tuple[str, str]:
+        """The prompt with the instructions of the JSON answer in json
+        output mode. They go in the static prefix when there is one."""
+        if self.response_schema(schema_name) is None:
+            return prompt_parts
+        prompt_prefix, prompt = prompt_parts
+        if prompt_prefix:
+            return prompt_prefix + json_instructions(schema_name), prompt
+        return prompt_prefix, prompt + json_instructions(schema_name)
+
+    def count_move_request(self, error_msg: Optional[str]) -> None:
+        # A move asked for again after an invalid one is a retry
+        self.move_requests += 1
+        if error_msg:
+            self.move_retries += 1
+
+    @property
+    def retry_rate(self) -> float:
+        """Share of the move prompts that were retries of an invalid move."""
+        return self.move_retries / self.move_requests if self.move_requests else 0.0
+
+    def start_session(self) -> None:
+        """Start the conversation of a new turn in session mode."""
+        if self.session is not None:
+            self.session.reset()
+
+    def record_prompt_tokens(self, message_content: str,
+                             system_prompt: Optional[str],
+                             prompt_prefix: Optional[str] = None,
+                             history: Optional[List[Dict[str, str]]] = None
+                             ) -> None:
+        # The history of a session is sent again with every call, like the
+        # static part of the prompt
+        self.system_prompt_tokens += estimate_tokens(system_prompt or "")
+        self.prompt_token_counts.append((
+            estimate_tokens((system_prompt or "") + history_text(history) +
+                            (prompt_prefix or "")),
+            estimate_tokens(message_content)))
+
+    @property
+    def prompt_tokens(self) -> int:
+        return sum(static_tokens + message_tokens for static_tokens, 
+                   message_tokens in self.prompt_token_counts)
+
+    @property
+    def static_prompt_tokens(self) -> int:
+        return sum(static_tokens for static_tokens, _ in self.prompt_token_counts)
+
+    @property
+    def session_tokens_saved(self) -> int:
+        """Prompt tokens saved by session mode compared with stateless
+        prompts, see PlayerSession.tokens_saved."""
+        return self.session.tokens_saved if self.session is not None else 0
+
+    def prompt_cache_stats(self) -> Dict[str, int]:
+        """Prompt tokens the provider read from its cache, see 
+        LLMClient.prompt_cache_stats."""
+        if not isinstance(self.llm_client, LLMClient):
+            return {}
+        return dict(self.llm_client.prompt_cache_stats)
+
+    def system_prompt(self, rules: 'Rules') -> Optional[str]:
+        """System prompt of the compact prompts, None in full mode where
+        the providers' default is used."""
+        if self.prompt_mode != "compact":
+            return None
+        return COMPACT_SYSTEM_PROMPT.format(rules=rules)
+
+    def format_board(self, game_state: 'GameState',
+                     only_territories: Optional[List[str]] = None) -> str:
+        """The board as the prompts of the prompt mode show it."""
+        if self.prompt_mode == "compact":
+            return game_state.format_compact_game_state(self.name,
+                                                        only_territories)
+        return game_state.format_game_state(only_territories)
+
+    def board_territories(self, game_state: 'GameState') -> List[str]:
+        """Territories the board of the prompt mode shows."""
+        if self.prompt_mode == "compact":
+            return (game_state.get_player_territories(self.name) +
+                    game_state.get_frontier_territories(self.name))
+        return list(TERRITORIES)
     
     def parse_response_strategy(self, move_response: object) -> str:
         response = move_response.strip()
@@ -71,6 +400,57 @@ class PlayerAgent:
                   f"{response}")
             return [{'territory_name': None, 'num_troops': None}], None, None
         
+    def parse_response_json(
+        self, move_response: object, schema_name: str
+    ) -> Tuple[List[Dict[str, int]], Optional[str], Optional[str]]:
+        """
+        Parses a JSON answer of json output mode into the same moves as
+        parse_response_text. An answer that does not match the schema,
+        e.g. with a territory that is not on the map, is a formatting error.
+        """
+        move, error = read_move(move_response, schema_name)
+        if move is not None and move.get("moves") == []:
+            move, error = None, "answer.moves is empty"
+        if move is None:
+            print(f"------__------Error parsing response: {error} ------__------" +
+                  f"{move_response.strip()[:1200]}")
+            return [{'territory_name': None, 'num_troops': None}], None, None
+
+        reasoning = move["reasoning"].strip()[:1200] or None
+        if "moves" in move:
+            moves = [{'territory_name': placement["territory"],
+                      'num_troops': placement["troops"]}
+                     for placement in move["moves"]]
+            return moves, reasoning, None
+        return ([{'territory_name': move["territory"],
+                  'num_troops': move["troops"]}], reasoning,
+                move["from_territory"])
+
+    def parse_move(
+        self, move_response: object, schema_name: str
+    ) -> Tuple[List[Dict[str, int]], Optional[str], Optional[str]]:
+        if self.output_mode == "json":
+            return self.parse_response_json(move_response, schema_name)
+        return self.parse_response_text(move_response)
+
+    def parse_card_trade_json(
+        self, move_response: object
+    ) -> Tuple[Optional[List[int]], Optional[str]]:
+        """Parses a JSON card trade answer, an empty list is no trade."""
+        move, error = read_move(move_response, "card_trade")
+        if move is None:
+            print(f"------__------Error parsing response: {error} ------__------" +
+                  f"{move_response.strip()[:1200]}")
+            return None, None
+        return move["cards"] or [0], move["reasoning"].strip()[:1200] or None
+
+    def parse_card_trade(
+        self, move_response: object
+    ) -> Tuple[Optional[List[int]], Optional[str]]:
+        if self.output_mode == "json":
+            return self.parse_card_trade_json(move_response)
+        return self.parse_card_trade_response(move_response)
+
     def parse_card_trade_response(
         self, move_response: object
     ) -> Tuple[Optional[List[int]], Optional[str]]:
@@ -132,30 +512,30 @@ class PlayerAgent:
         return formatted_combinations
         
         
-    def make_initial_troop_placement(
+    def initial_troop_placement_prompt(
             self, rules: 'Rules', 
             game_state: 'GameState', error_msg: Optional[str] = None
     ) -> str:
+        return "".join(self.initial_troop_placement_prompt_parts(
+            rules, game_state, error_msg))
+
+    def initial_troop_placement_prompt_parts(
+            self, rules: 'Rules', 
+            game_state: 'GameState', error_msg: Optional[str] = None
+    ) -> Tuple[str, str]:
+        """The static prefix and the dynamic rest of the prompt."""
+        if self.prompt_mode == "compact":
+            return "", self.compact_initial_troop_placement_prompt(
+                game_state, error_msg)
         # Implement strategy to make a move
         current_game_state = game_state.format_game_state()
-        player_territories = game_state.get_player_territories(self.name)
-        prompt = f"""
+        prompt_prefix = f"""
         We are playing Risk and we are in the initial troop placement phase.
-        You, are {self.name}, and it is your turn. 
 
         The current rules of the game are as follows:
 
         {rules}
 
-        """
-        if error_msg:
-             prompt += (f"Your last move was invalid:\n {error_msg} \nPlease " +
-             f"try again and DON'T make the same mistake.\n")
-
-
-        prompt += f"""
-        {current_game_state}
-
         From territories you control, and ONLY from one of the territories 
         you control, please suggest a move. You can only place one troop. 
         Think carefully about your move and consider also the moves of other players. 
@@ -172,45 +552,48 @@ class PlayerAgent:
         reasoning very brief. And you must remebmer to choose a territory 
         you control, this is very important for the grading of your submission.
         """
+        prompt = f"""
+        You, are {self.name}, and it is your turn. 
+
+        """
+        if error_msg:
+             prompt += (f"Your last move was invalid:\n {error_msg} \nPlease " +
+             f"try again and DON'T make the same mistake.\n")
+
+        prompt += f"""
+        {current_game_state}
+        """
         #print(f"---------------This is the initial troop placement prompt:----------------")        
         #print(prompt)
-        parsed_response = (
-            self.parse_response_text(
-                self.send_message(
-                 prompt))
-        )
-        return parsed_response
+        return prompt_prefix, prompt
     
 
-    def make_troop_placement(
+    def troop_placement_prompt(
             self, rules: 'Rules',
             game_state: 'GameState',  error_msg: Optional[str] = None
     ) -> str:
+        return "".join(self.troop_placement_prompt_parts(
+            rules, game_state, error_msg))
+
+    def troop_placement_prompt_parts(
+            self, rules: 'Rules',
+            game_state: 'GameState',  error_msg: Optional[str] = None
+    ) -> Tuple[str, str]:
+        if self.prompt_mode == "compact":
+            return "", self.compact_troop_placement_prompt(game_state, error_msg)
         current_game_state = game_state.format_game_state()
-        player_territories = game_state.get_player_territories(self.name)
 
-        prompt = f"""
+        prompt_prefix = f"""
         We are playing Risk and we are in the troop placement phase.
-        You, are {self.name}, and it is your turn. 
 
          The current rules of the game are as follows:
 
         {rules}
 
-
-        """
-        if error_msg:
-             prompt += (f"Your last move was invalid:\n {error_msg} \nPlease " +
-             f"try again and DON'T make the same mistake.\n")
-
-
-        prompt += f"""
-        {current_game_state}
-
         From territories you control, and ONLY from one of the territories 
         you control, please suggest your moves. You can place troops on any 
         of the territories you control, and you must place the 
-        number of available troops. You have {self.troops} to place. 
+        number of available troops. 
         Think carefully about your move and consider also the moves of 
         other players. 
 
@@ -240,46 +623,49 @@ class PlayerAgent:
         reasoning very brief. And remember you must choose territories you
         control, this is very important for the grading of your submission!
         """
-        parsed_response = (
-            self.parse_response_text(
-                self.send_message(
-                 prompt))
-        )
+        prompt = f"""
+        You, are {self.name}, and it is your turn. 
+
+        """
+        if error_msg:
+             prompt += (f"Your last move was invalid:\n {error_msg} \nPlease " +
+             f"try again and DON'T make the same mistake.\n")
 
-        return parsed_response
+        prompt += f"""
+        {current_game_state}
+
+        You have {self.troops} to place.
+        """
+        return prompt_prefix, prompt
     
-    def make_fortify_move(
+    def fortify_prompt(
             self, rules: 'Rules',
             game_state: 'GameState', error_msg: Optional[str] = None
     ) -> str:
+        return "".join(self.fortify_prompt_parts(rules, game_state, error_msg))
+
+    def fortify_prompt_parts(
+            self, rules: 'Rules',
+            game_state: 'GameState', error_msg: Optional[str] = None
+    ) -> Tuple[str, str]:
+        if self.prompt_mode == "compact":
+            return "", self.compact_fortify_prompt(game_state, error_msg)
         # Implement strategy to make a move
         current_game_state = game_state.format_game_state()
         strong_territories = game_state.get_strong_territories(self.name)
         territories_with_troops  = (
             game_state.get_strong_territories_with_troops(self.name))
+        formatted_fortify_options = game_state.format_fortify_options(
+            game_state.get_fortify_options(self.name))
 
 
-        prompt = f"""
+        prompt_prefix = f"""
         We are playing Risk and we are in the troop fortify phase.
-        You, are {self.name}, and it is your turn. 
 
          The current rules of the game are as follows:
 
         {rules}
 
-
-        """
-
-        if error_msg:
-             prompt += (f"Your last move was invalid:\n {error_msg} \nPlease " +
-             f"try again and DON'T make the same mistake.\n")
-
-
-        prompt += f"""
-        {current_game_state}
-
-        Your current strategy for this turn is: {self.turn_strategy}
-
         **Objective:**
         Your goal is to fortify your borders by moving large numbers of 
         troops to the key border territories that you control. This will 
@@ -298,14 +684,8 @@ class PlayerAgent:
         - Avoid spreading your troops too thin. Focus on fortifying with large numbers of troops, rather than just small reinforcements.
 
         To choose a territory to fortify from, you need to have more than one 
-        troop in that territory. The territories you have more than 
-        one troop in are: {strong_territories}.
-        To fortify is optional and you can choose not to fortify.
-
-        If you choose to fortify, choose a territory ONLY from the following
-        list of tuples containing territories and troop numbers:
-        {territories_with_troops}. The troop number indicates the maximum
-        numer of troops you can move from that territory.
+        troop in that territory. To fortify is optional and you can choose 
+        not to fortify.
 
         Also, most importantly, you MUST fortify between two territories 
         that are connected by a chain of territories under your control.
@@ -329,19 +709,49 @@ class PlayerAgent:
         reasoning brief, this is very important for the grading of your 
         submission.
         """
-        parsed_response = (
-            self.parse_response_text(
-                self.send_message(
-                 prompt))
-        )
+        prompt = f"""
+        You, are {self.name}, and it is your turn. 
 
-        return parsed_response
+        """
 
-    def make_attack_move(
+        if error_msg:
+             prompt += (f"Your last move was invalid:\n {error_msg} \nPlease " +
+             f"try again and DON'T make the same mistake.\n")
+
+
+        prompt += f"""
+        {current_game_state}
+
+        Your current strategy for this turn is: {self.turn_strategy}
+
+        The territories you have more than one troop in are: 
+        {strong_territories}.
+
+        If you choose to fortify, choose a territory ONLY from the following
+        list of tuples containing territories and troop numbers:
+        {territories_with_troops}. The troop number indicates the maximum
+        numer of troops you can move from that territory.
+
+        {formatted_fortify_options}
+        """
+        return prompt_prefix, prompt
+
+    def attack_prompt(
             self, rules: 'Rules', 
             game_state: 'GameState', successful_attacks: int, 
             error_msg: Optional[str] = None
     ) -> str:
+        return "".join(self.attack_prompt_parts(
+            rules, game_state, successful_attacks, error_msg))
+
+    def attack_prompt_parts(
+            self, rules: 'Rules', 
+            game_state: 'GameState', successful_attacks: int, 
+            error_msg: Optional[str] = None
+    ) -> Tuple[str, str]:
+        if self.prompt_mode == "compact":
+            return "", self.compact_attack_prompt(
+                game_state, successful_attacks, error_msg)
         # Implement strategy to make an attack
         current_game_state = game_state.format_game_state()
         strong_territories = (
@@ -354,34 +764,17 @@ class PlayerAgent:
         formatted_attack_vectors = (
             game_state.format_adjacent_enemy_territories(possible_attack_vectors))
 
-        prompt = f"""
+        prompt_prefix = f"""
         We are playing Risk and we are in the attack phase.   
-        You, are {self.name}, and it is your turn. 
 
         The current rules of the game are as follows:
 
         {rules}
 
-
-        """
-
-        if error_msg:
-             prompt += (f"Your last move was invalid:\n {error_msg} \nPlease " +
-             f"try again and DON'T make the same mistake.\n")
-
-
-        prompt += f"""
-        {current_game_state}
-
-        You have had {successful_attacks} successful attacks so far. 
-
-        Your current strategy for this turn is: {self.turn_strategy}
-
-        {formatted_attack_vectors} 
-
         Your attack MUST be chosen using one of the options from the list 
-        above. (you can chose to attack with less troops than the maximum 
-        number of troops in the dictionary).
+        of territories you control and the adjacent enemy territories given 
+        below. (you can chose to attack with less troops than the maximum 
+        number of troops in the list).
 
         PRO TIP: When attacking, it is always a good idea to attack with 3 or 
         more troops, because you will have a higher chance of winning the 
@@ -416,20 +809,88 @@ class PlayerAgent:
         reasoning brief, this is very important for the grading of your 
         submission.
         """
+        prompt = f"""
+        You, are {self.name}, and it is your turn. 
+
+        """
+
+        if error_msg:
+             prompt += (f"Your last move was invalid:\n {error_msg} \nPlease " +
+             f"try again and DON'T make the same mistake.\n")
+
+
+        prompt += f"""
+        {current_game_state}
+
+        You have had {successful_attacks} successful attacks so far. 
+
+        Your current strategy for this turn is: {self.turn_strategy}
+
+        {formatted_attack_vectors} 
+        """
         # print(f"---------------This is the attack prompt:----------------")
         # print(prompt)
-        parsed_response = (
-            self.parse_response_text(
-                self.send_message(
-                 prompt))
-        )
-
-        return parsed_response
+        return prompt_prefix, prompt
 
     
-    def must_trade_cards(self, cards: List['Card'], game_state: 'GameState',
+    # Compact prompts, the rules and instructions are in the system prompt
+
+    def compact_prompt_header(self, phase: str, game_state: 'GameState',
+                              error_msg: Optional[str] = None) -> str:
+        prompt = f"You are {self.name}. Phase: {phase}.\n"
+        if error_msg:
+            prompt += f"Your last move was invalid: {error_msg}\n"
+        return prompt + game_state.format_compact_game_state(self.name)
+
+    def compact_initial_troop_placement_prompt(
+            self, game_state: 'GameState', error_msg: Optional[str] = None
+    ) -> str:
+        return (self.compact_prompt_header(
+                    "initial troop placement", game_state, error_msg) +
+                "Place 1 troop.\n")
+
+    def compact_troop_placement_prompt(
+            self, game_state: 'GameState', error_msg: Optional[str] = None
+    ) -> str:
+        return (self.compact_prompt_header(
+                    "troop placement", game_state, error_msg) +
+                f"You have {self.troops} troops to place.\n")
+
+    def compact_attack_prompt(
+            self, game_state: 'GameState', successful_attacks: int,
+            error_msg: Optional[str] = None
+    ) -> str:
+        possible_attack_vectors = game_state.get_adjacent_enemy_territories(
+            self.name, game_state.get_strong_territories_with_troops(self.name))
+        return (self.compact_prompt_header("attack", game_state, error_msg) +
+                f"Strategy: {self.turn_strategy}\n" +
+                f"Successful attacks this turn: {successful_attacks}\n" +
+                game_state.format_compact_attack_options(possible_attack_vectors))
+
+    def compact_fortify_prompt(
+            self, game_state: 'GameState', error_msg: Optional[str] = None
+    ) -> str:
+        return (self.compact_prompt_header("fortify", game_state, error_msg) +
+                f"Strategy: {self.turn_strategy}\n" +
+                game_state.format_compact_fortify_options(
+                    game_state.get_fortify_options(self.name)))
+
+    def compact_strategy_prompt(self, game_state: 'GameState') -> str:
+        possible_attack_vectors = game_state.get_adjacent_enemy_territories(
+            self.name, game_state.get_strong_territories_with_troops(self.name))
+        number_of_territories = len(game_state.get_player_territories(self.name))
+        return (self.compact_prompt_header("strategy", game_state) +
+                f"You need {game_state.territories_required_to_win} " +
+                f"territories to win, {game_state.territories_required_to_win - number_of_territories} " +
+                "more than you control.\n" +
+                game_state.format_compact_attack_options(possible_attack_vectors))
+
+    def card_trade_prompt(self, prompt: str) -> str:
+        return self.structured_prompt_parts(("", prompt), "card_trade")[1]
+
+    def must_trade_cards_prompt(self, cards: List['Card'], game_state: 'GameState',
         valid_combinations: Dict[int, List[Tuple[List[int], bool]]]
-        ) -> Tuple[Optional[List[int]], Optional[str]]:
+        ) -> str:
 
         formatted_valid_combinations = self.format_valid_combinations(
             valid_combinations)
@@ -477,18 +938,12 @@ class PlayerAgent:
         """
         # print(f"-----------This is the must trade cards prompt:---------------")
         # print(prompt)   
-        parsed_response = (
-            self.parse_card_trade_response(
-                self.send_message(
-                 prompt))
-        )
-
-        return parsed_response
+        return prompt
     
 
-    def may_trade_cards(self, cards: List['Card'], game_state: 'GameState',
+    def may_trade_cards_prompt(self, cards: List['Card'], game_state: 'GameState',
         valid_combinations: Dict[int, List[Tuple[List[int], bool]]]
-        ) -> Tuple[Optional[List[int]], Optional[str]]:
+        ) -> str:
         
         current_game_state = game_state.format_game_state()
         formatted_valid_combinations = self.format_valid_combinations(
@@ -559,23 +1014,158 @@ class PlayerAgent:
         # print(f"-----------This is the may trade cards prompt:---------------")
         # print(prompt)   
 
-        parsed_response = (
-            self.parse_card_trade_response(
-                self.send_message(
-                 prompt))
-        )
-
-        return parsed_response
+        return prompt
         
     
+    # Moves, every prompt is sent with send_prompt or send_message (or
+    # their async versions) and the response is parsed into the structured
+    # move
+
+    def make_initial_troop_placement(
+            self, rules: 'Rules', 
+            game_state: 'GameState', error_msg: Optional[str] = None
+    ) -> Tuple[List[Dict[str, int]], Optional[str], Optional[str]]:
+        # Every initial placement is a turn of its own, a retry after an
+        # invalid move continues its session
+        if error_msg is None:
+            self.start_session()
+        self.count_move_request(error_msg)
+        return self.parse_move(self.send_prompt(
+            self.initial_troop_placement_prompt_parts(rules, game_state, error_msg), rules,
+            game_state, "initial_troop_placement"), "initial_troop_placement")
+
+    async def make_initial_troop_placement_async(
+            self, rules: 'Rules', 
+            game_state: 'GameState', error_msg: Optional[str] = None
+    ) -> Tuple[List[Dict[str, int]], Optional[str], Optional[str]]:
+        # Every initial placement is a turn of its own, a retry after an
+        # invalid move continues its session
+        if error_msg is None:
+            self.start_session()
+        self.count_move_request(error_msg)
+        return self.parse_move(await self.send_prompt_async(
+            self.initial_troop_placement_prompt_parts(rules, game_state, error_msg), rules,
+            game_state, "initial_troop_placement"), "initial_troop_placement")
+
+    def make_troop_placement(
+            self, rules: 'Rules',
+            game_state: 'GameState',  error_msg: Optional[str] = None
+    ) -> Tuple[List[Dict[str, int]], Optional[str], Optional[str]]:
+        self.count_move_request(error_msg)
+        return self.parse_move(self.send_prompt(
+            self.troop_placement_prompt_parts(rules, game_state, error_msg), rules,
+            game_state, "troop_placement"), "troop_placement")
+
+    async def make_troop_placement_async(
+            self, rules: 'Rules',
+            game_state: 'GameState',  error_msg: Optional[str] = None
+    ) -> Tuple[List[Dict[str, int]], Optional[str], Optional[str]]:
+        self.count_move_request(error_msg)
+        return self.parse_move(await self.send_prompt_async(
+            self.troop_placement_prompt_parts(rules, game_state, error_msg), rules,
+            game_state, "troop_placement"), "troop_placement")
+
+    def make_fortify_move(
+            self, rules: 'Rules',
+            game_state: 'GameState', error_msg: Optional[str] = None
+    ) -> Tuple[List[Dict[str, int]], Optional[str], Optional[str]]:
+        self.count_move_request(error_msg)
+        return self.parse_move(self.send_prompt(
+            self.fortify_prompt_parts(rules, game_state, error_msg), rules,
+            game_state, "fortify"), "fortify")
+
+    async def make_fortify_move_async(
+            self, rules: 'Rules',
+            game_state: 'GameState', error_msg: Optional[str] = None
+    ) -> Tuple[List[Dict[str, int]], Optional[str], Optional[str]]:
+        self.count_move_request(error_msg)
+        return self.parse_move(await self.send_prompt_async(
+            self.fortify_prompt_parts(rules, game_state, error_msg), rules,
+            game_state, "fortify"), "fortify")
+
+    def make_attack_move(
+            self, rules: 'Rules', 
+            game_state: 'GameState', successful_attacks: int, 
+            error_msg: Optional[str] = None
+    ) -> Tuple[List[Dict[str, int]], Optional[str], Optional[str]]:
+        self.count_move_request(error_msg)
+        return self.parse_move(self.send_prompt(
+            self.attack_prompt_parts(rules, game_state, successful_attacks, error_msg), rules,
+            game_state, "attack"), "attack")
+
+    async def make_attack_move_async(
+            self, rules: 'Rules', 
+            game_state: 'GameState', successful_attacks: int, 
+            error_msg: Optional[str] = None
+    ) -> Tuple[List[Dict[str, int]], Optional[str], Optional[str]]:
+        self.count_move_request(error_msg)
+        return self.parse_move(await self.send_prompt_async(
+            self.attack_prompt_parts(rules, game_state, successful_attacks, error_msg), rules,
+            game_state, "attack"), "attack")
+
+    def must_trade_cards(self, cards: List['Card'], game_state: 'GameState',
+        valid_combinations: Dict[int, List[Tuple[List[int], bool]]]
+        ) -> Tuple[Optional[List[int]], Optional[str]]:
+        return self.parse_card_trade(self.send_message(
+            self.card_trade_prompt(self.must_trade_cards_prompt(
+                cards, game_state, valid_combinations)),
+            response_schema=self.response_schema("card_trade")))
+
+    async def must_trade_cards_async(self, cards: List['Card'], 
+        game_state: 'GameState',
+        valid_combinations: Dict[int, List[Tuple[List[int], bool]]]
+        ) -> Tuple[Optional[List[int]], Optional[str]]:
+        return self.parse_card_trade(await self.send_message_async(
+            self.card_trade_prompt(self.must_trade_cards_prompt(
+                cards, game_state, valid_combinations)),
+            response_schema=self.response_schema("card_trade")))
+
+    def may_trade_cards(self, cards: List['Card'], game_state: 'GameState',
+        valid_combinations: Dict[int, List[Tuple[List[int], bool]]]
+        ) -> Tuple[Optional[List[int]], Optional[str]]:
+        return self.parse_card_trade(self.send_message(
+            self.card_trade_prompt(self.may_trade_cards_prompt(
+                cards, game_state, valid_combinations)),
+            response_schema=self.response_schema("card_trade")))
+
+    async def may_trade_cards_async(self, cards: List['Card'], 
+        game_state: 'GameState',
+        valid_combinations: Dict[int, List[Tuple[List[int], bool]]]
+        ) -> Tuple[Optional[List[int]], Optional[str]]:
+        return self.parse_card_trade(await self.send_message_async(
+            self.card_trade_prompt(self.may_trade_cards_prompt(
+                cards, game_state, valid_combinations)),
+            response_schema=self.response_schema("card_trade")))
+
+    def define_strategy_for_move(self, rules: 'Rules',
+            game_state: 'GameState') -> None:
+        # The strategy is the first prompt of a turn
+        self.start_session()
+        self.turn_strategy = self.parse_response_strategy(self.send_prompt(
+            self.strategy_prompt_parts(rules, game_state), rules, game_state))
+
+    async def define_strategy_for_move_async(self, rules: 'Rules',
+            game_state: 'GameState') -> None:
+        self.start_session()
+        self.turn_strategy = self.parse_response_strategy(
+            await self.send_prompt_async(
+                self.strategy_prompt_parts(rules, game_state), rules, game_state))
+
     def choose_capital(self, game_state: 'GameState') -> str:
         # Implement strategy to choose a capital
         # return the name of the capital
         pass
 
-    def define_strategy_for_move(self, rules: 'Rules',
-            game_state: 'GameState') -> None:
+    def strategy_prompt(self, rules: 'Rules',
+            game_state: 'GameState') -> str:
+        return "".join(self.strategy_prompt_parts(rules, game_state))
+
+    def strategy_prompt_parts(self, rules: 'Rules',
+            game_state: 'GameState') -> Tuple[str, str]:
+        if self.prompt_mode == "compact":
+            return "", self.compact_strategy_prompt(game_state)
         # Implement strategy to make a move
+        current_game_state = game_state.format_game_state()
         strong_territories = (
             game_state.get_strong_territories_with_troops(self.name))
         
@@ -593,28 +1183,16 @@ class PlayerAgent:
             number_of_territories)
 
 
-        prompt = """
+        prompt_prefix = f"""
         We are playing Risk and you are about to start your turn, but first 
         you need to define your strategy for this turn.
-        You, are {self.name}, and these are the current rules we are 
-        playing with:
+        These are the current rules we are playing with:
 
         {rules}
 
-        {current_game_state}
-
-        {formatted_attack_vectors}
-
         Your task is to formulate an overall strategy for your turn, 
         considering the territories you control, the other players, and the 
         potential for continent bonuses. 
-
-        Since the victory conditions only requires you to control 
-        {game_state.territories_required_to_win} territories, and you already 
-        control {number_of_territories} territories, 
-        you only need to win an extra {extra_territories_required_to_win}
-        to win the game outright. Can you do that this turn?? If so lay 
-        your strategy out accordingly.
    
         **Objective:**
 
@@ -664,28 +1242,35 @@ class PlayerAgent:
         how will you allocate your remaining troops?
 
         Example Strategy:
-        - **Attack Strategy:** Attack {Territory B} from {Territory C} with 
+        - **Attack Strategy:** Attack {{Territory B}} from {{Territory C}} with 
         10 troops to weaken Player 1 and prevent them from securing the 
-        continent bonus for {Continent Y}. Eliminate Player 2 by attacking 
-        their last remaining territory, {Territory D}, to gain their cards.
-        - **Defense Strategy:** Fortify {Territory E} with 3 troops to 
+        continent bonus for {{Continent Y}}. Eliminate Player 2 by attacking 
+        their last remaining territory, {{Territory D}}, to gain their cards.
+        - **Defense Strategy:** Fortify {{Territory E}} with 3 troops to 
         protect against a potential counter-attack from Player 3.
 
         Remember, your goal is to make the best strategic decisions that
             will maximize your chances of winning the game. Consider the 
             potential moves of your opponents and how you can position 
             yourself to counter them effectively.
+        """
+        prompt = f"""
+        You, are {self.name}, and it is your turn. 
+
+        {current_game_state}
+
+        {formatted_attack_vectors}
+
+        Since the victory conditions only requires you to control 
+        {game_state.territories_required_to_win} territories, and you already 
+        control {number_of_territories} territories, 
+        you only need to win an extra {extra_territories_required_to_win}
+        to win the game outright. Can you do that this turn?? If so lay 
+        your strategy out accordingly.
 
         What is your strategy for this turn?
         """
-        parsed_response = (
-            self.parse_response_strategy(
-                self.send_message(
-                 prompt))
-        )
-        
-
-        self.turn_strategy = parsed_response
+        return prompt_prefix, prompt
 
 def choose_capital(self, game_state: 'GameState') -> str:
     # Implement strategy to choose a capital
@@ -0,0 +1,167 @@
+"""
+Multi-turn conversation of a player during one turn of the game.
+
+In the default stateless mode every prompt of a turn repeats the rules, the
+whole board and the strategy of the turn. A PlayerSession keeps the
+messages of the turn instead, and every prompt after the first one only
+adds what the model has not seen yet:
+- the instructions of a phase are sent the first time the phase comes up,
+  later prompts of the phase only repeat its first line,
+- the rules are sent once,
+- the strategy of the turn is referred to instead of repeated,
+- the board is replaced by the territories that changed since it was sent.
+
+The history is bounded: when it holds more than max_messages messages the
+oldest exchanges are dropped and summarised in one line each, and whatever
+they held (instructions, rules, board, strategy) is sent again in full
+with the next prompt.
+
+The session also counts the prompt tokens it sends, history included,
+against the tokens the same prompts cost in stateless mode.
+"""
+import re
+from typing import Any, Dict, List, Optional, Set, Tuple
+from risk_game.llm_clients.llm_base import history_text
+from risk_game.llm_clients.rate_limiter import estimate_tokens
+
+# Strategy, placement, a few attacks and the fortify move of a turn
+DEFAULT_MAX_MESSAGES: int = 12
+
+SAME_INSTRUCTIONS = ("Follow the same instructions and response format " +
+                     "as before for this phase.\n")
+RULES_GIVEN_ABOVE = "(the rules given above)"
+STRATEGY_GIVEN_ABOVE = "(the strategy you gave above)"
+BOARD_CHANGES = "Changes to the board since your last message:\n"
+BOARD_UNCHANGED = "The board has not changed since your last message.\n"
+SUMMARY_HEADER = "Summary of your earlier answers this turn:\n"
+
+
+class PlayerSession:
+    """
+    Message history of a player's turn, see the module docstring.
+
+    Parameters:
+    - max_messages: Maximum number of messages kept in the history, user
+    and assistant messages count separately.
+    """
+    def __init__(self, max_messages: int = DEFAULT_MAX_MESSAGES) -> None:
+        if max_messages < 2:
+            raise ValueError("A session must keep at least 2 messages")
+        self.max_messages = max_messages
+        # Kept exchanges: the prompt as the builders made it, the message
+        # sent for it, the answer and the board the model knows afterwards
+        self.exchanges: List[Dict[str, Any]] = []
+        self.summary: List[str] = []
+        self.pending: Optional[Dict[str, Any]] = None
+        # Estimated prompt tokens sent in session mode, and what the same
+        # prompts cost in stateless mode
+        self.session_tokens: int = 0
+        self.stateless_tokens: int = 0
+        self.truncations: int = 0
+
+    def __repr__(self) -> str:
+        return (f"<PlayerSession(messages={len(self.history)}, " +
+                f"max_messages={self.max_messages}, " +
+                f"tokens_saved={self.tokens_saved})>")
+
+    @property
+    def tokens_saved(self) -> int:
+        """Prompt tokens saved compared with stateless prompts, negative
+        when re-sending the history costs more than it saves."""
+        return self.stateless_tokens - self.session_tokens
+
+    @property
+    def history(self) -> List[Dict[str, str]]:
+        messages = []
+        for exchange in self.exchanges:
+            messages.append({"role": "user", "content": exchange["message"]})
+            messages.append({"role": "assistant",
+                             "content": exchange["response"]})
+        if self.summary and messages:
+            messages[0]["content"] = (SUMMARY_HEADER + "".join(self.summary) +
+                                      "\n" + messages[0]["content"])
+        return messages
+
+    def reset(self) -> None:
+        """Start the session of a new turn, the token counts are kept."""
+        self.exchanges = []
+        self.summary = []
+        self.pending = None
+
+    def contains(self, text: str, role: str = "message") -> bool:
+        return any(text in exchange[role] for exchange in self.exchanges)
+
+    def known_board(self
+        ) -> Optional[Tuple[Dict[str, Optional[Tuple[str, int]]], Set[str]]]:
+        """Board the model knows from the history and the territories it
+        has seen, None when the full board has to be sent."""
+        if not any(exchange["full_board"] for exchange in self.exchanges):
+            return None
+        for exchange in reversed(self.exchanges):
+            if exchange["board"] is not None:
+                return exchange["board"]
+        return None
+
+    def next_message(self, prompt_parts: Tuple[str, str], rules: 'Rules',
+                     game_state: 'GameState', player: 'PlayerAgent',
+                     system_prompt: Optional[str] = None) -> str:
+        """
+        Message that sends the prompt as a delta on top of the history.
+        The exchange is kept once add_response gets the answer.
+        """
+        prompt_prefix, prompt = prompt_parts
+        self.stateless_tokens += estimate_tokens(
+            (system_prompt or "") + prompt_prefix + prompt)
+        message_prefix = prompt_prefix
+        if prompt_prefix and self.contains(prompt_prefix, "prompt_prefix"):
+            message_prefix = (prompt_prefix.strip().splitlines()[0].strip() +
+                              "\n" + SAME_INSTRUCTIONS)
+        elif prompt_prefix and self.contains(str(rules)):
+            message_prefix = prompt_prefix.replace(str(rules), RULES_GIVEN_ABOVE)
+
+        if player.turn_strategy and self.contains(player.turn_strategy,
+                                                  "response"):
+            prompt = prompt.replace(player.turn_strategy, STRATEGY_GIVEN_ABOVE)
+
+        board = None
+        full_board = False
+        current_board = player.format_board(game_state)
+        if current_board in prompt:
+            shown = set(player.board_territories(game_state))
+            known_board = self.known_board()
+            if known_board is None:
+                full_board = True
+            else:
+                snapshot, seen = known_board
+                changed = [territory for territory in
+                           game_state.get_changed_territories(snapshot)
+                           if territory in shown] + sorted(shown - seen)
+                prompt = prompt.replace(current_board, (
+                    BOARD_CHANGES + player.format_board(game_state, changed)
+                    if changed else BOARD_UNCHANGED))
+                shown |= seen
+            board = (game_state.board_snapshot(), shown)
+
+        message = message_prefix + prompt
+        history = self.history
+        self.session_tokens += estimate_tokens(
+            (system_prompt or "") + history_text(history) + message)
+        self.pending = {"prompt_prefix": prompt_prefix, "message": message,
+                        "board": board, "full_board": full_board}
+        return message
+
+    def add_response(self, response: str) -> None:
+        if self.pending is None:
+            raise ValueError("No message was sent in this session")
+        self.exchanges.append({**self.pending, "response": response})
+        self.pending = None
+        while 2 * len(self.exchanges) > self.max_messages:
+            self.summarise(self.exchanges.pop(0))
+            self.truncations += 1
+
+    def summarise(self, exchange: Dict[str, Any]) -> None:
+        # One line per dropped answer: its moves, or its first words
+        moves = re.findall(r'(\|\|\|.+?\|\|\||###.+?###)', exchange["response"])
+        summary = " ".join(moves) if moves else " ".join(
+            exchange["response"].split())
+        self.summary.append(f"- {summary[:200]}\n")
@@ -2,8 +2,12 @@
 from itertools import combinations
 from typing import List, Tuple, Dict, Optional
 from risk_game.card_deck import Card
-from risk_game.game_constants import CONTINENT_BONUSES
+from risk_game.game_constants import TERRITORIES
+from risk_game.world_map import CONTINENT_BONUS_VALUES, territory_mask, \
+controlled_continent_ids
 from risk_game.game_config import GameConfig
+from risk_game.move_repair import MOVE_REPAIR_MODES
+from risk_game.utils.game_log import GAME_LOG_FORMATS
 
 
 class Rules:
@@ -14,7 +18,22 @@ class Rules:
         self.required_continents = config.required_continents
         self.key_areas = config.key_areas
         self.max_rounds = config.max_rounds
+        self.battle_engine = config.battle_engine
+        self.battle_table_cap = config.battle_table_cap
+        self.move_repair = config.move_repair
+        self.speculative_prompts = config.speculative_prompts
+        self.game_log = config.game_log
+        self.keyframe_interval = config.keyframe_interval
+        self.background_writer = config.background_writer
+        self.checkpoint_interval = config.checkpoint_interval
         self.trade_count = 0
+
+        if self.battle_engine not in ("dice", "table"):
+            raise ValueError(f"Unknown battle engine: {self.battle_engine}")
+        if self.move_repair not in MOVE_REPAIR_MODES:
+            raise ValueError(f"Unknown move repair mode: {self.move_repair}")
+        if self.game_log not in GAME_LOG_FORMATS:
+            raise ValueError(f"Unknown game log format: {self.game_log}")
         
         # Set mode based on territory_control_percentage
         if self.territory_control_percentage == 1.0:
@@ -106,11 +125,11 @@ class Rules:
     def check_world_domination(self, game_state: "GameState",
         player: "PlayerAgent") -> bool:
         player_territories = game_state.get_player_territories(player.name)
-        return len(player_territories) == len(game_state.territories_df)
+        return len(player_territories) == len(TERRITORIES)
 
     def check_territory_control_percentage(self, game_state: "GameState", 
         player: "PlayerAgent") -> bool:
-        total_territories = len(game_state.territories_df)
+        total_territories = len(TERRITORIES)
         player_territories = len(game_state.get_player_territories(player.name))
         print(f"player_territories: {player_territories}")
         print(f"total_territories: {total_territories}")    
@@ -120,16 +139,15 @@ class Rules:
     
     def check_continent_control(self, game_state: "GameState", 
         player: "PlayerAgent") -> bool:
-        controlled_continents = 0
-        for continent, (territories, _) in CONTINENT_BONUSES.items():
-            if all(territory in game_state.get_player_territories(player.name) for territory in territories):
-                controlled_continents += 1
+        controlled_continents = len(
+            game_state.get_controlled_continents(player.name))
         return controlled_continents >= self.required_continents
 
     def check_key_areas_control(self, game_state: "GameState", 
         player: "PlayerAgent") -> bool:
-        player_territories = game_state.get_player_territories(player.name)
-        return all(area in player_territories for area in self.key_areas)
+        owned_mask = game_state.get_territory_mask(player.name)
+        key_areas_mask = territory_mask(self.key_areas)
+        return owned_mask & key_areas_mask == key_areas_mask
     
     def determine_winner_by_territory_control(self, game_state: "GameState", 
         active_players: List["PlayerAgent"]) -> "PlayerAgent":
@@ -265,10 +283,10 @@ class Rules:
         return total_troops
     
     def calculate_continent_bonus(self, player_territories: List[str]) -> int:
-        continent_bonus = 0
-        for continent, (territories, bonus) in CONTINENT_BONUSES.items():
-            if all(territory in player_territories for territory in territories):
-                continent_bonus += bonus
+        owned_mask = territory_mask(player_territories)
+        continent_bonus = sum(
+            CONTINENT_BONUS_VALUES[continent_id] 
+            for continent_id in controlled_continent_ids(owned_mask))
         return continent_bonus  
 
     def calculate_additional_bonuses(
@@ -0,0 +1,52 @@
+"""
+Speculative prompts within a turn.
+
+A turn sends its prompts one after the other: strategy, card trades, troop
+placement, the attacks and fortify, so the time of a turn is the sum of
+their latencies. With GameConfig(speculative_prompts=True) the game master
+sends some of them before it knows it needs them:
+- the troop placement together with the strategy, when no card trade can
+  change the troops to place; the placement prompt does not show the
+  strategy,
+- the fortify move together with every attack move, on the board the turn
+  would end with if the player stops attacking.
+
+A speculative prompt is only used when the player later sends exactly the
+same prompt, i.e. the board, troops and strategy it shows did not change.
+Otherwise it is thrown away, its tokens are still counted in the prompt
+tokens of the player. Players in session mode do not speculate, their
+prompts are one conversation.
+"""
+import asyncio
+from typing import Tuple
+
+
+class SpeculativePrompt:
+    """
+    A prompt sent ahead of time.
+
+    Parameters:
+    - prompt_parts: The (prompt prefix, prompt) that was sent.
+    - task: The task awaiting the response.
+    """
+    def __init__(self, prompt_parts: Tuple[str, str],
+                 task: 'asyncio.Task[str]') -> None:
+        self.prompt_parts = prompt_parts
+        self.task = task
+        # A discarded request that failed must not warn that its
+        # exception was never retrieved
+        task.add_done_callback(
+            lambda done: done.cancelled() or done.exception())
+
+    def __repr__(self) -> str:
+        return f"<SpeculativePrompt(done={self.task.done()})>"
+
+    def matches(self, prompt_parts: Tuple[str, str]) -> bool:
+        return self.prompt_parts == prompt_parts
+
+    async def response(self) -> str:
+        return await self.task
+
+    def cancel(self) -> None:
+        self.task.cancel()
+
@@ -6,47 +6,89 @@ import json
 
 
 
-def create_game_folder(base_folder="game_results"):
-    timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
-    game_name = "game__" + timestamp
+def create_game_folder(base_folder="game_results", 
+                       game_name: Optional[str] = None):
+    if game_name is None:
+        timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+        game_name = "game__" + timestamp
     game_folder = os.path.join(base_folder, game_name)
     os.makedirs(game_folder, exist_ok=True)
     return game_folder
 
 
-def save_game_state(game_state: 'GameState', game_folder: str, 
-                    turn_number: int, game_round: int):
-    save_state = game_state.territories_df.copy()
+def turn_game_state(game_state: 'GameState', turn_number: int,
+                    game_round: int) -> pd.DataFrame:
+    # DataFrame view of the board arrays
+    save_state = game_state.territories_df
 
     save_state['Turn_Number'] = turn_number
     save_state['Game_Round'] = game_round
-    filename = os.path.join(game_folder, f"game_state_turn_{turn_number}.csv")
-    save_state.to_csv(filename, index=False)
+    return save_state
 
-def save_player_data(players: List['PlayerAgent'], game_folder: str,
-                      turn_number: int, game_round: int):
-    player_data = []
-    for player in players:
-        player_data.append({
-            "Name": player.name,
-            "Troops": player.troops,
-            "Troop Placement Errors": player.troop_placement_errors,
-            "Return Formatting Errors": player.return_formatting_errors,
-            "Attack Errors": player.attack_errors,
-            "Fortify Errors": player.fortify_errors,
-            "Card Trade Errors": player.card_trade_errors,
-            "Accumulated Turn Time": player.accumulated_turn_time
-        })
-    
-    df = pd.DataFrame(player_data)
+def save_turn_csv(data: pd.DataFrame, game_folder: str, kind: str,
+                  turn_number: int):
+    """Write game_state_turn_N.csv or player_data_turn_N.csv."""
+    filename = os.path.join(game_folder, f"{kind}_turn_{turn_number}.csv")
+    data.to_csv(filename, index=False)
+
+def save_game_state(game_state: 'GameState', game_folder: str, 
+                    turn_number: int, game_round: int):
+    save_turn_csv(turn_game_state(game_state, turn_number, game_round),
+                  game_folder, "game_state", turn_number)
+
+def player_record(player: 'PlayerAgent') -> dict:
+    """The counters of a player, a row of the player data."""
+    return {
+        "Name": player.name,
+        "Troops": player.troops,
+        "Troop Placement Errors": player.troop_placement_errors,
+        "Return Formatting Errors": player.return_formatting_errors,
+        "Attack Errors": player.attack_errors,
+        "Fortify Errors": player.fortify_errors,
+        "Card Trade Errors": player.card_trade_errors,
+        "Move Requests": player.move_requests,
+        "Move Retries": player.move_retries,
+        "Move Repairs": player.move_repairs,
+        "Speculative Prompts": player.speculative_prompts,
+        "Speculation Hits": player.speculation_hits,
+        "Accumulated Turn Time": player.accumulated_turn_time,
+        "LLM Calls": len(player.prompt_token_counts),
+        "Prompt Tokens": player.prompt_tokens,
+        "System Prompt Tokens": player.system_prompt_tokens,
+        "Static Prompt Tokens": player.static_prompt_tokens,
+        "Cached Prompt Tokens": player.prompt_cache_stats().get(
+            "cached_tokens", 0),
+        "Session Tokens Saved": player.session_tokens_saved
+    }
+
+def turn_player_data(players: List['PlayerAgent'], turn_number: int,
+                game_round: int) -> pd.DataFrame:
+    df = pd.DataFrame([player_record(player) for player in players])
     df['Turn_Number'] = turn_number
     df['Game_Round'] = game_round
-    filename = os.path.join(game_folder, f"player_data_turn_{turn_number}.csv")
-    df.to_csv(filename, index=False)
+    return df
+
+def save_player_data(players: List['PlayerAgent'], game_folder: str,
+                      turn_number: int, game_round: int):
+    save_turn_csv(turn_player_data(players, turn_number, game_round),
+                  game_folder, "player_data", turn_number)
+
+def prompt_cache_summary(player: 'PlayerAgent') -> dict:
+    """Prompt tokens the provider served from its prompt cache."""
+    stats = player.prompt_cache_stats()
+    prompt_tokens = stats.get("prompt_tokens", 0)
+    return {
+        **stats,
+        'hit_rate': (stats.get("cached_tokens", 0) / prompt_tokens 
+                     if prompt_tokens else 0.0)
+    }
 
 def save_end_game_results(players: List["PlayerAgent"], winner: Optional[str], 
                           victory_condition: Optional[str], game_round: int, 
-                          games_folder: str, game_state: 'GameState') -> None:
+                          games_folder: str, game_state: 'GameState',
+                          seed_sequence: Optional['SeedSequence'] = None,
+                          log_writer: Optional[dict] = None
+                          ) -> None:
     """
     Save the end game results to a JSON file.
 
@@ -56,6 +98,10 @@ def save_end_game_results(players: List["PlayerAgent"], winner: Optional[str],
     - victory_condition: The victory condition met (or None if no specific condition).
     - game_round: The number of rounds the game lasted.
     - games_folder: The folder where the results should be saved.
+    - seed_sequence: The seed of the game's random generator, recorded so 
+    the game can be replayed.
+    - log_writer: Counters of the writer of the game log, see 
+    utils/log_writer.py.
     """
 
     # Prepare the file path
@@ -72,7 +118,20 @@ def save_end_game_results(players: List["PlayerAgent"], winner: Optional[str],
             'return_formatting_errors': player.return_formatting_errors,
             'attack_errors': player.attack_errors,
             'fortify_errors': player.fortify_errors,
-            'card_trade_errors': player.card_trade_errors
+            'card_trade_errors': player.card_trade_errors,
+            'move_requests': player.move_requests,
+            'move_retries': player.move_retries,
+            'retry_rate': player.retry_rate,
+            'move_repairs': player.move_repairs,
+            'speculative_prompts': player.speculative_prompts,
+            'speculation_hits': player.speculation_hits,
+            'llm_calls': len(player.prompt_token_counts),
+            'prompt_tokens': player.prompt_tokens,
+            'system_prompt_tokens': player.system_prompt_tokens,
+            'static_prompt_tokens': player.static_prompt_tokens,
+            'prompt_cache': prompt_cache_summary(player),
+            'session_tokens_saved': player.session_tokens_saved,
+            'prompt_token_counts': player.prompt_token_counts
         })
     
     # Prepare the end-game data
@@ -82,6 +141,13 @@ def save_end_game_results(players: List["PlayerAgent"], winner: Optional[str],
         'total_rounds': game_round,
         'players': player_data
     }
+    if seed_sequence is not None:
+        end_game_data['seed'] = {
+            'entropy': seed_sequence.entropy,
+            'spawn_key': list(seed_sequence.spawn_key)
+        }
+    if log_writer is not None:
+        end_game_data['log_writer'] = log_writer
     
     # Write the data to a JSON file
     with open(end_game_file, 'w') as file:
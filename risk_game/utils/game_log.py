@@ -0,0 +1,696 @@
+"""
+Append-only log of a game.
+
+The game master used to write two CSV files after every turn, a copy of
+the board and the player table, so every game left hundreds of small
+files. GameLog writes one file per game instead and appends one record
+batch per turn:
+- turn_number, game_round,
+- owner: the player index of every territory (-1 without owner), in the
+  order of TERRITORIES,
+- troops: the troops of every territory,
+- players: one struct per player with the columns of the player CSV.
+The player names and the territories are stored in the schema metadata.
+
+Formats (GameConfig.game_log):
+- "arrow": Arrow IPC stream, game_log.arrows. Every batch is complete on
+  disk when the turn ends, a game that crashed can be read up to its last
+  turn.
+- "parquet": Parquet file with one row group per turn, game_log.parquet.
+  Only readable once the game has closed the log.
+- "events": the moves, see EventLog. Only the territories a move changed
+  are stored, as fixed size records appended to game_events.bin after
+  every turn. A keyframe of the board and the players is appended to the
+  Arrow IPC stream game_keyframes.arrows every keyframe_interval turns.
+- "csv": the per-turn CSV files of before, game_state_turn_N.csv and
+  player_data_turn_N.csv.
+
+While a game is logged its folder holds a recovery marker,
+game_log.recovery.json. It is removed when the game ends and the log is
+synced to disk. A game that crashed leaves it behind with status
+"crashed" and the number of turns logged, see read_recovery_marker.
+
+export_csv writes the CSV files of a logged game, read_game_log,
+game_state_frame and player_data_frame load it for analysis and board_at
+rebuilds the board of any turn from the events.
+"""
+import json
+import os
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+from risk_game.game_constants import TERRITORIES
+from risk_game.utils.game_admin import player_record, save_turn_csv, \
+turn_game_state, turn_player_data
+
+GAME_LOG_FORMATS = ("arrow", "parquet", "events", "csv")
+GAME_LOG_FILES: Dict[str, str] = {
+    "arrow": "game_log.arrows",
+    "parquet": "game_log.parquet",
+    "events": "game_events.bin",
+}
+KEYFRAME_FILE = "game_keyframes.arrows"
+EVENT_TYPES = ("placement", "attack", "conquest", "fortify", "card_trade",
+               "elimination", "turn_end", "keyframe")
+NO_TERRITORY: int = -1
+# An event on disk, 26 bytes. -1 stands for a missing territory, owner or
+# game round, the event is its index in EVENT_TYPES
+EVENT_RECORD = np.dtype([
+    ('seq', '<i4'), ('turn_number', '<i2'), ('game_round', '<i2'),
+    ('event', 'i1'), ('player', 'i1'), ('count', '<i4'),
+    ('territory', 'i1'), ('owner', 'i1'), ('troops', '<i4'),
+    ('from_territory', 'i1'), ('from_owner', 'i1'), ('from_troops', '<i4'),
+])
+RECOVERY_MARKER = "game_log.recovery.json"
+
+
+def game_log_path(game_folder: str) -> Optional[str]:
+    """The log file of a game folder, None for a game saved as CSV."""
+    for file_name in GAME_LOG_FILES.values():
+        path = os.path.join(game_folder, file_name)
+        if os.path.exists(path):
+            return path
+    return None
+
+
+def read_recovery_marker(game_folder: str) -> Optional[Dict[str, Any]]:
+    """
+    The recovery marker of a game folder: status "running" while the game
+    is logged or after it was killed, "crashed" after an error, with the
+    log format and the number of turns logged. None once the game ended.
+    """
+    path = os.path.join(game_folder, RECOVERY_MARKER)
+    if not os.path.exists(path):
+        return None
+    with open(path) as file:
+        return json.load(file)
+
+
+class GameLog:
+    """
+    Log of the turns of one game, see the module docstring.
+
+    Parameters:
+    - game_folder: Folder of the game, the log file is created in it.
+    - log_format: "arrow", "parquet" or "csv".
+    """
+    def __init__(self, game_folder: str, log_format: str = "arrow") -> None:
+        if log_format not in GAME_LOG_FORMATS:
+            raise ValueError(f"Unknown game log format: {log_format}. " +
+                             f"Please choose one of {GAME_LOG_FORMATS}.")
+        self.game_folder = game_folder
+        self.log_format = log_format
+        self.path: Optional[str] = (
+            os.path.join(game_folder, GAME_LOG_FILES[log_format])
+            if log_format in GAME_LOG_FILES else None)
+        # Created with the schema of the first turn
+        self.schema: Optional[pa.Schema] = None
+        self.writer: Any = None
+        self.turns = 0
+        # Seconds spent writing the log
+        self.write_time = 0.0
+
+    def __repr__(self) -> str:
+        return (f"<GameLog(format='{self.log_format}', turns={self.turns}, " +
+                f"path='{self.path or self.game_folder}')>")
+
+    def __enter__(self) -> 'GameLog':
+        self.write_recovery_marker("running")
+        return self
+
+    def __exit__(self, exc_type: Any, exc_value: Any, traceback: Any
+                 ) -> None:
+        self.close()
+        if exc_type is None:
+            self.sync()
+            os.remove(self.recovery_marker_path)
+        else:
+            self.write_recovery_marker("crashed", exc_value)
+            self.sync()
+
+    @property
+    def recovery_marker_path(self) -> str:
+        return os.path.join(self.game_folder, RECOVERY_MARKER)
+
+    def write_recovery_marker(self, status: str,
+                              error: Optional[BaseException] = None) -> None:
+        marker = {'status': status, 'log_format': self.log_format,
+                  'turns': self.turns}
+        if error is not None:
+            marker['error'] = repr(error)
+        with open(self.recovery_marker_path, 'w') as file:
+            json.dump(marker, file)
+
+    def sync(self) -> None:
+        """Flush the files of the game folder to disk, so they survive a
+        crash of the machine too."""
+        for file_name in os.listdir(self.game_folder):
+            path = os.path.join(self.game_folder, file_name)
+            if os.path.isfile(path):
+                with open(path, 'rb') as file:
+                    os.fsync(file.fileno())
+        if hasattr(os, 'O_DIRECTORY'):
+            folder = os.open(self.game_folder, os.O_RDONLY | os.O_DIRECTORY)
+            try:
+                os.fsync(folder)
+            finally:
+                os.close(folder)
+
+    def append_turn(self, game_state: 'GameState',
+                    players: List['PlayerAgent'], turn_number: int,
+                    game_round: int) -> None:
+        """Log the board and the players after a turn."""
+        self.write_turn(self.turn_snapshot(game_state, players, turn_number,
+                                           game_round))
+
+    def turn_snapshot(self, game_state: 'GameState',
+                      players: List['PlayerAgent'], turn_number: int,
+                      game_round: int) -> Dict[str, Any]:
+        """
+        Copy of what is logged of a turn. Taken in the game loop, so that
+        write_turn can run in another thread while the game goes on.
+        """
+        self.turns += 1
+        if self.log_format == "csv":
+            return {'turn_number': turn_number,
+                    'game_state': turn_game_state(game_state, turn_number,
+                                                  game_round),
+                    'player_data': turn_player_data(players, turn_number,
+                                                    game_round)}
+        return {'player_names': list(game_state.board.player_names),
+                'columns': snapshot_columns(game_state, players, turn_number,
+                                            game_round)}
+
+    def write_turn(self, snapshot: Dict[str, Any]) -> None:
+        start_time = time.monotonic()
+        if self.log_format == "csv":
+            for kind in ("game_state", "player_data"):
+                save_turn_csv(snapshot[kind], self.game_folder, kind,
+                              snapshot['turn_number'])
+        else:
+            columns = snapshot['columns']
+            if self.schema is None:
+                self.open(snapshot['player_names'], columns)
+            batch = snapshot_batch(self.schema, columns)
+            # A record batch of the stream, a row group of the Parquet file
+            self.writer.write_batch(batch)
+        self.write_time += time.monotonic() - start_time
+
+    def submit(self, function: Callable[..., Any], *args: Any) -> None:
+        """Write something else to the game folder, in order with the
+        turns, e.g. the end game results."""
+        function(*args)
+
+    def stats(self) -> Dict[str, Any]:
+        """Counters of the writes, the background writer adds its queue."""
+        return {'background': False, 'turns': self.turns,
+                'write_time': self.write_time, 'blocked_writes': 0,
+                'blocked_time': 0.0, 'max_queue_depth': 0}
+
+    def open(self, player_names: List[str],
+             columns: Dict[str, pa.Array]) -> None:
+        self.schema = snapshot_schema(player_names, columns)
+        self.open_writer()
+
+    def open_writer(self, path: Optional[str] = None) -> None:
+        path = path or self.path
+        if self.log_format == "parquet":
+            self.writer = pq.ParquetWriter(path, self.schema)
+        else:
+            self.writer = pa.ipc.new_stream(path, self.schema)
+
+    def logged_turns(self, turn_number: int) -> Optional[pa.Table]:
+        """The rows of the log file up to a turn, None without a readable
+        log file."""
+        if self.path is None or not os.path.exists(self.path):
+            return None
+        try:
+            table = read_game_log(self.path)
+        except (pa.ArrowInvalid, OSError):
+            # A Parquet file that was never closed
+            return None
+        return table.filter(pc.less_equal(table.column('turn_number'),
+                                          turn_number)).combine_chunks()
+
+    def resume(self, game_state: 'GameState', players: List['PlayerAgent'],
+               turn_number: int, game_round: int) -> None:
+        """
+        Continue the log of a game resumed after turn_number, see
+        checkpoint.py. The turns logged after it are dropped and the turn
+        itself is logged if it is missing.
+        """
+        last_turn = -1
+        if self.log_format == "csv":
+            for file_name in os.listdir(self.game_folder):
+                for kind in ("game_state", "player_data"):
+                    prefix = f"{kind}_turn_"
+                    if not (file_name.startswith(prefix) and
+                            file_name.endswith(".csv")):
+                        continue
+                    logged_turn = int(file_name[len(prefix):-len(".csv")])
+                    if logged_turn > turn_number:
+                        os.remove(os.path.join(self.game_folder, file_name))
+                    elif kind == "game_state":
+                        self.turns += 1
+                        last_turn = max(last_turn, logged_turn)
+        else:
+            table = self.logged_turns(turn_number)
+            if table is not None and table.num_rows:
+                self.schema = table.schema
+                # The old log is only replaced once the kept turns are
+                # written, the writer goes on in the renamed file
+                temporary_path = self.path + ".tmp"
+                self.open_writer(temporary_path)
+                if self.log_format == "parquet":
+                    self.writer.write_table(table, row_group_size=1)
+                else:
+                    self.writer.write_table(table, max_chunksize=1)
+                os.replace(temporary_path, self.path)
+                self.turns = table.num_rows
+                last_turn = table.column('turn_number')[-1].as_py()
+        if last_turn < turn_number:
+            self.append_turn(game_state, players, turn_number, game_round)
+
+    def record_event(self, event: str, player_name: str,
+                     territory: Optional[str] = None,
+                     from_territory: Optional[str] = None,
+                     count: int = 0) -> None:
+        """Only the event log records the moves of a turn."""
+        pass
+
+    def close(self) -> None:
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+
+
+def snapshot_columns(game_state: 'GameState', players: List['PlayerAgent'],
+                     turn_number: int, game_round: int
+                     ) -> Dict[str, pa.Array]:
+    """The row of the board and the players after a turn."""
+    board = game_state.board
+    return {
+        'turn_number': pa.array([turn_number], pa.int32()),
+        'game_round': pa.array([game_round], pa.int32()),
+        'owner': pa.FixedSizeListArray.from_arrays(
+            pa.array(board.owner.copy(), pa.int8()), len(TERRITORIES)),
+        'troops': pa.FixedSizeListArray.from_arrays(
+            pa.array(board.troops.copy(), pa.int32()), len(TERRITORIES)),
+        'players': pa.array([[player_record(player) for player in players]]),
+    }
+
+
+def snapshot_schema(player_names: List[str], columns: Dict[str, pa.Array],
+                    **metadata: str) -> pa.Schema:
+    return pa.schema(
+        [pa.field(name, column.type) for name, column in columns.items()],
+        metadata={'players': json.dumps(player_names),
+                  'territories': json.dumps(list(TERRITORIES)), **metadata})
+
+
+def snapshot_batch(schema: pa.Schema, columns: Dict[str, pa.Array]
+    ) -> pa.RecordBatch:
+    return pa.RecordBatch.from_arrays(
+        [columns[field.name].cast(field.type) for field in schema],
+        schema=schema)
+
+
+class EventLog(GameLog):
+    """
+    Log of the moves of a game. Every move is an event with a sequence
+    number and the owner and troops, after the move, of the territory it
+    went to and the territory it came from:
+    - placement: troops (count) placed on territory,
+    - attack: attack of territory from from_territory with count troops,
+    - conquest: territory taken with count troops, after its attack,
+    - fortify: count troops moved from from_territory to territory,
+    - card_trade: cards traded for count troops,
+    - elimination: player eliminated.
+    The end of every turn is a turn_end event, or every keyframe_interval
+    turns a keyframe event. The events of a turn are appended to 
+    game_events.bin as EVENT_RECORD rows when the turn ends, a game that
+    crashed keeps every turn it logged. The board and the players of a
+    keyframe are a row of the keyframe stream, game_keyframes.arrows, with
+    the sequence number of its event. A record batch of an Arrow stream 
+    costs more than the events of a turn, so only the keyframes are one.
+    read_game_log joins the two files.
+
+    Parameters:
+    - game_folder: Folder of the game, the log files are created in it.
+    - keyframe_interval: Turns between two keyframes, turn 0 is one.
+    """
+    def __init__(self, game_folder: str, keyframe_interval: int = 10) -> None:
+        if keyframe_interval < 1:
+            raise ValueError("The keyframe interval must be at least 1")
+        super().__init__(game_folder, "events")
+        self.keyframe_interval = keyframe_interval
+        self.keyframe_path = os.path.join(game_folder, KEYFRAME_FILE)
+        self.events_file: Any = None
+        self.game_state: Optional['GameState'] = None
+        # Events of the turn being played
+        self.events: List[Dict[str, Any]] = []
+        self.sequence_number = 0
+        # The next logged turn is a keyframe, after a gap in the events
+        self.keyframe_due = False
+        # Turn of the events recorded, the one after the last logged turn
+        self.turn_number = 0
+
+    def record_event(self, event: str, player_name: str,
+                     territory: Optional[str] = None,
+                     from_territory: Optional[str] = None,
+                     count: int = 0) -> None:
+        if self.game_state is None:
+            # Moves before the first turn, e.g. the initial placement, are
+            # in the first keyframe
+            return
+        board = self.game_state.board
+        row = self.event_row(event, board.player_id(player_name), count)
+        for prefix, name in (('', territory), ('from_', from_territory)):
+            territory_id = board.territory_id(name)
+            if territory_id is not None:
+                row[prefix + 'territory'] = territory_id
+                row[prefix + 'owner'] = int(board.owner[territory_id])
+                row[prefix + 'troops'] = int(board.troops[territory_id])
+        self.events.append(row)
+
+    def event_row(self, event: str, player_id: int, count: int = 0
+        ) -> Dict[str, Any]:
+        self.sequence_number += 1
+        return {'seq': self.sequence_number, 'turn_number': self.turn_number,
+                'game_round': -1, 'event': EVENT_TYPES.index(event),
+                'player': player_id, 'count': count,
+                'territory': NO_TERRITORY, 'owner': -1, 'troops': 0,
+                'from_territory': NO_TERRITORY, 'from_owner': -1,
+                'from_troops': 0}
+
+    def turn_snapshot(self, game_state: 'GameState',
+                      players: List['PlayerAgent'], turn_number: int,
+                      game_round: int) -> Dict[str, Any]:
+        self.turns += 1
+        self.game_state = game_state
+        self.turn_number = turn_number
+        keyframe = None
+        if turn_number % self.keyframe_interval == 0 or self.keyframe_due:
+            self.keyframe_due = False
+            row = self.event_row("keyframe", NO_TERRITORY)
+            keyframe = {'seq': pa.array([row['seq']], pa.int32()),
+                        **snapshot_columns(game_state, players, turn_number,
+                                           game_round)}
+            if self.schema is None:
+                self.schema = snapshot_schema(
+                    list(game_state.board.player_names), keyframe,
+                    keyframe_interval=str(self.keyframe_interval))
+        else:
+            row = self.event_row("turn_end", NO_TERRITORY)
+        row['game_round'] = game_round
+        self.events.append(row)
+        events, self.events = self.events, []
+        # Events from here on belong to the next turn
+        self.turn_number = turn_number + 1
+        return {'events': events, 'keyframe': keyframe}
+
+    def write_turn(self, snapshot: Dict[str, Any]) -> None:
+        start_time = time.monotonic()
+        if self.events_file is None:
+            self.open_writer()
+        # The keyframe first, its event is only read with it
+        if snapshot['keyframe'] is not None:
+            self.writer.write_batch(snapshot_batch(self.schema,
+                                                   snapshot['keyframe']))
+        records = np.array(
+            [tuple(event[name] for name in EVENT_RECORD.names)
+             for event in snapshot['events']], dtype=EVENT_RECORD)
+        self.events_file.write(records.tobytes())
+        self.events_file.flush()
+        self.write_time += time.monotonic() - start_time
+
+    def open_writer(self, mode: str = 'wb',
+                    keyframe_path: Optional[str] = None) -> None:
+        self.events_file = open(self.path, mode)
+        self.writer = pa.ipc.new_stream(keyframe_path or self.keyframe_path,
+                                        self.schema)
+
+    def resume(self, game_state: 'GameState', players: List['PlayerAgent'],
+               turn_number: int, game_round: int) -> None:
+        """
+        Continue the log of a game resumed after turn_number. The events
+        file is cut after the turn and the keyframes after it are dropped.
+        A game that was killed while writing may have lost the end of 
+        turn_number, it is then logged again as a keyframe.
+        """
+        self.game_state = game_state
+        table = self.logged_turns(turn_number)
+        ended = False
+        if table is not None and table.num_rows:
+            # The events are in the order of the turns, the kept ones
+            # start the file
+            os.truncate(self.path, table.num_rows * EVENT_RECORD.itemsize)
+            keyframes = read_game_log(self.keyframe_path)
+            keyframes = keyframes.filter(pc.less_equal(
+                keyframes.column('turn_number'), turn_number))
+            self.schema = keyframes.schema
+            # Keyframes after the kept events are never read, so the
+            # keyframes are replaced after the events file is cut
+            temporary_path = self.keyframe_path + ".tmp"
+            self.open_writer('ab', temporary_path)
+            self.writer.write_table(keyframes, max_chunksize=1)
+            os.replace(temporary_path, self.keyframe_path)
+            self.sequence_number = pc.max(table.column('seq')).as_py()
+            turn_ends = table.filter(pc.is_in(
+                table.column('event').cast(pa.string()),
+                pa.array(["turn_end", "keyframe"])))
+            self.turns = turn_ends.num_rows
+            ended = (turn_ends.num_rows > 0 and turn_ends.column(
+                'turn_number')[-1].as_py() == turn_number)
+        if not ended:
+            self.keyframe_due = True
+            self.write_turn(self.turn_snapshot(game_state, players,
+                                               turn_number, game_round))
+        self.turn_number = turn_number + 1
+
+    def close(self) -> None:
+        if self.events_file is not None:
+            self.events_file.close()
+            self.events_file = None
+        super().close()
+
+
+def open_game_log(game_folder: str, log_format: str = "arrow",
+                  keyframe_interval: int = 10) -> GameLog:
+    """The log of a game in one of GAME_LOG_FORMATS."""
+    if log_format == "events":
+        return EventLog(game_folder, keyframe_interval)
+    return GameLog(game_folder, log_format)
+
+
+def read_game_log(path: str) -> pa.Table:
+    """
+    The turns of a game log. Of an Arrow log that was not closed, e.g.
+    after a crash, the turns written completely. An event log is read with
+    its keyframes, see read_event_log.
+    """
+    if path.endswith(".parquet"):
+        return pq.read_table(path)
+    if os.path.basename(path) == GAME_LOG_FILES["events"]:
+        return read_event_log(path)
+    batches = []
+    with pa.OSFile(path) as source:
+        reader = pa.ipc.open_stream(source)
+        while True:
+            try:
+                batches.append(reader.read_next_batch())
+            except StopIteration:
+                break
+            except (pa.ArrowInvalid, OSError):
+                # The last batch was cut off
+                break
+        return pa.Table.from_batches(batches, schema=reader.schema)
+
+
+def read_event_log(path: str) -> pa.Table:
+    """
+    The events of an event log, with the board (board_owner, board_troops)
+    and the players of the keyframe in the rows of the keyframe events.
+    The missing values of the records are nulls.
+    """
+    with open(path, 'rb') as file:
+        data = file.read()
+    # A record cut off by a crash is dropped
+    records = np.frombuffer(
+        data, dtype=EVENT_RECORD,
+        count=len(data) // EVENT_RECORD.itemsize)
+    keyframes = read_game_log(os.path.join(os.path.dirname(path),
+                                           KEYFRAME_FILE))
+
+    def column(name: str, arrow_type: pa.DataType,
+               missing: Optional[np.ndarray] = None) -> pa.Array:
+        return pa.array(records[name], arrow_type, mask=missing)
+
+    columns = {
+        'seq': column('seq', pa.int64()),
+        'turn_number': column('turn_number', pa.int32()),
+        'game_round': column('game_round', pa.int32(),
+                             records['game_round'] < 0),
+        'event': pa.DictionaryArray.from_arrays(
+            pa.array(records['event'], pa.int8()), pa.array(EVENT_TYPES)),
+        'player': column('player', pa.int8()),
+        'count': column('count', pa.int32()),
+    }
+    for prefix in ('', 'from_'):
+        missing = records[prefix + 'territory'] == NO_TERRITORY
+        columns[prefix + 'territory'] = column(prefix + 'territory', pa.int8())
+        columns[prefix + 'owner'] = column(prefix + 'owner', pa.int8(), missing)
+        columns[prefix + 'troops'] = column(prefix + 'troops', pa.int32(),
+                                            missing)
+    # Row of the keyframe of every event, null for the other events
+    keyframe_rows = pc.index_in(columns['seq'],
+                                keyframes.column('seq').cast(pa.int64()))
+    for name, keyframe_name in (('board_owner', 'owner'),
+                                ('board_troops', 'troops'),
+                                ('players', 'players')):
+        columns[name] = keyframes.column(keyframe_name).take(keyframe_rows)
+    return pa.table(columns).replace_schema_metadata(keyframes.schema.metadata)
+
+
+def log_metadata(table: pa.Table) -> Dict[str, List[str]]:
+    metadata = table.schema.metadata
+    return {key: json.loads(metadata[key.encode()])
+            for key in ('players', 'territories')}
+
+
+def is_event_log(table: pa.Table) -> bool:
+    return 'event' in table.column_names
+
+
+class EventColumns:
+    """The columns of an event log as numpy arrays, for board_at."""
+    def __init__(self, table: pa.Table) -> None:
+        def column(name: str, fill: int = NO_TERRITORY) -> np.ndarray:
+            return table.column(name).combine_chunks().fill_null(
+                fill).to_numpy()
+        self.table = table
+        self.seq = column('seq')
+        self.turn_number = column('turn_number')
+        self.event = np.array(table.column('event').combine_chunks(
+            ).cast(pa.string()).to_pylist())
+        self.territory = column('territory')
+        self.owner = column('owner')
+        self.troops = column('troops', 0)
+        self.from_territory = column('from_territory')
+        self.from_owner = column('from_owner')
+        self.from_troops = column('from_troops', 0)
+        self.keyframes = np.flatnonzero(self.event == "keyframe")
+        self.turn_ends = np.flatnonzero(
+            (self.event == "keyframe") | (self.event == "turn_end"))
+
+
+def board_at(table: pa.Table, turn_number: int,
+             columns: Optional[EventColumns] = None
+             ) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Owner (player index, -1 without owner) and troops of every territory
+    after a turn of an event log: the last keyframe before the turn with
+    the changes of the later events applied.
+    """
+    columns = columns if columns is not None else EventColumns(table)
+    keyframes = columns.keyframes[
+        columns.turn_number[columns.keyframes] <= turn_number]
+    if len(keyframes) == 0:
+        raise ValueError(f"No keyframe before turn {turn_number}")
+    keyframe = keyframes[-1]
+    owner = np.array(table.column('board_owner')[int(keyframe)].as_py(),
+                     dtype=np.int8)
+    troops = np.array(table.column('board_troops')[int(keyframe)].as_py(),
+                      dtype=np.int32)
+
+    rows = np.flatnonzero((columns.seq > columns.seq[keyframe]) &
+                          (columns.turn_number <= turn_number))
+    # Every event changed its from_territory and its territory, the last
+    # change of a territory wins
+    territory_ids = np.column_stack(
+        [columns.from_territory[rows], columns.territory[rows]]).ravel()
+    owners = np.column_stack(
+        [columns.from_owner[rows], columns.owner[rows]]).ravel()
+    territory_troops = np.column_stack(
+        [columns.from_troops[rows], columns.troops[rows]]).ravel()
+    changed = territory_ids != NO_TERRITORY
+    territory_ids = territory_ids[changed]
+    unique_ids, last_from_end = np.unique(territory_ids[::-1],
+                                          return_index=True)
+    last = len(territory_ids) - 1 - last_from_end
+    owner[unique_ids] = owners[changed][last]
+    troops[unique_ids] = territory_troops[changed][last]
+    return owner, troops
+
+
+def game_state_frame(table: pa.Table) -> pd.DataFrame:
+    """The board after every turn in the layout of the game state CSV
+    files: Territory, one troop column per player, Turn_Number and
+    Game_Round."""
+    metadata = log_metadata(table)
+    num_territories = len(metadata['territories'])
+    if is_event_log(table):
+        columns = EventColumns(table)
+        turns = table.take(columns.turn_ends)
+        boards = [board_at(table, turn_number, columns) for turn_number in
+                  turns.column('turn_number').to_pylist()]
+        owner = np.array([board_owner for board_owner, _ in boards])
+        troops = np.array([board_troops for _, board_troops in boards])
+    else:
+        turns = table
+        owner = table.column('owner').combine_chunks().flatten().to_numpy(
+            ).reshape(table.num_rows, num_territories)
+        troops = table.column('troops').combine_chunks().flatten().to_numpy(
+            ).reshape(table.num_rows, num_territories)
+    num_turns = turns.num_rows
+    frame = pd.DataFrame({
+        'Territory': np.tile(metadata['territories'], num_turns)})
+    for player_id, name in enumerate(metadata['players']):
+        frame[name] = np.where(owner == player_id,
+                               troops.astype(np.int64), 0).ravel()
+    frame['Turn_Number'] = np.repeat(
+        turns.column('turn_number').to_numpy(), num_territories)
+    frame['Game_Round'] = np.repeat(
+        turns.column('game_round').to_numpy(), num_territories)
+    return frame
+
+
+def player_data_frame(table: pa.Table) -> pd.DataFrame:
+    """The players after every turn in the layout of the player data CSV
+    files. An event log only has them for the keyframes."""
+    rows = []
+    for turn in table.select(['turn_number', 'game_round', 'players']
+                             ).to_pylist():
+        for record in turn['players'] or []:
+            rows.append({**record, 'Turn_Number': turn['turn_number'],
+                         'Game_Round': turn['game_round']})
+    return pd.DataFrame(rows)
+
+
+def export_csv(game_folder: str) -> int:
+    """
+    Write the per-turn CSV files of a logged game to its folder.
+
+    Returns:
+    - The number of turns exported.
+    """
+    path = game_log_path(game_folder)
+    if path is None:
+        raise FileNotFoundError(f"No game log in {game_folder}")
+    table = read_game_log(path)
+    game_states = game_state_frame(table)
+    player_data = player_data_frame(table)
+    turns = game_states.groupby('Turn_Number', sort=False)
+    for turn_number, turn_state in turns:
+        turn_state.to_csv(os.path.join(
+            game_folder, f"game_state_turn_{turn_number}.csv"), index=False)
+        turn_players = player_data[player_data['Turn_Number'] == turn_number]
+        if len(turn_players):
+            turn_players.to_csv(os.path.join(
+                game_folder, f"player_data_turn_{turn_number}.csv"),
+                index=False)
+    return turns.ngroups
@@ -0,0 +1,140 @@
+"""
+Background writer of the game log.
+
+GameLog writes a turn in the game loop, so every turn waits for the disk,
+which adds up with many games on shared storage. LogWriter moves the
+writes to a thread: the game loop only takes a copy of the turn, see
+GameLog.turn_snapshot, and puts it in a bounded queue. The thread writes
+the turns in order, all the turns waiting in the queue at once.
+
+When the queue is full the game loop waits for the writer, the
+backpressure is counted in stats(): blocked_writes and blocked_time, with
+the deepest the queue got. The end game results go through the same
+queue, see submit.
+
+Closing the writer waits for the queue, closes the log and syncs the game
+folder to disk, also when the game raised an error, which is recorded in
+the recovery marker of the log. An error of the writer is raised in the
+game loop at the next turn. In an event loop, the game master waits for a
+full queue and closes the writer in a worker thread, so the other games 
+of the loop keep playing, see GameMaster.write_log.
+"""
+import queue
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+from risk_game.utils.game_log import GameLog
+
+# Turns the writer may fall behind before the game waits for it
+MAX_PENDING_WRITES: int = 8
+
+
+class LogWriter:
+    """
+    Writes a game log in a background thread, see the module docstring.
+    Has the methods of GameLog the game master uses.
+
+    Parameters:
+    - game_log: The log to write.
+    - max_pending: Size of the queue of turns to write.
+    """
+    def __init__(self, game_log: GameLog,
+                 max_pending: int = MAX_PENDING_WRITES) -> None:
+        self.game_log = game_log
+        self.queue: 'queue.Queue[Optional[Callable[[], Any]]]' = queue.Queue(
+            maxsize=max_pending)
+        self.thread = threading.Thread(target=self.run, daemon=True,
+                                       name="log-writer")
+        self.error: Optional[BaseException] = None
+        # Backpressure on the game loop
+        self.blocked_writes = 0
+        self.blocked_time = 0.0
+        self.max_queue_depth = 0
+        # Times the writer found turns waiting and wrote them together
+        self.batches = 0
+
+    def __repr__(self) -> str:
+        return (f"<LogWriter(format='{self.game_log.log_format}', " +
+                f"pending={self.queue.qsize()}, " +
+                f"blocked_writes={self.blocked_writes})>")
+
+    def __enter__(self) -> 'LogWriter':
+        self.game_log.__enter__()
+        self.thread.start()
+        return self
+
+    def __exit__(self, exc_type: Any, exc_value: Any, traceback: Any
+                 ) -> None:
+        self.stop()
+        if exc_type is None and self.error is not None:
+            self.game_log.__exit__(type(self.error), self.error, None)
+            raise self.error
+        self.game_log.__exit__(exc_type, exc_value, traceback)
+
+    def run(self) -> None:
+        stopped = False
+        while not stopped:
+            jobs: List[Optional[Callable[[], Any]]] = [self.queue.get()]
+            while True:
+                try:
+                    jobs.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            self.batches += 1
+            for job in jobs:
+                if job is None:
+                    stopped = True
+                elif self.error is None:
+                    # After an error the queue is still emptied, so the
+                    # game loop never waits for a writer that stopped
+                    try:
+                        job()
+                    except Exception as error:
+                        self.error = error
+
+    def full(self) -> bool:
+        """Whether the next write waits for the writer."""
+        return self.queue.full()
+
+    def put(self, job: Optional[Callable[[], Any]]) -> None:
+        if self.error is not None:
+            raise self.error
+        try:
+            self.queue.put_nowait(job)
+        except queue.Full:
+            self.blocked_writes += 1
+            start_time = time.monotonic()
+            self.queue.put(job)
+            self.blocked_time += time.monotonic() - start_time
+        self.max_queue_depth = max(self.max_queue_depth, self.queue.qsize())
+
+    def append_turn(self, game_state: 'GameState',
+                    players: List['PlayerAgent'], turn_number: int,
+                    game_round: int) -> None:
+        snapshot = self.game_log.turn_snapshot(game_state, players,
+                                               turn_number, game_round)
+        self.put(lambda: self.game_log.write_turn(snapshot))
+
+    def record_event(self, *args: Any, **kwargs: Any) -> None:
+        # Events are kept in memory until the turn is logged
+        self.game_log.record_event(*args, **kwargs)
+
+    def resume(self, *args: Any) -> None:
+        # Only called before the first turn is queued, in the game loop
+        self.game_log.resume(*args)
+
+    def submit(self, function: Callable[..., Any], *args: Any) -> None:
+        self.put(lambda: function(*args))
+
+    def stop(self) -> None:
+        """Wait until everything in the queue is written."""
+        if self.thread.is_alive():
+            self.queue.put(None)
+            self.thread.join()
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self.game_log.stats(), 'background': True,
+                'blocked_writes': self.blocked_writes,
+                'blocked_time': self.blocked_time,
+                'max_queue_depth': self.max_queue_depth,
+                'batches': self.batches}
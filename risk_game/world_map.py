@@ -0,0 +1,106 @@
+"""
+Compiled form of the map in game_constants.
+
+Territories and continents are turned into integer ids when the module is
+imported. Adjacency is stored both as CSR arrays (ADJACENCY_INDPTR and
+ADJACENCY_INDICES) and as one 64-bit neighbour mask per territory, where
+bit i is set when territory i is adjacent. Together with a per-player
+ownership mask, questions like "which neighbours of X are enemy
+territories" are a single AND.
+"""
+import numpy as np
+from typing import Dict, Iterable, List
+from risk_game.game_constants import TERRITORIES, TERRITORY_CONNECTIONS, \
+CONTINENT_BONUSES
+
+# Integer id of every territory, in the order of TERRITORIES
+TERRITORY_IDS: Dict[str, int] = {
+    territory: territory_id for territory_id, territory in enumerate(TERRITORIES)
+}
+NUM_TERRITORIES: int = len(TERRITORIES)
+ALL_TERRITORIES_MASK: int = (1 << NUM_TERRITORIES) - 1
+
+
+def _compile_adjacency():
+    indptr = np.zeros(NUM_TERRITORIES + 1, dtype=np.int32)
+    indices = []
+    neighbour_masks = []
+    for territory_id, territory in enumerate(TERRITORIES):
+        neighbour_ids = sorted(
+            TERRITORY_IDS[neighbour] for neighbour in TERRITORY_CONNECTIONS[territory])
+        indices.extend(neighbour_ids)
+        indptr[territory_id + 1] = len(indices)
+        neighbour_masks.append(sum(1 << neighbour_id for neighbour_id in neighbour_ids))
+    return indptr, np.array(indices, dtype=np.int32), neighbour_masks
+
+
+ADJACENCY_INDPTR, ADJACENCY_INDICES, NEIGHBOUR_MASKS = _compile_adjacency()
+
+# Continents in the order of CONTINENT_BONUSES
+CONTINENTS: List[str] = list(CONTINENT_BONUSES)
+CONTINENT_IDS: Dict[str, int] = {
+    continent: continent_id for continent_id, continent in enumerate(CONTINENTS)
+}
+CONTINENT_MASKS: List[int] = [
+    sum(1 << TERRITORY_IDS[territory] for territory in territories)
+    for territories, _ in CONTINENT_BONUSES.values()
+]
+CONTINENT_BONUS_VALUES: List[int] = [
+    bonus for _, bonus in CONTINENT_BONUSES.values()
+]
+# Continent id of every territory
+TERRITORY_CONTINENT: np.ndarray = np.array([
+    next(continent_id for continent_id, continent_mask in enumerate(CONTINENT_MASKS)
+         if continent_mask >> territory_id & 1)
+    for territory_id in range(NUM_TERRITORIES)
+], dtype=np.int8)
+
+
+def neighbour_ids(territory_id: int) -> np.ndarray:
+    """Ids of the territories adjacent to a territory."""
+    return ADJACENCY_INDICES[
+        ADJACENCY_INDPTR[territory_id]:ADJACENCY_INDPTR[territory_id + 1]]
+
+
+def territory_mask(territories: Iterable[str]) -> int:
+    """Bitmask of a collection of territory names, unknown names are ignored."""
+    mask = 0
+    for territory in territories:
+        territory_id = TERRITORY_IDS.get(territory)
+        if territory_id is not None:
+            mask |= 1 << territory_id
+    return mask
+
+
+def mask_to_ids(mask: int) -> List[int]:
+    """Territory ids of the set bits of a mask, in increasing order."""
+    territory_ids = []
+    while mask:
+        lowest_bit = mask & -mask
+        territory_ids.append(lowest_bit.bit_length() - 1)
+        mask ^= lowest_bit
+    return territory_ids
+
+
+def mask_to_territories(mask: int) -> List[str]:
+    return [TERRITORIES[territory_id] for territory_id in mask_to_ids(mask)]
+
+
+def controlled_continent_ids(owned_mask: int) -> List[int]:
+    """Ids of the continents that are completely covered by a mask."""
+    return [continent_id for continent_id, continent_mask in enumerate(CONTINENT_MASKS)
+            if owned_mask & continent_mask == continent_mask]
+
+
+def flood_fill(territory_id: int, allowed_mask: int) -> int:
+    """Mask of the territories reachable from a territory by only moving
+    through territories in allowed_mask. The start territory is included."""
+    component_mask = 1 << territory_id
+    frontier_mask = component_mask
+    while frontier_mask:
+        reachable_mask = 0
+        for frontier_id in mask_to_ids(frontier_mask):
+            reachable_mask |= NEIGHBOUR_MASKS[frontier_id]
+        frontier_mask = reachable_mask & allowed_mask & ~component_mask
+        component_mask |= frontier_mask
+    return component_mask
@@ -0,0 +1,102 @@
+import asyncio
+import json
+import os
+import pytest
+from risk_game.experiments import Experiment
+from risk_game.game_config import GameConfig
+from risk_game.llm_clients.batch_client import BatchCollector, \
+BatchLLMClient, BatchRequestError, LocalBatchExecutor, batch_request, \
+read_batch_results
+from risk_game.player_agent import PlayerAgent
+from tests.test_local_client import make_game_state
+
+
+def test_batch_experiment_plays_games_in_lockstep(tmp_path):
+    experiment = Experiment(GameConfig(max_rounds=20), agent_mix=2,
+                            num_games=3, seed=11)
+    manifest = asyncio.run(experiment.run_experiment_batch(
+        executor=LocalBatchExecutor(seed=0), base_folder=str(tmp_path)))
+
+    assert manifest['completed'] == 3
+    assert manifest['batch_requests'] > 0
+    # The requests of the three games go out together
+    assert manifest['batches'] < manifest['batch_requests'] / 2
+    batch_folder = os.path.join(
+        os.path.dirname(manifest['games'][0]['folder']), "batches")
+    requests = []
+    for batch_file in os.listdir(batch_folder):
+        if batch_file.startswith("batch_00001_") and "_results" not in batch_file:
+            with open(os.path.join(batch_folder, batch_file)) as file:
+                lines = [json.loads(line) for line in file]
+            # One file per model
+            assert batch_file == ("batch_00001_Local_" +
+                                  lines[0]['body']['model'] + ".jsonl")
+            requests += lines
+    # The first batch holds the first request of every game
+    assert len(requests) == 3
+    assert all(request['url'] == "/v1/chat/completions" for request in requests)
+
+
+def test_openai_experiment_runs_offline_on_the_local_executor(tmp_path):
+    experiment = Experiment(GameConfig(max_rounds=10), agent_mix=3,
+                            num_games=2, seed=5)
+    manifest = asyncio.run(experiment.run_experiment_batch(
+        executor=LocalBatchExecutor(seed=0), base_folder=str(tmp_path)))
+
+    assert manifest['completed'] == 2
+    batch_files = os.listdir(os.path.join(
+        os.path.dirname(manifest['games'][0]['folder']), "batches"))
+    gpt_4o_batches = [batch_file for batch_file in batch_files
+                      if batch_file.endswith("_OpenAI_gpt-4o.jsonl")]
+    assert gpt_4o_batches
+    assert all(batch_file.replace(".jsonl", "_results.jsonl") in batch_files
+               for batch_file in gpt_4o_batches)
+
+
+def test_anthropic_batch_files_round_trip(tmp_path):
+    game = make_game_state()
+    prompt_prefix, prompt = PlayerAgent("Player 1", None).attack_prompt_parts(
+        game.rules, game.game_state, 0)
+    batch_file = str(tmp_path / "batch.jsonl")
+    with open(batch_file, "w") as file:
+        for custom_id in ("request-1", "request-2"):
+            request = batch_request("Anthropic", custom_id,
+                                    "claude-3-5-sonnet-20240620", 1000, 0,
+                                    prompt, prompt_prefix=prompt_prefix)
+            file.write(json.dumps(request) + "\n")
+    prefix_block = request['params']['messages'][-1]['content'][0]
+    assert prefix_block['cache_control'] == {"type": "ephemeral"}
+
+    results_file = LocalBatchExecutor(seed=0).run(batch_file, "anthropic",
+                                                  "Anthropic")
+    results = read_batch_results(results_file, "anthropic")
+    assert set(results) == {"request-1", "request-2"}
+    assert all("|||" in result['content'] for result in results.values())
+    # The second request reads the prefix the first one cached
+    assert results['request-1']['cache_write_tokens'] > 0
+    assert results['request-2']['cached_tokens'] > 0
+
+
+def test_failed_batch_requests_are_submitted_again(tmp_path):
+    executor = LocalBatchExecutor(profile={
+        "median_latency": 0.0, "latency_sigma": 0.0, "error_rate": 0.5,
+        "rate_limit_rate": 0.0, "malformed_rate": 0.0}, seed=0)
+    collector = BatchCollector(executor, str(tmp_path))
+    client = BatchLLMClient("Local", 1, collector)
+    client.max_retries = 20
+    game = make_game_state()
+    prompt = PlayerAgent("Player 1", None).attack_prompt(
+        game.rules, game.game_state, 0)
+
+    async def send_all():
+        return await asyncio.gather(
+            *(client.get_chat_completion(prompt) for _ in range(10)))
+
+    assert all("|||" in response for response in asyncio.run(send_all()))
+    assert collector.failed_requests > 0
+    assert collector.batches > 1
+
+    client.max_retries = 1
+    executor.model.profile["error_rate"] = 1.0
+    with pytest.raises(BatchRequestError):
+        asyncio.run(client.get_chat_completion(prompt))
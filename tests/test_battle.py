@@ -0,0 +1,66 @@
+import numpy as np
+from risk_game.battle import attack_odds, battle_outcome_table, \
+resolve_battle, simulate_battles, win_probability_table, \
+expected_losses_table
+from risk_game.game_config import GameConfig
+from risk_game.game_state import GameState
+from risk_game.player_agent import PlayerAgent
+from risk_game.rules import Rules
+
+
+def test_outcome_table_is_exact():
+    table = battle_outcome_table(10)
+    assert np.allclose(table[1:, 1:].sum(axis=2), 1.0)
+    # One die against one die: the attacker needs a strictly higher roll
+    assert np.isclose(table[1, 1, 1], 15 / 36)
+    assert np.isclose(table[1, 1, 10 + 1], 21 / 36)
+
+
+def test_table_engine_matches_dice_engine():
+    players = [PlayerAgent("Player 1", None), PlayerAgent("Player 2", None)]
+    game_state = GameState(players, Rules(GameConfig(battle_engine="dice")),
+                           rng=np.random.default_rng(0))
+    rng = np.random.default_rng(1)
+    num_battles = 20000
+
+    for attackers, defenders in [(3, 2), (7, 5)]:
+        dice_wins = sum(
+            game_state.simulate_attack(attackers, defenders)[0] == 'attacker'
+            for _ in range(num_battles))
+        table_wins = sum(
+            resolve_battle(attackers, defenders, rng)[0] == 'attacker'
+            for _ in range(num_battles))
+        exact = battle_outcome_table()[attackers, defenders, 1:51].sum()
+        assert abs(dice_wins / num_battles - exact) < 0.015
+        assert abs(table_wins / num_battles - exact) < 0.015
+
+
+def test_battles_above_the_cap():
+    rng = np.random.default_rng(1)
+    for _ in range(200):
+        winner, troops = resolve_battle(60, 45, rng, cap=20)
+        assert (winner == 'attacker' and 1 <= troops <= 60) or (
+            winner == 'defender' and 1 <= troops <= 45)
+
+
+def test_batch_simulation_matches_tables():
+    rng = np.random.default_rng(2)
+    attacker_wins, survivors = simulate_battles(np.full(100000, 7), 5, rng)
+    assert abs(attacker_wins.mean() - win_probability_table(10, 10)[7, 5]) < 0.01
+
+    attacker_losses, defender_losses = expected_losses_table(10, 10)
+    simulated_attacker_losses = np.where(attacker_wins, 7 - survivors, 7)
+    simulated_defender_losses = np.where(attacker_wins, 5, 5 - survivors)
+    assert abs(simulated_attacker_losses.mean() - attacker_losses[7, 5]) < 0.05
+    assert abs(simulated_defender_losses.mean() - defender_losses[7, 5]) < 0.05
+
+
+def test_attack_odds_are_looked_up_once():
+    attacker_losses, defender_losses = expected_losses_table(50, 50)
+    assert attack_odds(10, 8) == (win_probability_table(50, 50)[10, 8],
+                                  attacker_losses[10, 8],
+                                  defender_losses[10, 8])
+    # Battles above the cap are simulated once and then remembered
+    estimate = attack_odds(80, 8)
+    assert attack_odds(80, 8) is estimate
+    assert 0.99 < estimate[0] <= 1.0 and estimate[2] == 8
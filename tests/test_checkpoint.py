@@ -0,0 +1,141 @@
+import os
+import pandas as pd
+import pytest
+from risk_game.checkpoint import CHECKPOINT_FILE, game_checkpoint, \
+load_checkpoint, restore_checkpoint, save_checkpoint
+from risk_game.experiments import Experiment
+from risk_game.game_config import GameConfig
+from risk_game.game_master import GameMaster
+from risk_game.llm_clients.llm_client import create_llm_client
+from risk_game.rules import Rules
+from risk_game.utils.game_log import GAME_LOG_FILES, game_state_frame, \
+player_data_frame, read_game_log, read_recovery_marker
+
+
+def make_bot_game(game_log):
+    game = GameMaster(Rules(GameConfig(max_rounds=8, game_log=game_log,
+                                       keyframe_interval=4)), seed=7)
+    for name, bot in (("Random", "Random"), ("Greedy", "GreedyBorder"),
+                      ("Continent", "Continent")):
+        game.add_bot(name, bot)
+    return game
+
+
+def crash_in_round(monkeypatch, game_round, crashes=1):
+    """Let the second player of a round raise, as after a provider outage."""
+    play_a_turn = GameMaster.play_a_turn
+    crashed = []
+    async def crashing_turn(self, player):
+        if (self.game_round == game_round and len(crashed) < crashes and
+                player is self.active_players[1]):
+            crashed.append(player.name)
+            raise RuntimeError("Provider outage")
+        await play_a_turn(self, player)
+    monkeypatch.setattr(GameMaster, "play_a_turn", crashing_turn)
+
+
+def log_frames(game_folder, game_log):
+    table = read_game_log(str(game_folder / GAME_LOG_FILES[game_log]))
+    player_data = player_data_frame(table).drop(
+        columns=['Accumulated Turn Time'])
+    return game_state_frame(table), player_data
+
+
+@pytest.mark.parametrize("game_log", ["arrow", "events"])
+def test_resumed_game_plays_like_the_uninterrupted_game(tmp_path, monkeypatch,
+                                                       game_log):
+    uninterrupted = make_bot_game(game_log)
+    uninterrupted.play_game(games_folder=str(tmp_path / "uninterrupted"))
+
+    crash_in_round(monkeypatch, 3)
+    with pytest.raises(RuntimeError):
+        make_bot_game(game_log).play_game(games_folder=str(tmp_path / "game"))
+    checkpoint = load_checkpoint(str(tmp_path / "game"))
+    assert checkpoint['game_round'] == 3 and checkpoint['player_index'] == 1
+    assert read_recovery_marker(str(tmp_path / "game"))['status'] == "crashed"
+
+    game = make_bot_game(game_log)
+    game.play_game(games_folder=str(tmp_path / "game"), resume=True)
+
+    assert game.winner.name == uninterrupted.winner.name
+    assert game.game_round == uninterrupted.game_round
+    assert (game.game_state.board.troops.tolist() ==
+            uninterrupted.game_state.board.troops.tolist())
+    for frame, uninterrupted_frame in zip(
+            log_frames(tmp_path / "game", game_log),
+            log_frames(tmp_path / "uninterrupted", game_log)):
+        pd.testing.assert_frame_equal(frame, uninterrupted_frame)
+    assert not os.path.exists(tmp_path / "game" / CHECKPOINT_FILE)
+    assert read_recovery_marker(str(tmp_path / "game")) is None
+
+
+@pytest.mark.parametrize("game_log", ["arrow", "parquet", "events"])
+def test_failed_resume_keeps_the_log(tmp_path, monkeypatch, game_log):
+    crash_in_round(monkeypatch, 3)
+    with pytest.raises(RuntimeError):
+        make_bot_game(game_log).play_game(games_folder=str(tmp_path / "game"))
+    logged_frames = log_frames(tmp_path / "game", game_log)
+
+    def failing_replace(source, destination):
+        raise OSError("Disk full")
+    monkeypatch.setattr(os, "replace", failing_replace)
+    with pytest.raises(OSError):
+        make_bot_game(game_log).play_game(games_folder=str(tmp_path / "game"),
+                                          resume=True)
+    for frame, logged_frame in zip(log_frames(tmp_path / "game", game_log),
+                                   logged_frames):
+        pd.testing.assert_frame_equal(frame, logged_frame)
+
+
+def test_experiment_resumes_interrupted_games(tmp_path, monkeypatch):
+    def run(base_folder, **kwargs):
+        experiment = Experiment(GameConfig(max_rounds=8), agent_mix=0,
+                                num_games=2, seed=11,
+                                max_resumes=kwargs.pop('max_resumes', 2))
+        return experiment.run_experiment(base_folder=str(base_folder),
+                                         **kwargs)
+    uninterrupted = run(tmp_path / "uninterrupted")
+
+    # Resumed within the run
+    crash_in_round(monkeypatch, 3)
+    manifest = run(tmp_path / "resumed")
+    assert manifest['completed'] == 2
+    assert [game['resumes'] for game in manifest['games']] == [1, 0]
+
+    # Left with a checkpoint, and continued by running the experiment again
+    crash_in_round(monkeypatch, 3, crashes=2)
+    manifest = run(tmp_path / "interrupted", max_resumes=0)
+    assert manifest['completed'] == 0
+    experiment_folder = os.path.dirname(manifest['games'][0]['folder'])
+    monkeypatch.undo()
+    manifest = run(tmp_path, experiment_folder=experiment_folder)
+    assert manifest['completed'] == 2
+
+    for game, uninterrupted_game in zip(manifest['games'],
+                                        uninterrupted['games']):
+        assert game['winner'] == uninterrupted_game['winner']
+        assert game['rounds'] == uninterrupted_game['rounds']
+
+
+def test_checkpoint_keeps_the_token_counters(tmp_path):
+    def make_llm_game():
+        game = GameMaster(Rules(GameConfig(max_rounds=4)), seed=7)
+        game.add_player("Local", create_llm_client("Local", 1, seed=0),
+                        session_mode=True)
+        game.add_bot("Random", "Random")
+        return game
+
+    game = make_llm_game()
+    game.init_game_state()
+    player = [player for player in game.players if player.name == "Local"][0]
+    player.session.session_tokens, player.session.stateless_tokens = 300, 500
+    player.llm_client.record_prompt_cache(1000, 900, 100)
+    save_checkpoint(str(tmp_path), game_checkpoint(game, 5, 0))
+
+    resumed = make_llm_game()
+    restore_checkpoint(resumed, load_checkpoint(str(tmp_path)))
+    resumed_player = [player for player in resumed.players
+                      if player.name == "Local"][0]
+    assert resumed_player.session_tokens_saved == 200
+    assert resumed_player.prompt_cache_stats() == {
+        "prompt_tokens": 1000, "cached_tokens": 900, "cache_write_tokens": 100}
@@ -0,0 +1,93 @@
+import asyncio
+import json
+import os
+from risk_game.experiments import Experiment
+from risk_game.game_config import GameConfig
+import risk_game.game_master as gm
+
+
+def test_parallel_experiment_writes_manifest(tmp_path):
+    experiment = Experiment(GameConfig(max_rounds=20), agent_mix=0,
+                            num_games=3, seed=11)
+    manifest = experiment.run_experiment(workers=2, base_folder=str(tmp_path))
+
+    assert manifest['completed'] == 3
+    assert [game['game'] for game in manifest['games']] == [1, 2, 3]
+    folders = [game['folder'] for game in manifest['games']]
+    assert len(set(folders)) == 3
+    for folder in folders:
+        assert os.path.exists(os.path.join(folder, 'end_game_results.json'))
+        assert os.path.exists(os.path.join(folder, 'game_log.txt'))
+
+    experiment_folder = os.path.dirname(folders[0])
+    with open(os.path.join(experiment_folder, 'manifest.json')) as file:
+        assert json.load(file)['games'] == manifest['games']
+
+    # The same seed gives the same games, whatever the number of workers
+    serial_manifest = Experiment(GameConfig(max_rounds=20), agent_mix=0,
+                                 num_games=3, seed=11).run_experiment(
+        workers=1, base_folder=str(tmp_path / "serial"))
+    assert ([game['winner'] for game in serial_manifest['games']] ==
+            [game['winner'] for game in manifest['games']])
+
+
+def test_failed_game_is_recorded(tmp_path, monkeypatch):
+    def crash(self, *args, **kwargs):
+        raise RuntimeError("engine crashed")
+    monkeypatch.setattr(gm.GameMaster, "play_game", crash)
+
+    experiment = Experiment(GameConfig(max_rounds=20), agent_mix=0, num_games=2)
+    manifest = experiment.run_experiment(base_folder=str(tmp_path))
+
+    assert manifest['completed'] == 0
+    assert all(game['status'] == 'failed' for game in manifest['games'])
+    assert "engine crashed" in manifest['games'][0]['error']
+
+
+def test_async_experiment_plays_games_concurrently(tmp_path):
+    experiment = Experiment(GameConfig(max_rounds=20), agent_mix=0,
+                            num_games=3, seed=11)
+    manifest = asyncio.run(experiment.run_experiment_async(
+        concurrent_games=3, base_folder=str(tmp_path)))
+
+    serial_manifest = Experiment(GameConfig(max_rounds=20), agent_mix=0,
+                                 num_games=3, seed=11).run_experiment(
+        base_folder=str(tmp_path / "serial"))
+    assert manifest['completed'] == 3
+    assert ([game['rounds'] for game in manifest['games']] ==
+            [game['rounds'] for game in serial_manifest['games']])
+
+
+def test_experiment_replaces_a_pool_whose_worker_died(tmp_path, monkeypatch):
+    # The first game kills its worker process once, in the middle of the game
+    killed = tmp_path / "killed"
+    play_a_turn = gm.GameMaster.play_a_turn
+    async def dying_turn(self, player):
+        if self.game_round == 3 and not killed.exists():
+            killed.touch()
+            os._exit(1)
+        await play_a_turn(self, player)
+    monkeypatch.setattr(gm.GameMaster, "play_a_turn", dying_turn)
+
+    experiment = Experiment(GameConfig(max_rounds=8), agent_mix=0,
+                            num_games=3, seed=11)
+    manifest = experiment.run_experiment(workers=2,
+                                         base_folder=str(tmp_path / "games"))
+
+    assert killed.exists()
+    assert manifest['completed'] == 3
+    assert sum(game['resumes'] for game in manifest['games']) >= 1
+    serial_manifest = Experiment(GameConfig(max_rounds=8), agent_mix=0,
+                                 num_games=3, seed=11).run_experiment(
+        base_folder=str(tmp_path / "serial"))
+    assert ([game['winner'] for game in manifest['games']] ==
+            [game['winner'] for game in serial_manifest['games']])
+
+
+def test_local_model_experiment_is_reproducible(tmp_path):
+    def run(folder):
+        manifest = Experiment(GameConfig(max_rounds=6), agent_mix=2,
+                              num_games=2, seed=3).run_experiment(
+            base_folder=str(tmp_path / folder))
+        return [(game['winner'], game['rounds']) for game in manifest['games']]
+    assert run("first") == run("second")
@@ -0,0 +1,124 @@
+import os
+import pandas as pd
+import pyarrow.parquet as pq
+import pytest
+from risk_game.game_config import GameConfig
+from risk_game.game_master import GameMaster
+from risk_game.rules import Rules
+from risk_game.utils.game_log import GAME_LOG_FILES, KEYFRAME_FILE, board_at, \
+export_csv, game_state_frame, player_data_frame, read_game_log, \
+read_recovery_marker
+
+
+def play_bot_game(game_folder, game_log, max_rounds=5):
+    game = GameMaster(Rules(GameConfig(max_rounds=max_rounds, game_log=game_log,
+                                       keyframe_interval=4)), seed=7)
+    for name, bot in (("Random", "Random"), ("Greedy", "GreedyBorder"),
+                      ("Continent", "Continent")):
+        game.add_bot(name, bot)
+    game.play_game(games_folder=str(game_folder))
+    return game
+
+
+def read_turn_csv(game_folder, kind, turn_number):
+    frame = pd.read_csv(os.path.join(game_folder,
+                                     f"{kind}_turn_{turn_number}.csv"))
+    return frame.drop(columns=['Accumulated Turn Time'], errors='ignore')
+
+
+def test_game_log_exports_the_csv_files(tmp_path):
+    play_bot_game(tmp_path / "csv", "csv")
+    game = play_bot_game(tmp_path / "arrow", "arrow")
+
+    # One log file instead of two files per turn
+    assert sorted(os.listdir(tmp_path / "arrow")) == [
+        "end_game_results.json", GAME_LOG_FILES["arrow"]]
+    table = read_game_log(str(tmp_path / "arrow" / GAME_LOG_FILES["arrow"]))
+    num_turns = table.num_rows
+    assert num_turns == len([file_name for file_name in os.listdir(
+        tmp_path / "csv") if file_name.startswith("game_state_turn_")])
+    game_states = game_state_frame(table)
+    last_turn = game_states[game_states['Turn_Number'] == num_turns - 1]
+    for player in game.players:
+        assert last_turn[player.name].sum() == \
+            game.game_state.get_sum_of_player_troops(player.name)
+
+    assert export_csv(str(tmp_path / "arrow")) == num_turns
+    for turn_number in range(num_turns):
+        for kind in ("game_state", "player_data"):
+            pd.testing.assert_frame_equal(
+                read_turn_csv(tmp_path / "arrow", kind, turn_number),
+                read_turn_csv(tmp_path / "csv", kind, turn_number))
+
+
+def test_parquet_log_and_cut_off_arrow_log(tmp_path):
+    play_bot_game(tmp_path / "parquet", "parquet")
+    play_bot_game(tmp_path / "arrow", "arrow")
+    parquet_path = str(tmp_path / "parquet" / GAME_LOG_FILES["parquet"])
+    arrow_path = str(tmp_path / "arrow" / GAME_LOG_FILES["arrow"])
+
+    table = read_game_log(parquet_path)
+    # A row group per turn
+    assert pq.ParquetFile(parquet_path).num_row_groups == table.num_rows
+    pd.testing.assert_frame_equal(game_state_frame(table), game_state_frame(
+        read_game_log(arrow_path)))
+    assert len(player_data_frame(table)) == 3 * table.num_rows
+
+    # A game that crashed while writing keeps its complete turns
+    with open(arrow_path, "r+b") as file:
+        file.truncate(os.path.getsize(arrow_path) - 100)
+    assert read_game_log(arrow_path).num_rows == table.num_rows - 1
+
+
+def test_event_log_rebuilds_every_turn(tmp_path):
+    play_bot_game(tmp_path / "arrow", "arrow", max_rounds=15)
+    play_bot_game(tmp_path / "events", "events", max_rounds=15)
+    snapshots = read_game_log(str(tmp_path / "arrow" / GAME_LOG_FILES["arrow"]))
+    events_path = str(tmp_path / "events" / GAME_LOG_FILES["events"])
+    events = read_game_log(events_path)
+
+    event_types = set(events.column('event').to_pylist())
+    assert {"placement", "attack", "conquest", "fortify", "turn_end",
+            "keyframe"} <= event_types
+    assert events.column('seq').to_pylist() == list(range(1, events.num_rows + 1))
+    for turn_number, owner, troops in zip(
+            snapshots.column('turn_number').to_pylist(),
+            snapshots.column('owner').to_pylist(),
+            snapshots.column('troops').to_pylist()):
+        event_owner, event_troops = board_at(events, turn_number)
+        assert event_owner.tolist() == owner
+        assert event_troops.tolist() == troops
+    pd.testing.assert_frame_equal(game_state_frame(events),
+                                  game_state_frame(snapshots))
+    # Player counters are kept with the keyframes
+    assert set(player_data_frame(events)['Turn_Number']) == {
+        turn_number for turn_number in range(snapshots.num_rows)
+        if turn_number % 4 == 0}
+
+    # Only the keyframes store the whole board
+    events_size = (os.path.getsize(events_path) +
+                   os.path.getsize(tmp_path / "events" / KEYFRAME_FILE))
+    assert events_size < os.path.getsize(
+        tmp_path / "arrow" / GAME_LOG_FILES["arrow"]) / 2
+
+
+def test_crashed_event_log_keeps_every_logged_turn(tmp_path, monkeypatch):
+    play_bot_game(tmp_path / "arrow", "arrow", max_rounds=15)
+    play_a_turn = GameMaster.play_a_turn
+    async def crashing_turn(self, player):
+        if self.game_round == 7:
+            raise RuntimeError("Provider outage")
+        await play_a_turn(self, player)
+    monkeypatch.setattr(GameMaster, "play_a_turn", crashing_turn)
+    with pytest.raises(RuntimeError):
+        play_bot_game(tmp_path / "events", "events", max_rounds=15)
+
+    # The turns since the last keyframe (turn 16) are on disk too
+    marker = read_recovery_marker(str(tmp_path / "events"))
+    events = read_game_log(str(tmp_path / "events" / GAME_LOG_FILES["events"]))
+    game_states = game_state_frame(events)
+    assert game_states['Turn_Number'].nunique() == marker['turns'] == 19
+    snapshots = game_state_frame(read_game_log(
+        str(tmp_path / "arrow" / GAME_LOG_FILES["arrow"])))
+    pd.testing.assert_frame_equal(
+        game_states, snapshots[snapshots['Turn_Number'] < marker['turns']])
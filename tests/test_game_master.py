@@ -0,0 +1,84 @@
+import asyncio
+import pytest
+from risk_game.bots import ScriptedAgent
+from risk_game.game_config import GameConfig
+from risk_game.game_master import GameMaster
+from risk_game.rules import Rules
+
+
+def make_game_master(seed, names=("Player 1", "Player 2", "Player 3")):
+    game = GameMaster(Rules(GameConfig()), seed=seed)
+    for name in names:
+        game.add_player(name, llm_client=None)
+    game.init_game_state()
+    game.distribute_territories_random()
+    return game
+
+
+def test_same_seed_replays_the_same_game():
+    game1 = make_game_master(seed=42)
+    game2 = make_game_master(seed=42)
+
+    assert [player.name for player in game1.players] == [
+        player.name for player in game2.players]
+    assert game1.game_state.territories_df.equals(game2.game_state.territories_df)
+    assert repr(game1.deck.cards) == repr(game2.deck.cards)
+    assert [game1.game_state.simulate_attack(10, 8) for _ in range(20)] == [
+        game2.game_state.simulate_attack(10, 8) for _ in range(20)]
+
+
+def test_games_do_not_share_random_state():
+    game1 = make_game_master(seed=42)
+    game2 = make_game_master(seed=42)
+    game3 = make_game_master(seed=7)
+
+    # Drawing from one game must not change the draws of another
+    [game3.game_state.simulate_attack(10, 8) for _ in range(20)]
+    assert game1.game_state.simulate_attack(30, 30) == (
+        game2.game_state.simulate_attack(30, 30))
+
+
+def play_bot_game(seed, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    game = GameMaster(Rules(GameConfig(max_rounds=30)), seed=seed)
+    game.add_bot("Random_Bot", "Random")
+    game.add_bot("Greedy_Border_Bot", "GreedyBorder")
+    game.add_bot("Continent_Bot", "Continent")
+    game.play_game()
+    return game
+
+
+def test_bot_game_runs_to_completion(tmp_path, monkeypatch):
+    game = play_bot_game(3, tmp_path, monkeypatch)
+
+    assert game.game_over and game.winner is not None
+    total_errors = sum(player.troop_placement_errors + player.attack_errors +
+                       player.fortify_errors + player.card_trade_errors
+                       for player in game.players)
+    assert total_errors == 0
+
+
+def test_bot_game_plays_inside_a_running_event_loop(tmp_path, monkeypatch):
+    # As in a notebook, which runs its cells in an event loop
+    async def notebook_cell():
+        return play_bot_game(3, tmp_path, monkeypatch)
+    game = asyncio.run(notebook_cell())
+    assert game.game_over and game.winner is not None
+
+    game = GameMaster(Rules(GameConfig(max_rounds=30,
+                                       speculative_prompts=True)), seed=3)
+    game.add_bot("Random_Bot", "Random")
+    game.add_bot("Greedy_Border_Bot", "GreedyBorder")
+    async def speculative_notebook_cell():
+        game.play_game(games_folder=str(tmp_path / "speculative"))
+    with pytest.raises(RuntimeError, match="await play_game_async"):
+        asyncio.run(speculative_notebook_cell())
+
+
+def test_incomplete_bot_fails_when_created():
+    class PlacingBot(ScriptedAgent):
+        def choose_placement_territory(self, game_state):
+            return "Brazil"
+
+    with pytest.raises(TypeError, match="choose_attack"):
+        PlacingBot("Placing_Bot")
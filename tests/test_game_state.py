@@ -0,0 +1,98 @@
+from risk_game.game_config import GameConfig
+from risk_game.game_constants import TERRITORIES, TERRITORY_CONNECTIONS
+from risk_game.game_state import GameState
+from risk_game.player_agent import PlayerAgent
+from risk_game.rules import Rules
+
+
+def make_game_state(names=("Player 1", "Player 2", "Player 3")):
+    players = [PlayerAgent(name, llm_client=None) for name in names]
+    return GameState(players, Rules(GameConfig())), players
+
+
+def test_update_and_lookup_troops():
+    game_state, _ = make_game_state()
+    game_state.update_troops("Player 1", "Brazil", 3)
+    game_state.update_troops("Player 1", "Brazil", 2)
+
+    assert game_state.check_terr_control("Player 1", "Brazil")
+    assert not game_state.check_terr_control("Player 2", "Brazil")
+    assert game_state.check_number_of_troops("Player 1", "Brazil") == 5
+    assert game_state.check_number_of_troops("Player 2", "Brazil") == 0
+    assert game_state.get_territory_control("Brazil") == ("Player 1", 5)
+    assert game_state.get_territory_control("Peru") is None
+    assert not game_state.check_terr_control("Player 1", "Atlantis")
+
+
+def test_setting_troops_transfers_control():
+    game_state, _ = make_game_state()
+    game_state.update_troops("Player 2", "Peru", 4)
+    game_state.update_troops("Player 1", "Peru", 2, set_troops=True)
+    game_state.update_troops("Player 2", "Peru", 0, set_troops=True)
+
+    assert game_state.get_territory_control("Peru") == ("Player 1", 2)
+    assert game_state.get_player_territories("Player 2") == []
+
+
+def test_dataframe_view_matches_board():
+    game_state, players = make_game_state()
+    for player in players:
+        player.troops = 35
+    game_state.assign_territories_to_players_random(players)
+    assert game_state.validate_territory_assignment()
+
+    territories_df = game_state.territories_df
+    assert list(territories_df.columns) == ["Territory"] + [
+        player.name for player in players]
+    assert list(territories_df["Territory"]) == TERRITORIES
+    for player in players:
+        assert (territories_df[player.name].sum() ==
+                game_state.get_sum_of_player_troops(player.name) == 14)
+
+    game_state.territories_df = territories_df
+    assert game_state.territories_df.equals(territories_df)
+
+
+def test_adjacency_and_border_queries():
+    game_state, _ = make_game_state()
+    for territory in ["Venezuela", "Peru", "Brazil", "Argentina"]:
+        game_state.update_troops("Player 1", territory, 2)
+    game_state.update_troops("Player 2", "North Africa", 1)
+
+    assert game_state.check_if_adjacent("Brazil", "North Africa")
+    assert not game_state.check_if_adjacent("Brazil", "Egypt")
+    assert game_state.get_border_territories("Player 1") == [
+        "Venezuela", "Brazil"]
+    assert game_state.get_frontier_territories("Player 1") == [
+        "Central America", "North Africa"]
+    assert game_state.get_controlled_continents("Player 1") == ["South America"]
+
+    attack_vectors = game_state.get_adjacent_enemy_territories(
+        "Player 1", [("Brazil", 1), ("Peru", 1)])
+    assert attack_vectors == {"Brazil": [1, ["North Africa"]], "Peru": [1, []]}
+
+    # The enemy neighbours keep the order of TERRITORY_CONNECTIONS
+    game_state.update_troops("Player 2", "Ural", 1)
+    attack_vectors = game_state.get_adjacent_enemy_territories(
+        "Player 2", [("Ural", 1)])
+    assert attack_vectors["Ural"][1] == TERRITORY_CONNECTIONS["Ural"]
+
+
+def test_connectivity_follows_conquests():
+    game_state, _ = make_game_state()
+    for territory in ["Venezuela", "Peru", "Brazil", "Argentina"]:
+        game_state.update_troops("Player 1", territory, 2)
+    game_state.update_troops("Player 2", "Central America", 3)
+
+    assert game_state.are_territories_connected("Player 1", "Venezuela", "Argentina")
+    assert game_state.get_fortify_destinations("Player 1", "Peru") == [
+        "Venezuela", "Brazil", "Argentina"]
+
+    # Losing Peru and Brazil cuts Venezuela off from Argentina
+    for territory in ["Peru", "Brazil"]:
+        game_state.update_troops("Player 2", territory, 1, set_troops=True)
+        game_state.update_troops("Player 1", territory, 0, set_troops=True)
+    assert not game_state.are_territories_connected(
+        "Player 1", "Venezuela", "Argentina")
+    assert game_state.get_fortify_destinations("Player 2", "Peru") == ["Brazil"]
+    assert game_state.get_fortify_destinations("Player 1", "Venezuela") == []
@@ -0,0 +1,108 @@
+import asyncio
+import time
+import pytest
+from risk_game.llm_clients.hedged_client import HedgedLLMClient, \
+LatencyHistogram, get_latency_histogram
+from risk_game.llm_clients.llm_base import AsyncLLMClient
+from risk_game.llm_clients.llm_client import create_async_llm_client
+from risk_game.llm_clients.response_cache import AsyncCachedLLMClient
+
+
+class SlowClient(AsyncLLMClient):
+    """Answers with its model name after the next of its delays, a
+    negative delay fails."""
+    def __init__(self, model_type: str, delays) -> None:
+        super().__init__(provider_name="Fake", model_type=model_type)
+        self.delays = list(delays)
+        self.cancelled = 0
+
+    async def get_chat_completion(self, message_content: str,
+                                  system_prompt=None, prompt_prefix=None,
+                                  history=None, response_schema=None) -> str:
+        delay = self.delays.pop(0) if self.delays else 0.0
+        try:
+            await asyncio.sleep(abs(delay))
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        if delay < 0:
+            raise RuntimeError("Provider error")
+        return self.model_type
+
+
+def hedged(client, fallback_client=None):
+    return HedgedLLMClient(client, fallback_client, initial_deadline=0.1,
+                           min_deadline=0.01)
+
+
+def test_latency_histogram_quantiles():
+    histogram = LatencyHistogram()
+    assert histogram.quantile(0.95) is None
+    for latency in range(1, 101):
+        histogram.record(latency / 10)
+    # Within a bucket (12% at 20 buckets per decade) of the exact p95
+    assert 9.5 <= histogram.quantile(0.95) <= 9.5 * 1.13
+    assert histogram.quantile(0.5) <= 5.0 * 1.13
+    histogram.record(1e6)
+    assert histogram.quantile(1.0) == histogram.upper_bound(
+        len(histogram.counts) - 1)
+
+
+def test_slow_requests_are_duplicated():
+    client = SlowClient("hedge-same", [5.0, 0.0, 0.0])
+    hedged_client = hedged(client)
+    start_time = time.monotonic()
+    assert asyncio.run(hedged_client.get_chat_completion("prompt")) == "hedge-same"
+    assert time.monotonic() - start_time < 1.0
+    assert hedged_client.hedged_requests == 1
+    assert hedged_client.hedge_wins == 1
+    # The slow request is cancelled, and its time still recorded
+    assert client.cancelled == 1
+    assert get_latency_histogram("Fake", "hedge-same").count == 2
+
+    # Fast requests are not duplicated
+    asyncio.run(hedged_client.get_chat_completion("prompt"))
+    assert hedged_client.hedged_requests == 1
+
+
+def test_duplicates_go_to_the_fallback_model():
+    client = SlowClient("hedge-primary", [5.0, 0.3, -0.3])
+    fallback_client = SlowClient("hedge-fallback", [0.0, -0.05, -0.05])
+    hedged_client = hedged(client, fallback_client)
+    assert hedged_client.model_type == "hedge-primary"
+    assert asyncio.run(
+        hedged_client.get_chat_completion("prompt")) == "hedge-fallback"
+
+    # A failed duplicate waits for the original request
+    assert asyncio.run(
+        hedged_client.get_chat_completion("prompt")) == "hedge-primary"
+    with pytest.raises(RuntimeError):
+        asyncio.run(hedged_client.get_chat_completion("prompt"))
+    assert hedged_client.hedged_requests == 3
+    assert hedged_client.hedge_wins == 1
+
+
+def test_deadline_follows_the_latencies():
+    hedged_client = HedgedLLMClient(SlowClient("hedge-deadline", []),
+                                    min_samples=20, min_deadline=0.5)
+    assert hedged_client.deadline() == hedged_client.initial_deadline
+    histogram = get_latency_histogram("Fake", "hedge-deadline")
+    for _ in range(19):
+        histogram.record(2.0)
+    histogram.record(60.0)
+    assert 2.0 <= hedged_client.deadline() < 2.5
+    for _ in range(400):
+        histogram.record(0.05)
+    assert hedged_client.deadline() == 0.5
+
+
+def test_factory_wraps_the_hedged_client(tmp_path):
+    client = create_async_llm_client(
+        "Local", 1, seed=0, cache_mode="auto",
+        cache_path=str(tmp_path / "cache.sqlite"), hedge_requests=True,
+        hedge_fallbacks={"Local": ("Local", 2)})
+    assert isinstance(client, AsyncCachedLLMClient)
+    assert isinstance(client.llm_client, HedgedLLMClient)
+    assert client.model_type == client.llm_client.llm_client.model_type
+    assert (client.llm_client.fallback_client.model_type !=
+            client.model_type)
@@ -0,0 +1,103 @@
+import asyncio
+import json
+from types import SimpleNamespace
+import httpx
+import openai
+import pytest
+from risk_game.llm_clients import groq_client
+from risk_game.llm_clients.anthropic_client import build_request, \
+record_prompt_cache, response_text, tool_params, SYSTEM_PROMPT
+from risk_game.llm_clients.llm_base import ProviderUnavailableError
+from risk_game.llm_clients.local_client import LocalClient
+from risk_game.llm_clients.openai_client import AsyncOpenAIClient, \
+OpenAIClient, build_messages, cached_prompt_tokens, response_format
+from risk_game.move_schema import MOVE_SCHEMAS
+
+
+def test_anthropic_marks_the_static_prefix_as_cacheable():
+    system, messages = build_request("board", prompt_prefix="rules")
+    assert system == [{"type": "text", "text": SYSTEM_PROMPT}]
+    assert messages[0]["content"] == [
+        {"type": "text", "text": "rules", "cache_control": {"type": "ephemeral"}},
+        {"type": "text", "text": "board"}]
+
+    system, messages = build_request("board", system_prompt="rules")
+    assert system[0]["cache_control"] == {"type": "ephemeral"}
+    assert messages[0]["content"] == [{"type": "text", "text": "board"}]
+
+
+def test_prompt_cache_usage_is_recorded():
+    client = LocalClient(1)
+    record_prompt_cache(client, SimpleNamespace(
+        input_tokens=100, cache_read_input_tokens=900,
+        cache_creation_input_tokens=None))
+    assert client.prompt_cache_stats == {
+        "prompt_tokens": 1000, "cached_tokens": 900, "cache_write_tokens": 0}
+
+    assert cached_prompt_tokens(SimpleNamespace(
+        prompt_tokens=1200,
+        prompt_tokens_details=SimpleNamespace(cached_tokens=1024))) == 1024
+    assert cached_prompt_tokens(SimpleNamespace(prompt_tokens=10)) == 0
+    assert build_messages("board", prompt_prefix="rules ")[1]["content"] == (
+        "rules board")
+
+
+def test_session_history_is_sent_before_the_new_message():
+    history = [{"role": "user", "content": "board"},
+               {"role": "assistant", "content": "attack"}]
+    system, messages = build_request("changes", history=history)
+    assert [message["role"] for message in messages] == [
+        "user", "assistant", "user"]
+    assert messages[1]["content"] == [
+        {"type": "text", "text": "attack", "cache_control": {"type": "ephemeral"}}]
+    assert history[1]["content"] == "attack"
+
+    messages = build_messages("changes", history=history)
+    assert messages[1:] == history + [{"role": "user", "content": "changes"}]
+
+
+def test_structured_output_arguments_of_the_providers():
+    schema = MOVE_SCHEMAS["attack"]
+    assert response_format(None) == tool_params(None) == {}
+    assert response_format(schema)["response_format"]["json_schema"] == {
+        "name": "attack", "schema": schema, "strict": True}
+    assert groq_client.response_format(schema) == {
+        "response_format": {"type": "json_object"}}
+
+    params = tool_params(schema)
+    assert params["tools"][0]["input_schema"] == schema
+    assert params["tool_choice"] == {"type": "tool", "name": "attack"}
+    move = {"territory": "Peru", "troops": 3, "from_territory": "Brazil",
+            "reasoning": "Go"}
+    assert json.loads(response_text([
+        SimpleNamespace(type="text", text="Sure"),
+        SimpleNamespace(type="tool_use", input=move)])) == move
+    assert response_text([SimpleNamespace(type="text", text="Sure")]) == "Sure"
+
+
+def test_provider_outage_raises_after_the_retries(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    monkeypatch.setenv("GROQ_API_KEY", "test")
+    response = httpx.Response(503, request=httpx.Request("POST", "https://api"))
+    for client_class, error_class in (
+            (OpenAIClient, openai.InternalServerError),
+            (AsyncOpenAIClient, openai.InternalServerError),
+            (groq_client.GroqClient, groq_client.InternalServerError),
+            (groq_client.AsyncGroqClient, groq_client.InternalServerError)):
+        client = client_class(1)
+        client.max_retries, client.retry_delay = 2, 0
+        outage = error_class("Service unavailable", response=response,
+                             body=None)
+        def create(*args, **kwargs):
+            raise outage
+        async def create_async(*args, **kwargs):
+            raise outage
+        is_async = asyncio.iscoroutinefunction(client.get_chat_completion)
+        client.client = SimpleNamespace(chat=SimpleNamespace(
+            completions=SimpleNamespace(
+                create=create_async if is_async else create)))
+        with pytest.raises(ProviderUnavailableError):
+            if is_async:
+                asyncio.run(client.get_chat_completion("board"))
+            else:
+                client.get_chat_completion("board")
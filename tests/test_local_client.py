@@ -0,0 +1,156 @@
+import pytest
+from risk_game.game_config import GameConfig
+from risk_game.game_master import GameMaster
+from risk_game.llm_clients.llm_client import create_llm_client
+from risk_game.llm_clients.local_client import LocalClient, LocalModel, \
+LocalModelError, start_local_server
+from risk_game.player_agent import PlayerAgent
+from risk_game.player_session import PlayerSession
+from risk_game.rules import Rules
+
+
+def make_game_state(seed=0):
+    game = GameMaster(Rules(GameConfig()), seed=seed)
+    for name in ("Player 1", "Player 2", "Player 3"):
+        game.add_player(name, llm_client=None)
+    game.init_game_state()
+    game.distribute_territories_random()
+    return game
+
+
+def test_local_model_answers_parse_as_valid_moves():
+    game = make_game_state()
+    player = PlayerAgent("Player 1", LocalClient(1, seed=0))
+    player.troops = 5
+    player.turn_strategy = "Local strategy"
+
+    moves, _, _ = player.make_troop_placement(game.rules, game.game_state)
+    assert sum(move['num_troops'] for move in moves) == 5
+    assert all(game.game_state.check_terr_control("Player 1", move['territory_name'])
+               for move in moves)
+
+    moves, _, from_territory = player.make_attack_move(
+        game.rules, game.game_state, 0)
+    if from_territory != 'Blank':
+        assert game.game_state.check_terr_control("Player 1", from_territory)
+        assert not game.game_state.check_terr_control(
+            "Player 1", moves[0]['territory_name'])
+
+
+def test_local_players_finish_a_game(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    game = GameMaster(Rules(GameConfig(max_rounds=30)), seed=3)
+    for name, model_number in (("A", 1), ("B", 2), ("C", 3)):
+        game.add_player(name, create_llm_client("Local", model_number, seed=0))
+    game.play_game(games_folder=str(tmp_path / "game"))
+
+    assert game.winner is not None
+
+
+def test_local_players_understand_compact_prompts(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    game = GameMaster(Rules(GameConfig(max_rounds=30)), seed=3)
+    for name, model_number in (("A", 1), ("B", 2), ("C", 3)):
+        game.add_player(name, create_llm_client("Local", model_number, seed=0),
+                        prompt_mode="compact")
+    game.play_game(games_folder=str(tmp_path / "game"))
+
+    assert game.winner is not None
+    assert all(player.return_formatting_errors == 0 and 
+               player.troop_placement_errors == 0 for player in game.players)
+
+
+def test_local_players_follow_session_deltas(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    game = GameMaster(Rules(GameConfig(max_rounds=30)), seed=3)
+    for name, model_number in (("A", 1), ("B", 2), ("C", 3)):
+        game.add_player(name, create_llm_client("Local", model_number, seed=0),
+                        session_mode=True)
+    game.play_game(games_folder=str(tmp_path / "game"))
+
+    assert game.winner is not None
+    assert all(player.return_formatting_errors == 0 and 
+               player.troop_placement_errors == 0 for player in game.players)
+    assert all(player.session.truncations > 0 for player in game.players)
+
+
+def test_structured_output_avoids_malformed_answers(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    profile = {"median_latency": 0.0, "latency_sigma": 0.0, "error_rate": 0.0,
+               "rate_limit_rate": 0.0, "malformed_rate": 0.2,
+               "invalid_move_rate": 0.1}
+    retries = {}
+    formatting_errors = {}
+    for output_mode, enforce_schema in (("text", False), ("json", False),
+                                        ("json", True)):
+        game = GameMaster(Rules(GameConfig(max_rounds=10)), seed=3)
+        for name, model_number in (("A", 1), ("B", 2), ("C", 3)):
+            game.add_player(name, create_llm_client(
+                "Local", model_number, seed=0, profile=profile,
+                enforce_schema=enforce_schema), output_mode=output_mode)
+        game.play_game(games_folder=str(tmp_path / f"{output_mode}_{enforce_schema}"))
+        key = (output_mode, enforce_schema)
+        retries[key] = sum(player.move_retries for player in game.players)
+        formatting_errors[key] = sum(player.return_formatting_errors
+                                     for player in game.players)
+
+    # Only an enforced schema avoids malformed answers, the invalid moves
+    # are retried in every mode
+    assert formatting_errors[("text", False)] > 0
+    assert formatting_errors[("json", False)] > 0
+    assert formatting_errors[("json", True)] == 0
+    assert 0 < retries[("json", True)] < retries[("json", False)]
+
+
+def test_injected_errors_are_retried(monkeypatch):
+    client = LocalClient(1, profile={
+        "median_latency": 0.0, "latency_sigma": 0.0, "error_rate": 0.5,
+        "rate_limit_rate": 0.0, "malformed_rate": 0.0}, seed=0)
+    monkeypatch.setattr(client, "retry_backoff", lambda attempt: 0.0)
+    client.max_retries = 20
+    game = make_game_state()
+    prompt = PlayerAgent("Player 1", None).attack_prompt(
+        game.rules, game.game_state, 0)
+
+    for _ in range(10):
+        assert "|||" in client.get_chat_completion(prompt)
+    assert client.model.injected_errors > 0
+
+    model = LocalModel({"median_latency": 0.0, "latency_sigma": 0.0,
+                        "error_rate": 0.0, "rate_limit_rate": 1.0,
+                        "malformed_rate": 0.0})
+    with pytest.raises(LocalModelError) as error:
+        model.complete("local-random", prompt)
+    assert error.value.status_code == 429
+
+
+def test_local_model_over_http():
+    server = start_local_server(profile="instant", seed=0)
+    try:
+        game = make_game_state()
+        player = PlayerAgent("Player 2", LocalClient(2, base_url=server.url))
+        player.turn_strategy = "Local strategy"
+        moves, _, _ = player.make_initial_troop_placement(
+            game.rules, game.game_state)
+        assert len(moves) == 1
+        assert game.game_state.check_terr_control(
+            "Player 2", moves[0]['territory_name'])
+        assert server.model.requests == 1
+
+        # The static prefix is served from the prompt cache the second time
+        player.make_initial_troop_placement(game.rules, game.game_state)
+        stats = player.prompt_cache_stats()
+        assert 0 < stats["cached_tokens"] < stats["prompt_tokens"]
+
+        # The server rebuilds the board from the history of a session
+        player.session = PlayerSession()
+        player.define_strategy_for_move(game.rules, game.game_state)
+        player.troops = 3
+        moves, _, _ = player.make_troop_placement(game.rules, game.game_state)
+        moves, _, _ = player.make_troop_placement(game.rules, game.game_state)
+        assert "Current Game State" not in player.session.history[-2]["content"]
+        assert sum(move['num_troops'] for move in moves) == 3
+        assert all(game.game_state.check_terr_control(
+            "Player 2", move['territory_name']) for move in moves)
+    finally:
+        server.shutdown()
@@ -0,0 +1,106 @@
+import asyncio
+import json
+import os
+import time
+import pandas as pd
+import pytest
+from risk_game.game_config import GameConfig
+from risk_game.game_master import GameMaster
+from risk_game.rules import Rules
+from risk_game.utils.game_log import GAME_LOG_FILES, GameLog, \
+game_state_frame, read_game_log, read_recovery_marker
+
+
+def make_bot_game(background_writer, max_rounds=5):
+    game = GameMaster(Rules(GameConfig(max_rounds=max_rounds,
+                                       background_writer=background_writer)),
+                      seed=7)
+    for name, bot in (("Random", "Random"), ("Greedy", "GreedyBorder"),
+                      ("Continent", "Continent")):
+        game.add_bot(name, bot)
+    return game
+
+
+def test_background_writer_reports_backpressure(tmp_path, monkeypatch):
+    make_bot_game(False).play_game(games_folder=str(tmp_path / "inline"))
+
+    # The disk stalls on the first turn until the game waits for it
+    game = make_bot_game(True)
+    write_turn = GameLog.write_turn
+    written = []
+    def stalled_write_turn(self, snapshot):
+        deadline = time.monotonic() + 10
+        while (not written and game.game_log.blocked_writes == 0 and
+               time.monotonic() < deadline):
+            time.sleep(0.01)
+        written.append(snapshot)
+        write_turn(self, snapshot)
+    monkeypatch.setattr(GameLog, "write_turn", stalled_write_turn)
+    game.play_game(games_folder=str(tmp_path / "background"))
+
+    tables = [read_game_log(str(tmp_path / folder / GAME_LOG_FILES["arrow"]))
+              for folder in ("inline", "background")]
+    pd.testing.assert_frame_equal(game_state_frame(tables[0]),
+                                  game_state_frame(tables[1]))
+    stats = game.log_writer_stats
+    assert stats['background'] and stats['turns'] == tables[1].num_rows
+    assert stats['blocked_writes'] > 0 and stats['blocked_time'] > 0
+    assert stats['max_queue_depth'] == 8
+    with open(tmp_path / "background" / "end_game_results.json") as file:
+        assert json.load(file)['log_writer']['blocked_writes'] > 0
+    assert read_recovery_marker(str(tmp_path / "background")) is None
+
+
+@pytest.mark.parametrize("background_writer", [False, True])
+def test_crashed_game_leaves_recovery_marker(tmp_path, monkeypatch,
+                                             background_writer):
+    play_a_turn = GameMaster.play_a_turn
+    async def crashing_turn(self, player):
+        if self.game_round == 3:
+            raise RuntimeError("Provider outage")
+        await play_a_turn(self, player)
+    monkeypatch.setattr(GameMaster, "play_a_turn", crashing_turn)
+
+    with pytest.raises(RuntimeError):
+        make_bot_game(background_writer).play_game(
+            games_folder=str(tmp_path))
+
+    marker = read_recovery_marker(str(tmp_path))
+    assert marker['status'] == "crashed" and "Provider outage" in marker['error']
+    # Every turn logged before the crash is on disk
+    assert marker['turns'] == 1 + 2 * 3
+    assert read_game_log(str(tmp_path / GAME_LOG_FILES["arrow"])
+                         ).num_rows == marker['turns']
+    assert not os.path.exists(tmp_path / "end_game_results.json")
+
+
+def test_slow_disk_does_not_block_the_event_loop(tmp_path, monkeypatch):
+    # Every write and the final sync stall, as on a slow shared disk
+    write_turn = GameLog.write_turn
+    def slow_write_turn(self, snapshot):
+        time.sleep(0.02)
+        write_turn(self, snapshot)
+    sync = GameLog.sync
+    def slow_sync(self):
+        time.sleep(0.3)
+        sync(self)
+    monkeypatch.setattr(GameLog, "write_turn", slow_write_turn)
+    monkeypatch.setattr(GameLog, "sync", slow_sync)
+
+    async def play_with_heartbeat():
+        game = make_bot_game(True)
+        gaps = []
+        async def heartbeat():
+            while True:
+                start_time = time.monotonic()
+                await asyncio.sleep(0.01)
+                gaps.append(time.monotonic() - start_time)
+        beating = asyncio.ensure_future(heartbeat())
+        await game.play_game_async(games_folder=str(tmp_path))
+        beating.cancel()
+        return game, gaps
+
+    game, gaps = asyncio.run(play_with_heartbeat())
+    assert game.log_writer_stats['blocked_writes'] > 0
+    # The loop kept running while the game waited for the writer and the disk
+    assert sum(gaps) > 0.3 and max(gaps) < 0.2
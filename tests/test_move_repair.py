@@ -0,0 +1,81 @@
+import asyncio
+from risk_game.game_config import GameConfig
+from risk_game.game_master import GameMaster
+from risk_game.move_repair import MoveRepair, match_territory, rescale_troops
+from risk_game.player_agent import PlayerAgent
+from risk_game.rules import Rules
+from tests.test_player_agent import FakeClient
+
+
+def make_game(move_repair, response):
+    game = GameMaster(Rules(GameConfig(move_repair=move_repair)), seed=0)
+    game.add_player("Player 1", FakeClient(response))
+    game.add_player("Player 2", None)
+    game.init_game_state()
+    game.game_state.update_troops("Player 1", "Brazil", 3)
+    game.game_state.update_troops("Player 1", "Argentina", 1)
+    game.game_state.update_troops("Player 2", "Peru", 2)
+    return game, game.players[0]
+
+
+def test_names_are_only_matched_when_close_to_one_territory():
+    assert match_territory("brasil") == "Brazil"
+    assert match_territory(" western  europe ") == "Western Europe"
+    assert match_territory("blank", allow_blank=True) == "Blank"
+    assert match_territory("blank") is None
+    assert match_territory("Atlantis") is None
+    # As close to Western Australia as to Eastern Australia
+    assert match_territory("Australia") is None
+    assert rescale_troops([2, 2, 1], 4) == [2, 1, 1]
+    assert sum(rescale_troops([1, 1, 1], 7)) == 7
+
+
+def test_near_valid_placement_is_repaired_and_counted():
+    game, player = make_game("log", "Move 1:|||brasil, 4|||\n" +
+                                    "Move 2:|||Argentina, 2|||")
+    game.phase = 1
+    player.troops = 5
+    asyncio.run(game.ensure_valid_move(player))
+
+    assert player.move_retries == 0
+    assert player.move_repairs == 2
+    assert game.game_state.check_number_of_troops("Player 1", "Brazil") == 6
+    assert game.game_state.check_number_of_troops("Player 1", "Argentina") == 3
+
+    # Off by more than the margin, or off mode, goes back to the player
+    repair = MoveRepair("log")
+    moves = [{'territory_name': 'Brazil', 'num_troops': 10}]
+    assert repair.repair_placement(player, moves) == moves
+    game, player = make_game("off", "Move 1:|||brasil, 1|||")
+    game.phase = 0
+    player.troops = 1
+    moves, _, _ = player.make_initial_troop_placement(game.rules, game.game_state)
+    assert game.move_repair.repair_placement(player, moves, True) == moves
+
+
+def test_attack_with_every_troop_is_clamped():
+    game, player = make_game("silent", "Attack Opponent Territory:|||peru, 3|||\n" +
+                                       "From Territory:###Brazil###")
+    move, _, from_territory = player.make_attack_move(
+        game.rules, game.game_state, 0)
+    move, from_territory = game.move_repair.repair_troop_move(
+        player, move, from_territory, game.game_state)
+    assert move == [{'territory_name': 'Peru', 'num_troops': 2}]
+    assert game.validate_attack_move(player, move, None, from_territory) == (
+        True, None)
+    # Silent repairs are not counted
+    assert player.move_repairs == 0
+
+    # A territory with one troop cannot attack, that is not repaired
+    move, from_territory = game.move_repair.repair_troop_move(
+        player, [{'territory_name': 'Peru', 'num_troops': 1}], "Argentina",
+        game.game_state)
+    assert move[0]['num_troops'] == 1
+
+    # More troops than the territory has is not clamped, it is rejected
+    move, from_territory = game.move_repair.repair_troop_move(
+        player, [{'territory_name': 'Peru', 'num_troops': 50}], "Brazil",
+        game.game_state)
+    assert move[0]['num_troops'] == 50
+    assert not game.validate_attack_move(player, move, None,
+                                         from_territory)[0]
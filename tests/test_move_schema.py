@@ -0,0 +1,44 @@
+import json
+from risk_game.move_schema import MOVE_SCHEMAS, format_card_trade_json, \
+format_move_json, read_move, validate_json
+
+
+def test_answers_are_checked_against_the_schema():
+    move, error = read_move('```json\n{"territory": "Brazil", "troops": 3, ' +
+                            '"from_territory": "Argentina", "reasoning": "Go"}\n```',
+                            "attack")
+    assert error is None
+    assert move["from_territory"] == "Argentina"
+
+    schema = MOVE_SCHEMAS["troop_placement"]
+    assert validate_json({"moves": [{"territory": "Atlantis", "troops": 1}],
+                          "reasoning": ""}, schema) == (
+        "answer.moves[0].territory 'Atlantis' is not a territory of the map")
+    assert validate_json({"moves": [{"territory": "Peru", "troops": True}],
+                          "reasoning": ""}, schema) == (
+        "answer.moves[0].troops must be a whole number")
+    assert validate_json({"moves": []}, schema) == "answer is missing 'reasoning'"
+    assert validate_json({"moves": [], "reasoning": "", "extra": 1}, schema) == (
+        "answer has an unknown key 'extra'")
+    assert read_move("Move:|||Brazil, 1|||", "troop_placement") == (
+        None, "the answer is not a JSON object")
+    # Blank ends the attacks, it is not a territory to place troops on
+    assert validate_json({"moves": [{"territory": "Blank", "troops": 0}],
+                          "reasoning": ""}, schema) is not None
+
+
+def test_formatted_moves_read_back():
+    moves = [{'territory_name': 'Peru', 'num_troops': 2},
+             {'territory_name': 'Brazil', 'num_troops': 1}]
+    move, error = read_move(format_move_json("troop_placement", moves, "Hold"),
+                            "troop_placement")
+    assert error is None
+    assert move == {"moves": [{"territory": "Peru", "troops": 2},
+                              {"territory": "Brazil", "troops": 1}],
+                    "reasoning": "Hold"}
+
+    blank = format_move_json("fortify", [{'territory_name': 'Blank',
+                                          'num_troops': 0}])
+    assert read_move(blank, "fortify")[0]["from_territory"] == "Blank"
+    assert json.loads(format_card_trade_json([0])) == {"cards": [],
+                                                       "reasoning": ""}
@@ -0,0 +1,235 @@
+import asyncio
+import pytest
+from risk_game.game_config import GameConfig
+from risk_game.game_state import GameState
+from risk_game.llm_clients import llm_base
+from risk_game.llm_clients.llm_base import AsyncLLMClient, LLMClient, \
+set_provider_concurrency
+from risk_game.llm_clients.rate_limiter import estimate_tokens
+from risk_game.player_agent import PlayerAgent
+from risk_game.move_schema import MOVE_SCHEMAS
+from risk_game.player_session import PlayerSession, SAME_INSTRUCTIONS, \
+SUMMARY_HEADER
+from risk_game.rules import Rules
+
+
+class FakeAsyncClient(AsyncLLMClient):
+    def __init__(self, response: str, delay: float = 0.01) -> None:
+        super().__init__(provider_name="Fake", model_type="fake")
+        self.response = response
+        self.delay = delay
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def get_chat_completion(self, message_content: str,
+                                  system_prompt=None, prompt_prefix=None,
+                                  history=None, response_schema=None) -> str:
+        async with self.concurrency_limit():
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            await asyncio.sleep(self.delay)
+            self.in_flight -= 1
+        return self.response
+
+
+class FakeClient(LLMClient):
+    def __init__(self, response: str) -> None:
+        super().__init__(provider_name="Fake", model_type="fake")
+        self.response = response
+        self.system_prompts = []
+        self.prompt_prefixes = []
+        self.histories = []
+        self.response_schemas = []
+
+    def get_chat_completion(self, message_content: str,
+                            system_prompt=None, prompt_prefix=None,
+                            history=None, response_schema=None) -> str:
+        self.system_prompts.append(system_prompt)
+        self.prompt_prefixes.append(prompt_prefix)
+        self.histories.append(history)
+        self.response_schemas.append(response_schema)
+        return self.response
+
+
+def make_player_and_state(llm_client):
+    player = PlayerAgent("Player 1", llm_client)
+    rules = Rules(GameConfig())
+    game_state = GameState([player, PlayerAgent("Player 2", None)], rules)
+    game_state.update_troops("Player 1", "Brazil", 3)
+    game_state.update_troops("Player 2", "Peru", 2)
+    return player, rules, game_state
+
+
+def test_sync_and_async_clients_give_the_same_move():
+    response = "Move:|||Brazil, 1|||\nReasoning:+++Hold Brazil+++"
+    expected = ([{'territory_name': 'Brazil', 'num_troops': 1}], 
+                'Hold Brazil', None)
+    player, rules, game_state = make_player_and_state(FakeClient(response))
+    assert player.make_initial_troop_placement(rules, game_state) == expected
+    for llm_client in (FakeClient(response), FakeAsyncClient(response)):
+        player, rules, game_state = make_player_and_state(llm_client)
+        assert asyncio.run(player.make_initial_troop_placement_async(
+            rules, game_state)) == expected
+
+    # An async client is only awaited, never in an event loop of its own
+    player, rules, game_state = make_player_and_state(FakeAsyncClient(response))
+    with pytest.raises(RuntimeError, match="send_message_async"):
+        player.make_initial_troop_placement(rules, game_state)
+
+
+def test_requests_in_flight_are_limited_per_provider(monkeypatch):
+    # The limits are module state, the other tests keep the default
+    monkeypatch.setattr(llm_base, "PROVIDER_CONCURRENCY",
+                        dict(llm_base.PROVIDER_CONCURRENCY))
+    set_provider_concurrency("Fake", 2)
+    llm_client = FakeAsyncClient("|||0|||")
+    players = [PlayerAgent(f"Player {i}", llm_client) for i in range(6)]
+
+    async def send_all():
+        return await asyncio.gather(
+            *(player.send_message_async("Hello") for player in players))
+
+    assert asyncio.run(send_all()) == ["|||0|||"] * 6
+    assert llm_client.max_in_flight == 2
+
+
+def test_compact_prompts_only_send_the_relevant_board():
+    full_player, rules, game_state = make_player_and_state(None)
+    game_state.update_troops("Player 2", "Japan", 5)
+    compact_player = PlayerAgent("Player 1", None, prompt_mode="compact")
+
+    full_prompt = full_player.attack_prompt(rules, game_state, 0)
+    compact_prompt = compact_player.attack_prompt(rules, game_state, 0)
+    assert len(compact_prompt) < len(full_prompt) / 2
+    assert "Player 1: Brazil 3" in compact_prompt
+    assert "Player 2: Peru 2" in compact_prompt
+    # Japan is not adjacent to any territory of Player 1
+    assert "Japan" not in compact_prompt
+    win_chance = game_state.get_attack_win_probability(2, "Peru")
+    assert f"Brazil (2): Venezuela 0%, Peru {win_chance:.0%}" in compact_prompt
+    assert str(rules) in compact_player.system_prompt(rules)
+    assert full_player.system_prompt(rules) is None
+
+
+def test_compact_strategy_prompt_has_the_same_board_in_fewer_tokens():
+    full_player, rules, game_state = make_player_and_state(None)
+    game_state.update_troops("Player 1", "Brazil", 5)
+    compact_player = PlayerAgent("Player 1", None, prompt_mode="compact")
+
+    full_prompt = full_player.strategy_prompt_parts(rules, game_state)[1]
+    compact_prompt = compact_player.strategy_prompt(rules, game_state)
+    for prompt in (full_prompt, compact_prompt):
+        assert "Brazil" in prompt and "Peru" in prompt
+    assert estimate_tokens(compact_prompt) < estimate_tokens(full_prompt) / 2
+
+
+def test_compact_prompts_send_the_rules_in_the_system_prompt():
+    llm_client = FakeClient("Move:|||Brazil, 1|||\nReasoning:+++Hold Brazil+++")
+    player, rules, game_state = make_player_and_state(llm_client)
+    player.prompt_mode = "compact"
+    player.make_initial_troop_placement(rules, game_state)
+    player.define_strategy_for_move(rules, game_state)
+
+    assert llm_client.system_prompts == [player.system_prompt(rules)] * 2
+    assert len(player.prompt_token_counts) == 2
+    system_tokens, message_tokens = player.prompt_token_counts[0]
+    assert system_tokens > message_tokens > 0
+    assert player.prompt_tokens == sum(map(sum, player.prompt_token_counts))
+    assert player.system_prompt_tokens == player.static_prompt_tokens
+
+
+def test_prompt_prefix_is_the_same_for_every_call_of_a_phase():
+    llm_client = FakeClient("Attack Opponent Territory:|||Blank, 0|||\n" +
+                            "From Territory:###Blank###")
+    player, rules, game_state = make_player_and_state(llm_client)
+    player.make_attack_move(rules, game_state, 0)
+    game_state.update_troops("Player 1", "Brazil", 5)
+    player.make_attack_move(rules, game_state, 1, error_msg="Invalid attack")
+
+    first_prefix, second_prefix = llm_client.prompt_prefixes
+    assert first_prefix == second_prefix
+    assert "Player 1" not in first_prefix
+    assert "Brazil: Controlled by" not in first_prefix
+    prompt_prefix, prompt = player.attack_prompt_parts(rules, game_state, 0)
+    assert prompt_prefix == first_prefix
+    assert prompt_prefix + prompt == player.attack_prompt(rules, game_state, 0)
+    assert player.static_prompt_tokens > 0
+    # The attack prompts have no system prompt in full mode
+    assert player.system_prompt_tokens == 0
+
+
+def test_strategy_prompt_has_the_game_state():
+    player, rules, game_state = make_player_and_state(None)
+    game_state.update_troops("Player 1", "Brazil", 5)
+    prompt_prefix, prompt = player.strategy_prompt_parts(rules, game_state)
+    for field in ("{self.name}", "{rules}", "{current_game_state}",
+                  "{formatted_attack_vectors}", "{number_of_territories}"):
+        assert field not in prompt_prefix + prompt
+    assert str(rules) in prompt_prefix
+    assert "You, are Player 1" in prompt
+    assert game_state.format_game_state() in prompt
+    assert "Peru" in prompt
+    # The board changes, the instructions stay the same
+    game_state.update_troops("Player 1", "Argentina", 1)
+    assert player.strategy_prompt_parts(rules, game_state) != (
+        prompt_prefix, prompt)
+    assert player.strategy_prompt_parts(rules, game_state)[0] == prompt_prefix
+
+
+def test_session_mode_only_sends_what_changed():
+    llm_client = FakeClient("Attack Opponent Territory:|||Blank, 0|||\n" +
+                            "From Territory:###Blank###")
+    player, rules, game_state = make_player_and_state(llm_client)
+    player.session = PlayerSession(max_messages=4)
+    player.turn_strategy = "Take Peru"
+    player.make_attack_move(rules, game_state, 0)
+    game_state.update_troops("Player 1", "Brazil", 5)
+    player.make_attack_move(rules, game_state, 0)
+
+    first_message, second_message = [
+        message["content"] for message in player.session.history[::2]]
+    assert str(rules) in first_message
+    assert "Brazil: Controlled by Player 1 with 3 troops" in first_message
+    assert str(rules) not in second_message
+    assert SAME_INSTRUCTIONS in second_message
+    assert "Brazil: Controlled by Player 1 with 8 troops" in second_message
+    assert "Peru: Controlled by" not in second_message
+    assert llm_client.histories[1] == player.session.history[:2]
+    assert len(second_message) < len(first_message) / 2
+
+    # The oldest exchange is summarised, without it the next message sends
+    # the full board again
+    player.make_attack_move(rules, game_state, 0)
+    assert player.session.truncations == 1
+    assert player.session.history[0]["content"].startswith(SUMMARY_HEADER)
+    player.make_attack_move(rules, game_state, 0)
+    assert "Peru: Controlled by Player 2" in player.session.history[-2]["content"]
+    assert player.session.stateless_tokens > 0
+    assert player.session_tokens_saved == (player.session.stateless_tokens -
+                                           player.session.session_tokens)
+
+    player.define_strategy_for_move(rules, game_state)
+    assert len(player.session.history) == 2
+
+
+def test_json_output_mode_sends_the_schema_and_reads_json_moves():
+    llm_client = FakeClient('{"territory": "Peru", "troops": 2, ' +
+                            '"from_territory": "Brazil", "reasoning": "Go"}')
+    player, rules, game_state = make_player_and_state(llm_client)
+    player.output_mode = "json"
+    assert player.make_attack_move(rules, game_state, 0) == (
+        [{'territory_name': 'Peru', 'num_troops': 2}], 'Go', 'Brazil')
+    assert llm_client.response_schemas == [MOVE_SCHEMAS["attack"]]
+    assert "Answer ONLY with a JSON object" in llm_client.prompt_prefixes[0]
+
+    # A territory that is not on the map is a formatting error
+    llm_client.response = ('{"moves": [{"territory": "Brasil", "troops": 1}], ' +
+                           '"reasoning": ""}')
+    moves, _, _ = player.make_initial_troop_placement(
+        rules, game_state, error_msg="Invalid move")
+    assert moves == [{'territory_name': None, 'num_troops': None}]
+    assert (player.move_requests, player.move_retries) == (2, 1)
+    assert player.retry_rate == 0.5
+
+    llm_client.response = '{"cards": [], "reasoning": "Wait"}'
+    assert player.may_trade_cards([], game_state, {}) == ([0], "Wait")
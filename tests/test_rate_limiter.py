@@ -0,0 +1,46 @@
+import pytest
+from risk_game.llm_clients.rate_limiter import RateLimiter, backoff_delay, \
+get_rate_limiter
+
+
+def test_requests_are_spaced_in_arrival_order():
+    rate_limiter = RateLimiter(requests_per_minute=60, tokens_per_minute=10**6)
+    burst = [rate_limiter.reserve(10) for _ in range(60)]
+    queued = [rate_limiter.reserve(10) for _ in range(3)]
+
+    assert max(burst) == 0
+    assert queued == pytest.approx([1, 2, 3], abs=0.05)
+
+
+def test_tokens_per_minute_limit_and_usage_correction():
+    rate_limiter = RateLimiter(requests_per_minute=1000, tokens_per_minute=600)
+    assert rate_limiter.reserve(600) == 0
+    # 10 tokens per second refill
+    assert rate_limiter.reserve(100) == pytest.approx(10, abs=0.05)
+
+    # The requests used fewer tokens than estimated
+    rate_limiter.record_usage(estimated_tokens=700, used_tokens=100)
+    assert rate_limiter.reserve(100) == pytest.approx(0, abs=0.05)
+
+
+def test_pause_holds_back_every_request():
+    rate_limiter = RateLimiter(requests_per_minute=600, tokens_per_minute=10**6)
+    rate_limiter.pause(5)
+    assert rate_limiter.reserve(1) == pytest.approx(5.1, abs=0.05)
+
+
+def test_limiters_are_shared_per_model():
+    first = get_rate_limiter("Test", "model-a")
+    assert get_rate_limiter("Test", "model-a") is first
+    assert get_rate_limiter("Test", "model-b") is not first
+
+    custom = get_rate_limiter("Test", "model-a", requests_per_minute=5)
+    assert custom is not first and custom.requests_per_minute == 5
+    assert get_rate_limiter("Test", "model-a") is custom
+
+
+def test_backoff_is_jittered_and_capped():
+    delays = [backoff_delay(attempt, 10, max_delay=60) 
+              for attempt in range(6) for _ in range(50)]
+    assert all(0 <= delay <= 60 for delay in delays)
+    assert len(set(delays)) > 1
@@ -0,0 +1,105 @@
+import asyncio
+import os
+import pytest
+from risk_game.llm_clients.llm_client import create_async_llm_client, \
+create_llm_client
+from risk_game.llm_clients.llm_base import AsyncLLMClient, LLMClient
+from risk_game.llm_clients.response_cache import AsyncCachedLLMClient, \
+CachedLLMClient, CacheMissError, ResponseCache, DEFAULT_CACHE_PATH
+
+
+class CountingClient(LLMClient):
+    def __init__(self, temperature=1):
+        super().__init__(provider_name="Fake", model_type="fake",
+                         temperature=temperature)
+        self.calls = 0
+
+    def get_chat_completion(self, message_content, system_prompt=None,
+                            prompt_prefix=None, history=None,
+                            response_schema=None):
+        self.calls += 1
+        return f"{message_content} #{self.calls}"
+
+
+class AsyncCountingClient(AsyncLLMClient):
+    def __init__(self):
+        super().__init__(provider_name="Fake", model_type="fake")
+        self.calls = 0
+
+    async def get_chat_completion(self, message_content, system_prompt=None,
+                                  prompt_prefix=None, history=None,
+                                  response_schema=None):
+        self.calls += 1
+        return f"{message_content} #{self.calls}"
+
+
+def test_record_then_replay_without_provider(tmp_path):
+    cache = ResponseCache(str(tmp_path / "cache.sqlite"))
+    recording = CachedLLMClient(CountingClient(), cache, mode="record")
+    recorded = [recording.get_chat_completion(prompt)
+                for prompt in ["attack", "attack", "fortify"]]
+    assert recorded == ["attack #1", "attack #2", "fortify #3"]
+
+    # A fresh client replays every occurrence of a prompt in order
+    provider = CountingClient()
+    replaying = CachedLLMClient(provider, cache, mode="replay")
+    assert [replaying.get_chat_completion(prompt)
+            for prompt in ["attack", "attack", "fortify"]] == recorded
+    assert provider.calls == 0 and replaying.hits == 3
+    with pytest.raises(CacheMissError):
+        replaying.get_chat_completion("attack")
+
+
+def test_key_includes_model_settings(tmp_path):
+    cache = ResponseCache(str(tmp_path / "cache.sqlite"))
+    CachedLLMClient(CountingClient(temperature=1), cache, 
+                    mode="record").get_chat_completion("attack")
+    other_temperature = CachedLLMClient(CountingClient(temperature=0), cache, 
+                                        mode="replay")
+    with pytest.raises(CacheMissError):
+        other_temperature.get_chat_completion("attack")
+
+
+def test_auto_and_bypass_modes(tmp_path):
+    cache = ResponseCache(str(tmp_path / "cache.sqlite"))
+    provider = CountingClient()
+    CachedLLMClient(provider, cache, mode="auto").get_chat_completion("attack")
+    assert CachedLLMClient(provider, cache, 
+                           mode="auto").get_chat_completion("attack") == "attack #1"
+    assert CachedLLMClient(provider, cache, 
+                           mode="bypass").get_chat_completion("attack") == "attack #2"
+    assert provider.calls == 2 and len(cache) == 1
+
+
+def test_bypass_mode_opens_no_cache(tmp_path):
+    cache_path = str(tmp_path / "cache.sqlite")
+    for create_client in (create_llm_client, create_async_llm_client):
+        client = create_client("Local", 1, seed=0, cache_mode="bypass",
+                               cache_path=cache_path)
+        assert not isinstance(client, (CachedLLMClient, AsyncCachedLLMClient))
+    assert not os.path.exists(cache_path)
+    # Not in the working directory
+    assert os.path.isabs(DEFAULT_CACHE_PATH)
+
+
+def test_least_recently_used_responses_are_evicted(tmp_path):
+    cache = ResponseCache(str(tmp_path / "cache.sqlite"), max_size_bytes=40)
+    client = CachedLLMClient(CountingClient(), cache, mode="record")
+    for prompt in ["first prompt", "second prompt", "third prompt"]:
+        client.get_chat_completion(prompt)
+
+    assert cache.size_bytes() <= 40
+    replaying = CachedLLMClient(CountingClient(), cache, mode="replay")
+    assert replaying.get_chat_completion("third prompt") == "third prompt #3"
+    with pytest.raises(CacheMissError):
+        replaying.get_chat_completion("first prompt")
+
+
+def test_async_client_shares_the_cache(tmp_path):
+    cache = ResponseCache(str(tmp_path / "cache.sqlite"))
+    recording = AsyncCachedLLMClient(AsyncCountingClient(), cache, mode="record")
+    response = asyncio.run(recording.get_chat_completion("attack"))
+
+    replaying = CachedLLMClient(CountingClient(temperature=0), cache, 
+                                mode="replay")
+    assert replaying.get_chat_completion("attack") == response
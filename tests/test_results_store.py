@@ -0,0 +1,75 @@
+import os
+import pandas as pd
+from game_analysis.data_processing import combine_game_results, \
+load_game_state_from_folder, load_player_data_from_folder, \
+process_json_files_in_folder
+from game_analysis.results_store import STORE_FOLDER, ResultsStore, \
+ingest_results
+from risk_game.experiments import Experiment
+from risk_game.game_config import GameConfig
+
+
+def run_experiment(base_folder, num_games=2):
+    manifest = Experiment(GameConfig(max_rounds=10), agent_mix=0,
+                          num_games=num_games, seed=11).run_experiment(
+        base_folder=str(base_folder))
+    return os.path.dirname(manifest['games'][0]['folder'])
+
+
+def sorted_frame(df):
+    return df.sort_values(list(df.columns)).reset_index(drop=True)
+
+
+def test_store_returns_the_results_of_the_game_folders(tmp_path):
+    experiment_folder = run_experiment(tmp_path)
+    assert ingest_results(str(tmp_path)) == 2
+    store = ResultsStore(str(tmp_path / STORE_FOLDER))
+
+    for loader in (load_game_state_from_folder, load_player_data_from_folder,
+                   process_json_files_in_folder):
+        folder_df = combine_game_results(loader, experiment_folder)
+        store_df = combine_game_results(loader, experiment_folder,
+                                        store=store)
+        assert list(store_df.columns) == list(folder_df.columns)
+        pd.testing.assert_frame_equal(sorted_frame(store_df),
+                                      sorted_frame(folder_df),
+                                      check_dtype=False)
+
+    games = store.games()
+    assert games['Turns'].tolist() == [
+        len(load_player_data_from_folder(folder)) // 3
+        for folder in games['Game_Folder'].map(
+            lambda key: os.path.join(str(tmp_path), key))]
+    assert set(games['Agent_Mix']) == {0}
+
+
+def test_ingest_adds_only_new_games(tmp_path):
+    run_experiment(tmp_path, num_games=1)
+    assert ingest_results(str(tmp_path)) == 1
+    assert ingest_results(str(tmp_path)) == 0
+
+    experiment_folder = run_experiment(tmp_path / "second", num_games=1)
+    assert ingest_results(str(tmp_path)) == 1
+    store = ResultsStore(str(tmp_path / STORE_FOLDER))
+    assert len(store.games()) == 2
+    # Only the games of the experiment are read
+    game_folders = [os.path.join(experiment_folder, name)
+                    for name in os.listdir(experiment_folder)
+                    if os.path.isdir(os.path.join(experiment_folder, name))]
+    state = store.query('game_state', ['Game_Id'],
+                        game_ids=[store.game_id(game_folders[0])])
+    assert set(state['Game_Id']) == {store.game_id(game_folders[0])}
+
+
+def test_store_reads_the_games_it_does_not_have_from_their_folders(tmp_path):
+    run_experiment(tmp_path / "ingested", num_games=1)
+    assert ingest_results(str(tmp_path / "ingested")) == 1
+    store = ResultsStore(str(tmp_path / "ingested" / STORE_FOLDER))
+    experiment_folder = run_experiment(tmp_path / "new", num_games=1)
+
+    for loader in (load_game_state_from_folder, load_player_data_from_folder,
+                   process_json_files_in_folder):
+        pd.testing.assert_frame_equal(
+            combine_game_results(loader, experiment_folder, store=store),
+            combine_game_results(loader, experiment_folder))
+    assert store.query('game_state', ['Game_Id'], game_ids=[]).empty
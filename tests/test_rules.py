@@ -0,0 +1,13 @@
+from risk_game.game_config import GameConfig
+from risk_game.rules import Rules
+
+
+def test_calculate_continent_bonus():
+    rules = Rules(GameConfig())
+    south_america = ["Venezuela", "Peru", "Brazil", "Argentina"]
+    australia = ["Indonesia", "New Guinea", "Western Australia",
+                 "Eastern Australia"]
+
+    assert rules.calculate_continent_bonus(south_america) == 2
+    assert rules.calculate_continent_bonus(south_america + australia) == 4
+    assert rules.calculate_continent_bonus(south_america[1:] + australia) == 2
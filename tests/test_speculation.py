@@ -0,0 +1,69 @@
+import asyncio
+from risk_game.game_config import GameConfig
+from risk_game.game_master import GameMaster
+from risk_game.llm_clients.llm_client import create_async_llm_client
+from risk_game.rules import Rules
+from tests.test_player_agent import FakeAsyncClient, make_player_and_state
+
+LATENCY = 0.1
+
+
+class CountingClient(FakeAsyncClient):
+    def __init__(self, response: str) -> None:
+        super().__init__(response, delay=LATENCY)
+        self.prompts = []
+
+    async def get_chat_completion(self, message_content: str, *args, **kwargs
+                                  ) -> str:
+        self.prompts.append(message_content)
+        return await super().get_chat_completion(message_content, *args,
+                                                 **kwargs)
+
+
+def test_speculative_prompt_is_used_only_for_the_same_prompt():
+    client = CountingClient("To Territory:|||Blank, 0|||\n" +
+                            "From Territory:###Blank###")
+    player, rules, game_state = make_player_and_state(client)
+
+    async def fortify_twice():
+        player.speculate(player.fortify_prompt_parts(rules, game_state),
+                         rules, game_state, "fortify")
+        first = await player.make_fortify_move_async(rules, game_state)
+        player.speculate(player.fortify_prompt_parts(rules, game_state),
+                         rules, game_state, "fortify")
+        # The board changes before the move is asked for
+        game_state.update_troops("Player 1", "Brazil", 2)
+        second = await player.make_fortify_move_async(rules, game_state)
+        return first, second
+
+    first, second = asyncio.run(fortify_twice())
+    assert first == second
+    assert player.speculative_prompts == 2
+    assert player.speculation_hits == 1
+    # The move was asked again on the new board
+    assert "Controlled by Player 1 with 5 troops" in client.prompts[-1]
+    assert player.speculations == {}
+
+
+def test_speculative_turns_overlap_the_prompts(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    profile = {"median_latency": LATENCY, "latency_sigma": 0.0,
+               "error_rate": 0.0, "rate_limit_rate": 0.0,
+               "malformed_rate": 0.0}
+    game = GameMaster(Rules(GameConfig(speculative_prompts=True)), seed=3)
+    for name, model_number in (("A", 1), ("B", 2), ("C", 3)):
+        game.add_player(name, create_async_llm_client(
+            "Local", model_number, seed=0, profile=profile))
+    game.init_game_state()
+    game.distribute_territories_random()
+    player = game.players[0]
+
+    asyncio.run(game.play_a_turn(player))
+
+    # The placement went out with the strategy
+    assert player.speculation_hits >= 1
+    assert player.speculations == {}
+    # One turn of prompts one after the other takes at least the strategy
+    # and every move prompt
+    serial_time = (1 + player.move_requests) * LATENCY
+    assert player.accumulated_turn_time < serial_time - LATENCY / 2